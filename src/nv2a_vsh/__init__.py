@@ -1,6 +1,6 @@
 """Setuptools entrypoint for assembler/disassembler."""
 
-from nv2a_vsh import assemble, disassemble
+from nv2a_vsh import assemble, disassemble, search, verify
 
 
 def run_assemble():
@@ -11,3 +11,13 @@ def run_assemble():
 def run_disassemble():
     """Disassemble nv2a machine code into assembly code."""
     disassemble.entrypoint()
+
+
+def run_search():
+    """Search nv2a machine code for instructions matching field predicates."""
+    search.entrypoint()
+
+
+def run_verify():
+    """Verify that nv2a machine code survives a disassemble -> assemble round trip."""
+    verify.entrypoint()
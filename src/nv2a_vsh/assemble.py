@@ -7,12 +7,17 @@
 from __future__ import annotations
 
 import argparse
+import io
 import logging
 import os
+import re
 import sys
 
+from nv2a_vsh.nv2a_vsh_asm import archive, constant_footprint, interface, program_writer, specialization, stats
 from nv2a_vsh.nv2a_vsh_asm.assembler import Assembler
 
+OUTPUT_FORMATS = ("inl", "binary", "header", "npy")
+
 
 def assemble_to_c(source: str, *, explicit_final: bool = False) -> tuple[str, list[Assembler.ErrorContext]]:
     """Assembles the given source string, returning a C-style list of values."""
@@ -35,6 +40,38 @@ def assemble(source: str, *, explicit_final: bool = False) -> tuple[list[list[in
     return results, []
 
 
+def _default_array_name(output: str | None) -> str:
+    if not output:
+        return "vsh_program"
+    name = re.sub(r"\W", "_", os.path.splitext(os.path.basename(output))[0])
+    if not name or name[0].isdigit():
+        name = f"vsh_{name}"
+    return name
+
+
+def _write_output(asm: Assembler, output_format: str, outfile, array_name: str, *, comments: bool) -> None:
+    if output_format == "binary":
+        program_writer.write_binary(asm.output, outfile)
+    elif output_format == "npy":
+        program_writer.write_npy(asm.output, outfile)
+    elif output_format == "header":
+        program_writer.write_c_header(asm.output, outfile, array_name, comments=asm.comments if comments else None)
+    else:
+        outfile.write(asm.get_c_output())
+        outfile.write("\n")
+
+
+def _write_interface(asm: Assembler, path: str, array_name: str) -> None:
+    program_interface = interface.analyze(asm.output)
+    contents = io.StringIO()
+    if os.path.splitext(path)[1].lower() in {".h", ".hpp"}:
+        program_interface.write_c_header(contents, array_name)
+    else:
+        program_interface.write_json(contents)
+    with open(path, "w", encoding="utf-8") as outfile:
+        outfile.write(contents.getvalue())
+
+
 def _main(args):
     log_level = logging.DEBUG if args.verbose else logging.INFO
     logging.basicConfig(level=log_level)
@@ -44,23 +81,105 @@ def _main(args):
         print(f"Failed to open input file '{args.input}'", file=sys.stderr)
         return 1
 
+    try:
+        latency_model = stats.parse_latency_model(args.latency or ())
+        input_ranges, constant_ranges = constant_footprint.parse_value_ranges(args.value_range or ())
+        known_constants = (
+            specialization.parse_constant_values(args.constant_value) if args.constant_value is not None else None
+        )
+    except ValueError as err:
+        print(err, file=sys.stderr)
+        return 1
+
     with open(input_file) as infile:
         source = infile.read()
-    results, errors = assemble_to_c(source, explicit_final=args.explicit_final)
-    if errors:
+    asm = Assembler(source)
+    if not asm.assemble(
+        inline_final_flag=(not args.explicit_final),
+        known_constants=known_constants,
+        fast_math=args.fast_math,
+        optimize_peephole=args.peephole,
+        unit_w_inputs=args.unit_w_input or (),
+        eliminate_common_subexpressions=args.eliminate_common_subexpressions,
+        eliminate_dead_code=args.eliminate_dead_code,
+        allocate_registers=args.allocate_registers,
+        pinned_registers=args.pin_register or (),
+        schedule=args.schedule,
+    ):
         print(f"Assembly failed due to errors in {args.input}:", file=sys.stderr)
-        for error in errors:
+        for error in asm.errors:
             print(
                 f"{args.input}:{error.line}:{error.column}: {error.message}",
                 file=sys.stderr,
             )
         return 1
 
+    if asm.specialization_result:
+        for line in asm.specialization_result.report():
+            print(line, file=sys.stderr)
+
+    if asm.peephole_result:
+        for line in asm.peephole_result.report():
+            print(line, file=sys.stderr)
+
+    if asm.common_subexpression_result:
+        for line in asm.common_subexpression_result.report():
+            print(line, file=sys.stderr)
+
+    if asm.dead_code_result:
+        for line in asm.dead_code_result.report():
+            print(line, file=sys.stderr)
+
+    if asm.allocation_result:
+        print(asm.allocation_result.report(), file=sys.stderr)
+
+    if asm.schedule_result:
+        result = asm.schedule_result
+        print(
+            f"Scheduling saved {result.slots_saved} of {result.original_slots} instruction slots",
+            file=sys.stderr,
+        )
+
+    if args.stats:
+        for line in stats.analyze(asm.output, latency_model).report():
+            print(line, file=sys.stderr)
+
+    if args.constant_footprint:
+        footprint = constant_footprint.analyze(
+            asm.output, input_ranges=input_ranges, constant_ranges=constant_ranges, uniforms=asm.uniforms
+        )
+        for line in footprint.report():
+            print(line, file=sys.stderr)
+
+    array_name = args.name or _default_array_name(args.output)
+    if args.interface:
+        try:
+            _write_interface(asm, os.path.abspath(os.path.expanduser(args.interface)), array_name)
+        except ValueError as err:
+            print(f"Failed to write interface '{args.interface}': {err}", file=sys.stderr)
+            return 1
+
+    if args.archive:
+        if args.output:
+            print("An output path may not be combined with --archive", file=sys.stderr)
+            return 1
+        entry_name = args.name or os.path.splitext(os.path.basename(args.input))[0]
+        try:
+            archive.update_archive(os.path.abspath(os.path.expanduser(args.archive)), entry_name, asm.output)
+        except ValueError as err:
+            print(f"Failed to update archive '{args.archive}': {err}", file=sys.stderr)
+            return 1
+        return 0
+
+    is_binary = args.format in {"binary", "npy"}
     if args.output:
-        with open(args.output, "w") as outfile:
-            outfile.write(results)
+        with open(args.output, "wb" if is_binary else "w") as outfile:
+            _write_output(asm, args.format, outfile, array_name, comments=not args.no_comments)
+    elif is_binary:
+        _write_output(asm, args.format, sys.stdout.buffer, array_name, comments=not args.no_comments)
+        sys.stdout.buffer.flush()
     else:
-        print(results)
+        _write_output(asm, args.format, sys.stdout, array_name, comments=not args.no_comments)
 
     return 0
 
@@ -81,7 +200,39 @@ def entrypoint():
             "output",
             nargs="?",
             metavar="target_path",
-            help="Path to write the .inl output.",
+            help="Path to write the output to. Defaults to stdout.",
+        )
+
+        parser.add_argument(
+            "-f",
+            "--format",
+            choices=OUTPUT_FORMATS,
+            default="inl",
+            help=(
+                "Output format: 'inl' is a commented list of C values, 'binary' is raw little-endian uint32 words, "
+                "'header' is a complete C header and 'npy' is an (N, 4) uint32 NumPy array."
+            ),
+        )
+
+        parser.add_argument(
+            "--name",
+            help=(
+                "Name of the array declared by the 'header' format (defaults to the output file name) or of the "
+                "program added to an --archive (defaults to the source file name)."
+            ),
+        )
+
+        parser.add_argument(
+            "-a",
+            "--archive",
+            metavar="archive_path",
+            help="Add the assembled program to the given archive, creating it if necessary, instead of writing output.",
+        )
+
+        parser.add_argument(
+            "--no-comments",
+            action="store_true",
+            help="Omit the per-instruction source comments from the 'header' format.",
         )
 
         parser.add_argument(
@@ -91,6 +242,118 @@ def entrypoint():
             help="Append a nop instruction instead of marking the last real instruction as FINAL",
         )
 
+        parser.add_argument(
+            "--interface",
+            metavar="interface_path",
+            help=(
+                "Write the input registers read and output registers written by the program, with their component "
+                "masks, to the given path. Paths ending in '.h' receive a C header, other paths receive JSON."
+            ),
+        )
+
+        parser.add_argument(
+            "--constant-value",
+            action="append",
+            metavar="REGISTER=X,Y,Z,W",
+            help=(
+                "Specialize the program for a constant register that always holds the given values (e.g., "
+                "'c4=1,0,0,0', or 'c4=0' for all four components), folding them into the operations that read it. "
+                "May be repeated."
+            ),
+        )
+
+        parser.add_argument(
+            "--fast-math",
+            action="store_true",
+            help=(
+                "Let --constant-value assume that no value is infinite or NaN and ignore the sign of zero results, to "
+                "fold 0 * x to 0 and x + 0 to x."
+            ),
+        )
+
+        parser.add_argument(
+            "--peephole",
+            action="store_true",
+            help="Rewrite common instruction idioms (e.g., MUL + ADD) into cheaper equivalent forms.",
+        )
+
+        parser.add_argument(
+            "--unit-w-input",
+            action="append",
+            type=int,
+            choices=range(16),
+            metavar="INDEX",
+            help="Declare that the w component of the given input register is 1.0 for --peephole. May be repeated.",
+        )
+
+        parser.add_argument(
+            "--eliminate-common-subexpressions",
+            action="store_true",
+            help=(
+                "Remove operations that recompute a value that is still held in a register (e.g., repeated macro "
+                "expansions) and read the earlier result instead."
+            ),
+        )
+
+        parser.add_argument(
+            "--eliminate-dead-code",
+            action="store_true",
+            help="Remove operations and write mask components whose results are never read.",
+        )
+
+        parser.add_argument(
+            "--allocate-registers",
+            action="store_true",
+            help="Rename temporary registers to minimize the number in use and keep R1 free for ILU pairing.",
+        )
+
+        parser.add_argument(
+            "--pin-register",
+            action="append",
+            type=int,
+            choices=range(12),
+            metavar="INDEX",
+            help="Keep the name of the given temporary register during --allocate-registers. May be repeated.",
+        )
+
+        parser.add_argument(
+            "--schedule",
+            action="store_true",
+            help="Reorder operations to pair independent MAC and ILU operations into single instructions.",
+        )
+
+        parser.add_argument(
+            "--stats",
+            action="store_true",
+            help="Print the instruction count, unit utilization and estimated cycles per vertex of the program.",
+        )
+
+        parser.add_argument(
+            "--latency",
+            action="append",
+            metavar="NAME=CYCLES",
+            help=(
+                "Override the latency model used by --stats. NAME is 'mac', 'ilu' or an operation such as 'RSQ'. "
+                "May be repeated."
+            ),
+        )
+
+        parser.add_argument(
+            "--constant-footprint",
+            action="store_true",
+            help="Print the constant registers read by the program and a plan of contiguous ranges to upload.",
+        )
+
+        parser.add_argument(
+            "--value-range",
+            action="append",
+            metavar="REGISTER=MIN:MAX",
+            help=(
+                "Bound the values of an input (e.g., 'v3=0:29') or constant (e.g., 'c4=3:3') register, to narrow the "
+                "c[A0+n] reads reported by --constant-footprint. May be repeated."
+            ),
+        )
+
         parser.add_argument(
             "-v",
             "--verbose",
@@ -7,12 +7,18 @@
 from __future__ import annotations
 
 import argparse
+import io
+import json
 import logging
 import os
 import re
 import sys
+from typing import TYPE_CHECKING, Any
 
-from nv2a_vsh.nv2a_vsh_asm import vsh_instruction
+from nv2a_vsh.nv2a_vsh_asm import archive, constant_footprint, program_writer, stats, vsh_instruction
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
 
 _HEX_MATCH = r"0x[0-9a-fA-F]+"
 _VALUE_RE = re.compile(r"\s*(" + _HEX_MATCH + r")\s*,?", re.MULTILINE)
@@ -32,9 +38,45 @@ def _parse_text_input(infile):
 
 
 def _parse_binary_input(infile):
-    del infile
-    # TODO: Implement me.
-    raise NotImplementedError
+    data = infile.read()
+    if archive.is_archive(data):
+        msg = "Input is a program archive, use load_programs to read it"
+        raise ValueError(msg)
+    if program_writer.is_npy(data):
+        return program_writer.read_npy(io.BytesIO(data))
+    return program_writer.read_binary(io.BytesIO(data))
+
+
+def load_values(input_file: str, *, text: bool) -> list[list[int]]:
+    """Loads the list of machine code quadruplets stored in the given file."""
+    if text:
+        with open(input_file, encoding="utf-8") as infile:
+            return _parse_text_input(infile)
+
+    with open(input_file, "rb") as infile:
+        return _parse_binary_input(infile)
+
+
+def _is_archive_file(input_file: str) -> bool:
+    with open(input_file, "rb") as infile:
+        return archive.is_archive(infile.read(len(archive.MAGIC)))
+
+
+def load_programs(input_file: str, *, text: bool, label: str | None = None) -> list[tuple[str, list[list[int]]]]:
+    """Loads the (name, machine code quadruplets) programs stored in the given file.
+
+    Archives written by `nv2avsh --archive` produce one entry per contained program, named `label:program`. Any other
+    file produces a single entry named `label`.
+
+    :param label: The name used to identify the file, defaults to `input_file`.
+    """
+    if label is None:
+        label = input_file
+    if not text and _is_archive_file(input_file):
+        with archive.ProgramArchive(input_file) as program_archive:
+            return [(f"{label}:{name}", program_archive.values(name)) for name in program_archive.names]
+
+    return [(label, load_values(input_file, text=text))]
 
 
 def disassemble(values: list[list[int]], *, explain: bool = True) -> list[str]:
@@ -53,6 +95,36 @@ def disassemble(values: list[list[int]], *, explain: bool = True) -> list[str]:
     return ret
 
 
+def disassemble_to_records(values: list[list[int]]) -> Iterator[dict[str, Any]]:
+    """Yields a structured description of each of the given machine code entries.
+
+    Each record contains the instruction `index`, the raw `words`, the decoded `fields`, and the `mac` and `ilu`
+    operations (as produced by `VshInstruction.disassemble_to_dict`, or None if the unit is unused).
+    """
+    vsh_ins = vsh_instruction.VshInstruction()
+    for index, instruction in enumerate(values):
+        vsh_ins.set_values(instruction)
+        operations = vsh_ins.disassemble_to_dict()
+        yield {
+            "index": index,
+            "words": list(instruction),
+            "fields": vsh_instruction.decode_fields(instruction),
+            "mac": operations.get("mac"),
+            "ilu": operations.get("ilu"),
+        }
+
+
+def write_jsonl(values: list[list[int]], outfile, *, program: str | None = None) -> None:
+    """Writes one JSON object per machine code entry to the given text stream.
+
+    :param program: If given, added to each record as `program` (e.g., to identify the source of archived programs).
+    """
+    encoder = json.JSONEncoder(separators=(",", ":"))
+    for record in disassemble_to_records(values):
+        outfile.write(encoder.encode(record if program is None else {"program": program, **record}))
+        outfile.write("\n")
+
+
 def disassemble_to_instructions(
     values: list[list[int]],
 ) -> list[vsh_instruction.VshInstruction]:
@@ -74,15 +146,51 @@ def _main(args):
         print(f"Failed to open input file '{args.input}'", file=sys.stderr)
         return 1
 
-    if args.text:
-        with open(input_file, encoding="utf-8") as infile:
-            values = _parse_text_input(infile)
-    else:
-        with open(input_file, "rb") as infile:
-            values = _parse_binary_input(infile)
+    try:
+        latency_model = stats.parse_latency_model(args.latency or ())
+        input_ranges, constant_ranges = constant_footprint.parse_value_ranges(args.value_range or ())
+    except ValueError as err:
+        print(err, file=sys.stderr)
+        return 1
 
-    results = disassemble(values, explain=args.explain)
-    results = "\n".join(results)
+    if not args.text and _is_archive_file(input_file):
+        with archive.ProgramArchive(input_file) as program_archive:
+            if args.name and args.name not in program_archive:
+                print(f"No program named '{args.name}' in archive '{args.input}'", file=sys.stderr)
+                return 1
+            names = [args.name] if args.name else program_archive.names
+            programs = [(name, program_archive.values(name)) for name in names]
+    else:
+        programs = [(None, load_values(input_file, text=args.text))]
+
+    if args.format == "jsonl" and not args.stats and not args.constant_footprint:
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as outfile:
+                for name, values in programs:
+                    write_jsonl(values, outfile, program=name)
+        else:
+            for name, values in programs:
+                write_jsonl(values, sys.stdout, program=name)
+        return 0
+
+    sections = []
+    for name, values in programs:
+        if args.stats or args.constant_footprint:
+            report = []
+            if args.stats:
+                report += stats.analyze(disassemble_to_instructions(values), latency_model).report()
+            if args.constant_footprint:
+                footprint = constant_footprint.analyze(
+                    values, input_ranges=input_ranges, constant_ranges=constant_ranges
+                )
+                report += footprint.report()
+            disassembled = "\n".join(report)
+        else:
+            disassembled = "\n".join(disassemble(values, explain=args.explain))
+        if name is not None and len(programs) > 1:
+            disassembled = f"// {name}\n{disassembled}"
+        sections.append(disassembled)
+    results = "\n\n".join(sections)
 
     if args.output:
         with open(args.output, "w", encoding="utf-8") as outfile:
@@ -128,6 +236,58 @@ def entrypoint():
             help="Add detailed comments describing the values of the fields.",
         )
 
+        parser.add_argument(
+            "-n",
+            "--name",
+            help="Disassemble only the named program from an archive. By default every program is disassembled.",
+        )
+
+        parser.add_argument(
+            "-f",
+            "--format",
+            choices=["text", "jsonl"],
+            default="text",
+            help="Output format. 'jsonl' emits one JSON object per instruction with its decoded fields and operands.",
+        )
+
+        parser.add_argument(
+            "--stats",
+            action="store_true",
+            help=(
+                "Print the instruction count, unit utilization and estimated cycles per vertex of each program instead "
+                "of disassembling it."
+            ),
+        )
+
+        parser.add_argument(
+            "--latency",
+            action="append",
+            metavar="NAME=CYCLES",
+            help=(
+                "Override the latency model used by --stats. NAME is 'mac', 'ilu' or an operation such as 'RSQ'. "
+                "May be repeated."
+            ),
+        )
+
+        parser.add_argument(
+            "--constant-footprint",
+            action="store_true",
+            help=(
+                "Print the constant registers read by each program and a plan of contiguous ranges to upload instead "
+                "of disassembling it."
+            ),
+        )
+
+        parser.add_argument(
+            "--value-range",
+            action="append",
+            metavar="REGISTER=MIN:MAX",
+            help=(
+                "Bound the values of an input (e.g., 'v3=0:29') or constant (e.g., 'c4=3:3') register, to narrow the "
+                "c[A0+n] reads reported by --constant-footprint. May be repeated."
+            ),
+        )
+
         parser.add_argument(
             "-v",
             "--verbose",
@@ -0,0 +1,209 @@
+"""Packs many encoded nv2a vertex shader programs into a single memory mappable archive.
+
+Layout (all integers little-endian):
+
+    header:   magic "NV2AVSHA" | u32 version | u32 program count
+    table:    one entry per program, sorted by (hash, name):
+              u64 FNV-1a hash of the UTF-8 name | u32 name offset | u32 name length |
+              u32 program offset | u32 instruction count
+    names:    UTF-8 program names
+    programs: 16-byte aligned blobs of 4 uint32 words per instruction
+
+Offsets are relative to the start of the file.
+"""
+
+from __future__ import annotations
+
+import bisect
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import typing
+
+from nv2a_vsh.nv2a_vsh_asm import program_writer
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Iterator, Mapping, Sequence
+
+    from typing_extensions import Self
+
+MAGIC = b"NV2AVSHA"
+_VERSION = 1
+_HEADER = struct.Struct("<8sII")
+_ENTRY = struct.Struct("<QIIII")
+_PROGRAM_ALIGNMENT = 16
+_INSTRUCTION_SIZE = 16
+
+_FNV_OFFSET_BASIS = 0xCBF29CE484222325
+_FNV_PRIME = 0x100000001B3
+
+
+def name_hash(name: str) -> int:
+    """Returns the 64-bit FNV-1a hash of the given program name, as stored in the archive table."""
+    ret = _FNV_OFFSET_BASIS
+    for byte in name.encode("utf-8"):
+        ret = ((ret ^ byte) * _FNV_PRIME) & 0xFFFFFFFFFFFFFFFF
+    return ret
+
+
+def is_archive(data: bytes) -> bool:
+    """Returns True if `data` begins with the archive magic string."""
+    return data.startswith(MAGIC)
+
+
+def write_archive(programs: Mapping[str, Sequence[Sequence[int]]], outfile: typing.BinaryIO) -> None:
+    """Writes the given mapping of name to machine code quadruplets as an archive."""
+    entries = sorted(((name_hash(name), name) for name in programs), key=lambda entry: (entry[0], entry[1]))
+    encoded_names = [name.encode("utf-8") for _hash, name in entries]
+
+    offset = _HEADER.size + _ENTRY.size * len(entries)
+    name_offsets = []
+    for encoded_name in encoded_names:
+        name_offsets.append(offset)
+        offset += len(encoded_name)
+
+    program_offsets = []
+    for _hash, name in entries:
+        if not programs[name]:
+            msg = f"Program '{name}' is empty"
+            raise ValueError(msg)
+        offset += -offset % _PROGRAM_ALIGNMENT
+        program_offsets.append(offset)
+        offset += len(programs[name]) * _INSTRUCTION_SIZE
+
+    outfile.write(_HEADER.pack(MAGIC, _VERSION, len(entries)))
+    for (hash_value, name), encoded_name, name_offset, program_offset in zip(
+        entries, encoded_names, name_offsets, program_offsets, strict=True
+    ):
+        outfile.write(_ENTRY.pack(hash_value, name_offset, len(encoded_name), program_offset, len(programs[name])))
+    for encoded_name in encoded_names:
+        outfile.write(encoded_name)
+
+    position = name_offsets[-1] + len(encoded_names[-1]) if entries else _HEADER.size
+    for (_hash, name), program_offset in zip(entries, program_offsets, strict=True):
+        outfile.write(b"\x00" * (program_offset - position))
+        program_writer.write_binary(programs[name], outfile)
+        position = program_offset + len(programs[name]) * _INSTRUCTION_SIZE
+
+
+def update_archive(path: str, name: str, values: Sequence[Sequence[int]]) -> None:
+    """Adds (or replaces) the program `name` in the archive at `path`, creating the archive if necessary.
+
+    The archive is rewritten to a temporary file which then replaces the original.
+    """
+    programs: dict[str, Sequence[Sequence[int]]] = {}
+    if os.path.exists(path):
+        with ProgramArchive(path) as archive:
+            programs = {entry: archive.values(entry) for entry in archive.names}
+    programs[name] = values
+
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile("wb", dir=directory, delete=False) as outfile:
+        try:
+            write_archive(programs, typing.cast("typing.BinaryIO", outfile))
+        except BaseException:
+            outfile.close()
+            os.unlink(outfile.name)
+            raise
+    os.replace(outfile.name, path)
+
+
+class ProgramArchive:
+    """Read-only, memory mapped view of an archive written via `write_archive`.
+
+    Programs are returned as zero-copy (N, 4) uint32 `memoryview`s into the mapping. All views must be released before
+    the archive is closed.
+    """
+
+    def __init__(self, path: str):
+        if sys.byteorder != "little":
+            msg = "Zero-copy archive views require a little-endian host"
+            raise RuntimeError(msg)
+
+        with open(path, "rb") as infile:
+            self._mmap = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._entries = self._read_table(path)
+        except (ValueError, struct.error):
+            self._mmap.close()
+            raise
+        self._hashes = [entry[0] for entry in self._entries]
+
+    def _read_table(self, path: str) -> list[tuple[int, int, int, int, int]]:
+        magic, version, count = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            msg = f"'{path}' is not a vertex shader archive"
+            raise ValueError(msg)
+        if version != _VERSION:
+            msg = f"Unsupported archive version {version}"
+            raise ValueError(msg)
+        return [_ENTRY.unpack_from(self._mmap, _HEADER.size + i * _ENTRY.size) for i in range(count)]
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *_args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, name: str) -> bool:
+        return self._find(name) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names)
+
+    def _name(self, entry: tuple[int, int, int, int, int]) -> str:
+        _hash, name_offset, name_length, _offset, _count = entry
+        return self._mmap[name_offset : name_offset + name_length].decode("utf-8")
+
+    def _find(self, name: str) -> tuple[int, int, int, int, int] | None:
+        hash_value = name_hash(name)
+        start = bisect.bisect_left(self._hashes, hash_value)
+        for entry in self._entries[start : bisect.bisect_right(self._hashes, hash_value, lo=start)]:
+            if self._name(entry) == name:
+                return entry
+        return None
+
+    def _view(self, entry: tuple[int, int, int, int, int]) -> memoryview:
+        _hash, _name_offset, _name_length, offset, count = entry
+        end = offset + count * _INSTRUCTION_SIZE
+        if end > len(self._mmap):
+            msg = f"Program '{self._name(entry)}' extends beyond the end of the archive"
+            raise ValueError(msg)
+        return memoryview(self._mmap)[offset:end].cast(program_writer.UINT32_TYPECODE, shape=[count, 4])  # type: ignore[call-overload]
+
+    @property
+    def names(self) -> list[str]:
+        """Returns the names of all programs in table (hash) order."""
+        return [self._name(entry) for entry in self._entries]
+
+    def program(self, name: str) -> memoryview:
+        """Returns a zero-copy (N, 4) uint32 view of the program with the given name."""
+        entry = self._find(name)
+        if entry is None:
+            raise KeyError(name)
+        return self._view(entry)
+
+    def program_by_hash(self, hash_value: int) -> memoryview:
+        """Returns a zero-copy view of the program whose name has the given `name_hash`."""
+        start = bisect.bisect_left(self._hashes, hash_value)
+        end = bisect.bisect_right(self._hashes, hash_value, lo=start)
+        if start == end:
+            raise KeyError(hash_value)
+        if end - start > 1:
+            names = [self._name(entry) for entry in self._entries[start:end]]
+            msg = f"Hash 0x{hash_value:016x} is shared by programs {names!r}"
+            raise ValueError(msg)
+        return self._view(self._entries[start])
+
+    def values(self, name: str) -> list[list[int]]:
+        """Returns a copy of the program with the given name as a list of machine code quadruplets."""
+        with self.program(name) as view:
+            return typing.cast("list[list[int]]", view.tolist())
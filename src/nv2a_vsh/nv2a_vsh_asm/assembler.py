@@ -2,13 +2,22 @@
 
 from __future__ import annotations
 
-from collections.abc import Iterable
+from collections.abc import Iterable, Mapping, Sequence
 
 import antlr4
 
 from nv2a_vsh.grammar.vsh.VshLexer import VshLexer
 from nv2a_vsh.grammar.vsh.VshParser import VshParser
-from nv2a_vsh.nv2a_vsh_asm import encoding_visitor, vsh_encoder
+from nv2a_vsh.nv2a_vsh_asm import (
+    common_subexpressions,
+    dead_code,
+    encoding_visitor,
+    peephole,
+    register_allocator,
+    scheduler,
+    specialization,
+    vsh_encoder,
+)
 from nv2a_vsh.nv2a_vsh_asm.vsh_error_listener import VshErrorListener
 
 
@@ -29,9 +38,49 @@ class Assembler:
         self._output: list[list[int]] = []
         self._pretty_sources: tuple = ()
         self._error_listener = VshErrorListener()
-
-    def assemble(self, **kwargs) -> bool:
-        """Assembles the source code and populates the output byte array"""
+        # Maps the name of each `#uniform` declared by the source to the constant registers that it occupies.
+        self.uniforms: dict[str, range] = {}
+        self.specialization_result: specialization.SpecializationResult | None = None
+        self.peephole_result: peephole.PeepholeResult | None = None
+        self.common_subexpression_result: common_subexpressions.CommonSubexpressionResult | None = None
+        self.dead_code_result: dead_code.DeadCodeResult | None = None
+        self.allocation_result: register_allocator.AllocationResult | None = None
+        self.schedule_result: scheduler.ScheduleResult | None = None
+
+    def assemble(
+        self,
+        *,
+        known_constants: Mapping[int, Sequence[float]] | None = None,
+        fast_math: bool = False,
+        optimize_peephole: bool = False,
+        unit_w_inputs: Iterable[int] = (),
+        eliminate_common_subexpressions: bool = False,
+        eliminate_dead_code: bool = False,
+        allocate_registers: bool = False,
+        pinned_registers: Iterable[int] = (),
+        schedule: bool = False,
+        **kwargs,
+    ) -> bool:
+        """Assembles the source code and populates the output byte array
+
+        :param known_constants: Maps constant register indices to the values that they always hold, to specialize the
+            program for them (see `specialization.specialize`). The outcome is recorded in `specialization_result`.
+        :param fast_math: Let specialization assume that no value is infinite or NaN and ignore the sign of zero
+            results, to fold products with zero and additions of zero.
+        :param optimize_peephole: Rewrite common instruction idioms into cheaper forms (see `peephole.optimize`). The
+            outcome is recorded in `peephole_result`.
+        :param unit_w_inputs: Indices of input registers whose `w` component is 1.0, for the peephole `dph` rule.
+        :param eliminate_common_subexpressions: Remove operations that recompute a value that is still held in a
+            register (see `common_subexpressions.eliminate_common_subexpressions`). The outcome is recorded in
+            `common_subexpression_result`.
+        :param eliminate_dead_code: Remove operations and write mask components whose results are never read (see
+            `dead_code.eliminate_dead_code`). The outcome is recorded in `dead_code_result`.
+        :param allocate_registers: Rename temporary registers to minimize the number in use (see
+            `register_allocator.allocate_registers`). The outcome is recorded in `allocation_result`.
+        :param pinned_registers: Indices of temporary registers that keep their names during register allocation.
+        :param schedule: Reorder operations and pair independent MAC and ILU operations (see `scheduler.schedule`).
+            The outcome is recorded in `schedule_result`.
+        """
         input_stream = antlr4.InputStream(self._source)
         lexer = VshLexer(input_stream)
         token_stream = antlr4.CommonTokenStream(lexer)
@@ -44,15 +93,11 @@ class Assembler:
 
         visitor = encoding_visitor.EncodingVisitor()
         program = visitor.visit(parser.program())  # type: ignore[func-returns-value]
+        self.uniforms = visitor.uniforms
 
         if self._error_listener.has_errors:
             return False
 
-        if not program:
-            self._output = []
-            self._pretty_sources = ()
-            return True
-
         def flatten(xs):
             for x in xs:
                 if isinstance(x, tuple):
@@ -62,8 +107,40 @@ class Assembler:
                 else:
                     yield x
 
-        program = flatten(program)
-        instructions, sources = zip(*program, strict=True)
+        statements = list(flatten(program or []))
+        self.specialization_result = None
+        self.peephole_result = None
+        self.common_subexpression_result = None
+        self.dead_code_result = None
+        self.allocation_result = None
+        self.schedule_result = None
+        if known_constants is not None:
+            self.specialization_result = specialization.specialize(
+                statements, known_constants, fast_math=fast_math, uniforms=self.uniforms
+            )
+            statements = self.specialization_result.statements
+        if optimize_peephole:
+            self.peephole_result = peephole.optimize(statements, unit_w_inputs=unit_w_inputs)
+            statements = self.peephole_result.statements
+        if eliminate_common_subexpressions:
+            self.common_subexpression_result = common_subexpressions.eliminate_common_subexpressions(statements)
+            statements = self.common_subexpression_result.statements
+        if eliminate_dead_code:
+            self.dead_code_result = dead_code.eliminate_dead_code(statements)
+            statements = self.dead_code_result.statements
+        if allocate_registers:
+            self.allocation_result = register_allocator.allocate_registers(statements, pinned_registers)
+            statements = self.allocation_result.statements
+        if schedule:
+            self.schedule_result = scheduler.schedule(statements)
+            statements = self.schedule_result.statements
+
+        if not statements:
+            self._output = []
+            self._pretty_sources = ()
+            return True
+
+        instructions, sources = zip(*statements, strict=True)
         self._output = vsh_encoder.encode(instructions, **kwargs)  # type: ignore[arg-type]
         self._pretty_sources = sources  # type: ignore[assignment]
         return True
@@ -80,6 +157,14 @@ class Assembler:
         """Retrieves the assembled list of machine code quadruplets."""
         return self._output
 
+    @property
+    def comments(self) -> list[str]:
+        """Retrieves a description of each entry in `output`, including any trailing FINAL marker."""
+        ret = [str(source) for source in self._pretty_sources]
+        if len(self._output) == len(self._pretty_sources) + 1:
+            ret.append("<NOP FINAL MARKER>")
+        return ret
+
     def get_c_output(self) -> str:
         """Retrieves the assembled machine code as a C-like string."""
         lines = []
@@ -0,0 +1,282 @@
+"""Removes operations that recompute a value that is still held in a register.
+
+Every register component is assigned a value number that identifies how its value was computed: two operations with
+the same opcode that read the same values produce the same value number, regardless of the registers involved (`MOV`
+keeps the number of its input, and the operands of commutative operations are sorted). An unpaired operation that
+writes only a temporary register is redundant if each component that it writes already holds, or may be read from, a
+register component with the same number. Repeated `%matmul4x4` and `%norm3` expansions of the same inputs are typical.
+
+Redundant operations are removed and the operands that read their results are rewritten to read the earlier register
+(a temporary or `R12`) instead. Each removal is verified by numbering the values of the rewritten program: every
+operand must read the same values as in the original program, so a removal is skipped if the earlier register is
+overwritten before the last read, or if an operand would need to read components from more than one register.
+Operations that write the same register are removed together, so that e.g. all four `DP4`s of a `%matmul4x4` may be
+replaced even though they are read as a single operand.
+"""
+
+from __future__ import annotations
+
+import typing
+
+from nv2a_vsh.nv2a_vsh_asm import dataflow, decoder
+from nv2a_vsh.nv2a_vsh_asm.vsh_encoder import Opcode, RegisterFile, SourceRegister
+from nv2a_vsh.nv2a_vsh_asm.vsh_encoder_defs import R12
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from nv2a_vsh.nv2a_vsh_asm.dataflow import Location, Operation, Statement
+
+# Operations whose result components differ from each other. Other operations that are not component-wise write the
+# same value to every component.
+_PER_COMPONENT_RESULTS = frozenset({Opcode.OPCODE_DST, Opcode.OPCODE_EXP, Opcode.OPCODE_LOG, Opcode.OPCODE_LIT})
+
+# The number of leading operands of each operation that may be exchanged without changing the result.
+_COMMUTATIVE_OPERANDS = {
+    Opcode.OPCODE_ADD: 2,
+    Opcode.OPCODE_MUL: 2,
+    Opcode.OPCODE_MAD: 2,
+    Opcode.OPCODE_MIN: 2,
+    Opcode.OPCODE_MAX: 2,
+    Opcode.OPCODE_DP3: 2,
+    Opcode.OPCODE_DP4: 2,
+}
+
+# Stands in for the contents of the whole constant file, which is read by `c[A0+n]` operands.
+_CONSTANTS: Location = (RegisterFile.PROGRAM_ENV_PARAM, -1, 0)
+
+
+class CommonSubexpressionResult(typing.NamedTuple):
+    """The result of common subexpression elimination."""
+
+    statements: list[Statement]
+    # The source of each instruction that was removed.
+    removed: list[str]
+    # The (original, rewritten) source of each instruction that now reads an earlier result.
+    rewritten: list[tuple[str, str]]
+
+    def report(self) -> list[str]:
+        """Returns a line describing each change."""
+        return [f"Removed redundant instruction '{source}'" for source in self.removed] + [
+            f"Rewrote '{original}' to '{rewritten}'" for original, rewritten in self.rewritten
+        ]
+
+
+class _ValueNumbers:
+    """Assigns the same number to values that are computed in the same way."""
+
+    def __init__(self) -> None:
+        self._numbers: dict[tuple, int] = {}
+        self._negated: dict[int, int] = {}
+
+    def number(self, key: tuple) -> int:
+        return self._numbers.setdefault(key, len(self._numbers))
+
+    def negate(self, value: int) -> int:
+        ret = self._negated.get(value)
+        if ret is None:
+            ret = self.number(("negate", value))
+            self._negated[value] = ret
+            self._negated[ret] = value
+        return ret
+
+    def read(self, state: dict[Location, int], location: Location) -> int:
+        """Returns the number of the value held by `location` in `state`."""
+        value = state.get(location)
+        if value is None:
+            value = self.number(("initial", location))
+            state[location] = value
+        return value
+
+    def operand(self, state: dict[Location, int], source: SourceRegister, slot: int) -> int:
+        """Returns the number of the value read by the given swizzle slot of `source`."""
+        component = dataflow.swizzle_components(source)[slot] & 0x3
+        if source.file == RegisterFile.PROGRAM_ENV_PARAM and source.rel_addr:
+            key = ("relative", source.index, component, self.read(state, dataflow.A0_LOCATION))
+            value = self.number((*key, self.read(state, _CONSTANTS)))
+        else:
+            (location,) = dataflow.source_locations(source, (component,))
+            value = self.read(state, location)
+        return self.negate(value) if source.negate else value
+
+    def results(self, state: dict[Location, int], operation: Operation) -> dict[Location, int]:
+        """Returns the number of the value written to each location by `operation`."""
+        opcode = operation.opcode
+        commutative = _COMMUTATIVE_OPERANDS.get(opcode, 0)
+        ret = {}
+        for component in operation.written_components:
+            inputs = [
+                tuple(
+                    self.operand(state, source, slot)
+                    for slot in ((component,) if opcode in dataflow.COMPONENT_WISE else operation.read_slots(position))
+                )
+                for position, source in enumerate(operation.inputs)
+            ]
+            inputs[:commutative] = sorted(inputs[:commutative])
+            if opcode == Opcode.OPCODE_MOV:
+                value = inputs[0][0]
+            else:
+                value = self.number((opcode, component if opcode in _PER_COMPONENT_RESULTS else None, *inputs))
+            for output in operation.outputs:
+                for location in dataflow.destination_locations(output):
+                    if location[2] == component:
+                        ret[location] = value
+        return ret
+
+    def execute(self, state: dict[Location, int], operations: Sequence[Operation]) -> None:
+        """Updates `state` with the results of an instruction."""
+        written: dict[Location, int] = {}
+
+        def write(_operation: Operation, results: dict[Location, int]) -> None:
+            state.update(results)
+            written.update(results)
+
+        decoder.execute(operations, lambda operation: self.results(state, operation), write)
+        constants = sorted(item for item in written.items() if item[0][0] == RegisterFile.PROGRAM_ENV_PARAM)
+        if constants:
+            state[_CONSTANTS] = self.number(("constants", self.read(state, _CONSTANTS), *constants))
+
+    def expected(self, state: dict[Location, int], operation: Operation, position: int) -> list[int | None]:
+        """Returns the number of the value read by each swizzle slot of an input (None for slots that are unused)."""
+        slots = operation.read_slots(position)
+        source = operation.inputs[position]
+        return [self.operand(state, source, slot) if slot in slots else None for slot in range(4)]
+
+    def reread(self, state: dict[Location, int], expected: list[int | None]) -> SourceRegister | None:
+        """Returns a temporary register operand that reads the `expected` values, if one exists in `state`."""
+        used = {slot: value for slot, value in enumerate(expected) if value is not None}
+        if not used:
+            return None
+        first_slot = min(used)
+        for negate in (False, True):
+            wanted = {slot: self.negate(value) if negate else value for slot, value in used.items()}
+            for register_file, index in _holders(state, wanted[first_slot]):
+                held = {state.get((register_file, index, component)): component for component in reversed(range(4))}
+                if not all(value in held for value in wanted.values()):
+                    continue
+                # Unused slots repeat the first used one.
+                swizzle = 0
+                for slot in range(4):
+                    swizzle |= held[wanted.get(slot, wanted[first_slot])] << (3 * slot)
+                register = R12 if (register_file, index) == dataflow.OPOS_REGISTER else index
+                return SourceRegister(RegisterFile.PROGRAM_TEMPORARY, register, swizzle, negate=negate)
+        return None
+
+
+def _holders(state: dict[Location, int], value: int) -> list[tuple[RegisterFile, int]]:
+    """Returns the registers that may be read through a temporary register operand and hold `value`."""
+    ret = {
+        (register_file, index)
+        for (register_file, index, _), held in state.items()
+        if held == value
+        and (
+            (register_file == RegisterFile.PROGRAM_TEMPORARY and index < dataflow.NUM_TEMPS)
+            or (register_file, index) == dataflow.OPOS_REGISTER
+        )
+    }
+    # Prefer temporary registers over R12.
+    return sorted(ret, key=lambda register: (register == dataflow.OPOS_REGISTER, register[1]))
+
+
+def _candidate_register(operations: Sequence[Operation]) -> int | None:
+    """Returns the temporary register written by the operation of an instruction, if the instruction may be removed."""
+    if len(operations) != 1 or len(operations[0].outputs) != 1:
+        return None
+    output = operations[0].outputs[0]
+    if not output.targets_temporary or output.index >= dataflow.NUM_TEMPS:
+        return None
+    return output.index
+
+
+def _rewrite(statements: Sequence[Statement], removed: set[int]) -> list[tuple[Statement, str | None]] | None:
+    """Returns `statements` without the `removed` instructions, with the operands that read their results rewritten.
+
+    :return: Each remaining statement along with its original source if it was rewritten, or None if an operand
+        cannot be rewritten.
+    """
+    values = _ValueNumbers()
+    original: dict[Location, int] = {}
+    current: dict[Location, int] = {}
+    ret: list[tuple[Statement, str | None]] = []
+    for index, statement in enumerate(statements):
+        operations = dataflow.operations(statement[0])
+        if index in removed:
+            values.execute(original, operations)
+            continue
+
+        rewritten = []
+        for operation in operations:
+            inputs = list(operation.inputs)
+            for position in range(len(inputs)):
+                expected = values.expected(original, operation, position)
+                if expected == values.expected(current, operation, position):
+                    continue
+                replacement = values.reread(current, expected)
+                if replacement is None or len(operations) > 1:
+                    return None
+                inputs[position] = replacement
+            rewritten.append(operation._replace(inputs=tuple(inputs)))
+
+        values.execute(original, operations)
+        values.execute(current, rewritten)
+        if rewritten == operations:
+            ret.append((statement, None))
+        else:
+            instruction = dataflow.make_instruction(rewritten[0])
+            ret.append(((instruction, dataflow.format_instruction(instruction)), statement[1]))
+    return ret
+
+
+def _candidate_groups(statements: Sequence[Statement]) -> list[list[int]]:
+    """Returns the redundant instructions, grouped by the register that they write when no other instruction writes
+    that register in between."""
+    values = _ValueNumbers()
+    state: dict[Location, int] = {}
+    groups: list[list[int]] = []
+    open_groups: dict[int, list[int]] = {}
+    for index, (instruction, _) in enumerate(statements):
+        operations = dataflow.operations(instruction)
+        register = _candidate_register(operations)
+        if register is not None and not all(
+            _holders(state, value) or _holders(state, values.negate(value))
+            for value in values.results(state, operations[0]).values()
+        ):
+            register = None
+
+        written = {
+            index
+            for register_file, index, _ in dataflow.writes(instruction)
+            if register_file == RegisterFile.PROGRAM_TEMPORARY
+        }
+        groups.extend(open_groups.pop(closed) for closed in sorted(written & open_groups.keys()) if closed != register)
+        if register is not None:
+            open_groups.setdefault(register, []).append(index)
+        values.execute(state, operations)
+
+    groups.extend(open_groups.values())
+    return sorted(groups)
+
+
+def eliminate_common_subexpressions(statements: Sequence[Statement]) -> CommonSubexpressionResult:
+    """Removes the instructions of `statements` that recompute values that are still held in a register."""
+    removed: set[int] = set()
+    result = _rewrite(statements, removed)
+    for group in _candidate_groups(statements):
+        attempts = [group] + ([[index] for index in group] if len(group) > 1 else [])
+        for attempt in attempts:
+            rewritten = _rewrite(statements, removed | set(attempt))
+            if rewritten is None:
+                continue
+            removed.update(attempt)
+            result = rewritten
+            if attempt is group:
+                break
+
+    if result is None:
+        msg = "The original program must not need to be rewritten"
+        raise ValueError(msg)
+    return CommonSubexpressionResult(
+        [statement for statement, _ in result],
+        [statements[index][1] for index in sorted(removed)],
+        [(source, statement[1]) for statement, source in result if source is not None],
+    )
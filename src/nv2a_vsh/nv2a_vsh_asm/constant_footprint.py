@@ -0,0 +1,317 @@
+"""Determines which constant registers a program reads, so that only those need to be uploaded.
+
+`analyze` decodes a program and collects the exact set of `c` registers that it reads directly, along with a
+conservative range for each relatively addressed `c[A0+n]` read. The range of `A0` is inferred from the `ARL`
+operation that loads it by propagating value intervals through the program: input and constant registers are unbounded
+unless a range is given for them (e.g., `v3=0:29` for bone indices), and the interval arithmetic follows the
+emulator's float32 operations, rounding outward. A relative read whose `A0` cannot be bounded may read any of the 192
+constant registers, as may one that precedes every `ARL`.
+
+The registers read by a program are combined into an upload plan of contiguous `ConstantRange`s, each labeled with the
+`#uniform` declarations that it covers when the source is available.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+import struct
+import typing
+
+from nv2a_vsh.nv2a_vsh_asm import decoder
+from nv2a_vsh.nv2a_vsh_asm.dataflow import NUM_CONSTANTS
+from nv2a_vsh.nv2a_vsh_asm.decoder import FILE_ADDRESS, FILE_CONST, FILE_INPUT, UNIT_MAC
+from nv2a_vsh.nv2a_vsh_asm.vsh_encoder_defs import ILU, MAC
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Iterable, Mapping
+
+    from nv2a_vsh.nv2a_vsh_asm.decoder import DecodedOperation, Destination, Location, Operand
+    from nv2a_vsh.nv2a_vsh_asm.vsh_instruction import VshInstruction
+
+# The (minimum, maximum) value of a register component.
+Interval = tuple[float, float]
+
+_NUM_INPUTS = 16
+_UNBOUNDED: Interval = (-math.inf, math.inf)
+_FLOAT32_MAX = 3.4028234663852886e38
+
+_VALUE_RANGE_RE = re.compile(r"^\s*(?:([vc])(\d+)|c\[(\d+)\])\s*=([^:]+):([^:]+)$", re.IGNORECASE)
+
+
+class ConstantRange(typing.NamedTuple):
+    """A contiguous run of constant registers to upload.
+
+    :param uniforms: The names of the `#uniform` declarations that overlap the range.
+    """
+
+    start: int
+    length: int
+    uniforms: tuple[str, ...] = ()
+
+    @property
+    def stop(self) -> int:
+        return self.start + self.length
+
+    def __str__(self) -> str:
+        name = f"c[{self.start}]" if self.length == 1 else f"c[{self.start}..{self.stop - 1}]"
+        if self.uniforms:
+            name += f" ({', '.join(self.uniforms)})"
+        return name
+
+
+class RelativeRead(typing.NamedTuple):
+    """A `c[A0+offset]` operand.
+
+    :param pc: The index of the instruction that reads the operand.
+    :param a0: The (minimum, maximum) value of `A0` when the operand is read, or None if it is unknown.
+    """
+
+    pc: int
+    offset: int
+    a0: tuple[int, int] | None
+
+    @property
+    def indices(self) -> range:
+        """Returns the constant registers that may be read. Indices outside of the constant file read zero."""
+        if self.a0 is None:
+            return range(NUM_CONSTANTS)
+        return range(max(0, self.offset + self.a0[0]), min(NUM_CONSTANTS, self.offset + self.a0[1] + 1))
+
+    def __str__(self) -> str:
+        bounds = "unknown" if self.a0 is None else f"in [{self.a0[0]}, {self.a0[1]}]"
+        read = _describe_indices(self.indices)
+        return f"c[A0+{self.offset}] at instruction {self.pc}: A0 {bounds}, reads {read}"
+
+
+class ConstantFootprint(typing.NamedTuple):
+    """The constant registers read by a program.
+
+    :param direct: The indices of the constant registers read without relative addressing.
+    :param relative: Every relatively addressed read, in program order.
+    :param uniforms: Maps `#uniform` names to the constant registers that they occupy.
+    """
+
+    direct: frozenset[int]
+    relative: list[RelativeRead]
+    uniforms: Mapping[str, range] | None = None
+
+    @property
+    def indices(self) -> frozenset[int]:
+        """Returns the indices of every constant register that may be read."""
+        return self.direct.union(*(read.indices for read in self.relative))
+
+    def upload_plan(self, max_gap: int = 0) -> list[ConstantRange]:
+        """Returns the contiguous ranges of constant registers that cover `indices`.
+
+        :param max_gap: Merge ranges separated by up to this many unused registers, trading upload size for fewer
+            uploads.
+        """
+        bounds: list[list[int]] = []
+        for index in sorted(self.indices):
+            if bounds and index - bounds[-1][1] <= max_gap + 1:
+                bounds[-1][1] = index
+            else:
+                bounds.append([index, index])
+
+        ret = []
+        for start, last in bounds:
+            names = tuple(
+                name
+                for name, registers in (self.uniforms or {}).items()
+                if registers.start <= last and start < registers.stop
+            )
+            ret.append(ConstantRange(start, last - start + 1, names))
+        return ret
+
+    def report(self, max_gap: int = 0) -> list[str]:
+        """Returns a human readable description of the footprint and its upload plan."""
+        relative = frozenset().union(*(read.indices for read in self.relative))
+        plan = self.upload_plan(max_gap)
+        uploaded = sum(entry.length for entry in plan)
+        return [
+            f"Constants: {len(self.direct)} read directly, {len(relative)} through c[A0+n]",
+            *(str(read) for read in self.relative),
+            f"Upload plan: {', '.join(str(entry) for entry in plan) or 'none'}",
+            f"Upload plan covers {uploaded} of {NUM_CONSTANTS} constant registers in {len(plan)} ranges",
+        ]
+
+
+def _describe_indices(indices: range) -> str:
+    if not indices:
+        return "nothing"
+    if len(indices) == 1:
+        return f"c[{indices.start}]"
+    return f"c[{indices.start}..{indices.stop - 1}]"
+
+
+def parse_value_ranges(specs: Iterable[str]) -> tuple[dict[int, Interval], dict[int, Interval]]:
+    """Parses `REGISTER=MIN:MAX` strings, where REGISTER is an input (`v3`) or constant (`c4` or `c[4]`) register.
+
+    :return: The (input ranges, constant ranges), keyed by register index.
+    """
+    inputs: dict[int, Interval] = {}
+    constants: dict[int, Interval] = {}
+    for spec in specs:
+        match = _VALUE_RANGE_RE.match(spec)
+        interval: Interval | None = None
+        if match:
+            register_file = (match.group(1) or FILE_CONST).lower()
+            index = int(match.group(2) or match.group(3))
+            try:
+                interval = (float(match.group(4)), float(match.group(5)))
+            except ValueError:
+                interval = None
+            limit = _NUM_INPUTS if register_file == FILE_INPUT else NUM_CONSTANTS
+            if index >= limit or (interval and not interval[0] <= interval[1]):
+                interval = None
+        if not match or interval is None:
+            msg = f"Invalid value range '{spec}', expected REGISTER=MIN:MAX (e.g., v3=0:29)"
+            raise ValueError(msg)
+        (inputs if register_file == FILE_INPUT else constants)[index] = interval
+    return inputs, constants
+
+
+def _round_float32(value: float, direction: int) -> float:
+    """Rounds `value` to a float32, towards -inf if `direction` is negative and +inf otherwise."""
+    if math.isinf(value):
+        return value
+    if abs(value) > _FLOAT32_MAX:
+        return math.copysign(math.inf, direction)
+    rounded: float = struct.unpack("<f", struct.pack("<f", value))[0]
+    if rounded == value or (rounded > value) == (direction > 0):
+        return rounded
+    if rounded == 0.0:
+        return math.copysign(struct.unpack("<f", struct.pack("<I", 1))[0], direction)
+    (bits,) = struct.unpack("<I", struct.pack("<f", rounded))
+    # Moving away from zero increments the magnitude bits.
+    bits += 1 if (rounded > 0) == (direction > 0) else -1
+    return struct.unpack("<f", struct.pack("<I", bits))[0]
+
+
+def _interval(values: Iterable[float]) -> Interval:
+    candidates = list(values)
+    if any(math.isnan(value) for value in candidates):
+        return _UNBOUNDED
+    return _round_float32(min(candidates), -1), _round_float32(max(candidates), 1)
+
+
+def _add(a: Interval, b: Interval) -> Interval:
+    return _interval((a[0] + b[0], a[1] + b[1]))
+
+
+def _mul(a: Interval, b: Interval) -> Interval:
+    return _interval(x * y for x in a for y in b)
+
+
+def _dot(a: list[Interval], b: list[Interval]) -> Interval:
+    ret = _mul(a[0], b[0])
+    for x, y in zip(a[1:], b[1:], strict=True):
+        ret = _add(ret, _mul(x, y))
+    return ret
+
+
+class _ValueRanges:
+    """Tracks the interval of every register component."""
+
+    def __init__(self, inputs: Mapping[int, Interval], constants: Mapping[int, Interval]):
+        self._values: dict[Location, Interval] = {}
+        for index, interval in inputs.items():
+            for component in range(4):
+                self._values[(FILE_INPUT, index, component)] = interval
+        for index, interval in constants.items():
+            for component in range(4):
+                self._values[(FILE_CONST, index, component)] = interval
+
+    def operand(self, operand: Operand) -> list[Interval]:
+        """Returns the interval of each swizzled component of `operand`."""
+        ret = []
+        for location in operand.locations(operand.swizzle):
+            value = _UNBOUNDED if operand.relative else self._values.get(location, _UNBOUNDED)
+            ret.append((-value[1], -value[0]) if operand.negate else value)
+        return ret
+
+    def mac(self, operation: DecodedOperation) -> list[Interval]:
+        """Returns the interval of each component of the result of a MAC operation."""
+        inputs = [self.operand(operand) for operand in operation.inputs]
+        mac = operation.opcode
+        if mac in {MAC.MAC_MOV, MAC.MAC_ARL}:
+            return inputs[0]
+        if mac == MAC.MAC_MUL:
+            return [_mul(a, b) for a, b in zip(inputs[0], inputs[1], strict=True)]
+        if mac == MAC.MAC_ADD:
+            return [_add(a, c) for a, c in zip(inputs[0], inputs[1], strict=True)]
+        if mac == MAC.MAC_MAD:
+            return [_add(_mul(a, b), c) for a, b, c in zip(*inputs, strict=True)]
+        if mac in {MAC.MAC_MIN, MAC.MAC_MAX}:
+            pick = min if mac == MAC.MAC_MIN else max
+            return [(pick(a[0], b[0]), pick(a[1], b[1])) for a, b in zip(inputs[0], inputs[1], strict=True)]
+        if mac in {MAC.MAC_SLT, MAC.MAC_SGE}:
+            return [(0.0, 1.0)] * 4
+        if mac == MAC.MAC_DP3:
+            return [_dot(inputs[0][:3], inputs[1][:3])] * 4
+        if mac == MAC.MAC_DP4:
+            return [_dot(inputs[0], inputs[1])] * 4
+        if mac == MAC.MAC_DPH:
+            return [_add(_dot(inputs[0][:3], inputs[1][:3]), inputs[1][3])] * 4
+        if mac == MAC.MAC_DST:
+            a, b = inputs
+            return [(1.0, 1.0), _mul(a[1], b[1]), a[2], b[3]]
+        return [_UNBOUNDED] * 4
+
+    def ilu(self, operation: DecodedOperation) -> list[Interval]:
+        """Returns the interval of each component of the result of an ILU operation."""
+        if operation.opcode == ILU.ILU_MOV:
+            return self.operand(operation.inputs[0])
+        return [_UNBOUNDED] * 4
+
+    def evaluate(self, operation: DecodedOperation) -> list[Interval]:
+        """Returns the interval of each component of the result of `operation`."""
+        return self.mac(operation) if operation.unit == UNIT_MAC else self.ilu(operation)
+
+    def write(self, destination: Destination, values: list[Interval]) -> None:
+        for location in destination.locations:
+            self._values[location] = values[location[2]]
+
+
+def analyze(
+    program: Iterable[VshInstruction | list[int]],
+    *,
+    input_ranges: Mapping[int, Interval] | None = None,
+    constant_ranges: Mapping[int, Interval] | None = None,
+    uniforms: Mapping[str, range] | None = None,
+) -> ConstantFootprint:
+    """Computes the `ConstantFootprint` of a program given as `VshInstruction`s or machine code quadruplets.
+
+    :param input_ranges: Maps input register indices to the range of values of every component.
+    :param constant_ranges: Maps constant register indices to the range of values of every component.
+    :param uniforms: Maps `#uniform` names to the constant registers that they occupy (see `Assembler.uniforms`), to
+        label the upload plan.
+    """
+    values = _ValueRanges(input_ranges or {}, constant_ranges or {})
+    # The range of A0, or None if it is unbounded.
+    a0: tuple[int, int] | None = None
+    direct: set[int] = set()
+    relative: list[RelativeRead] = []
+
+    def write(operation: DecodedOperation, intervals: list[Interval]) -> None:
+        nonlocal a0
+        for output in operation.outputs:
+            if output.file != FILE_ADDRESS:
+                values.write(output, intervals)
+                continue
+            low, high = intervals[0]
+            a0 = (math.floor(low), math.floor(high)) if math.isfinite(low) and math.isfinite(high) else None
+
+    for pc, instruction in enumerate(decoder.decode_program(program)):
+        for operand, components in instruction.reads():
+            if operand.file != FILE_CONST or not components:
+                continue
+            if operand.relative:
+                relative.append(RelativeRead(pc, operand.number, a0))
+            else:
+                direct.add(operand.number)
+
+        decoder.execute(instruction.operations(), values.evaluate, write)
+
+    return ConstantFootprint(frozenset(direct), relative, uniforms)
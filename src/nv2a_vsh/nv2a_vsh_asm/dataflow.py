@@ -0,0 +1,338 @@
+"""Component level dataflow over `vsh_encoder.Instruction`s, shared by the optional optimization passes.
+
+The passes operate on the `(Instruction, source)` statements produced by `EncodingVisitor`, before they are encoded.
+Each `Instruction` holds one or two `Operation`s (a MAC operation, an ILU operation or a paired MAC + ILU), and every
+register is tracked per component as a `Location`.
+"""
+
+from __future__ import annotations
+
+import enum
+import typing
+
+from nv2a_vsh.nv2a_vsh_asm.encoding_visitor import EncodingVisitor
+from nv2a_vsh.nv2a_vsh_asm.vsh_encoder import (
+    DestinationRegister,
+    Instruction,
+    Opcode,
+    RegisterFile,
+    SourceRegister,
+)
+from nv2a_vsh.nv2a_vsh_asm.vsh_encoder_defs import R12, OutputRegisters
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Iterable, Sequence
+
+# An instruction along with the source text that describes it.
+Statement = tuple[Instruction, str]
+
+# (register file, register index, component)
+Location = tuple[RegisterFile, int, int]
+
+NUM_CONSTANTS = 192
+NUM_TEMPS = 12
+
+A0_LOCATION: Location = (RegisterFile.PROGRAM_ADDRESS, 0, 0)
+
+# Every component of every constant register, which may be read through `c[A0+n]`.
+ALL_CONSTANT_LOCATIONS = frozenset(
+    (RegisterFile.PROGRAM_ENV_PARAM, index, component) for index in range(NUM_CONSTANTS) for component in range(4)
+)
+
+# The oPos register, which R12 aliases.
+OPOS_REGISTER: tuple[RegisterFile, int] = (RegisterFile.PROGRAM_OUTPUT, int(OutputRegisters.REG_POS))
+
+# Operations whose result components are computed from the same components of their inputs.
+COMPONENT_WISE = frozenset(
+    {
+        Opcode.OPCODE_MOV,
+        Opcode.OPCODE_ADD,
+        Opcode.OPCODE_MUL,
+        Opcode.OPCODE_MAD,
+        Opcode.OPCODE_MIN,
+        Opcode.OPCODE_MAX,
+        Opcode.OPCODE_SLT,
+        Opcode.OPCODE_SGE,
+    }
+)
+
+# The number of source operands of each operation.
+_OPERAND_COUNTS = {Opcode.OPCODE_MOV: 1, Opcode.OPCODE_ARL: 1, Opcode.OPCODE_MAD: 3}
+
+# The components (0 = x ... 3 = w) of each source operand that influence the result, indexed by operand position.
+# Component-wise operations are not listed; they read the components that they write.
+_READ_COMPONENTS: dict[Opcode, tuple[tuple[int, ...], ...]] = {
+    Opcode.OPCODE_DP3: ((0, 1, 2), (0, 1, 2)),
+    Opcode.OPCODE_DP4: ((0, 1, 2, 3), (0, 1, 2, 3)),
+    Opcode.OPCODE_DPH: ((0, 1, 2), (0, 1, 2, 3)),
+    Opcode.OPCODE_DST: ((1, 2), (1, 3)),
+    Opcode.OPCODE_ARL: ((0,),),
+    Opcode.OPCODE_RCP: ((0,),),
+    Opcode.OPCODE_RCC: ((0,),),
+    Opcode.OPCODE_RSQ: ((0,),),
+    Opcode.OPCODE_EXP: ((0,),),
+    Opcode.OPCODE_LOG: ((0,),),
+    Opcode.OPCODE_LIT: ((0, 1, 3),),
+}
+
+# The mnemonics that differ from the opcode name.
+_MNEMONICS = {Opcode.OPCODE_EXP: "expp", Opcode.OPCODE_LOG: "logp"}
+
+
+class Unit(enum.Enum):
+    """The execution units of the vertex shader."""
+
+    MAC = enum.auto()
+    ILU = enum.auto()
+
+
+class Operation(typing.NamedTuple):
+    """A single MAC or ILU operation.
+
+    :param inputs: The source operands in the order in which they are written in the source (e.g., `a, b` for `ADD`),
+        regardless of the operand slots they are encoded into.
+    """
+
+    unit: Unit
+    opcode: Opcode
+    outputs: tuple[DestinationRegister, ...]
+    inputs: tuple[SourceRegister, ...]
+
+    @property
+    def written_components(self) -> tuple[int, ...]:
+        """Returns the sorted components written to any output."""
+        return tuple(sorted({component for output in self.outputs for component in mask_components(output)}))
+
+    def read_slots(self, position: int) -> tuple[int, ...]:
+        """Returns the swizzle slots of the input at `position` that influence the result."""
+        per_operand = _READ_COMPONENTS.get(self.opcode)
+        return per_operand[position] if per_operand else self.written_components
+
+    def read_components(self) -> list[tuple[SourceRegister, tuple[int, ...]]]:
+        """Returns each input along with the register components that influence the result."""
+        ret = []
+        for position, source in enumerate(self.inputs):
+            swizzle = swizzle_components(source)
+            ret.append((source, tuple(sorted({swizzle[slot] for slot in self.read_slots(position)}))))
+        return ret
+
+    def reads(self) -> set[Location]:
+        """Returns every register component read by this operation."""
+        ret: set[Location] = set()
+        for source, components in self.read_components():
+            ret.update(source_locations(source, components))
+        return ret
+
+    def writes(self) -> set[Location]:
+        """Returns every register component written by this operation."""
+        ret: set[Location] = set()
+        for output in self.outputs:
+            ret.update(destination_locations(output))
+        return ret
+
+
+def mask_components(destination: DestinationRegister) -> tuple[int, ...]:
+    """Returns the components (0 = x ... 3 = w) enabled in the write mask of `destination`."""
+    return tuple(component for component in range(4) if destination.write_mask & (1 << component))
+
+
+def write_mask(components: Iterable[int]) -> int:
+    """Returns the `WRITEMASK_*` value that enables the given components."""
+    ret = 0
+    for component in components:
+        ret |= 1 << component
+    return ret
+
+
+def swizzle_components(source: SourceRegister) -> tuple[int, int, int, int]:
+    """Returns the register component selected by each of the four swizzle slots of `source`."""
+    x, y, z, w = ((source.swizzle >> (3 * slot)) & 0x7 for slot in range(4))
+    return (x, y, z, w)
+
+
+def source_locations(source: SourceRegister, components: Iterable[int]) -> set[Location]:
+    """Returns the locations read when the given register components of `source` are read."""
+    if source.file == RegisterFile.PROGRAM_ENV_PARAM and source.rel_addr:
+        return {A0_LOCATION, *ALL_CONSTANT_LOCATIONS}
+    register_file, index = source.file, source.index
+    if register_file == RegisterFile.PROGRAM_TEMPORARY and index >= R12:
+        # R12 is a read-only alias of oPos.
+        register_file, index = OPOS_REGISTER
+    return {(register_file, index, component) for component in components if component < 4}  # noqa: PLR2004
+
+
+def destination_locations(destination: DestinationRegister) -> set[Location]:
+    """Returns the locations written through `destination`."""
+    if destination.file == RegisterFile.PROGRAM_ADDRESS:
+        return {A0_LOCATION}
+    register_file, index = destination.file, destination.index
+    if register_file == RegisterFile.PROGRAM_TEMPORARY and index >= R12:
+        return {(*OPOS_REGISTER, component) for component in mask_components(destination)}
+    return {(register_file, index, component) for component in mask_components(destination)}
+
+
+def _mac_inputs(instruction: Instruction) -> tuple[SourceRegister, ...]:
+    src_a, src_b, src_c = instruction.src_reg
+    if instruction.opcode == Opcode.OPCODE_ADD:
+        # ADD reads slots A and C once encoded; the swap may or may not have been applied yet.
+        second = src_b if src_b is not None else src_c
+        return tuple(source for source in (src_a, second) if source is not None)
+    count = _OPERAND_COUNTS.get(instruction.opcode, 2)
+    return tuple(source for source in (src_a, src_b, src_c)[:count] if source is not None)
+
+
+def _outputs(*destinations: DestinationRegister | None) -> tuple[DestinationRegister, ...]:
+    return tuple(destination for destination in destinations if destination is not None)
+
+
+def operations(instruction: Instruction) -> list[Operation]:
+    """Returns the MAC and/or ILU operations performed by `instruction`."""
+    if instruction.paired_ilu_opcode:
+        # A paired ILU operation always writes R1, whatever temporary register is named.
+        ilu_outputs = tuple(
+            DestinationRegister(output.file, 1, output.write_mask) if output.targets_temporary else output
+            for output in _outputs(instruction.paired_ilu_dst_reg, instruction.paired_ilu_secondary_dst_reg)
+        )
+        ilu_input = instruction.src_reg[2]
+        return [
+            Operation(
+                Unit.MAC,
+                instruction.opcode,
+                _outputs(instruction.dst_reg, instruction.secondary_dst_reg),
+                _mac_inputs(instruction),
+            ),
+            Operation(
+                Unit.ILU, instruction.paired_ilu_opcode, ilu_outputs, (ilu_input,) if ilu_input is not None else ()
+            ),
+        ]
+
+    outputs = _outputs(instruction.dst_reg, instruction.secondary_dst_reg)
+    if instruction.opcode.is_ilu():
+        # The single input is moved from slot A to slot C when the instruction is encoded.
+        source = instruction.src_reg[0] if instruction.src_reg[0] is not None else instruction.src_reg[2]
+        return [Operation(Unit.ILU, instruction.opcode, outputs, (source,) if source is not None else ())]
+    return [Operation(Unit.MAC, instruction.opcode, outputs, _mac_inputs(instruction))]
+
+
+def reads(instruction: Instruction) -> set[Location]:
+    """Returns every register component read by `instruction`."""
+    ret: set[Location] = set()
+    for operation in operations(instruction):
+        ret.update(operation.reads())
+    return ret
+
+
+def writes(instruction: Instruction) -> set[Location]:
+    """Returns every register component written by `instruction`."""
+    ret: set[Location] = set()
+    for operation in operations(instruction):
+        ret.update(operation.writes())
+    return ret
+
+
+def _split_outputs(operation: Operation) -> tuple[DestinationRegister | None, DestinationRegister | None]:
+    outputs = operation.outputs
+    return (outputs[0] if outputs else None), (outputs[1] if len(outputs) > 1 else None)
+
+
+def make_instruction(mac: Operation | None, ilu: Operation | None = None) -> Instruction:
+    """Creates an unencoded `Instruction` that performs the given operations.
+
+    The caller is responsible for ensuring that a MAC + ILU pair is encodable (see `scheduler.can_pair`).
+    """
+    primary = mac or ilu
+    if primary is None:
+        msg = "At least one operation must be given"
+        raise ValueError(msg)
+
+    sources: list[SourceRegister | None] = [None, None, None]
+    sources[: len(primary.inputs)] = primary.inputs
+    output, secondary_output = _split_outputs(primary)
+    ret = Instruction(
+        primary.opcode,
+        output,
+        src_a=sources[0],
+        src_b=sources[1],
+        src_c=sources[2],
+        secondary_output=secondary_output,
+    )
+    if mac is not None and ilu is not None:
+        # The ILU reads operand slot C.
+        ret.src_reg[2] = ilu.inputs[0]
+        ret.paired_ilu_opcode = ilu.opcode
+        ret.paired_ilu_dst_reg, ret.paired_ilu_secondary_dst_reg = _split_outputs(ilu)
+    return ret
+
+
+def format_operation(operation: Operation) -> str:
+    """Returns assembler source for `operation`, in the style of the `EncodingVisitor` source comments."""
+    mnemonic = _MNEMONICS.get(operation.opcode, operation.opcode.name.removeprefix("OPCODE_").lower())
+    # Secondary outputs are written as separate statements that share their inputs.
+    inputs = [EncodingVisitor._prettify_source(source) for source in operation.inputs]  # noqa: SLF001
+    return " + ".join(
+        f"{mnemonic} {', '.join([EncodingVisitor._prettify_destination(output), *inputs])}"  # noqa: SLF001
+        for output in operation.outputs
+    )
+
+
+def format_instruction(instruction: Instruction) -> str:
+    """Returns assembler source for `instruction`."""
+    return " + ".join(format_operation(operation) for operation in operations(instruction))
+
+
+def statements(instructions: Iterable[Instruction]) -> list[Statement]:
+    """Pairs each instruction with regenerated source text."""
+    return [(instruction, format_instruction(instruction)) for instruction in instructions]
+
+
+class Dependency(enum.Enum):
+    """The ways in which an operation may depend on an earlier one."""
+
+    # Reads a value written by the earlier operation.
+    TRUE = enum.auto()
+    # Overwrites a value read by the earlier operation. May be issued in the same instruction (see `decoder.execute`).
+    ANTI = enum.auto()
+    # Overwrites a value written by the earlier operation.
+    OUTPUT = enum.auto()
+
+
+def dependencies(
+    accesses: Sequence[tuple[set[Location], set[Location]]],
+) -> list[dict[int, Dependency]]:
+    """Computes the dependencies between a sequence of (reads, writes) accesses.
+
+    :return: For each entry, a dictionary mapping the indices of the earlier entries it depends on to the strongest
+        kind of dependency (TRUE over OUTPUT over ANTI).
+    """
+    last_writer: dict[Location, int] = {}
+    readers: dict[Location, list[int]] = {}
+    ret: list[dict[int, Dependency]] = []
+    strength = {Dependency.TRUE: 2, Dependency.OUTPUT: 1, Dependency.ANTI: 0}
+
+    for index, (read_locations, write_locations) in enumerate(accesses):
+        predecessors: dict[int, Dependency] = {}
+
+        def _add(predecessor: int, kind: Dependency, predecessors: dict[int, Dependency] = predecessors) -> None:
+            existing = predecessors.get(predecessor)
+            if existing is None or strength[kind] > strength[existing]:
+                predecessors[predecessor] = kind
+
+        for location in read_locations:
+            writer = last_writer.get(location)
+            if writer is not None:
+                _add(writer, Dependency.TRUE)
+        for location in write_locations:
+            writer = last_writer.get(location)
+            if writer is not None:
+                _add(writer, Dependency.OUTPUT)
+            for reader in readers.get(location, ()):
+                _add(reader, Dependency.ANTI)
+
+        for location in read_locations:
+            readers.setdefault(location, []).append(index)
+        for location in write_locations:
+            last_writer[location] = index
+            readers[location] = []
+        ret.append(predecessors)
+
+    return ret
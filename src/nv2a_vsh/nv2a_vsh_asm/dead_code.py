@@ -0,0 +1,93 @@
+"""Removes operations and write mask components whose results are never read.
+
+Liveness is tracked per component of the temporary registers R0 - R11. Writes to output registers, `c` registers and
+A0 are always considered live. Instructions are processed in reverse: a temporary component is live if a later
+operation reads it before it is overwritten. Destinations with no live components are dropped, write masks are
+narrowed to the live components (which also narrows the components read by component-wise operations) and operations
+without any remaining destination are removed.
+"""
+
+from __future__ import annotations
+
+import typing
+
+from nv2a_vsh.nv2a_vsh_asm import dataflow
+from nv2a_vsh.nv2a_vsh_asm.dataflow import Location, Operation, Statement, Unit
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from nv2a_vsh.nv2a_vsh_asm.vsh_encoder import DestinationRegister
+
+
+class DeadCodeResult(typing.NamedTuple):
+    """The result of dead code elimination."""
+
+    statements: list[Statement]
+    # The source of each instruction that was removed entirely.
+    removed: list[str]
+    # The (original, rewritten) source of each instruction that had operations or write mask components removed.
+    narrowed: list[tuple[str, str]]
+
+    def report(self) -> list[str]:
+        """Returns a line describing each change."""
+        return [f"Removed dead instruction '{source}'" for source in self.removed] + [
+            f"Narrowed '{original}' to '{rewritten}'" for original, rewritten in self.narrowed
+        ]
+
+
+def _is_temporary(destination: DestinationRegister) -> bool:
+    return destination.targets_temporary and destination.index < dataflow.NUM_TEMPS
+
+
+def _live_operation(operation: Operation, live: set[Location]) -> Operation | None:
+    """Returns `operation` with only its live destination components, or None if it is dead."""
+    outputs = []
+    for output in operation.outputs:
+        if not _is_temporary(output):
+            outputs.append(output)
+            continue
+        components = [
+            component
+            for component in dataflow.mask_components(output)
+            if (output.file, output.index, component) in live
+        ]
+        if components:
+            outputs.append(output.copy_with_mask(dataflow.write_mask(components)))
+    if not outputs:
+        return None
+    return operation._replace(outputs=tuple(outputs))
+
+
+def eliminate_dead_code(statements: Sequence[Statement]) -> DeadCodeResult:
+    """Removes dead operations and write mask components from `statements`."""
+    live: set[Location] = set()
+    kept: list[Statement] = []
+    removed: list[str] = []
+    narrowed: list[tuple[str, str]] = []
+
+    for instruction, source in reversed(statements):
+        operations = dataflow.operations(instruction)
+        live_operations = [_live_operation(operation, live) for operation in operations]
+        remaining = [operation for operation in live_operations if operation is not None]
+
+        if not remaining:
+            removed.append(source)
+            continue
+
+        statement = (instruction, source)
+        if remaining != operations:
+            mac = next((operation for operation in remaining if operation.unit == Unit.MAC), None)
+            ilu = next((operation for operation in remaining if operation.unit == Unit.ILU), None)
+            rewritten = dataflow.make_instruction(mac, ilu)
+            statement = (rewritten, dataflow.format_instruction(rewritten))
+            narrowed.append((source, statement[1]))
+
+        live.difference_update(dataflow.writes(statement[0]))
+        live.update(dataflow.reads(statement[0]))
+        kept.append(statement)
+
+    kept.reverse()
+    removed.reverse()
+    narrowed.reverse()
+    return DeadCodeResult(kept, removed, narrowed)
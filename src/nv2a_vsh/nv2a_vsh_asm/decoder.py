@@ -0,0 +1,379 @@
+"""Decodes nv2a vertex shader machine code into a register-level description of each operation.
+
+The decoded form resolves the hardware specific encoding details (operand slot assignment for ADD/ILU operations, the
+implicit R1 target of paired ILU operations, the reversed VSH component masks, etc.) so that consumers such as the
+emulator and static analyses do not need to reimplement them.
+"""
+
+# pylint: disable=too-few-public-methods
+
+from __future__ import annotations
+
+import typing
+
+from nv2a_vsh.nv2a_vsh_asm.vsh_encoder_defs import (
+    DESTINATION_REGISTER_TO_NAME_MAP_SHORT,
+    ILU,
+    ILU_NAMES,
+    MAC,
+    MAC_NAMES,
+    OMUX_ILU,
+    OUTPUT_O,
+    PARAM_C,
+    PARAM_R,
+    PARAM_V,
+    R12,
+    OutputRegisters,
+)
+from nv2a_vsh.nv2a_vsh_asm.vsh_instruction import VshInstruction, decode_fields
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+
+_T = typing.TypeVar("_T")
+_R = typing.TypeVar("_R")
+
+# Register file identifiers used by `Operand` and `Destination`.
+FILE_TEMP = "R"
+FILE_INPUT = "v"
+FILE_CONST = "c"
+FILE_OUTPUT = "o"
+FILE_ADDRESS = "a"
+
+# A single register component, as (register file, register number, component).
+Location = tuple[str, int, int]
+
+# The execution units, as reported by `DecodedOperation.unit`.
+UNIT_MAC = "mac"
+UNIT_ILU = "ilu"
+
+# The output register that is read through R12.
+_OPOS = int(OutputRegisters.REG_POS)
+
+_MUX_TO_FILE = {
+    PARAM_R: FILE_TEMP,
+    PARAM_V: FILE_INPUT,
+    PARAM_C: FILE_CONST,
+}
+
+# The operand slots (A, B, C) read by each MAC operation.
+MAC_INPUT_SLOTS: dict[int, str] = {
+    MAC.MAC_NOP: "",
+    MAC.MAC_MOV: "A",
+    MAC.MAC_MUL: "AB",
+    MAC.MAC_ADD: "AC",
+    MAC.MAC_MAD: "ABC",
+    MAC.MAC_DP3: "AB",
+    MAC.MAC_DPH: "AB",
+    MAC.MAC_DP4: "AB",
+    MAC.MAC_DST: "AB",
+    MAC.MAC_MIN: "AB",
+    MAC.MAC_MAX: "AB",
+    MAC.MAC_SLT: "AB",
+    MAC.MAC_SGE: "AB",
+    MAC.MAC_ARL: "A",
+}
+
+# The operand slot read by all ILU operations.
+ILU_INPUT_SLOT = "C"
+
+# The components (0 = x ... 3 = w) of each source operand that influence the result of each MAC operation, indexed
+# by operand position. Component-wise operations are not listed; they read the components that they write.
+MAC_READ_COMPONENTS: dict[int, tuple[tuple[int, ...], ...]] = {
+    MAC.MAC_DP3: ((0, 1, 2), (0, 1, 2)),
+    MAC.MAC_DP4: ((0, 1, 2, 3), (0, 1, 2, 3)),
+    MAC.MAC_DPH: ((0, 1, 2), (0, 1, 2, 3)),
+    MAC.MAC_DST: ((1, 2), (1, 3)),
+    MAC.MAC_ARL: ((0,),),
+}
+
+# The components of the source operand that influence the result of each ILU operation. ILU MOV reads the components
+# that it writes.
+ILU_READ_COMPONENTS: dict[int, tuple[int, ...]] = {
+    ILU.ILU_RCP: (0,),
+    ILU.ILU_RCC: (0,),
+    ILU.ILU_RSQ: (0,),
+    ILU.ILU_EXP: (0,),
+    ILU.ILU_LOG: (0,),
+    ILU.ILU_LIT: (0, 1, 3),
+}
+
+
+def vsh_mask_components(mask: int) -> tuple[int, ...]:
+    """Converts an encoded VSH output mask (MASK_X = 8 ... MASK_W = 1) into a tuple of component indices."""
+    return tuple(component for component in range(4) if mask & (0x8 >> component))
+
+
+class Operand(typing.NamedTuple):
+    """A source operand read by an operation."""
+
+    file: str
+    number: int
+    swizzle: tuple[int, int, int, int]
+    negate: bool = False
+    relative: bool = False
+
+    @property
+    def is_identity_swizzle(self) -> bool:
+        return self.swizzle == (0, 1, 2, 3)
+
+    @property
+    def register(self) -> tuple[str, int]:
+        """Returns the (file, number) of the register that is read, resolving R12 to the oPos register it aliases."""
+        if self.file == FILE_TEMP and self.number >= R12:
+            return FILE_OUTPUT, _OPOS
+        return self.file, self.number
+
+    def locations(self, components: Iterable[int]) -> list[Location]:
+        """Returns the locations of the given register components, ignoring relative addressing."""
+        register_file, number = self.register
+        return [(register_file, number, component) for component in components]
+
+    def source_components(self, components: Iterable[int]) -> tuple[int, ...]:
+        """Returns the sorted register components read to produce the given swizzled components."""
+        return tuple(sorted({self.swizzle[component] for component in components}))
+
+    def __str__(self) -> str:
+        if self.file == FILE_CONST:
+            name = f"c[A0+{self.number}]" if self.relative else f"c[{self.number}]"
+        else:
+            name = f"{self.file}{self.number}"
+        if self.negate:
+            name = f"-{name}"
+        if not self.is_identity_swizzle:
+            name += "." + "".join("xyzw"[component] for component in self.swizzle)
+        return name
+
+
+class Destination(typing.NamedTuple):
+    """A register written by an operation."""
+
+    file: str
+    number: int
+    components: tuple[int, ...]
+
+    @property
+    def is_read_only(self) -> bool:
+        """Returns True if writes to this destination are discarded (R12 is a read-only alias of oPos)."""
+        return self.file == FILE_TEMP and self.number >= R12
+
+    @property
+    def locations(self) -> list[Location]:
+        """Returns the locations of the written components."""
+        return [(self.file, self.number, component) for component in self.components]
+
+    @property
+    def name(self) -> str:
+        """Returns the name of the destination register (without a component mask)."""
+        if self.file == FILE_OUTPUT:
+            return output_name(self.number)
+        if self.file == FILE_ADDRESS:
+            return "A0"
+        if self.file == FILE_CONST:
+            return f"c[{self.number}]"
+        return f"{self.file}{self.number}"
+
+    def __str__(self) -> str:
+        return self.name + "." + "".join("xyzw"[component] for component in self.components)
+
+
+def output_name(index: int) -> str:
+    """Returns the short name of the output register with the given index (e.g., `oPos`, `oD0`)."""
+    name = DESTINATION_REGISTER_TO_NAME_MAP_SHORT.get(index)
+    if name is None or name == "A0":
+        return f"o{index}"
+    return name
+
+
+def _written_components(outputs: Iterable[Destination]) -> tuple[int, ...]:
+    written: set[int] = set()
+    for output in outputs:
+        written.update(output.components)
+    return tuple(sorted(written))
+
+
+class DecodedOperation(typing.NamedTuple):
+    """The MAC or ILU operation performed by one unit of a `DecodedInstruction`.
+
+    :param reads: Each operand along with the register components that it actually reads.
+    """
+
+    unit: str
+    opcode: MAC | ILU
+    inputs: tuple[Operand, ...]
+    outputs: tuple[Destination, ...]
+    reads: list[tuple[Operand, tuple[int, ...]]]
+
+    @property
+    def mnemonic(self) -> str:
+        return MAC_NAMES[self.opcode] if isinstance(self.opcode, MAC) else ILU_NAMES[self.opcode]
+
+
+class DecodedInstruction(typing.NamedTuple):
+    """Describes the operations performed by a single machine code instruction."""
+
+    mac: MAC
+    ilu: ILU
+    mac_inputs: tuple[Operand, ...]
+    ilu_input: Operand | None
+    mac_outputs: tuple[Destination, ...]
+    ilu_outputs: tuple[Destination, ...]
+    final: bool = False
+
+    @property
+    def is_nop(self) -> bool:
+        return not self.mac and not self.ilu
+
+    @property
+    def is_paired(self) -> bool:
+        return bool(self.mac and self.ilu)
+
+    @property
+    def inputs(self) -> tuple[Operand, ...]:
+        """Returns all operands read by this instruction."""
+        if self.ilu_input is None:
+            return self.mac_inputs
+        return (*self.mac_inputs, self.ilu_input)
+
+    @property
+    def outputs(self) -> tuple[Destination, ...]:
+        """Returns all destinations written by this instruction."""
+        return self.mac_outputs + self.ilu_outputs
+
+    def reads(self) -> list[tuple[Operand, tuple[int, ...]]]:
+        """Returns each operand read by this instruction along with the register components it actually reads."""
+        ret = []
+        mac_components = MAC_READ_COMPONENTS.get(self.mac)
+        for position, operand in enumerate(self.mac_inputs):
+            swizzled = mac_components[position] if mac_components else _written_components(self.mac_outputs)
+            ret.append((operand, operand.source_components(swizzled)))
+        if self.ilu_input is not None:
+            swizzled = ILU_READ_COMPONENTS.get(self.ilu) or _written_components(self.ilu_outputs)
+            ret.append((self.ilu_input, self.ilu_input.source_components(swizzled)))
+        return ret
+
+    def operations(self) -> list[DecodedOperation]:
+        """Returns the MAC and then the ILU operation performed by this instruction, omitting idle units."""
+        reads = self.reads()
+        ret = []
+        if self.mac:
+            ret.append(
+                DecodedOperation(UNIT_MAC, self.mac, self.mac_inputs, self.mac_outputs, reads[: len(self.mac_inputs)])
+            )
+        if self.ilu and self.ilu_input is not None:
+            ret.append(
+                DecodedOperation(UNIT_ILU, self.ilu, (self.ilu_input,), self.ilu_outputs, reads[len(self.mac_inputs) :])
+            )
+        return ret
+
+    def __str__(self) -> str:
+        parts = []
+        if self.mac:
+            outputs = ", ".join(str(output) for output in self.mac_outputs)
+            inputs = ", ".join(str(operand) for operand in self.mac_inputs)
+            parts.append(f"{MAC_NAMES[self.mac]} {outputs}, {inputs}")
+        if self.ilu:
+            outputs = ", ".join(str(output) for output in self.ilu_outputs)
+            parts.append(f"{ILU_NAMES[self.ilu]} {outputs}, {self.ilu_input}")
+        return " + ".join(parts) if parts else "NOP"
+
+
+def execute(operations: Iterable[_T], evaluate: Callable[[_T], _R], write: Callable[[_T, _R], None]) -> None:
+    """Executes the operations of a single instruction: evaluates all of them, and then writes each result.
+
+    Both units read their inputs before either writes its results, so an operation never observes the result of the
+    operation that it is paired with. The operations may be `DecodedOperation`s or any other per-unit representation.
+    """
+    results = [(operation, evaluate(operation)) for operation in operations]
+    for operation, result in results:
+        write(operation, result)
+
+
+def _operand(fields: dict[str, int], slot: str) -> Operand:
+    mux = fields[f"{slot}_MUX"]
+    register_file = _MUX_TO_FILE.get(mux)
+    if register_file is None:
+        msg = f"Unknown mux code {mux} for operand {slot}"
+        raise ValueError(msg)
+
+    if register_file == FILE_TEMP:
+        index = (
+            (fields["C_TEMP_REG_HIGH"] << 2) | fields["C_TEMP_REG_LOW"] if slot == "C" else fields[f"{slot}_TEMP_REG"]
+        )
+    elif register_file == FILE_INPUT:
+        index = fields["INPUT"]
+    else:
+        index = fields["CONST"]
+
+    swizzle = (fields[f"{slot}_SWZ_X"], fields[f"{slot}_SWZ_Y"], fields[f"{slot}_SWZ_Z"], fields[f"{slot}_SWZ_W"])
+    return Operand(
+        register_file,
+        index,
+        swizzle,
+        negate=bool(fields[f"{slot}_NEG"]),
+        relative=register_file == FILE_CONST and bool(fields["A0X"]),
+    )
+
+
+def decode_instruction(values: list[int]) -> DecodedInstruction:
+    """Decodes a single machine code quadruplet."""
+    fields = decode_fields(values)
+    try:
+        mac = MAC(fields["MAC"])
+        ilu = ILU(fields["ILU"])
+    except ValueError:
+        msg = f"Unsupported operation MAC={fields['MAC']} ILU={fields['ILU']} in {values!r}"
+        raise ValueError(msg) from None
+
+    mac_outputs: list[Destination] = []
+    ilu_outputs: list[Destination] = []
+
+    if fields["OUT_O_MASK"]:
+        register_file = FILE_OUTPUT if fields["OUT_ORB"] == OUTPUT_O else FILE_CONST
+        destination = Destination(register_file, fields["OUT_ADDRESS"], vsh_mask_components(fields["OUT_O_MASK"]))
+        if fields["OUT_MUX"] == OMUX_ILU:
+            ilu_outputs.append(destination)
+        else:
+            mac_outputs.append(destination)
+
+    if mac == MAC.MAC_ARL:
+        mac_outputs = [Destination(FILE_ADDRESS, 0, (0,))]
+    elif fields["OUT_MAC_MASK"] and mac:
+        mac_outputs.append(Destination(FILE_TEMP, fields["OUT_TEMP_REG"], vsh_mask_components(fields["OUT_MAC_MASK"])))
+
+    if fields["OUT_ILU_MASK"] and ilu:
+        # A paired ILU operation always writes to R1, regardless of the encoded temporary register.
+        temp_reg = 1 if mac else fields["OUT_TEMP_REG"]
+        ilu_outputs.append(Destination(FILE_TEMP, temp_reg, vsh_mask_components(fields["OUT_ILU_MASK"])))
+
+    if not mac:
+        mac_outputs = []
+    if not ilu:
+        ilu_outputs = []
+
+    return DecodedInstruction(
+        mac,
+        ilu,
+        tuple(_operand(fields, slot) for slot in MAC_INPUT_SLOTS[mac]),
+        _operand(fields, ILU_INPUT_SLOT) if ilu else None,
+        tuple(mac_outputs),
+        tuple(ilu_outputs),
+        final=bool(fields["FINAL"]),
+    )
+
+
+def decode_program(
+    program: Iterable[VshInstruction | list[int]], *, stop_at_final: bool = True
+) -> list[DecodedInstruction]:
+    """Decodes a program given as `VshInstruction`s or machine code quadruplets.
+
+    :param stop_at_final: Stop decoding after the first instruction with the FINAL flag set.
+    """
+    ret = []
+    for instruction in program:
+        values = instruction.encode() if isinstance(instruction, VshInstruction) else list(instruction)
+        decoded = decode_instruction(values)
+        ret.append(decoded)
+        if stop_at_final and decoded.final:
+            break
+    return ret
@@ -451,6 +451,11 @@ class EncodingVisitor(VshVisitor):
         super().__init__()
         self._uniforms: dict[str, _Uniform] = {}
 
+    @property
+    def uniforms(self) -> dict[str, range]:
+        """Maps the name of each `#uniform` declared so far to the constant registers that it occupies."""
+        return {name: range(uniform.value, uniform.value + uniform.size) for name, uniform in self._uniforms.items()}
+
     def visit(self, tree: Tree) -> Any:
         return super().visit(tree)  # type: ignore[func-returns-value]
 
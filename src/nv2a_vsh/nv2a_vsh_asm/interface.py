@@ -0,0 +1,126 @@
+"""Describes the vertex attributes that a program reads and the output registers that it writes.
+
+Hosts can use the description to disable the vertex attribute streams that a program never reads. The read components
+are taken from the decoded operations, so they account for swizzles, the operand slots used by `ADD` and ILU
+operations and the components that each operation actually consumes (e.g., `DP3` ignores `w`). Every operation
+counts, including ones whose results are never used, as the hardware fetches their inputs regardless.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import typing
+
+from nv2a_vsh.nv2a_vsh_asm import decoder
+from nv2a_vsh.nv2a_vsh_asm.decoder import FILE_INPUT, FILE_OUTPUT
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from nv2a_vsh.nv2a_vsh_asm.vsh_instruction import VshInstruction
+
+# The number of input and output registers.
+NUM_REGISTERS = 16
+
+_C_IDENTIFIER_RE = re.compile(r"^[A-Za-z_]\w*$")
+
+
+def _component_mask(components: Iterable[int]) -> int:
+    """Returns a mask with bit 0 set for x ... bit 3 set for w."""
+    ret = 0
+    for component in components:
+        ret |= 1 << component
+    return ret
+
+
+def _component_names(components: Iterable[int]) -> str:
+    return "".join("xyzw"[component] for component in sorted(components))
+
+
+class ProgramInterface(typing.NamedTuple):
+    """The input registers read and output registers written by a program.
+
+    :param inputs: Maps the index of each input register that is read to the components that are read.
+    :param outputs: Maps the index of each output register that is written to the components that are written.
+    """
+
+    inputs: dict[int, tuple[int, ...]]
+    outputs: dict[int, tuple[int, ...]]
+
+    @property
+    def input_mask(self) -> int:
+        """Returns a mask with bit N set if input register vN is read."""
+        return _component_mask(self.inputs)
+
+    @property
+    def output_mask(self) -> int:
+        """Returns a mask with bit N set if output register N is written."""
+        return _component_mask(self.outputs)
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        return {
+            "inputs": {f"v{index}": _component_names(components) for index, components in self.inputs.items()},
+            "outputs": {
+                decoder.output_name(index): _component_names(components) for index, components in self.outputs.items()
+            },
+        }
+
+    def write_json(self, outfile: typing.TextIO) -> None:
+        json.dump(self.to_dict(), outfile, indent=2)
+        outfile.write("\n")
+
+    def write_c_header(self, outfile: typing.TextIO, name: str = "vsh_program") -> None:
+        """Writes a self-contained C header declaring the masks of the interface, prefixed by `name`.
+
+        Component masks have bit 0 set for x ... bit 3 set for w.
+        """
+        if not _C_IDENTIFIER_RE.match(name):
+            msg = f"'{name}' is not a valid C identifier"
+            raise ValueError(msg)
+
+        def components(registers: dict[int, tuple[int, ...]]) -> str:
+            return ", ".join(f"0x{_component_mask(registers.get(index, ())):x}" for index in range(NUM_REGISTERS))
+
+        guard = f"{name.upper()}_INTERFACE_H_"
+        outfile.write(f"#ifndef {guard}\n#define {guard}\n\n#include <stdint.h>\n\n")
+        outfile.write("/* Bit N is set if input register vN is read. */\n")
+        outfile.write(f"static const uint32_t {name}_input_mask = 0x{self.input_mask:04x};\n\n")
+        outfile.write("/* The components of each input register that are read (bit 0 = x ... bit 3 = w). */\n")
+        outfile.write(
+            f"static const uint8_t {name}_input_components[{NUM_REGISTERS}] = {{{components(self.inputs)}}};\n\n"
+        )
+        outfile.write("/* Bit N is set if output register N is written. */\n")
+        outfile.write(f"static const uint32_t {name}_output_mask = 0x{self.output_mask:04x};\n\n")
+        outfile.write("/* The components of each output register that are written (bit 0 = x ... bit 3 = w). */\n")
+        outfile.write(
+            f"static const uint8_t {name}_output_components[{NUM_REGISTERS}] = {{{components(self.outputs)}}};\n\n"
+        )
+        outfile.write(f"#endif  /* {guard} */\n")
+
+    def report(self) -> list[str]:
+        """Returns a human readable description of the interface."""
+        inputs = self.to_dict()["inputs"]
+        outputs = self.to_dict()["outputs"]
+        return [
+            f"Inputs: {', '.join(f'{name}.{mask}' for name, mask in inputs.items()) or 'none'}",
+            f"Outputs: {', '.join(f'{name}.{mask}' for name, mask in outputs.items()) or 'none'}",
+        ]
+
+
+def analyze(program: Iterable[VshInstruction | list[int]]) -> ProgramInterface:
+    """Computes the `ProgramInterface` of a program given as `VshInstruction`s or machine code quadruplets."""
+    inputs: dict[int, set[int]] = {}
+    outputs: dict[int, set[int]] = {}
+    for instruction in decoder.decode_program(program):
+        for operand, components in instruction.reads():
+            if operand.file == FILE_INPUT and components:
+                inputs.setdefault(operand.number, set()).update(components)
+        for output in instruction.outputs:
+            if output.file == FILE_OUTPUT:
+                outputs.setdefault(output.number, set()).update(output.components)
+
+    return ProgramInterface(
+        {index: tuple(sorted(inputs[index])) for index in sorted(inputs)},
+        {index: tuple(sorted(outputs[index])) for index in sorted(outputs)},
+    )
@@ -0,0 +1,347 @@
+"""Rewrites common instruction idioms into equivalent, cheaper forms.
+
+The rules are applied repeatedly, in the order below, until none of them matches:
+
+`mad`
+    `MUL t, a, b` followed by `ADD d, t, c` (or `ADD d, c, t`) becomes `MAD d, a, b, c` when the ADD is the only
+    reader of the product and neither `a` nor `b` changes in between. The swizzle and negation of the `t` operand are
+    folded into `a` and `b`. The rewrite is exact because `MAD` rounds the product before adding, like `MUL` + `ADD`.
+`copy`
+    `MOV t, x` whose result is read by a single later instruction is removed and the reader reads `x` directly, with
+    the swizzles and negations combined, provided that `x` does not change in between.
+`overwritten-mov`
+    A `MOV` to a temporary register whose result is never read, typically because it is immediately overwritten, is
+    removed.
+`dph`
+    `DP4 d, a, b` becomes `DPH d, a, b` when `a.w` (or, swapping the operands, `b.w`) is known to be exactly 1.0, so
+    that `a.w * b.w == b.w`. The `w` component of `EXPP`, `LOGP` and `LIT` results, the `x` component of `LIT` and
+    `DST` results, inputs declared by the caller and copies of any of these are known to be 1.0. The rewrite does not
+    save an instruction, but stops `a.w` from being read, which may leave the instruction that wrote it dead.
+
+Every rule checks the register components that are actually read (taking swizzles, write masks and the fixed
+components read by operations such as `DP3` into account), so unrelated components of the same register do not block
+a rewrite. Rewrites that would read more than one `v` or `c` register in a single instruction are skipped.
+"""
+
+from __future__ import annotations
+
+import typing
+
+from nv2a_vsh.nv2a_vsh_asm import dataflow, decoder
+from nv2a_vsh.nv2a_vsh_asm.dataflow import Location, Operation, Statement, Unit
+from nv2a_vsh.nv2a_vsh_asm.vsh_encoder import Opcode, RegisterFile, SourceRegister
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Sequence
+
+RULES = ("mad", "copy", "overwritten-mov", "dph")
+
+# The components (0 = x ... 3 = w) of each operation's result that are always exactly 1.0.
+_ONE_COMPONENTS = {
+    Opcode.OPCODE_EXP: (3,),
+    Opcode.OPCODE_LOG: (3,),
+    Opcode.OPCODE_LIT: (0, 3),
+    Opcode.OPCODE_DST: (0,),
+}
+
+
+class Rewrite(typing.NamedTuple):
+    """A single application of a peephole rule."""
+
+    rule: str
+    # The source of the instructions that were replaced, and of the instruction that replaced them (if any).
+    original: list[str]
+    replacement: str | None
+
+
+class PeepholeResult(typing.NamedTuple):
+    """The result of peephole optimization."""
+
+    statements: list[Statement]
+    rewrites: list[Rewrite]
+    # The number of instructions before optimization.
+    original_instructions: int
+
+    @property
+    def instructions_saved(self) -> int:
+        return self.original_instructions - len(self.statements)
+
+    def report(self) -> list[str]:
+        """Returns a line describing each rewrite, followed by the total savings."""
+        ret = []
+        for rewrite in self.rewrites:
+            original = ", ".join(f"'{source}'" for source in rewrite.original)
+            if rewrite.replacement is None:
+                ret.append(f"[{rewrite.rule}] Removed {original}")
+            else:
+                ret.append(f"[{rewrite.rule}] Replaced {original} with '{rewrite.replacement}'")
+        ret.append(
+            f"Peephole optimization saved {self.instructions_saved} of {self.original_instructions} instructions"
+        )
+        return ret
+
+
+def _single_operation(statement: Statement) -> Operation | None:
+    """Returns the operation of an unpaired instruction, or None if the instruction is paired."""
+    operations = dataflow.operations(statement[0])
+    return operations[0] if len(operations) == 1 else None
+
+
+def _temporary_output(operation: Operation) -> bool:
+    """Returns True if `operation` writes a single temporary register and nothing else."""
+    return (
+        len(operation.outputs) == 1
+        and operation.outputs[0].targets_temporary
+        and operation.outputs[0].index < dataflow.NUM_TEMPS
+    )
+
+
+def _make_statement(mac: Operation | None, ilu: Operation | None = None) -> Statement:
+    instruction = dataflow.make_instruction(mac, ilu)
+    return instruction, dataflow.format_instruction(instruction)
+
+
+def _readers(statements: Sequence[Statement], start: int, locations: set[Location]) -> list[tuple[int, set[Location]]]:
+    """Returns the instructions that read any of the values written to `locations` by `start`.
+
+    :return: The index of each reading instruction along with the locations that still hold the values written by
+        `start` when it executes.
+    """
+    pending = set(locations)
+    ret = []
+    for index in range(start + 1, len(statements)):
+        if not pending:
+            break
+        instruction = statements[index][0]
+        if dataflow.reads(instruction) & pending:
+            ret.append((index, set(pending)))
+        pending -= dataflow.writes(instruction)
+    return ret
+
+
+def _unchanged(statements: Sequence[Statement], start: int, end: int, locations: set[Location]) -> bool:
+    """Returns True if no instruction strictly between `start` and `end` writes any of `locations`."""
+    return not any(dataflow.writes(statements[index][0]) & locations for index in range(start + 1, end))
+
+
+def _encodable(sources: Iterable[SourceRegister]) -> bool:
+    """Returns True if the given operands may be read by a single instruction."""
+    sources = list(sources)
+    inputs = {source.index for source in sources if source.file == RegisterFile.PROGRAM_INPUT}
+    constants = {(source.index, source.rel_addr) for source in sources if source.file == RegisterFile.PROGRAM_ENV_PARAM}
+    return len(inputs) <= 1 and len(constants) <= 1
+
+
+def _substitute(reader: SourceRegister, source: SourceRegister, *, negate: bool = True) -> SourceRegister:
+    """Returns an operand that reads `source` directly, given a `reader` that reads a register holding `source`.
+
+    :param negate: Apply the negation of `reader` to the result.
+    """
+    inner = dataflow.swizzle_components(source)
+    swizzle = 0
+    for slot, component in enumerate(dataflow.swizzle_components(reader)):
+        swizzle |= inner[component & 0x3] << (3 * slot)
+    return SourceRegister(
+        source.file,
+        source.index,
+        swizzle,
+        rel_addr=source.rel_addr,
+        negate=source.negate != (negate and reader.negate),
+    )
+
+
+def _reads_from(operation: Operation, locations: set[Location]) -> tuple[list[int], bool]:
+    """Returns the positions of the inputs of `operation` that read any of `locations`.
+
+    :return: The positions, and whether every component read by those inputs is in `locations`.
+    """
+    positions = []
+    contained = True
+    for position, (source, components) in enumerate(operation.read_components()):
+        read = dataflow.source_locations(source, components)
+        if read & locations:
+            positions.append(position)
+            contained = contained and read <= locations
+    return positions, contained
+
+
+def _fuse_multiply_add(statements: list[Statement], index: int, _ones: list[set[Location]]) -> Rewrite | None:
+    multiply = _single_operation(statements[index])
+    if multiply is None or multiply.opcode != Opcode.OPCODE_MUL or not _temporary_output(multiply):
+        return None
+    product = multiply.writes()
+    factors = multiply.reads()
+    if factors & product:
+        return None
+
+    readers = _readers(statements, index, product)
+    if len(readers) != 1:
+        return None
+    ((add_index, remaining),) = readers
+    add = _single_operation(statements[add_index])
+    if add is None or add.opcode != Opcode.OPCODE_ADD:
+        return None
+    positions, contained = _reads_from(add, remaining)
+    if len(positions) != 1 or not contained or not _unchanged(statements, index, add_index, factors):
+        return None
+
+    reader = add.inputs[positions[0]]
+    addend = add.inputs[1 - positions[0]]
+    # Only one of the factors takes the negation of the product.
+    a = _substitute(reader, multiply.inputs[0])
+    b = _substitute(reader, multiply.inputs[1], negate=False)
+    if not _encodable((a, b, addend)):
+        return None
+
+    original = [statements[index][1], statements[add_index][1]]
+    statements[add_index] = _make_statement(Operation(Unit.MAC, Opcode.OPCODE_MAD, add.outputs, (a, b, addend)))
+    del statements[index]
+    return Rewrite("mad", original, statements[add_index - 1][1])
+
+
+def _propagate_copy(statements: list[Statement], index: int, _ones: list[set[Location]]) -> Rewrite | None:
+    move = _single_operation(statements[index])
+    if move is None or move.opcode != Opcode.OPCODE_MOV or not _temporary_output(move):
+        return None
+    copy = move.writes()
+    copied = move.reads()
+    if copied & copy:
+        return None
+
+    readers = _readers(statements, index, copy)
+    if len(readers) != 1:
+        return None
+    ((reader_index, remaining),) = readers
+    reader = _single_operation(statements[reader_index])
+    if reader is None:
+        return None
+    positions, contained = _reads_from(reader, remaining)
+    if not contained or not _unchanged(statements, index, reader_index, copied):
+        return None
+
+    source = move.inputs[0]
+    inputs = tuple(
+        _substitute(operand, source) if position in positions else operand
+        for position, operand in enumerate(reader.inputs)
+    )
+    if not _encodable(inputs):
+        return None
+
+    original = [statements[index][1], statements[reader_index][1]]
+    replacement = reader._replace(inputs=inputs)
+    statements[reader_index] = (
+        _make_statement(replacement) if reader.unit == Unit.MAC else _make_statement(None, replacement)
+    )
+    del statements[index]
+    return Rewrite("copy", original, statements[reader_index - 1][1])
+
+
+def _remove_overwritten_move(statements: list[Statement], index: int, _ones: list[set[Location]]) -> Rewrite | None:
+    move = _single_operation(statements[index])
+    if move is None or move.opcode != Opcode.OPCODE_MOV or not _temporary_output(move):
+        return None
+    if _readers(statements, index, move.writes()):
+        return None
+    original = [statements[index][1]]
+    del statements[index]
+    return Rewrite("overwritten-mov", original, None)
+
+
+def _reads_one(source: SourceRegister, slot: int, ones: set[Location]) -> bool:
+    """Returns True if the given swizzle slot (0 = x ... 3 = w) of `source` is known to be 1.0."""
+    if source.negate:
+        return False
+    component = dataflow.swizzle_components(source)[slot]
+    return dataflow.source_locations(source, (component,)) <= ones
+
+
+def _homogeneous_dot_product(statements: list[Statement], index: int, ones: list[set[Location]]) -> Rewrite | None:
+    operations = dataflow.operations(statements[index][0])
+    mac = next((operation for operation in operations if operation.unit == Unit.MAC), None)
+    if mac is None or mac.opcode != Opcode.OPCODE_DP4:
+        return None
+    a, b = mac.inputs
+    if _reads_one(a, 3, ones[index]):
+        inputs = (a, b)
+    elif _reads_one(b, 3, ones[index]):
+        inputs = (b, a)
+    else:
+        return None
+
+    ilu = next((operation for operation in operations if operation.unit == Unit.ILU), None)
+    original = [statements[index][1]]
+    statements[index] = _make_statement(mac._replace(opcode=Opcode.OPCODE_DPH, inputs=inputs), ilu)
+    return Rewrite("dph", original, statements[index][1])
+
+
+_RULES: dict[str, Callable[[list[Statement], int, list[set[Location]]], Rewrite | None]] = {
+    "mad": _fuse_multiply_add,
+    "copy": _propagate_copy,
+    "overwritten-mov": _remove_overwritten_move,
+    "dph": _homogeneous_dot_product,
+}
+
+
+def _operation_ones(operation: Operation, ones: set[Location]) -> set[Location]:
+    """Returns the locations that `operation` sets to exactly 1.0."""
+    ret: set[Location] = set()
+    for output in operation.outputs:
+        for component in dataflow.mask_components(output):
+            if operation.opcode == Opcode.OPCODE_MOV:
+                is_one = _reads_one(operation.inputs[0], component, ones)
+            else:
+                is_one = component in _ONE_COMPONENTS.get(operation.opcode, ())
+            if is_one:
+                ret.update(dataflow.destination_locations(output.copy_with_mask(dataflow.write_mask((component,)))))
+    return ret
+
+
+def _known_ones(statements: Sequence[Statement], unit_w_inputs: frozenset[int]) -> list[set[Location]]:
+    """Returns the locations known to hold exactly 1.0 before each instruction."""
+    ones: set[Location] = {(RegisterFile.PROGRAM_INPUT, index, 3) for index in unit_w_inputs}
+    ret = []
+
+    def write(operation: Operation, new_ones: set[Location]) -> None:
+        ones.difference_update(operation.writes())
+        ones.update(new_ones)
+
+    for instruction, _source in statements:
+        ret.append(set(ones))
+        decoder.execute(dataflow.operations(instruction), lambda operation: _operation_ones(operation, ones), write)
+    return ret
+
+
+def optimize(
+    statements: Sequence[Statement], rules: Iterable[str] = RULES, unit_w_inputs: Iterable[int] = ()
+) -> PeepholeResult:
+    """Applies the peephole `rules` to `statements` until none of them matches.
+
+    :param rules: The names of the rules to apply (see `RULES`).
+    :param unit_w_inputs: Indices of the input registers whose `w` component is known to be 1.0 (e.g., positions
+        supplied as three component vertex attributes).
+    """
+    enabled = []
+    for rule in rules:
+        if rule not in _RULES:
+            msg = f"Unknown peephole rule '{rule}', expected one of {', '.join(RULES)}"
+            raise ValueError(msg)
+        enabled.append(_RULES[rule])
+    unit_w_inputs = frozenset(unit_w_inputs)
+
+    ret = list(statements)
+    rewrites: list[Rewrite] = []
+    changed = True
+    while changed:
+        changed = False
+        for apply in enabled:
+            ones = _known_ones(ret, unit_w_inputs)
+            for index in range(len(ret)):
+                rewrite = apply(ret, index, ones)
+                if rewrite is not None:
+                    rewrites.append(rewrite)
+                    changed = True
+                    break
+            if changed:
+                break
+
+    return PeepholeResult(ret, rewrites, len(statements))
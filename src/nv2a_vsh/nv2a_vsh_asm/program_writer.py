@@ -0,0 +1,132 @@
+"""Serializes encoded nv2a vertex shader programs into formats that may be loaded without parsing text."""
+
+from __future__ import annotations
+
+import array
+import ast
+import re
+import sys
+import typing
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Sequence
+
+_NPY_MAGIC = b"\x93NUMPY"
+_NPY_ALIGNMENT = 64
+_C_IDENTIFIER_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _uint32_typecode() -> str:
+    for typecode in ("I", "L"):
+        if array.array(typecode).itemsize == 4:  # noqa: PLR2004 Magic value used in comparison
+            return typecode
+    msg = "No 32-bit unsigned array typecode available"
+    raise RuntimeError(msg)
+
+
+# The array typecode for native 32-bit unsigned integers.
+UINT32_TYPECODE = _uint32_typecode()
+
+
+def _to_le_words(values: Sequence[Sequence[int]]) -> array.array:
+    words = array.array(UINT32_TYPECODE)
+    for instruction in values:
+        if len(instruction) != 4:  # noqa: PLR2004 Magic value used in comparison
+            msg = f"values {instruction!r} must be a 4-integer encoded instruction"
+            raise ValueError(msg)
+        words.extend(instruction)
+    if sys.byteorder != "little":
+        words.byteswap()
+    return words
+
+
+def _from_le_words(data: bytes) -> list[list[int]]:
+    if len(data) % 16:
+        msg = f"Binary program length {len(data)} is not a multiple of 16 bytes"
+        raise ValueError(msg)
+    words = array.array(UINT32_TYPECODE)
+    words.frombytes(data)
+    if sys.byteorder != "little":
+        words.byteswap()
+    return [words[i : i + 4].tolist() for i in range(0, len(words), 4)]
+
+
+def write_binary(values: Sequence[Sequence[int]], outfile: typing.BinaryIO) -> None:
+    """Writes the given machine code quadruplets as consecutive little-endian uint32 words."""
+    _to_le_words(values).tofile(outfile)  # type: ignore[arg-type]
+
+
+def read_binary(infile: typing.BinaryIO) -> list[list[int]]:
+    """Reads machine code quadruplets previously written via `write_binary`."""
+    return _from_le_words(infile.read())
+
+
+def write_c_header(
+    values: Sequence[Sequence[int]],
+    outfile: typing.TextIO,
+    name: str = "vsh_program",
+    comments: Sequence[str] | None = None,
+) -> None:
+    """Writes a self-contained C header declaring `static const uint32_t name[]` and a `name_length` constant.
+
+    :param comments: Optional per-instruction descriptions (e.g., `Assembler.comments`) emitted above each entry.
+    """
+    if not _C_IDENTIFIER_RE.match(name):
+        msg = f"'{name}' is not a valid C identifier"
+        raise ValueError(msg)
+    if comments is not None and len(comments) != len(values):
+        msg = f"Expected {len(values)} comments but got {len(comments)}"
+        raise ValueError(msg)
+
+    guard = f"{name.upper()}_H_"
+    outfile.write(f"#ifndef {guard}\n#define {guard}\n\n#include <stdint.h>\n\n")
+    outfile.write(f"static const uint32_t {name}[] = {{\n")
+    for i, (int_0, int_1, int_2, int_3) in enumerate(values):
+        if comments is not None:
+            outfile.write(f"    /* {comments[i].replace('*/', '* /')} */\n")
+        outfile.write(f"    0x{int_0:08x}, 0x{int_1:08x}, 0x{int_2:08x}, 0x{int_3:08x},\n")
+    outfile.write("};\n\n")
+    outfile.write(f"/* Number of 4-word instructions in {name}. */\n")
+    outfile.write(f"static const uint32_t {name}_length = {len(values)};\n\n#endif  /* {guard} */\n")
+
+
+def write_npy(values: Sequence[Sequence[int]], outfile: typing.BinaryIO) -> None:
+    """Writes the given machine code quadruplets as an (N, 4) little-endian uint32 NumPy `.npy` (format 1.0) file."""
+    header = f"{{'descr': '<u4', 'fortran_order': False, 'shape': ({len(values)}, 4), }}"
+    # Pad with spaces so that the array data starts on an aligned boundary, terminating with a newline.
+    preamble_length = len(_NPY_MAGIC) + 2 + 2
+    padding = -(preamble_length + len(header) + 1) % _NPY_ALIGNMENT
+    header_bytes = (header + " " * padding + "\n").encode("latin1")
+
+    outfile.write(_NPY_MAGIC)
+    outfile.write(b"\x01\x00")
+    outfile.write(len(header_bytes).to_bytes(2, "little"))
+    outfile.write(header_bytes)
+    _to_le_words(values).tofile(outfile)  # type: ignore[arg-type]
+
+
+def is_npy(data: bytes) -> bool:
+    """Returns True if `data` begins with the NumPy `.npy` magic string."""
+    return data.startswith(_NPY_MAGIC)
+
+
+def read_npy(infile: typing.BinaryIO) -> list[list[int]]:
+    """Reads machine code quadruplets from a `.npy` file containing an (N, 4) little-endian uint32 array."""
+    preamble = infile.read(len(_NPY_MAGIC) + 2)
+    if not is_npy(preamble):
+        msg = "Not a .npy file"
+        raise ValueError(msg)
+    major_version = preamble[-2]
+    header_length_size = 2 if major_version == 1 else 4
+    header_length = int.from_bytes(infile.read(header_length_size), "little")
+    header = ast.literal_eval(infile.read(header_length).decode("latin1"))
+
+    if header.get("descr") != "<u4" or header.get("fortran_order"):
+        msg = f"Unsupported .npy array {header!r}, expected C ordered '<u4'"
+        raise ValueError(msg)
+    shape = header.get("shape")
+    if len(shape) != 2 or shape[1] != 4:  # noqa: PLR2004 Magic value used in comparison
+        msg = f"Unsupported .npy shape {shape!r}, expected (N, 4)"
+        raise ValueError(msg)
+
+    return _from_le_words(infile.read(shape[0] * 16))
@@ -0,0 +1,269 @@
+"""Renames temporary registers to minimize the number in use.
+
+Every write to a temporary register `R0` - `R11` starts a value, and every read joins the values that reach it into a
+single live range that must be kept in one register. Live ranges are then assigned registers in program order, reusing
+a register as soon as the ranges (or components) that occupied it are no longer live, which keeps the number of
+registers in use close to the number of values that are live at the busiest point of the program.
+
+Some registers may not be renamed:
+
+* A paired ILU operation can only write `R1`, so its result is pinned there. Other ranges avoid `R1` wherever possible,
+  and ranges written by an unpaired ILU operation prefer it so that `scheduler.schedule` can pair them.
+* Registers that are read before they are written keep their names, as the author relies on their initial value.
+* Registers explicitly pinned by the caller keep their names and are not assigned to any other range.
+"""
+
+from __future__ import annotations
+
+import typing
+
+from nv2a_vsh.nv2a_vsh_asm import dataflow
+from nv2a_vsh.nv2a_vsh_asm.dataflow import Statement, Unit
+from nv2a_vsh.nv2a_vsh_asm.vsh_encoder import DestinationRegister, Opcode, RegisterFile, SourceRegister
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Iterable, Sequence
+
+    from nv2a_vsh.nv2a_vsh_asm.dataflow import Operation
+
+_ILU_REGISTER = 1
+
+# The order in which registers are tried for live ranges that do not prefer R1.
+_REGISTER_ORDER = (*(index for index in range(dataflow.NUM_TEMPS) if index != _ILU_REGISTER), _ILU_REGISTER)
+
+
+class AllocationResult(typing.NamedTuple):
+    """The result of register allocation."""
+
+    statements: list[Statement]
+    # The temporary registers used before and after allocation.
+    original_registers: frozenset[int]
+    registers: frozenset[int]
+
+    def report(self) -> str:
+        """Returns a line describing the change in register usage."""
+        return (
+            f"Register allocation uses {len(self.registers)} temporary registers "
+            f"(previously {len(self.original_registers)})"
+        )
+
+
+class _LiveRange:
+    """Definitions and uses of a temporary register that must be assigned the same register.
+
+    Positions are `2 * instruction` for reads and `2 * instruction + 1` for writes (see `decoder.execute`).
+    """
+
+    def __init__(self, index: int, position: int, components: Iterable[int]):
+        self.index = index
+        self.start = position
+        self.end = position
+        self.components = set(components)
+        # The register that this range must be assigned, if any.
+        self.required: int | None = None
+        # Registers that this range may not be assigned.
+        self.excluded: set[int] = set()
+        self.written_by_mac = False
+        self.written_by_ilu = False
+        self.parent = self
+
+    def find(self) -> _LiveRange:
+        root = self
+        while root.parent is not root:
+            root = root.parent
+        self.parent = root
+        return root
+
+    def merge(self, other: _LiveRange) -> None:
+        root, other = self.find(), other.find()
+        if root is other:
+            return
+        other.parent = root
+        root.start = min(root.start, other.start)
+        root.end = max(root.end, other.end)
+        root.components |= other.components
+        if root.required is None:
+            root.required = other.required
+        root.excluded |= other.excluded
+        root.written_by_mac |= other.written_by_mac
+        root.written_by_ilu |= other.written_by_ilu
+
+    def conflicts(self, other: _LiveRange) -> bool:
+        return self.start <= other.end and other.start <= self.end and bool(self.components & other.components)
+
+    @property
+    def preferred_registers(self) -> tuple[int, ...]:
+        if self.written_by_ilu and not self.written_by_mac:
+            return (_ILU_REGISTER, *(index for index in _REGISTER_ORDER if index != _ILU_REGISTER))
+        return _REGISTER_ORDER
+
+
+def _is_temporary(register: SourceRegister | DestinationRegister) -> bool:
+    return register.file == RegisterFile.PROGRAM_TEMPORARY and register.index < dataflow.NUM_TEMPS
+
+
+def _temporaries(statements: Sequence[Statement]) -> frozenset[int]:
+    return frozenset(
+        index
+        for instruction, _source in statements
+        for register_file, index, _component in dataflow.reads(instruction) | dataflow.writes(instruction)
+        if register_file == RegisterFile.PROGRAM_TEMPORARY and index < dataflow.NUM_TEMPS
+    )
+
+
+def _input_key(operations: list[Operation], operation: Operation, position: int) -> tuple[Unit, int]:
+    if len(operations) > 1 and operation.unit == Unit.ILU and operations[0].opcode == Opcode.OPCODE_MAD:
+        # The ILU shares operand slot C with the third MAD operand.
+        return Unit.MAC, 2
+    return operation.unit, position
+
+
+def _build_live_ranges(
+    statements: Sequence[Statement],
+) -> list[tuple[list[Operation], dict[tuple[Unit, int], _LiveRange], dict[tuple[Unit, int], _LiveRange]]]:
+    """Returns the operations of each statement along with the live ranges of their temporary inputs and outputs."""
+    last_writer: dict[tuple[int, int], _LiveRange] = {}
+    ret = []
+    for position, (instruction, _source) in enumerate(statements):
+        operations = dataflow.operations(instruction)
+        paired = len(operations) > 1
+        inputs: dict[tuple[Unit, int], _LiveRange] = {}
+        outputs: dict[tuple[Unit, int], _LiveRange] = {}
+
+        for operation in operations:
+            for index, (source, components) in enumerate(operation.read_components()):
+                if not _is_temporary(source):
+                    continue
+                key = _input_key(operations, operation, index)
+                live_range = inputs.get(key)
+                if live_range is None:
+                    live_range = inputs[key] = _LiveRange(source.index, 2 * position, components)
+                live_range.find().components.update(components)
+                for component in components:
+                    writer = last_writer.get((source.index, component))
+                    if writer is None:
+                        # Read before it is written, so the initial value of the register is used.
+                        live_range.find().required = source.index
+                        live_range.find().start = 0
+                    else:
+                        live_range.merge(writer)
+
+        for operation in operations:
+            for index, output in enumerate(operation.outputs):
+                if not _is_temporary(output):
+                    continue
+                components = dataflow.mask_components(output)
+                live_range = _LiveRange(output.index, 2 * position + 1, components)
+                if operation.unit == Unit.ILU:
+                    live_range.written_by_ilu = True
+                    if paired:
+                        live_range.required = _ILU_REGISTER
+                else:
+                    live_range.written_by_mac = True
+                    if paired:
+                        # Keep R1 for the ILU result.
+                        live_range.excluded.add(_ILU_REGISTER)
+                outputs[(operation.unit, index)] = live_range
+                for component in components:
+                    last_writer[(output.index, component)] = live_range
+
+        ret.append((operations, inputs, outputs))
+    return ret
+
+
+def _assign(live_ranges: Iterable[_LiveRange], pinned: frozenset[int]) -> dict[_LiveRange, int] | None:
+    """Assigns a register to each live range, returning None if there are not enough registers."""
+    roots = {live_range.find() for live_range in live_ranges}
+    for root in roots:
+        if root.index in pinned:
+            root.required = root.index
+
+    assigned: dict[int, list[_LiveRange]] = {index: [] for index in range(dataflow.NUM_TEMPS)}
+    ret: dict[_LiveRange, int] = {}
+    for root in sorted(roots, key=lambda root: (root.required is None, root.start, root.end, root.index)):
+        register = root.required
+        if register is None:
+            register = next(
+                (
+                    index
+                    for index in root.preferred_registers
+                    if index not in pinned
+                    and index not in root.excluded
+                    and not any(root.conflicts(other) for other in assigned[index])
+                ),
+                None,
+            )
+            if register is None:
+                return None
+        assigned[register].append(root)
+        ret[root] = register
+    return ret
+
+
+def _rename_operation(
+    operation: Operation,
+    inputs: dict[tuple[Unit, int], _LiveRange],
+    outputs: dict[tuple[Unit, int], _LiveRange],
+    operations: list[Operation],
+    registers: dict[_LiveRange, int],
+) -> Operation:
+    renamed_inputs = []
+    for index, source in enumerate(operation.inputs):
+        live_range = inputs.get(_input_key(operations, operation, index))
+        if live_range is None:
+            renamed_inputs.append(source)
+            continue
+        register = registers[live_range.find()]
+        renamed_inputs.append(
+            SourceRegister(source.file, register, source.swizzle, rel_addr=source.rel_addr, negate=source.negate)
+        )
+
+    renamed_outputs = []
+    for index, output in enumerate(operation.outputs):
+        live_range = outputs.get((operation.unit, index))
+        if live_range is None:
+            renamed_outputs.append(output)
+            continue
+        register = registers[live_range.find()]
+        renamed_outputs.append(DestinationRegister(output.file, register, output.write_mask, output.rel_addr))
+
+    return operation._replace(inputs=tuple(renamed_inputs), outputs=tuple(renamed_outputs))
+
+
+def allocate_registers(statements: Sequence[Statement], pinned: Iterable[int] = ()) -> AllocationResult:
+    """Renames the temporary registers used by `statements`, minimizing the number of registers in use.
+
+    :param pinned: Indices of temporary registers that must keep their names. No other value is placed in them.
+    :return: The renamed statements. Statements whose registers are unchanged are returned unmodified. If the
+        constraints do not allow an assignment that uses at most as many registers as the original program,
+        `statements` are returned unchanged.
+    """
+    pinned = frozenset(pinned)
+    original_registers = _temporaries(statements)
+    accesses = _build_live_ranges(statements)
+    registers = _assign(
+        (
+            live_range
+            for _operations, inputs, outputs in accesses
+            for live_range in (*inputs.values(), *outputs.values())
+        ),
+        pinned,
+    )
+    if registers is None:
+        return AllocationResult(list(statements), original_registers, original_registers)
+
+    ret: list[Statement] = []
+    for statement, (operations, inputs, outputs) in zip(statements, accesses, strict=True):
+        renamed = [_rename_operation(operation, inputs, outputs, operations, registers) for operation in operations]
+        if renamed == operations:
+            ret.append(statement)
+            continue
+        mac = next((operation for operation in renamed if operation.unit == Unit.MAC), None)
+        ilu = next((operation for operation in renamed if operation.unit == Unit.ILU), None)
+        instruction = dataflow.make_instruction(mac, ilu)
+        ret.append((instruction, dataflow.format_instruction(instruction)))
+
+    allocated_registers = _temporaries(ret)
+    if len(allocated_registers) > len(original_registers):
+        return AllocationResult(list(statements), original_registers, original_registers)
+    return AllocationResult(ret, original_registers, allocated_registers)
@@ -0,0 +1,284 @@
+"""Verifies that disassembled machine code reassembles to the original machine code."""
+
+# pylint: disable=too-few-public-methods
+
+from __future__ import annotations
+
+import concurrent.futures
+import functools
+import typing
+from collections import defaultdict
+
+from nv2a_vsh.nv2a_vsh_asm.assembler import Assembler
+from nv2a_vsh.nv2a_vsh_asm.decoder import ILU_READ_COMPONENTS, MAC_READ_COMPONENTS, vsh_mask_components
+from nv2a_vsh.nv2a_vsh_asm.encoding_error import EncodingError
+from nv2a_vsh.nv2a_vsh_asm.vsh_encoder_defs import MAC, OMUX_ILU, OMUX_MAC, PARAM_C, PARAM_R, PARAM_V
+from nv2a_vsh.nv2a_vsh_asm.vsh_instruction import VshInstruction, decode_fields, differing_fields, vsh_diff_programs
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Iterable
+
+# Pseudo field names used to group instructions that could not be disassembled or reassembled at all.
+DISASSEMBLY_FAILED = "<disassemble>"
+ASSEMBLY_FAILED = "<assemble>"
+
+
+class Mismatch(typing.NamedTuple):
+    """Describes an instruction that did not survive a disassemble -> assemble round trip."""
+
+    program: str
+    instruction: int
+    source: str
+    expected: list[int]
+    actual: list[int] | None
+    fields: tuple[str, ...]
+    message: str = ""
+
+
+class RoundTripReport:
+    """Aggregates the results of round trip verification over one or more programs."""
+
+    def __init__(self) -> None:
+        self.programs = 0
+        self.instructions = 0
+        self.skipped = 0
+        self.mismatches: list[Mismatch] = []
+        # The `vsh_diff_programs` explanation for each program with mismatched instructions, keyed by program name.
+        self.diffs: dict[str, str] = {}
+
+    @property
+    def ok(self) -> bool:
+        return not self.mismatches
+
+    def merge(self, other: RoundTripReport) -> None:
+        """Adds the results from `other` to this report."""
+        self.programs += other.programs
+        self.instructions += other.instructions
+        self.skipped += other.skipped
+        self.mismatches.extend(other.mismatches)
+        self.diffs.update(other.diffs)
+
+    def by_field(self) -> dict[str, list[Mismatch]]:
+        """Groups mismatches by differing field, most frequent first.
+
+        A mismatch with several differing fields is listed under each of them.
+        """
+        groups: dict[str, list[Mismatch]] = defaultdict(list)
+        for mismatch in self.mismatches:
+            for field in mismatch.fields:
+                groups[field].append(mismatch)
+        return dict(sorted(groups.items(), key=lambda item: (-len(item[1]), item[0])))
+
+    def summary(self, max_examples: int = 3) -> str:
+        """Returns a human readable summary of this report."""
+        lines = [
+            f"Verified {self.programs} programs ({self.instructions} instructions, {self.skipped} NOPs skipped): "
+            f"{len(self.mismatches)} mismatched instructions"
+        ]
+        for field, mismatches in self.by_field().items():
+            lines.append(f"  {field}: {len(mismatches)}")
+            for mismatch in mismatches[:max_examples]:
+                detail = f" ({mismatch.message})" if mismatch.message else ""
+                lines.append(f"    {mismatch.program}:{mismatch.instruction}: {mismatch.source}{detail}")
+        return "\n".join(lines)
+
+
+_MAC_INPUT_SLOTS: dict[int, str] = {
+    MAC.MAC_NOP: "",
+    MAC.MAC_MOV: "A",
+    MAC.MAC_ARL: "A",
+    MAC.MAC_ADD: "AC",
+    MAC.MAC_MAD: "ABC",
+}
+
+_SLOT_FIELDS = {
+    slot: (f"{slot}_SWZ_X", f"{slot}_SWZ_Y", f"{slot}_SWZ_Z", f"{slot}_SWZ_W", f"{slot}_NEG", f"{slot}_MUX")
+    for slot in "ABC"
+}
+
+_SLOT_TEMP_REG_FIELDS = {
+    "A": ("A_TEMP_REG",),
+    "B": ("B_TEMP_REG",),
+    "C": ("C_TEMP_REG_HIGH", "C_TEMP_REG_LOW"),
+}
+
+
+def _written_components(fields: dict[str, int], mask: str, mux: int) -> set[int]:
+    ret = set(vsh_mask_components(fields[mask]))
+    if fields["OUT_MUX"] == mux:
+        ret.update(vsh_mask_components(fields["OUT_O_MASK"]))
+    return ret
+
+
+def _read_swizzle_positions(fields: dict[str, int]) -> dict[str, set[int]]:
+    """Returns the swizzle positions of each input slot whose source components affect the result."""
+    ret: dict[str, set[int]] = defaultdict(set)
+    mac = fields["MAC"]
+    mac_components = MAC_READ_COMPONENTS.get(mac)
+    for position, slot in enumerate(_MAC_INPUT_SLOTS.get(mac, "AB")):
+        if mac_components:
+            ret[slot].update(mac_components[position])
+        else:
+            ret[slot].update(_written_components(fields, "OUT_MAC_MASK", OMUX_MAC))
+    if fields["ILU"]:
+        ilu_components = ILU_READ_COMPONENTS.get(fields["ILU"])
+        ret["C"].update(ilu_components or _written_components(fields, "OUT_ILU_MASK", OMUX_ILU))
+    return ret
+
+
+def _unused_fields(values: list[int]) -> set[str]:
+    """Returns the names of fields that have no effect on the behavior of the given encoded instruction."""
+    fields = decode_fields(values)
+    read_positions = _read_swizzle_positions(fields)
+    used_slots = set(read_positions)
+
+    ret: set[str] = set()
+    used_muxes = set()
+    for slot in "ABC":
+        if slot not in used_slots:
+            ret.update(_SLOT_FIELDS[slot])
+            ret.update(_SLOT_TEMP_REG_FIELDS[slot])
+            continue
+        ret.update(f"{slot}_SWZ_{name}" for position, name in enumerate("XYZW") if position not in read_positions[slot])
+        mux = fields[f"{slot}_MUX"]
+        used_muxes.add(mux)
+        if mux != PARAM_R:
+            ret.update(_SLOT_TEMP_REG_FIELDS[slot])
+
+    if PARAM_V not in used_muxes:
+        ret.add("INPUT")
+    if PARAM_C not in used_muxes:
+        ret.update(("CONST", "A0X"))
+
+    if not fields["OUT_O_MASK"]:
+        ret.update(("OUT_MUX", "OUT_ADDRESS", "OUT_ORB"))
+
+    # A paired ILU operation always writes to R1, so only a MAC temporary write uses the temp register field.
+    if not fields["OUT_MAC_MASK"] and (not fields["OUT_ILU_MASK"] or fields["MAC"]):
+        ret.add("OUT_TEMP_REG")
+
+    return ret
+
+
+def _is_nop(vsh_ins: VshInstruction) -> bool:
+    return not vsh_ins.mac and not vsh_ins.ilu
+
+
+def _assemble(source: str) -> tuple[list[list[int]], str]:
+    """Assembles `source` with an inline FINAL flag, returning (output, error_message)."""
+    asm = Assembler(source)
+    try:
+        success = asm.assemble(inline_final_flag=True)
+    except (EncodingError, ValueError) as err:
+        return [], str(err)
+    if not success:
+        return [], "; ".join(f"{error.line}:{error.column}: {error.message}" for error in asm.errors)
+    return asm.output, ""
+
+
+def _set_final(values: list[int], *, final: bool) -> list[int]:
+    return [values[0], values[1], values[2], (values[3] & ~0x1) | int(final)]
+
+
+def verify_program(
+    name: str, values: list[list[int]], *, ignore_final_flag: bool = False, ignore_unused_fields: bool = False
+) -> RoundTripReport:
+    """Disassembles the given machine code quadruplets, reassembles them, and reports any differences.
+
+    NOP instructions (which disassemble to comments) are skipped. The reassembled program is compared with the
+    original through `vsh_diff_programs`, whose explanation is kept in `RoundTripReport.diffs` if anything differs.
+
+    :param ignore_unused_fields: Ignore differences in fields that do not affect the behavior of the original
+        instruction (e.g., the swizzle of an operand slot that is not read by the operation).
+    """
+    report = RoundTripReport()
+    report.programs = 1
+
+    entries: list[tuple[int, str, list[int]]] = []
+    vsh_ins = VshInstruction()
+    for index, instruction in enumerate(values):
+        report.instructions += 1
+        vsh_ins.set_values(instruction)
+        if _is_nop(vsh_ins):
+            report.skipped += 1
+            continue
+
+        try:
+            source = vsh_ins.disassemble()
+        except (KeyError, ValueError) as err:
+            report.mismatches.append(
+                Mismatch(name, index, "", instruction, None, (DISASSEMBLY_FAILED,), f"{type(err).__name__}: {err}")
+            )
+            continue
+        entries.append((index, source, instruction))
+
+    if not entries:
+        return report
+
+    output, _error = _assemble("\n".join(source for _index, source, _expected in entries))
+    if len(output) != len(entries):
+        # Reassemble instructions individually so that a single failure doesn't obscure the rest of the program.
+        output = []
+        for i, (index, source, expected) in enumerate(entries):
+            single, error = _assemble(source)
+            if len(single) != 1:
+                output.append([])
+                message = error or vsh_diff_programs([expected], single).strip()
+                report.mismatches.append(Mismatch(name, index, source, expected, None, (ASSEMBLY_FAILED,), message))
+                continue
+            output.append(_set_final(single[0], final=i == len(entries) - 1))
+    elif not vsh_diff_programs(
+        [expected for _index, _source, expected in entries], output, ignore_final_flag=ignore_final_flag
+    ):
+        return report
+
+    reassembled = [list(instruction) for instruction in values]
+    for (index, source, expected), actual in zip(entries, output, strict=True):
+        if not actual:
+            continue
+        reassembled[index] = actual
+        fields = differing_fields(expected, actual, ignore_final_flag=ignore_final_flag)
+        if ignore_unused_fields:
+            unused = _unused_fields(expected)
+            fields = [field for field in fields if field not in unused]
+        if fields:
+            report.mismatches.append(Mismatch(name, index, source, expected, actual, tuple(fields)))
+
+    if report.mismatches:
+        report.diffs[name] = vsh_diff_programs(values, reassembled, ignore_final_flag=ignore_final_flag)
+    return report
+
+
+def _verify_entry(
+    entry: tuple[str, list[list[int]]], *, ignore_final_flag: bool, ignore_unused_fields: bool
+) -> RoundTripReport:
+    name, values = entry
+    return verify_program(name, values, ignore_final_flag=ignore_final_flag, ignore_unused_fields=ignore_unused_fields)
+
+
+def verify_corpus(
+    programs: Iterable[tuple[str, list[list[int]]]],
+    *,
+    ignore_final_flag: bool = False,
+    ignore_unused_fields: bool = False,
+    max_workers: int | None = None,
+    chunksize: int = 8,
+) -> RoundTripReport:
+    """Verifies a collection of (name, machine code) programs, distributing the work across processes.
+
+    :param max_workers: The number of worker processes. `None` uses the CPU count and 1 runs serially in-process.
+    """
+    verify = functools.partial(
+        _verify_entry, ignore_final_flag=ignore_final_flag, ignore_unused_fields=ignore_unused_fields
+    )
+    report = RoundTripReport()
+
+    if max_workers == 1:
+        for entry in programs:
+            report.merge(verify(entry))
+        return report
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for result in executor.map(verify, programs, chunksize=chunksize):
+            report.merge(result)
+    return report
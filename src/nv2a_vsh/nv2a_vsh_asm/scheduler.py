@@ -0,0 +1,141 @@
+"""Packs independent MAC and ILU operations into paired instructions.
+
+The nv2a executes one MAC and one ILU operation per instruction slot, but pairing only happens when the author writes
+`op + op` by hand. `schedule` builds the dependency graph of a program and greedily list schedules it, issuing
+operations in their original order unless an independent operation for the idle unit can be hoisted into the same
+slot. Pairs must satisfy the encoding rules that `process_combined_operations` enforces for hand written pairs:
+
+* A paired ILU operation may only write R1 (or an output register).
+* Only one of the two operations may write an output (`o` or `c`) register.
+* The instruction reads at most one `v` register and one `c` register.
+* The ILU reads operand slot C, so a MAC operation that uses slot C (`MAD`) must read the same value there. `ADD`,
+  which is encoded into slots A and C, is never paired.
+"""
+
+from __future__ import annotations
+
+import typing
+
+from nv2a_vsh.nv2a_vsh_asm import dataflow
+from nv2a_vsh.nv2a_vsh_asm.dataflow import Dependency, Operation, Statement, Unit
+from nv2a_vsh.nv2a_vsh_asm.vsh_encoder import Opcode, RegisterFile
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Sequence
+
+_OUTPUT_FILES = (RegisterFile.PROGRAM_OUTPUT, RegisterFile.PROGRAM_ENV_PARAM)
+
+
+class ScheduleResult(typing.NamedTuple):
+    """The result of scheduling a program."""
+
+    statements: list[Statement]
+    # The number of instruction slots used by the program before scheduling.
+    original_slots: int
+
+    @property
+    def slots(self) -> int:
+        return len(self.statements)
+
+    @property
+    def slots_saved(self) -> int:
+        return self.original_slots - self.slots
+
+
+def _writes_output(operation: Operation) -> bool:
+    return any(output.file in _OUTPUT_FILES for output in operation.outputs)
+
+
+def can_pair(mac: Operation, ilu: Operation) -> bool:
+    """Returns True if the given operations may be encoded into a single instruction.
+
+    Dependencies between the operations are not considered.
+    """
+    if mac.unit != Unit.MAC or ilu.unit != Unit.ILU or mac.opcode == Opcode.OPCODE_ADD or len(ilu.inputs) != 1:
+        return False
+    if any(output.targets_temporary and output.index != 1 for output in ilu.outputs):
+        return False
+    if _writes_output(mac) and _writes_output(ilu):
+        return False
+    if mac.writes() & ilu.writes():
+        return False
+
+    inputs = {source.index for source in (*mac.inputs, *ilu.inputs) if source.file == RegisterFile.PROGRAM_INPUT}
+    constants = {
+        (source.index, source.rel_addr)
+        for source in (*mac.inputs, *ilu.inputs)
+        if source.file == RegisterFile.PROGRAM_ENV_PARAM
+    }
+    if len(inputs) > 1 or len(constants) > 1:
+        return False
+
+    return len(mac.inputs) < 3 or mac.inputs[2] == ilu.inputs[0]  # noqa: PLR2004 Magic value used in comparison
+
+
+def _pairable_operation(statement: Statement) -> Operation | None:
+    """Returns the single operation of an instruction that may be paired, or None."""
+    operations = dataflow.operations(statement[0])
+    if len(operations) != 1:
+        return None
+    operation = operations[0]
+    if operation.unit == Unit.ILU and operation.opcode == Opcode.OPCODE_MOV:
+        return None
+    return operation
+
+
+def schedule(statements: Sequence[Statement]) -> ScheduleResult:
+    """Reorders `statements` within their dependencies, merging eligible MAC and ILU operations.
+
+    :return: The scheduled statements. Statements that are not paired are returned unmodified, in their original
+        relative order wherever the dependencies allow.
+    """
+    accesses = [(dataflow.reads(instruction), dataflow.writes(instruction)) for instruction, _source in statements]
+    predecessors = dataflow.dependencies(accesses)
+    operations = [_pairable_operation(statement) for statement in statements]
+
+    scheduled: set[int] = set()
+    pending = list(range(len(statements)))
+    ret: list[Statement] = []
+
+    def _is_ready(index: int, partner: int | None = None) -> bool:
+        return all(
+            predecessor in scheduled or (predecessor == partner and kind == Dependency.ANTI)
+            for predecessor, kind in predecessors[index].items()
+        )
+
+    def _find_partner(primary: int) -> int | None:
+        operation = operations[primary]
+        if operation is None:
+            return None
+        for candidate in pending:
+            other = operations[candidate]
+            if candidate == primary or other is None or other.unit == operation.unit:
+                continue
+            if not _is_ready(candidate, primary):
+                continue
+            mac, ilu = (operation, other) if operation.unit == Unit.MAC else (other, operation)
+            if can_pair(mac, ilu):
+                return candidate
+        return None
+
+    while pending:
+        primary = next(index for index in pending if _is_ready(index))
+        partner = _find_partner(primary)
+        pending.remove(primary)
+        scheduled.add(primary)
+        if partner is None:
+            ret.append(statements[primary])
+            continue
+
+        pending.remove(partner)
+        scheduled.add(partner)
+        first, second = sorted((primary, partner))
+        mac, ilu = (first, second) if operations[first].unit == Unit.MAC else (second, first)  # type: ignore[union-attr]
+        ret.append(
+            (
+                dataflow.make_instruction(operations[mac], operations[ilu]),
+                f"{statements[mac][1]} + {statements[ilu][1]}",
+            )
+        )
+
+    return ScheduleResult(ret, len(statements))
@@ -0,0 +1,311 @@
+"""Provides an inverted index over the decoded fields of encoded nv2a vertex shader programs."""
+
+# pylint: disable=too-few-public-methods
+
+from __future__ import annotations
+
+import abc
+import json
+import typing
+from collections import defaultdict
+
+from nv2a_vsh.nv2a_vsh_asm.vsh_encoder_defs import (
+    DESTINATION_REGISTER_TO_NAME_MAP,
+    DESTINATION_REGISTER_TO_NAME_MAP_SHORT,
+    ILU,
+    ILU_NAMES,
+    MAC,
+    MAC_NAMES,
+    OUTPUT_O,
+    OutputRegisters,
+)
+from nv2a_vsh.nv2a_vsh_asm.vsh_instruction import decode_fields
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Iterable
+
+# The fields that are indexed. Swizzle, negation and temp register fields are deliberately omitted as they are rarely
+# useful on their own and would bloat the index.
+INDEXED_FIELDS = (
+    "MAC",
+    "ILU",
+    "A_MUX",
+    "B_MUX",
+    "C_MUX",
+    "INPUT",
+    "CONST",
+    "A0X",
+    "OUT_MUX",
+    "OUT_ADDRESS",
+    "OUT_ORB",
+    "OUT_O_MASK",
+    "OUT_ILU_MASK",
+    "OUT_MAC_MASK",
+    "OUT_TEMP_REG",
+    "FINAL",
+)
+
+_INDEX_FORMAT_VERSION = 1
+
+
+class Match(typing.NamedTuple):
+    """Identifies a single instruction within an indexed program."""
+
+    program: str
+    instruction: int
+
+
+class Predicate(abc.ABC):
+    """Base class for index queries. Predicates may be combined via `&`, `|`, and `~`."""
+
+    @abc.abstractmethod
+    def evaluate(self, index: ProgramIndex) -> set[tuple[int, int]]:
+        """Returns the set of (program_id, instruction_index) positions matching this predicate."""
+
+    def __and__(self, other: Predicate) -> Predicate:
+        return _And(self, other)
+
+    def __or__(self, other: Predicate) -> Predicate:
+        return _Or(self, other)
+
+    def __invert__(self) -> Predicate:
+        return _Not(self)
+
+
+class Field(Predicate):
+    """Matches instructions whose decoded `name` field is equal to `value`."""
+
+    def __init__(self, name: str, value: int):
+        if name not in INDEXED_FIELDS:
+            msg = f"Field '{name}' is not indexed. Must be one of {INDEXED_FIELDS!r}"
+            raise ValueError(msg)
+        self.name = name
+        self.value = int(value)
+
+    def evaluate(self, index: ProgramIndex) -> set[tuple[int, int]]:
+        return set(index.postings(self.name, self.value))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.name}={self.value})"
+
+
+class _And(Predicate):
+    def __init__(self, lhs: Predicate, rhs: Predicate):
+        self.lhs = lhs
+        self.rhs = rhs
+
+    def evaluate(self, index: ProgramIndex) -> set[tuple[int, int]]:
+        return self.lhs.evaluate(index) & self.rhs.evaluate(index)
+
+
+class _Or(Predicate):
+    def __init__(self, lhs: Predicate, rhs: Predicate):
+        self.lhs = lhs
+        self.rhs = rhs
+
+    def evaluate(self, index: ProgramIndex) -> set[tuple[int, int]]:
+        return self.lhs.evaluate(index) | self.rhs.evaluate(index)
+
+
+class _Not(Predicate):
+    def __init__(self, inner: Predicate):
+        self.inner = inner
+
+    def evaluate(self, index: ProgramIndex) -> set[tuple[int, int]]:
+        return index.all_positions() - self.inner.evaluate(index)
+
+
+def mac(opcode: MAC) -> Predicate:
+    """Matches instructions executing the given MAC operation."""
+    return Field("MAC", opcode)
+
+
+def ilu(opcode: ILU) -> Predicate:
+    """Matches instructions executing the given ILU operation."""
+    return Field("ILU", opcode)
+
+
+def reads_relative_constant() -> Predicate:
+    """Matches instructions that read a `c[A0+N]` register."""
+    return Field("A0X", 1)
+
+
+def writes_output(register: OutputRegisters) -> Predicate:
+    """Matches instructions that write to the given output (o) register."""
+    return Field("OUT_ORB", OUTPUT_O) & Field("OUT_ADDRESS", register) & ~Field("OUT_O_MASK", 0)
+
+
+_NAMED_VALUES: dict[str, dict[str, int]] = {
+    "MAC": {name.lower(): int(value) for value, name in MAC_NAMES.items()},
+    "ILU": {name.lower(): int(value) for value, name in ILU_NAMES.items()},
+    "OUT_ADDRESS": {
+        name.lower(): int(value)
+        for mapping in (DESTINATION_REGISTER_TO_NAME_MAP, DESTINATION_REGISTER_TO_NAME_MAP_SHORT)
+        for value, name in mapping.items()
+        if value != OutputRegisters.REG_A0
+    },
+}
+
+
+def parse_term(term: str) -> Predicate:
+    """Parses a textual `FIELD=VALUE` or `FIELD!=VALUE` query term.
+
+    VALUE may be an integer (decimal or 0x-prefixed hex) or a mnemonic for the MAC, ILU, and OUT_ADDRESS fields (e.g.,
+    `MAC=MUL`, `ILU=RCC`, `OUT_ADDRESS=oFog`).
+    """
+    negate = False
+    if "!=" in term:
+        name, value = term.split("!=", 1)
+        negate = True
+    elif "=" in term:
+        name, value = term.split("=", 1)
+    else:
+        msg = f"Invalid query term '{term}', expected FIELD=VALUE or FIELD!=VALUE"
+        raise ValueError(msg)
+
+    name = name.strip().upper()
+    value = value.strip()
+    named_value = _NAMED_VALUES.get(name, {}).get(value.lower())
+    if named_value is not None:
+        numeric_value = named_value
+    else:
+        try:
+            numeric_value = int(value, 0)
+        except ValueError:
+            msg = f"Invalid value '{value}' for field {name} in query term '{term}'"
+            raise ValueError(msg) from None
+
+    ret = Field(name, numeric_value)
+    if negate:
+        return ~ret
+    return ret
+
+
+class ProgramIndex:
+    """Inverted index mapping decoded instruction fields to program/instruction positions.
+
+    Programs may be added incrementally; adding a program with a name that is already indexed replaces it.
+    """
+
+    def __init__(self) -> None:
+        self._program_names: list[str | None] = []
+        self._program_ids: dict[str, int] = {}
+        self._program_values: dict[int, list[list[int]]] = {}
+        self._postings: dict[tuple[str, int], set[tuple[int, int]]] = defaultdict(set)
+
+    @property
+    def programs(self) -> list[str]:
+        """Returns the names of all indexed programs."""
+        return list(self._program_ids)
+
+    def __len__(self) -> int:
+        return len(self._program_ids)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._program_ids
+
+    def add_program(self, name: str, values: Iterable[list[int]]) -> None:
+        """Indexes the given list of machine code quadruplets under `name`."""
+        if name in self._program_ids:
+            self.remove_program(name)
+
+        program_id = len(self._program_names)
+        self._program_names.append(name)
+        self._program_ids[name] = program_id
+
+        program_values = [list(instruction) for instruction in values]
+        for instruction_index, instruction in enumerate(program_values):
+            fields = decode_fields(instruction)
+            position = (program_id, instruction_index)
+            for field in INDEXED_FIELDS:
+                self._postings[(field, fields[field])].add(position)
+        self._program_values[program_id] = program_values
+
+    def remove_program(self, name: str) -> None:
+        """Removes the program with the given name from the index."""
+        program_id = self._program_ids.pop(name)
+        self._program_names[program_id] = None
+        del self._program_values[program_id]
+
+        empty_keys = []
+        for key, positions in self._postings.items():
+            stale = {position for position in positions if position[0] == program_id}
+            if stale:
+                positions.difference_update(stale)
+                if not positions:
+                    empty_keys.append(key)
+        for key in empty_keys:
+            del self._postings[key]
+
+    def postings(self, field: str, value: int) -> set[tuple[int, int]]:
+        """Returns the (program_id, instruction_index) positions at which `field` has the given `value`."""
+        return self._postings.get((field, value), set())
+
+    def all_positions(self) -> set[tuple[int, int]]:
+        """Returns every indexed (program_id, instruction_index) position."""
+        return {
+            (program_id, instruction_index)
+            for program_id, values in self._program_values.items()
+            for instruction_index in range(len(values))
+        }
+
+    def program_values(self, name: str) -> list[list[int]]:
+        """Returns the machine code quadruplets of the program with the given name."""
+        return self._program_values[self._program_ids[name]]
+
+    def instruction(self, match: Match) -> list[int]:
+        """Returns the machine code quadruplet identified by `match`."""
+        return self.program_values(match.program)[match.instruction]
+
+    def search(self, predicate: Predicate) -> list[Match]:
+        """Returns all instructions matching `predicate`, sorted by program name and instruction index."""
+        matches = [
+            Match(typing.cast("str", self._program_names[program_id]), instruction_index)
+            for program_id, instruction_index in predicate.evaluate(self)
+        ]
+        return sorted(matches)
+
+    def matching_programs(self, predicate: Predicate) -> list[str]:
+        """Returns the sorted names of all programs containing at least one instruction matching `predicate`."""
+        return sorted({match.program for match in self.search(predicate)})
+
+    def save(self, outfile: typing.TextIO) -> None:
+        """Serializes this index as JSON."""
+        # Compact program IDs so that removed programs do not leave holes.
+        remapped_ids = {program_id: i for i, program_id in enumerate(self._program_ids.values())}
+        postings: dict[str, dict[str, list[list[int]]]] = defaultdict(dict)
+        for (field, value), positions in self._postings.items():
+            postings[field][str(value)] = sorted([remapped_ids[program], index] for program, index in positions)
+
+        json.dump(
+            {
+                "version": _INDEX_FORMAT_VERSION,
+                "programs": [
+                    [name, self._program_values[program_id]] for name, program_id in self._program_ids.items()
+                ],
+                "postings": postings,
+            },
+            outfile,
+        )
+
+    @classmethod
+    def load(cls, infile: typing.TextIO) -> ProgramIndex:
+        """Deserializes an index previously written via `save`."""
+        data = json.load(infile)
+        if data.get("version") != _INDEX_FORMAT_VERSION:
+            msg = f"Unsupported index version {data.get('version')!r}"
+            raise ValueError(msg)
+
+        ret = cls()
+        for program_id, (name, values) in enumerate(data["programs"]):
+            ret._program_names.append(name)
+            ret._program_ids[name] = program_id
+            ret._program_values[program_id] = values
+
+        for field, values in data["postings"].items():
+            if field not in INDEXED_FIELDS:
+                msg = f"Unknown field '{field}' in index"
+                raise ValueError(msg)
+            for value, positions in values.items():
+                ret._postings[(field, int(value))] = {(program, index) for program, index in positions}
+        return ret
@@ -0,0 +1,451 @@
+"""Specializes a program for constant registers whose values are known when it is built.
+
+`specialize` propagates the known values of `c` registers through the MAC operations of a program, following the
+emulator's float32 arithmetic, and simplifies each unpaired operation whose result depends on fewer inputs as a
+result:
+
+* An operation whose result is entirely known becomes a `MOV` from a register that holds the same values (possibly
+  swizzled or negated), if there is one.
+* An operation whose result components each equal a component of one operand becomes a `MOV` of that operand (e.g.,
+  `MUL x, 1` or `MUL x, -1`). A `MOV` that copies a register onto itself is removed.
+* `MAD a, 1, c` becomes `ADD a, c`.
+* `c[A0+n]` becomes a direct read once `A0` is known.
+
+The rewrites above produce bit-identical results. With `fast_math`, the program is assumed to never produce infinities
+or NaNs and the sign of zero results is ignored (as with `-ffast-math`), which additionally folds `0 * x` to zero and
+`x + 0` to `x` (`0 * inf` is NaN and `-0 + 0` is `+0`, which matters when the result is passed to `RCP`). Among other
+things, this turns `ADD x, 0` and `MAD a, b, 0` into `MOV` and `MUL`, and reduces dot products with unit vectors (e.g.,
+the rows of an identity matrix) to a single component.
+
+Operations whose results are no longer read are then removed by `dead_code.eliminate_dead_code`, and the constant
+registers that the specialized program still reads are described by a `ConstantFootprint`.
+"""
+
+from __future__ import annotations
+
+import copy
+import math
+import re
+import struct
+import typing
+
+from nv2a_vsh.nv2a_vsh_asm import constant_footprint, dataflow, dead_code, vsh_encoder
+from nv2a_vsh.nv2a_vsh_asm.dataflow import NUM_CONSTANTS, Operation, Unit
+from nv2a_vsh.nv2a_vsh_asm.vsh_encoder import Opcode, RegisterFile, SourceRegister
+from nv2a_vsh.nv2a_vsh_asm.vsh_encoder_defs import R12
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Iterable, Mapping, Sequence
+
+    from nv2a_vsh.nv2a_vsh_asm.constant_footprint import ConstantFootprint
+    from nv2a_vsh.nv2a_vsh_asm.dataflow import Location, Statement
+    from nv2a_vsh.nv2a_vsh_asm.dead_code import DeadCodeResult
+
+_CONSTANT_VALUE_RE = re.compile(r"^\s*(?:c(\d+)|c\[(\d+)\])\s*=(.+)$", re.IGNORECASE)
+
+# The number of products summed by each dot product.
+_DOT_PRODUCT_TERMS = {Opcode.OPCODE_DP3: 3, Opcode.OPCODE_DPH: 3, Opcode.OPCODE_DP4: 4}
+
+
+class _Copy(typing.NamedTuple):
+    """A result component that equals a component of a register read by an operand."""
+
+    # (register file, index, relatively addressed)
+    register: tuple[RegisterFile, int, bool]
+    component: int
+    negate: bool
+
+    def negated(self) -> _Copy:
+        return self._replace(negate=not self.negate)
+
+
+# A known value, a copy of an operand component or None if neither.
+_Value = float | _Copy | None
+
+
+class SpecializationResult(typing.NamedTuple):
+    """The result of specializing a program for known constant values."""
+
+    statements: list[Statement]
+    # The (original, rewritten) source of each instruction that was simplified.
+    rewritten: list[tuple[str, str]]
+    # The source of each instruction that was removed because it copied a register onto itself.
+    removed: list[str]
+    # The operations that were removed because their results were no longer read.
+    dead_code: DeadCodeResult
+    # The constant registers read by the specialized program.
+    footprint: ConstantFootprint
+    # The number of instructions before specialization.
+    original_instructions: int
+
+    @property
+    def instructions_saved(self) -> int:
+        return self.original_instructions - len(self.statements)
+
+    def report(self) -> list[str]:
+        """Returns a line describing each change, followed by the savings and the remaining constant footprint."""
+        ret = [f"Specialized '{original}' to '{rewritten}'" for original, rewritten in self.rewritten]
+        ret.extend(f"Removed self copy '{source}'" for source in self.removed)
+        ret.extend(self.dead_code.report())
+        ret.append(f"Specialization saved {self.instructions_saved} of {self.original_instructions} instructions")
+        ret.extend(self.footprint.report())
+        return ret
+
+
+def parse_constant_values(specs: Iterable[str]) -> dict[int, tuple[float, float, float, float]]:
+    """Parses `REGISTER=X,Y,Z,W` strings, where REGISTER is a constant register (`c4` or `c[4]`).
+
+    A single value (e.g., `c4=0`) is used for all four components.
+    """
+    ret: dict[int, tuple[float, float, float, float]] = {}
+    for spec in specs:
+        match = _CONSTANT_VALUE_RE.match(spec)
+        values: list[float] | None = None
+        if match:
+            index = int(match.group(1) or match.group(2))
+            try:
+                values = [float(value) for value in match.group(3).split(",")]
+            except ValueError:
+                values = None
+            if values and len(values) == 1:
+                values *= 4
+            if index >= NUM_CONSTANTS or (values and len(values) != 4):  # noqa: PLR2004
+                values = None
+        if not match or not values:
+            msg = f"Invalid constant value '{spec}', expected REGISTER=X,Y,Z,W (e.g., c4=1,0,0,0)"
+            raise ValueError(msg)
+        ret[index] = (values[0], values[1], values[2], values[3])
+    return ret
+
+
+def _float32(value: float) -> float:
+    """Rounds `value` to the nearest float32."""
+    try:
+        ret: float = struct.unpack("<f", struct.pack("<f", value))[0]
+    except OverflowError:
+        return math.copysign(math.inf, value)
+    return ret
+
+
+def _same(a: float, b: float, *, fast_math: bool) -> bool:
+    """Returns True if `a` and `b` are the same float32 value, ignoring the sign of zeros with `fast_math`."""
+    if math.isnan(a) or math.isnan(b):
+        return False
+    return a == b if fast_math else struct.pack("<f", a) == struct.pack("<f", b)
+
+
+def _is_additive_identity(value: _Value, *, fast_math: bool) -> bool:
+    """Returns True if adding `value` to any x yields x: -0, or either zero with `fast_math`."""
+    return isinstance(value, float) and value == 0.0 and (fast_math or math.copysign(1.0, value) < 0)
+
+
+def _negate(value: _Value) -> _Value:
+    if value is None:
+        return None
+    return value.negated() if isinstance(value, _Copy) else -value
+
+
+def _multiply(a: _Value, b: _Value, *, fast_math: bool) -> _Value:
+    if isinstance(a, float) and isinstance(b, float):
+        return _float32(a * b)
+    for factor, other in ((a, b), (b, a)):
+        if isinstance(factor, float):
+            if factor == 1.0:
+                return other
+            if factor == -1.0:
+                return _negate(other)
+            if factor == 0.0 and fast_math and other is not None:
+                return 0.0
+    return None
+
+
+def _add(a: _Value, b: _Value, *, fast_math: bool) -> _Value:
+    if a is None or b is None:
+        return None
+    if isinstance(a, float) and isinstance(b, float):
+        return _float32(a + b)
+    for addend, other in ((a, b), (b, a)):
+        if _is_additive_identity(addend, fast_math=fast_math):
+            return other
+    return None
+
+
+def _sum(terms: Sequence[_Value], *, fast_math: bool) -> _Value:
+    """Returns the sum of `terms`, added in order like the dot product operations."""
+    if any(term is None for term in terms):
+        return None
+    remaining = [term for term in terms if not _is_additive_identity(term, fast_math=fast_math)]
+    if len(remaining) == 1 and isinstance(remaining[0], _Copy):
+        return remaining[0]
+    if any(isinstance(term, _Copy) for term in remaining):
+        return None
+    ret = typing.cast("float", terms[0])
+    for term in terms[1:]:
+        ret = _float32(ret + typing.cast("float", term))
+    return ret
+
+
+def _compare(opcode: Opcode, a: _Value, b: _Value) -> _Value:
+    if not isinstance(a, float) or not isinstance(b, float):
+        return None
+    if opcode == Opcode.OPCODE_SLT:
+        return 1.0 if a < b else 0.0
+    if opcode == Opcode.OPCODE_SGE:
+        return 1.0 if a >= b else 0.0
+    if math.isnan(a) or math.isnan(b):
+        return math.nan
+    if a == b and math.copysign(1.0, a) != math.copysign(1.0, b):
+        # The emulator does not define which zero is returned.
+        return None
+    return min(a, b) if opcode == Opcode.OPCODE_MIN else max(a, b)
+
+
+class _Specializer:
+    """Tracks the known register values of a program."""
+
+    def __init__(self, constants: Mapping[int, Sequence[float]], *, fast_math: bool) -> None:
+        self._known: dict[Location, float] = {}
+        self._a0: int | None = None
+        self._fast_math = fast_math
+        for index, values in constants.items():
+            if not 0 <= index < NUM_CONSTANTS or len(values) != 4:  # noqa: PLR2004
+                msg = f"Invalid known value for c[{index}], expected an index below {NUM_CONSTANTS} and 4 components"
+                raise ValueError(msg)
+            for component, value in enumerate(values):
+                self._known[(RegisterFile.PROGRAM_ENV_PARAM, index, component)] = _float32(float(value))
+
+    def resolve(self, operation: Operation) -> Operation:
+        """Returns `operation` with the `c[A0+n]` operands read directly if `A0` is known."""
+        inputs = []
+        for source in operation.inputs:
+            index = source.index + self._a0 if source.rel_addr and self._a0 is not None else -1
+            if 0 <= index < NUM_CONSTANTS:
+                source = SourceRegister(source.file, index, source.swizzle, negate=source.negate)  # noqa: PLW2901
+            inputs.append(source)
+        return operation._replace(inputs=tuple(inputs))
+
+    def operand(self, operation: Operation, position: int, slot: int) -> _Value:
+        """Returns the value read by the given swizzle slot of an input of `operation`."""
+        source = operation.inputs[position]
+        component = dataflow.swizzle_components(source)[slot] & 0x3
+        value: _Value = _Copy((source.file, source.index, source.rel_addr), component, negate=False)
+        if not source.rel_addr:
+            (location,) = dataflow.source_locations(source, (component,))
+            value = self._known.get(location, value)
+        return _negate(value) if source.negate else value
+
+    def results(self, operation: Operation) -> dict[int, _Value]:
+        """Returns the value written to each component by `operation`."""
+        opcode = operation.opcode
+        if operation.unit != Unit.MAC:
+            return dict.fromkeys(operation.written_components)
+
+        def operand(position: int, slot: int) -> _Value:
+            return self.operand(operation, position, slot)
+
+        def multiply(a: _Value, b: _Value) -> _Value:
+            return _multiply(a, b, fast_math=self._fast_math)
+
+        def add(a: _Value, b: _Value) -> _Value:
+            return _add(a, b, fast_math=self._fast_math)
+
+        scalar: _Value = None
+        if opcode in _DOT_PRODUCT_TERMS:
+            terms = [multiply(operand(0, slot), operand(1, slot)) for slot in range(_DOT_PRODUCT_TERMS[opcode])]
+            if opcode == Opcode.OPCODE_DPH:
+                terms.append(operand(1, 3))
+            scalar = _sum(terms, fast_math=self._fast_math)
+
+        ret: dict[int, _Value] = {}
+        for component in operation.written_components:
+            if opcode in _DOT_PRODUCT_TERMS:
+                ret[component] = scalar
+            elif opcode == Opcode.OPCODE_DST:
+                ret[component] = (
+                    1.0,
+                    multiply(operand(0, 1), operand(1, 1)),
+                    operand(0, 2),
+                    operand(1, 3),
+                )[component]
+            elif opcode in dataflow.COMPONENT_WISE:
+                values = [operand(position, component) for position in range(len(operation.inputs))]
+                if opcode == Opcode.OPCODE_MOV:
+                    ret[component] = values[0]
+                elif opcode == Opcode.OPCODE_MUL:
+                    ret[component] = multiply(values[0], values[1])
+                elif opcode == Opcode.OPCODE_ADD:
+                    ret[component] = add(values[0], values[1])
+                elif opcode == Opcode.OPCODE_MAD:
+                    ret[component] = add(multiply(values[0], values[1]), values[2])
+                else:
+                    ret[component] = _compare(opcode, values[0], values[1])
+            else:
+                ret[component] = None
+        return ret
+
+    def update(self, operations: Sequence[Operation], results: Sequence[dict[int, _Value]]) -> None:
+        """Records the values written by an instruction."""
+        for operation, values in zip(operations, results, strict=True):
+            if operation.opcode == Opcode.OPCODE_ARL:
+                value = self.operand(operation, 0, 0)
+                self._a0 = math.floor(value) if isinstance(value, float) and math.isfinite(value) else None
+                continue
+            for output in operation.outputs:
+                for component in dataflow.mask_components(output):
+                    (location,) = dataflow.destination_locations(
+                        output.copy_with_mask(dataflow.write_mask((component,)))
+                    )
+                    value = values[component]
+                    if isinstance(value, float):
+                        self._known[location] = value
+                    else:
+                        self._known.pop(location, None)
+
+    def holder(self, values: dict[int, float]) -> SourceRegister | None:
+        """Returns an operand that reads `values` (keyed by swizzle slot) from a register that holds them."""
+        registers: dict[tuple[RegisterFile, int], dict[int, float]] = {}
+        for (register_file, index, component), value in self._known.items():
+            if (register_file, index) == dataflow.OPOS_REGISTER:
+                # oPos may be read through R12.
+                registers.setdefault((RegisterFile.PROGRAM_TEMPORARY, R12), {})[component] = value
+            elif register_file == RegisterFile.PROGRAM_ENV_PARAM or (
+                register_file == RegisterFile.PROGRAM_TEMPORARY and index < dataflow.NUM_TEMPS
+            ):
+                registers.setdefault((register_file, index), {})[component] = value
+
+        # Prefer constant registers, which have no lifetime, to temporary registers and R12.
+        first = values[min(values)]
+        for negate in (False, True):
+            for register_file, index in sorted(
+                registers, key=lambda register: (register[0] != RegisterFile.PROGRAM_ENV_PARAM, register[1])
+            ):
+                held = registers[(register_file, index)]
+                swizzle = 0
+                for slot in range(4):
+                    wanted = values.get(slot, first)
+                    wanted = -wanted if negate else wanted
+                    matches = [
+                        component
+                        for component in sorted(held)
+                        if _same(held[component], wanted, fast_math=self._fast_math)
+                    ]
+                    if not matches:
+                        break
+                    swizzle |= matches[0] << (3 * slot)
+                else:
+                    return SourceRegister(register_file, index, swizzle, negate=negate)
+        return None
+
+    def simplify(self, operation: Operation, results: dict[int, _Value]) -> Operation | None:
+        """Returns a simpler operation that writes the same `results`, or None if `operation` has no effect."""
+        values = list(results.values())
+        if operation.unit != Unit.MAC or operation.opcode == Opcode.OPCODE_ARL or not values:
+            return operation
+
+        if all(isinstance(value, float) for value in values):
+            source = None if operation.opcode == Opcode.OPCODE_MOV else self.holder(typing.cast("dict", results))
+            return operation if source is None else _move(operation, source)
+
+        copies = {value for value in values if isinstance(value, _Copy)}
+        if len(copies) == len(values) and len({(copy.register, copy.negate) for copy in copies}) == 1:
+            (register_file, index, rel_addr), _, negate = next(iter(copies))
+            swizzle = 0
+            for slot in range(4):
+                swizzle |= typing.cast("_Copy", results.get(slot, values[0])).component << (3 * slot)
+            move = _move(operation, SourceRegister(register_file, index, swizzle, rel_addr=rel_addr, negate=negate))
+            return None if _copies_onto_itself(move) else move
+
+        if operation.opcode == Opcode.OPCODE_MAD:
+            a, b, c = operation.inputs
+            components = list(results)
+            for position, other in ((1, a), (0, b)):
+                factors = [self.operand(operation, position, component) for component in components]
+                if all(isinstance(factor, float) and factor == 1.0 for factor in factors):
+                    return operation._replace(opcode=Opcode.OPCODE_ADD, inputs=(other, c))
+                if all(isinstance(factor, float) and factor == -1.0 for factor in factors):
+                    negated = SourceRegister(
+                        other.file, other.index, other.swizzle, rel_addr=other.rel_addr, negate=not other.negate
+                    )
+                    return operation._replace(opcode=Opcode.OPCODE_ADD, inputs=(negated, c))
+            addends = [self.operand(operation, 2, component) for component in components]
+            if all(_is_additive_identity(addend, fast_math=self._fast_math) for addend in addends):
+                return operation._replace(opcode=Opcode.OPCODE_MUL, inputs=(a, b))
+        return operation
+
+
+def _move(operation: Operation, source: SourceRegister) -> Operation:
+    return Operation(Unit.MAC, Opcode.OPCODE_MOV, operation.outputs, (source,))
+
+
+def _copies_onto_itself(move: Operation) -> bool:
+    """Returns True if every component written by a `MOV` already holds the value that it copies."""
+    (source,) = move.inputs
+    if source.negate or source.rel_addr:
+        return False
+    swizzle = dataflow.swizzle_components(source)
+    return all(
+        dataflow.source_locations(source, (swizzle[component],))
+        == dataflow.destination_locations(output.copy_with_mask(dataflow.write_mask((component,))))
+        for output in move.outputs
+        for component in dataflow.mask_components(output)
+    )
+
+
+def specialize(
+    statements: Sequence[Statement],
+    constants: Mapping[int, Sequence[float]],
+    *,
+    fast_math: bool = False,
+    uniforms: Mapping[str, range] | None = None,
+) -> SpecializationResult:
+    """Simplifies `statements` for the given constant register values.
+
+    :param constants: Maps constant register indices to the x, y, z, w values that they hold whenever the program runs.
+    :param fast_math: Assume that no value is infinite or NaN and ignore the sign of zero results, to fold products
+        with zero and additions of zero.
+    :param uniforms: Maps `#uniform` names to the constant registers that they occupy (see `Assembler.uniforms`), to
+        label the upload plan of the footprint.
+    """
+    specializer = _Specializer(constants, fast_math=fast_math)
+    kept: list[Statement] = []
+    rewritten: list[tuple[str, str]] = []
+    removed: list[str] = []
+    for instruction, source in statements:
+        operations = dataflow.operations(instruction)
+        if len(operations) > 1:
+            # Paired operations are kept as they are, so that the pair remains encodable.
+            specializer.update(operations, [specializer.results(operation) for operation in operations])
+            kept.append((instruction, source))
+            continue
+
+        operation = specializer.resolve(operations[0])
+        results = specializer.results(operation)
+        simplified = specializer.simplify(operation, results)
+        specializer.update([operation], [results])
+        if simplified is None:
+            removed.append(source)
+        elif simplified == operations[0]:
+            kept.append((instruction, source))
+        else:
+            replacement = (
+                dataflow.make_instruction(simplified)
+                if simplified.unit == Unit.MAC
+                else dataflow.make_instruction(None, simplified)
+            )
+            statement = (replacement, dataflow.format_instruction(replacement))
+            kept.append(statement)
+            rewritten.append((source, statement[1]))
+
+    dead_code_result = dead_code.eliminate_dead_code(kept)
+    # Encoding modifies the instructions (e.g., moving the second `ADD` operand to slot C), so copies are encoded.
+    program = vsh_encoder.encode_to_objects(
+        [copy.deepcopy(instruction) for instruction, _ in dead_code_result.statements]
+    )
+    return SpecializationResult(
+        dead_code_result.statements,
+        rewritten,
+        removed,
+        dead_code_result,
+        constant_footprint.analyze(program, uniforms=uniforms),
+        len(statements),
+    )
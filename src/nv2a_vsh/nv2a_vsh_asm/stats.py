@@ -0,0 +1,210 @@
+"""Static estimates of the size and execution cost of vertex shader programs.
+
+`analyze` decodes a program and reports how many of the 136 instruction slots it uses, how the slots are split between
+paired and unpaired MAC/ILU operations, and two timing estimates based on a `LatencyModel`:
+
+* The critical path is the longest chain of operations that each read a result of the previous one, weighted by the
+  latency of each operation. No schedule can execute a vertex faster.
+* The estimated cycles per vertex assume that one instruction is issued per cycle, in order, that an instruction
+  stalls until the results that it reads are available, and that a vertex is complete once the results of its last
+  output and constant writes are available.
+
+The default latencies are placeholders rather than hardware measurements; calibrate them (e.g., with
+`--latency RSQ=8`) against captures before comparing programs with different mixes of operations.
+"""
+
+from __future__ import annotations
+
+import typing
+
+from nv2a_vsh.nv2a_vsh_asm import decoder
+from nv2a_vsh.nv2a_vsh_asm.decoder import FILE_ADDRESS, FILE_CONST, FILE_OUTPUT, UNIT_ILU, UNIT_MAC
+from nv2a_vsh.nv2a_vsh_asm.vsh_encoder_defs import ILU_NAMES, MAC_NAMES
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Iterable, Mapping
+
+    from nv2a_vsh.nv2a_vsh_asm.decoder import DecodedInstruction, DecodedOperation, Destination, Location, Operand
+    from nv2a_vsh.nv2a_vsh_asm.vsh_instruction import VshInstruction
+
+# The number of instruction slots available to a program.
+MAX_INSTRUCTIONS = 136
+
+_A0_LOCATION: Location = (FILE_ADDRESS, 0, 0)
+# Stands in for every constant register when a constant is read through `c[A0+n]`.
+_ANY_CONSTANT: Location = (FILE_CONST, -1, 0)
+
+_UNITS = (UNIT_MAC, UNIT_ILU)
+_MNEMONICS = frozenset(name for name in (*MAC_NAMES.values(), *ILU_NAMES.values()) if name != "NOP")
+
+
+class LatencyModel(typing.NamedTuple):
+    """The number of cycles after an operation is issued before its result may be read.
+
+    :param overrides: Maps operation mnemonics (e.g., `RSQ`) to latencies that replace the latency of their unit.
+    """
+
+    mac: int = 3
+    ilu: int = 5
+    overrides: Mapping[str, int] | None = None
+
+    def latency(self, mnemonic: str, unit: str) -> int:
+        """Returns the latency of the given operation on the given unit ("mac" or "ilu")."""
+        if self.overrides and mnemonic in self.overrides:
+            return self.overrides[mnemonic]
+        return self.mac if unit == "mac" else self.ilu
+
+
+def parse_latency_model(specs: Iterable[str]) -> LatencyModel:
+    """Creates a `LatencyModel` from `NAME=CYCLES` strings, where NAME is `mac`, `ilu` or an operation mnemonic."""
+    units: dict[str, int] = {}
+    overrides: dict[str, int] = {}
+    for spec in specs:
+        name, _, value = spec.partition("=")
+        name = name.strip()
+        try:
+            cycles = int(value)
+        except ValueError:
+            cycles = -1
+        if cycles < 1:
+            msg = f"Invalid latency '{spec}', expected NAME=CYCLES with a positive number of cycles"
+            raise ValueError(msg)
+        if name.lower() in _UNITS:
+            units[name.lower()] = cycles
+        elif name.upper() in _MNEMONICS:
+            overrides[name.upper()] = cycles
+        else:
+            msg = f"Unknown operation '{name}' in latency '{spec}'"
+            raise ValueError(msg)
+    return LatencyModel(**units, overrides=overrides or None)
+
+
+class ProgramStats(typing.NamedTuple):
+    """Static statistics describing a program."""
+
+    instructions: int
+    # The number of instructions that execute both a MAC and an ILU operation, a single one, or neither.
+    paired: int
+    mac_only: int
+    ilu_only: int
+    nops: int
+    # The program counters of the operations on the critical path, in execution order.
+    critical_path: list[int]
+    critical_path_cycles: int
+    cycles: int
+
+    @property
+    def mac_utilization(self) -> float:
+        """Returns the fraction of instruction slots that use the MAC."""
+        return (self.paired + self.mac_only) / self.instructions if self.instructions else 0.0
+
+    @property
+    def ilu_utilization(self) -> float:
+        """Returns the fraction of instruction slots that use the ILU."""
+        return (self.paired + self.ilu_only) / self.instructions if self.instructions else 0.0
+
+    @property
+    def stall_cycles(self) -> int:
+        """Returns the estimated number of cycles spent waiting for results."""
+        return max(0, self.cycles - self.instructions)
+
+    def report(self) -> list[str]:
+        """Returns a human readable description of the statistics."""
+        return [
+            f"Instructions: {self.instructions} of {MAX_INSTRUCTIONS}",
+            f"Slots: {self.paired} paired, {self.mac_only} MAC only, {self.ilu_only} ILU only, {self.nops} NOP",
+            f"Utilization: MAC {self.mac_utilization:.1%}, ILU {self.ilu_utilization:.1%}",
+            f"Critical path: {len(self.critical_path)} operations, {self.critical_path_cycles} cycles",
+            f"Estimated cycles per vertex: {self.cycles} ({self.stall_cycles} stalled)",
+        ]
+
+
+def _read_locations(operand: Operand, components: Iterable[int]) -> list[Location]:
+    if operand.file == FILE_CONST and operand.relative:
+        return [_A0_LOCATION, _ANY_CONSTANT]
+    return operand.locations(components)
+
+
+def _write_locations(destination: Destination) -> list[Location]:
+    ret = destination.locations
+    if destination.file == FILE_CONST:
+        ret.append(_ANY_CONSTANT)
+    return ret
+
+
+def _operation_reads(operation: DecodedOperation) -> list[Location]:
+    return [location for operand, components in operation.reads for location in _read_locations(operand, components)]
+
+
+class _Operation(typing.NamedTuple):
+    pc: int
+    decoded: DecodedOperation
+    reads: list[Location]
+
+
+class _Timing:
+    """Tracks when the value of each location becomes available while instructions are issued in order."""
+
+    def __init__(self, latency_model: LatencyModel):
+        self.latency_model = latency_model
+        # The cycle at which each location's latest value may be read.
+        self.ready: dict[Location, int] = {}
+        # The (cycles, program counters) of the longest path ending at the operation that wrote each location.
+        self.paths: dict[Location, tuple[int, list[int]]] = {}
+        self.critical_path: tuple[int, list[int]] = (0, [])
+        self.issue = -1
+        # The cycle at which the last output or constant write is complete.
+        self.complete = 0
+
+    def execute(self, pc: int, instruction: DecodedInstruction) -> None:
+        """Issues `instruction` once the values that it reads are available."""
+        operations = [_Operation(pc, operation, _operation_reads(operation)) for operation in instruction.operations()]
+        self.issue = max(
+            [self.issue + 1, *(self.ready.get(location, 0) for operation in operations for location in operation.reads)]
+        )
+        decoder.execute(operations, self._evaluate, self._write)
+
+    def _evaluate(self, operation: _Operation) -> tuple[int, tuple[int, list[int]]]:
+        """Returns the cycle at which the results of `operation` are available and the longest path ending at it."""
+        decoded = operation.decoded
+        latency = self.latency_model.latency(decoded.mnemonic, decoded.unit)
+        longest = max(
+            (self.paths[location] for location in operation.reads if location in self.paths),
+            key=lambda entry: entry[0],
+            default=(0, []),
+        )
+        path = (longest[0] + latency, [*longest[1], operation.pc])
+        self.critical_path = max(self.critical_path, path, key=lambda entry: entry[0])
+        return self.issue + latency, path
+
+    def _write(self, operation: _Operation, result: tuple[int, tuple[int, list[int]]]) -> None:
+        available, path = result
+        for location in (location for output in operation.decoded.outputs for location in _write_locations(output)):
+            if location[0] in {FILE_OUTPUT, FILE_CONST}:
+                self.complete = max(self.complete, available)
+            if location == _ANY_CONSTANT and location in self.ready:
+                # Relative reads wait for every earlier constant write.
+                self.ready[location] = max(available, self.ready[location])
+                self.paths[location] = max(path, self.paths[location], key=lambda entry: entry[0])
+            else:
+                self.ready[location] = available
+                self.paths[location] = path
+
+
+def analyze(program: Iterable[VshInstruction | list[int]], latency_model: LatencyModel | None = None) -> ProgramStats:
+    """Computes `ProgramStats` for a program given as `VshInstruction`s or machine code quadruplets."""
+    instructions = decoder.decode_program(program)
+    timing = _Timing(latency_model or LatencyModel())
+    for pc, instruction in enumerate(instructions):
+        timing.execute(pc, instruction)
+
+    return ProgramStats(
+        instructions=len(instructions),
+        paired=sum(instruction.is_paired for instruction in instructions),
+        mac_only=sum(bool(instruction.mac and not instruction.ilu) for instruction in instructions),
+        ilu_only=sum(bool(instruction.ilu and not instruction.mac) for instruction in instructions),
+        nops=sum(instruction.is_nop for instruction in instructions),
+        critical_path=timing.critical_path[1],
+        critical_path_cycles=timing.critical_path[0],
+        cycles=max(timing.issue + 1, timing.complete),
+    )
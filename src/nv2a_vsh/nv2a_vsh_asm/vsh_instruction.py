@@ -130,6 +130,32 @@ class _D(ctypes.LittleEndianStructure):
     ]
 
 
+def _build_field_layout() -> tuple[tuple[str, int, int, int], ...]:
+    """Returns (name, word_index, shift, mask) for every bitfield in an encoded instruction."""
+    layout = []
+    for word_index, structure in ((1, _B), (2, _C), (3, _D)):
+        shift = 0
+        # mypy assumes that _fields_ may be 2-tuples from the base class.
+        for name, _ctype, size in structure._fields_:  # type: ignore[misc]
+            layout.append((name, word_index, shift, (1 << size) - 1))
+            shift += size
+    return tuple(layout)
+
+
+# Precomputed bit positions of each named field, allowing fields to be extracted with shifts rather than by
+# instantiating the ctypes structures.
+FIELD_LAYOUT = _build_field_layout()
+FIELD_NAMES = tuple(name for name, _word_index, _shift, _mask in FIELD_LAYOUT)
+
+
+def decode_fields(values: list[int]) -> dict[str, int]:
+    """Returns a dictionary mapping each named field to its value in the given machine code quadruplet."""
+    if len(values) != 4:
+        msg = f"values {values!r} must be a 4-integer encoded instruction"
+        raise ValueError(msg)
+    return {name: (values[word_index] >> shift) & mask for name, word_index, shift, mask in FIELD_LAYOUT}
+
+
 def get_swizzle(swz: int, idx: int) -> int:
     """Extracts the swizzle component at `idx` from `swz`."""
     return ((swz) >> ((idx) * 3)) & 0x7
@@ -914,3 +940,31 @@ def explain(values: list[int]) -> str:
     vsh = VshInstruction(empty_final=True)
     vsh.set_values(values)
     return vsh.explain()
+
+
+def differing_fields(expected: list[int], actual: list[int], *, ignore_final_flag=False) -> list[str]:
+    """Returns the names of the fields that differ between two encoded instructions."""
+    expected_fields = decode_fields(expected)
+    actual_fields = decode_fields(actual)
+    return [
+        name
+        for name in FIELD_NAMES
+        if expected_fields[name] != actual_fields[name] and not (ignore_final_flag and name == "FINAL")
+    ]
+
+
+def vsh_diff_programs(expected: list[list[int]], actual: list[list[int]], *, ignore_final_flag=False) -> str:
+    """Provides a verbose explanation of the differences between two encoded programs.
+
+    :return "" if the programs match, else a string explaining the delta.
+    """
+    differences = []
+    if len(expected) != len(actual):
+        differences.append(f"Program lengths differ: expected {len(expected)} != actual {len(actual)}\n")
+
+    for index, (expected_instruction, actual_instruction) in enumerate(zip(expected, actual, strict=False)):
+        diff = vsh_diff_instructions(expected_instruction, actual_instruction, ignore_final_flag=ignore_final_flag)
+        if diff:
+            differences.append(f"[{index}] {diff}")
+
+    return "".join(differences)
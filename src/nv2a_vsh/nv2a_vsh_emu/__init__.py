@@ -0,0 +1,18 @@
+"""Emulates the nv2a vertex shader unit using NumPy.
+
+NumPy is an optional dependency, install the `emulator` extra to use this package.
+"""
+
+from nv2a_vsh.nv2a_vsh_emu.compiler import CompiledProgram, compile_program
+from nv2a_vsh.nv2a_vsh_emu.emulator import Emulator, run
+from nv2a_vsh.nv2a_vsh_emu.vertex_stream import AttributeType, VertexAttribute, VertexStream
+
+__all__ = [
+    "AttributeType",
+    "CompiledProgram",
+    "Emulator",
+    "VertexAttribute",
+    "VertexStream",
+    "compile_program",
+    "run",
+]
@@ -0,0 +1,316 @@
+"""Compiles vertex shader programs into specialized, straight-line NumPy kernels.
+
+Each register component is held in its own variable, so swizzles and write masks are resolved at compile time and
+plain register moves cost nothing at run time. Components that do not contribute to an output register are removed
+before code generation. The generated source is available via `CompiledProgram.source`.
+"""
+
+from __future__ import annotations
+
+import functools
+import itertools
+import typing
+
+import numpy as np
+
+from nv2a_vsh.nv2a_vsh_asm import decoder
+from nv2a_vsh.nv2a_vsh_asm.decoder import (
+    FILE_ADDRESS,
+    FILE_CONST,
+    FILE_INPUT,
+    FILE_OUTPUT,
+    UNIT_MAC,
+    DecodedInstruction,
+    DecodedOperation,
+    Operand,
+)
+from nv2a_vsh.nv2a_vsh_asm.vsh_encoder_defs import ILU, MAC
+from nv2a_vsh.nv2a_vsh_emu import operations
+from nv2a_vsh.nv2a_vsh_emu.emulator import DEFAULT_OUTPUT, NUM_CONSTANTS, Emulator, gather_constants
+from nv2a_vsh.nv2a_vsh_emu.liveness import output_locations, prune
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from nv2a_vsh.nv2a_vsh_asm.vsh_instruction import VshInstruction
+
+# The maximum number of compiled programs retained by `compile_program`.
+KERNEL_CACHE_SIZE = 64
+
+_COMPONENTS = "xyzw"
+
+
+def _read_relative(constants: np.ndarray, index: np.ndarray, overrides: dict[int, tuple], lane_shape: tuple[int, ...]):
+    """Reads c[index] for each lane, substituting per-lane values of constants written by the program."""
+    ret, index = gather_constants(constants, np.broadcast_to(index, lane_shape))
+    for written_index, components in overrides.items():
+        selected = index == written_index
+        if selected.any():
+            for component, value in enumerate(components):
+                ret[selected, component] = np.broadcast_to(value, lane_shape)[selected]
+    return ret
+
+
+def _arl(x) -> np.ndarray:
+    return np.floor(x).astype(np.int32)
+
+
+def _as_float32(value) -> np.ndarray:
+    return np.asarray(value, dtype=np.float32)
+
+
+# Names available to generated kernels.
+_KERNEL_GLOBALS = {
+    "np": np,
+    "_ZERO": np.float32(0.0),
+    "_ONE": np.float32(1.0),
+    "_f32": _as_float32,
+    "_arl": _arl,
+    "_read_relative": _read_relative,
+    "_rcp": operations.rcp,
+    "_rcc": operations.rcc,
+    "_rsq": operations.rsq,
+    "_expp": operations.expp,
+    "_logp": operations.logp,
+    "_lit": operations.lit,
+}
+
+_DEFAULT_OUTPUT_NAMES = tuple("_ONE" if value else "_ZERO" for value in DEFAULT_OUTPUT)
+
+
+class _CodeGenerator:
+    """Lowers decoded instructions to Python statements operating on per-component variables."""
+
+    def __init__(self) -> None:
+        self.prologue: list[str] = []
+        self.body: list[str] = []
+        # Maps (register file, number, component) to the name of the variable holding its current value.
+        self.registers: dict[tuple[str, int, int], str] = {}
+        self._temp_counter = itertools.count()
+        self._hoisted: dict[str, str] = {}
+        # Relative constant reads performed by the current instruction, keyed by offset.
+        self._relative_reads: dict[int, str] = {}
+
+    def _new_temp(self) -> str:
+        return f"t{next(self._temp_counter)}"
+
+    def _hoist(self, name: str, expression: str) -> str:
+        if name not in self._hoisted:
+            self._hoisted[name] = expression
+            self.prologue.append(f"{name} = {expression}")
+        return name
+
+    def _register(self, register_file: str, number: int, component: int) -> str:
+        name = self.registers.get((register_file, number, component))
+        if name is not None:
+            return name
+        if register_file == FILE_OUTPUT:
+            return _DEFAULT_OUTPUT_NAMES[component]
+        if register_file == FILE_CONST and number < NUM_CONSTANTS:
+            return self._hoist(f"c{number}_{_COMPONENTS[component]}", f"constants[..., {number}, {component}]")
+        return "_ZERO"
+
+    def output(self, number: int, component: int) -> str:
+        """Returns the expression holding the final value of the given output register component."""
+        return self._register(FILE_OUTPUT, number, component)
+
+    def _relative(self, number: int) -> str:
+        """Returns a variable holding the (N, 4) value of c[A0+number]."""
+        name = self._relative_reads.get(number)
+        if name is not None:
+            return name
+        overrides = {
+            register_number: tuple(self._register(FILE_CONST, register_number, component) for component in range(4))
+            for register_file, register_number, _component in self.registers
+            if register_file == FILE_CONST
+        }
+        override_source = ", ".join(f"{key}: ({', '.join(values)})" for key, values in overrides.items())
+        name = self.assign(f"_read_relative(constants, a0 + {number}, {{{override_source}}}, lane_shape)")
+        self._relative_reads[number] = name
+        return name
+
+    def _source(self, operand: Operand, component: int) -> str:
+        if operand.file == FILE_CONST and operand.relative:
+            return f"{self._relative(operand.number)}[..., {component}]"
+        if operand.file == FILE_INPUT:
+            return self._hoist(
+                f"v{operand.number}_{_COMPONENTS[component]}",
+                f"np.ascontiguousarray(inputs[..., {operand.number}, {component}])",
+            )
+        return self._register(*operand.register, component)
+
+    def read(self, operand: Operand, components: Iterable[int]) -> dict[int, str]:
+        """Returns expressions for the requested (swizzled) components of `operand`."""
+        ret = {}
+        for component in components:
+            expression = self._source(operand, operand.swizzle[component])
+            ret[component] = f"(-{expression})" if operand.negate else expression
+        return ret
+
+    def assign(self, expression: str) -> str:
+        name = self._new_temp()
+        self.body.append(f"{name} = {expression}")
+        return name
+
+    def materialize(self, expression: str) -> str:
+        """Returns a variable holding the value of `expression`, so that it is evaluated only once."""
+        if expression.isidentifier():
+            return expression
+        return self.assign(expression)
+
+    def _mac(self, operation: DecodedOperation, written: tuple[int, ...]) -> dict[int, str]:
+        mac = MAC(operation.opcode)
+        inputs = operation.inputs
+
+        def _operands(components: Iterable[int]) -> list[dict[int, str]]:
+            components = tuple(components)
+            return [self.read(operand, components) for operand in inputs]
+
+        if mac == MAC.MAC_ARL:
+            (a,) = _operands((0,))
+            return {0: self.assign(f"_arl({a[0]})")}
+        if mac in {MAC.MAC_DP3, MAC.MAC_DP4, MAC.MAC_DPH}:
+            count = 4 if mac == MAC.MAC_DP4 else 3
+            a, b = _operands(range(4 if mac != MAC.MAC_DP3 else 3))
+            terms = [f"{a[component]} * {b[component]}" for component in range(count)]
+            if mac == MAC.MAC_DPH:
+                terms.append(b[3])
+            result = self.assign(" + ".join(terms))
+            return dict.fromkeys(written, result)
+        if mac == MAC.MAC_DST:
+            a, b = _operands((1, 2, 3))
+            return {0: "_ONE", 1: self.assign(f"{a[1]} * {b[1]}"), 2: self.materialize(a[2]), 3: self.materialize(b[3])}
+
+        operands = _operands(written)
+        ret = {}
+        for component in written:
+            args = [operand[component] for operand in operands]
+            if mac == MAC.MAC_MOV:
+                ret[component] = self.materialize(args[0])
+            elif mac == MAC.MAC_MUL:
+                ret[component] = self.assign(f"{args[0]} * {args[1]}")
+            elif mac == MAC.MAC_ADD:
+                ret[component] = self.assign(f"{args[0]} + {args[1]}")
+            elif mac == MAC.MAC_MAD:
+                ret[component] = self.assign(f"{args[0]} * {args[1]} + {args[2]}")
+            elif mac == MAC.MAC_MIN:
+                ret[component] = self.assign(f"np.minimum({args[0]}, {args[1]})")
+            elif mac == MAC.MAC_MAX:
+                ret[component] = self.assign(f"np.maximum({args[0]}, {args[1]})")
+            elif mac == MAC.MAC_SLT:
+                ret[component] = self.assign(f"_f32({args[0]} < {args[1]})")
+            elif mac == MAC.MAC_SGE:
+                ret[component] = self.assign(f"_f32({args[0]} >= {args[1]})")
+            else:
+                msg = f"Unsupported MAC operation {mac}"
+                raise ValueError(msg)
+        return ret
+
+    def _ilu(self, operation: DecodedOperation, written: tuple[int, ...]) -> dict[int, str]:
+        ilu = ILU(operation.opcode)
+        (operand,) = operation.inputs
+
+        if ilu == ILU.ILU_MOV:
+            return {component: self.materialize(value) for component, value in self.read(operand, written).items()}
+        if ilu in {ILU.ILU_RCP, ILU.ILU_RCC, ILU.ILU_RSQ}:
+            x = self.read(operand, (0,))[0]
+            function = {ILU.ILU_RCP: "_rcp", ILU.ILU_RCC: "_rcc", ILU.ILU_RSQ: "_rsq"}[ilu]
+            result = self.assign(f"{function}({x})")
+            return dict.fromkeys(written, result)
+
+        if ilu == ILU.ILU_LIT:
+            source = self.read(operand, (0, 1, 3))
+            call = f"_lit({source[0]}, {source[1]}, {source[3]})"
+        else:
+            x = self.read(operand, (0,))[0]
+            call = f"{'_expp' if ilu == ILU.ILU_EXP else '_logp'}({x})"
+        names = [self._new_temp() for _ in range(4)]
+        self.body.append(f"{', '.join(names)} = {call}")
+        return dict(enumerate(names))
+
+    def _evaluate(self, operation: DecodedOperation) -> dict[int, str]:
+        written = tuple(sorted({component for output in operation.outputs for component in output.components}))
+        if operation.unit == UNIT_MAC:
+            return self._mac(operation, written)
+        return self._ilu(operation, written)
+
+    def _write(self, operation: DecodedOperation, values: dict[int, str]) -> None:
+        for destination in operation.outputs:
+            if destination.file == FILE_ADDRESS:
+                self.body.append(f"a0 = {values[0]}")
+                continue
+            if destination.is_read_only:
+                continue
+            if destination.file == FILE_CONST and destination.number >= NUM_CONSTANTS:
+                continue
+            for location in destination.locations:
+                self.registers[location] = values[location[2]]
+
+    def emit(self, instruction: DecodedInstruction) -> None:
+        self._relative_reads = {}
+        decoder.execute(instruction.operations(), self._evaluate, self._write)
+
+
+def generate_source(program: list[DecodedInstruction], output_indices: dict[str, int]) -> str:
+    """Generates the source of a `kernel(inputs, constants, outputs)` function executing `program`.
+
+    `outputs` must map each name in `output_indices` to a writable (N, 4) array.
+    """
+    pruned = prune(program, output_locations(output_indices.values()))
+    generator = _CodeGenerator()
+    for index, instruction in enumerate(pruned):
+        generator.body.append(f"# {index}: {instruction}")
+        generator.emit(instruction)
+
+    lines = [
+        "def kernel(inputs, constants, outputs):",
+        "    lane_shape = inputs.shape[:-2]",
+        "    a0 = np.zeros(lane_shape, dtype=np.int32)",
+    ]
+    lines.extend(f"    {line}" for line in generator.prologue)
+    lines.extend(f"    {line}" for line in generator.body)
+    for name, number in output_indices.items():
+        values = [generator.output(number, component) for component in range(4)]
+        if values == list(_DEFAULT_OUTPUT_NAMES):
+            lines.append(f"    outputs[{name!r}][:] = ({', '.join(values)})")
+            continue
+        lines.extend(f"    outputs[{name!r}][..., {component}] = {value}" for component, value in enumerate(values))
+    return "\n".join(lines) + "\n"
+
+
+class CompiledProgram(Emulator):
+    """An `Emulator` that executes a generated NumPy kernel instead of interpreting each instruction."""
+
+    def __init__(self, program: Iterable[VshInstruction | list[int]], *, outputs: Iterable[str] | None = None):
+        super().__init__(program, outputs=outputs)
+        self.source = generate_source(self.live_program, self.output_indices())
+        namespace: dict[str, typing.Any] = dict(_KERNEL_GLOBALS)
+        exec(compile(self.source, "<nv2a_vsh kernel>", "exec"), namespace)  # noqa: S102 Use of `exec` detected
+        self._kernel: typing.Callable[[np.ndarray, np.ndarray, dict[str, np.ndarray]], None] = namespace["kernel"]
+
+    def _run_chunk(self, inputs: np.ndarray, constants: np.ndarray, outputs: dict[str, np.ndarray]) -> None:
+        self._kernel(inputs, constants, outputs)
+
+
+@functools.lru_cache(maxsize=KERNEL_CACHE_SIZE)
+def _compile_cached(program: tuple[tuple[int, ...], ...], outputs: tuple[str, ...] | None) -> CompiledProgram:
+    return CompiledProgram([list(values) for values in program], outputs=outputs)
+
+
+def compile_program(
+    program: Iterable[VshInstruction | list[int]], *, outputs: Iterable[str] | None = None
+) -> CompiledProgram:
+    """Returns a `CompiledProgram` for the given program, reusing a previously compiled kernel if possible.
+
+    :param outputs: The names of the output registers to compute. Defaults to every output register.
+    """
+    key = tuple(
+        tuple(instruction.encode()) if not isinstance(instruction, (list, tuple)) else tuple(instruction)
+        for instruction in program
+    )
+    return _compile_cached(key, None if outputs is None else tuple(outputs))
+
+
+def clear_cache() -> None:
+    """Discards all cached compiled programs."""
+    _compile_cached.cache_clear()
@@ -0,0 +1,445 @@
+"""Executes nv2a vertex shader programs over many vertices at once using NumPy."""
+
+# pylint: disable=too-few-public-methods
+
+from __future__ import annotations
+
+import typing
+
+import numpy as np
+
+from nv2a_vsh.nv2a_vsh_asm import decoder
+from nv2a_vsh.nv2a_vsh_asm.decoder import (
+    FILE_ADDRESS,
+    FILE_INPUT,
+    FILE_OUTPUT,
+    FILE_TEMP,
+    UNIT_MAC,
+    DecodedInstruction,
+    DecodedOperation,
+    Destination,
+    Operand,
+    decode_program,
+    output_name,
+)
+from nv2a_vsh.nv2a_vsh_asm.vsh_encoder_defs import DESTINATION_REGISTER_TO_NAME_MAP_SHORT, OutputRegisters
+from nv2a_vsh.nv2a_vsh_emu.liveness import output_locations, prune
+from nv2a_vsh.nv2a_vsh_emu.operations import ILU_OPERATIONS, MAC_OPERATIONS
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator, Mapping
+
+    from nv2a_vsh.nv2a_vsh_asm.vsh_instruction import VshInstruction
+
+NUM_CONSTANTS = 192
+NUM_TEMPS = 12
+NUM_INPUTS = 16
+NUM_OUTPUTS = 16
+
+# The value of every output register before the program writes it.
+DEFAULT_OUTPUT = (0.0, 0.0, 0.0, 1.0)
+
+# The number of vertices processed per pass by default. Small batches keep the working set of each NumPy operation
+# in cache, which is considerably faster than operating on the entire input at once.
+DEFAULT_CHUNK_SIZE = 8192
+
+# The names of the output registers that are always returned, mapped to their register index.
+OUTPUT_INDICES = {
+    name: int(index)
+    for index, name in DESTINATION_REGISTER_TO_NAME_MAP_SHORT.items()
+    if index != OutputRegisters.REG_A0
+}
+
+_ZERO_VECTOR = np.zeros(4, dtype=np.float32)
+
+
+def _component_index(components: tuple[int, ...]) -> slice | list[int]:
+    """Returns the cheapest index expression selecting the given components."""
+    if components == tuple(range(components[0], components[-1] + 1)):
+        return slice(components[0], components[-1] + 1)
+    return list(components)
+
+
+def gather_constants(constants: np.ndarray, index: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Reads `constants[index]` for each lane.
+
+    :param constants: (192, 4) constants shared by every lane or (K, 1, 192, 4) per-instance constants.
+    :param index: The constant register index of each lane. Out of range indices read zero.
+    :return: A new (..., 4) array of the values read and the in-range indices (out of range indices are replaced by
+        0).
+    """
+    valid = (index >= 0) & (index < NUM_CONSTANTS)
+    clipped = np.where(valid, index, 0)
+    if constants.ndim == 2:  # noqa: PLR2004 Magic value used in comparison
+        ret = constants[clipped]
+    else:
+        ret = np.take_along_axis(constants, clipped[..., np.newaxis, np.newaxis], axis=-2)[..., 0, :]
+    ret[~valid] = 0.0
+    return ret, np.where(valid, clipped, -1)
+
+
+class RegisterState:
+    """The register file for a batch of lanes.
+
+    Each lane executes the program for one vertex. Lanes are laid out as (N,) vertices, or as (K, N) when executing
+    K instances with different constants. The register storage is allocated once and reused by each call to `reset`,
+    growing only if a batch has more than `capacity` lanes.
+    """
+
+    def __init__(self, capacity: int = 0):
+        self._allocate(capacity)
+        self.inputs = np.empty((0, NUM_INPUTS, 4), dtype=np.float32)
+        self.constants = np.empty((NUM_CONSTANTS, 4), dtype=np.float32)
+        self.temps = self._temps[:, :0]
+        self.outputs = self._outputs[:, :0]
+        self.a0 = self._a0[:0]
+        # Per-lane copies of constant registers that have been written by the program.
+        self.written_constants: dict[int, np.ndarray] = {}
+
+    def _allocate(self, capacity: int) -> None:
+        self.capacity = capacity
+        self._temps = np.empty((NUM_TEMPS, capacity, 4), dtype=np.float32)
+        self._outputs = np.empty((NUM_OUTPUTS, capacity, 4), dtype=np.float32)
+        self._a0 = np.empty(capacity, dtype=np.int32)
+
+    def reset(self, inputs: np.ndarray, constants: np.ndarray) -> None:
+        """Prepares the register file to execute a new batch of lanes.
+
+        :param inputs: (..., 16, 4) float32 vertex attributes for each lane.
+        :param constants: (192, 4) float32 constant registers shared by every lane or (K, 1, 192, 4) per-instance
+            constants.
+        """
+        lane_shape = inputs.shape[:-2]
+        num_lanes = int(np.prod(lane_shape))
+        if num_lanes > self.capacity:
+            self._allocate(num_lanes)
+
+        self.inputs = inputs
+        self.constants = constants
+        self.temps = self._temps[:, :num_lanes].reshape((NUM_TEMPS, *lane_shape, 4))
+        self.temps.fill(0.0)
+        self.outputs = self._outputs[:, :num_lanes].reshape((NUM_OUTPUTS, *lane_shape, 4))
+        self.outputs[...] = DEFAULT_OUTPUT
+        self.a0 = self._a0[:num_lanes].reshape(lane_shape)
+        self.a0.fill(0)
+        self.written_constants = {}
+
+    def _read_relative_constant(self, offset: int) -> np.ndarray:
+        ret, index = gather_constants(self.constants, self.a0 + offset)
+        for written_index, value in self.written_constants.items():
+            selected = index == written_index
+            ret[selected] = value[selected]
+        return ret
+
+    def read(self, operand: Operand) -> np.ndarray:
+        """Returns the swizzled and negated value of the given operand."""
+        register_file, number = operand.register
+        if register_file == FILE_TEMP:
+            value = self.temps[number]
+        elif register_file == FILE_OUTPUT:
+            value = self.outputs[number]
+        elif operand.file == FILE_INPUT:
+            value = self.inputs[..., operand.number, :]
+        elif operand.relative:
+            value = self._read_relative_constant(operand.number)
+        else:
+            value = self.written_constants.get(operand.number)
+            if value is None:
+                value = self.constants[..., operand.number, :] if operand.number < NUM_CONSTANTS else _ZERO_VECTOR
+
+        if not operand.is_identity_swizzle:
+            value = value[..., list(operand.swizzle)]
+        if operand.negate:
+            value = -value
+        return value
+
+    def write(self, destination: Destination, value: np.ndarray) -> None:
+        """Writes the masked components of `value` to the given destination."""
+        if destination.file == FILE_ADDRESS:
+            self.a0[...] = value
+            return
+
+        if destination.is_read_only:
+            return
+        if destination.file == FILE_TEMP:
+            target = self.temps[destination.number]
+        elif destination.file == FILE_OUTPUT:
+            target = self.outputs[destination.number % NUM_OUTPUTS]
+        elif destination.number >= NUM_CONSTANTS:
+            return
+        else:
+            target = self.written_constants.get(destination.number)
+            if target is None:
+                target = np.empty(self.temps.shape[1:], dtype=np.float32)
+                target[...] = self.constants[..., destination.number, :]
+                self.written_constants[destination.number] = target
+
+        components = _component_index(destination.components)
+        target[..., components] = value[..., components]
+
+
+def _evaluate_operation(operation: DecodedOperation, state: RegisterState) -> np.ndarray:
+    operations = MAC_OPERATIONS if operation.unit == UNIT_MAC else ILU_OPERATIONS
+    return operations[operation.opcode](*(state.read(operand) for operand in operation.inputs))
+
+
+def evaluate(instruction: DecodedInstruction, state: RegisterState) -> list[tuple[tuple[Destination, ...], np.ndarray]]:
+    """Computes the results of `instruction` without writing them, returning (destinations, value) pairs."""
+    return [(operation.outputs, _evaluate_operation(operation, state)) for operation in instruction.operations()]
+
+
+def _execute(instruction: DecodedInstruction, state: RegisterState) -> None:
+    def write(operation: DecodedOperation, value: np.ndarray) -> None:
+        for destination in operation.outputs:
+            state.write(destination, value)
+
+    decoder.execute(instruction.operations(), lambda operation: _evaluate_operation(operation, state), write)
+
+
+def as_float32(value, shape: tuple[int, ...], name: str) -> np.ndarray:
+    """Converts `value` to a float32 array, raising a ValueError naming `name` if its trailing shape is not `shape`."""
+    ret = np.asarray(value, dtype=np.float32)
+    _check_shape(ret, shape, name)
+    return ret
+
+
+def _check_shape(value: np.ndarray, shape: tuple[int, ...], name: str) -> None:
+    if value.shape[-len(shape) :] != shape:
+        msg = f"{name} must have trailing shape {shape} but has shape {value.shape}"
+        raise ValueError(msg)
+
+
+def _as_vertices(value):
+    """Returns `value` as an array-like of vertices without converting (or reading) its contents.
+
+    Objects that have a `shape` (e.g., `numpy.memmap` or `VertexStream`) are returned as is and are expected to convert
+    slices on demand.
+    """
+    return value if hasattr(value, "shape") else np.asanyarray(value)
+
+
+def vertex_array(value, name: str = "inputs"):
+    """Returns `value` as an (N, 16, 4) array-like of vertices without converting its contents.
+
+    Raises a ValueError naming `name` if `value` does not have that shape.
+    """
+    ret = _as_vertices(value)
+    _check_shape(ret, (NUM_INPUTS, 4), name)
+    if ret.ndim != 3:  # noqa: PLR2004 Magic value used in comparison
+        msg = f"{name} must have shape (N, {NUM_INPUTS}, 4) but has shape {ret.shape}"
+        raise ValueError(msg)
+    return ret
+
+
+def _iter_chunks(inputs, chunk_size: int) -> Iterator[np.ndarray]:
+    """Yields float32 chunks of at most `chunk_size` vertices from an array or an iterable of arrays."""
+    arrays = [inputs] if hasattr(inputs, "shape") else inputs
+    for array in arrays:
+        vertices = vertex_array(array)
+        for start in range(0, vertices.shape[0], chunk_size):
+            yield np.asarray(vertices[start : start + chunk_size], dtype=np.float32)
+
+
+class Emulator:
+    """Executes a vertex shader program.
+
+    :param program: The program to execute as `VshInstruction`s or machine code quadruplets. Execution stops at the
+        first instruction with the FINAL flag set.
+    :param outputs: The names of the output registers to compute (e.g., `["oPos"]`). Operations that do not contribute
+        to them are removed before execution. Defaults to every output register.
+    """
+
+    def __init__(self, program: Iterable[VshInstruction | list[int]], *, outputs: Iterable[str] | None = None):
+        self.program = decode_program(program)
+        self._state = RegisterState()
+        self.written_outputs = sorted(
+            {
+                destination.number % NUM_OUTPUTS
+                for instruction in self.program
+                for destination in instruction.outputs
+                if destination.file == FILE_OUTPUT
+            }
+        )
+
+        available = dict(OUTPUT_INDICES)
+        for index in self.written_outputs:
+            available.setdefault(output_name(index), index)
+        if outputs is None:
+            self._output_indices = available
+        else:
+            requested = list(outputs)
+            unknown = [name for name in requested if name not in available]
+            if unknown:
+                msg = f"Unknown output registers {unknown}"
+                raise ValueError(msg)
+            self._output_indices = {name: available[name] for name in requested}
+
+        # The operations that contribute to the requested outputs.
+        self.live_program = prune(self.program, output_locations(self._output_indices.values()))
+
+    def output_indices(self) -> dict[str, int]:
+        """Returns the names of the output registers returned by `run`, mapped to their register index."""
+        return dict(self._output_indices)
+
+    def run(
+        self,
+        inputs,
+        constants=None,
+        *,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        out: Mapping[str, np.ndarray] | None = None,
+    ) -> dict[str, np.ndarray]:
+        """Executes the program for every vertex in `inputs`.
+
+        `inputs` is read and converted to float32 one chunk at a time, so it may be a memory mapped file of any
+        numeric type.
+
+        Passing a (K, 192, 4) array of `constants` executes K instances of the program, one per constant set. The
+        inputs may then be given per instance as (K, N, 16, 4) or shared by every instance as (N, 16, 4). Small
+        instances are batched so that each vectorized pass executes roughly `chunk_size` lanes.
+
+        :param inputs: (N, 16, 4) vertex attributes (v0 - v15), or a `VertexStream`.
+        :param constants: (192, 4) constant registers (c0 - c191) or (K, 192, 4) constant sets. Defaults to all
+            zeros.
+        :param chunk_size: The number of lanes executed per vectorized pass.
+        :param out: Optional preallocated (e.g., memory mapped) destination arrays for some or all of the output
+            registers, which are written in place.
+        :return: A dictionary mapping output register names (e.g., `oPos`, `oD0`) to (N, 4) float32 arrays, or
+            (K, N, 4) arrays when executing instances.
+        """
+        inputs = _as_vertices(inputs)
+        _check_shape(inputs, (NUM_INPUTS, 4), "inputs")
+        if constants is None:
+            constants = np.zeros((NUM_CONSTANTS, 4), dtype=np.float32)
+        constants = as_float32(constants, (NUM_CONSTANTS, 4), "constants")
+        chunk_size = max(1, chunk_size)
+
+        if constants.ndim == 2:  # noqa: PLR2004 Magic value used in comparison
+            if inputs.ndim != 3:  # noqa: PLR2004 Magic value used in comparison
+                msg = f"inputs must have shape (N, {NUM_INPUTS}, 4) but has shape {inputs.shape}"
+                raise ValueError(msg)
+            results = self._allocate_results(inputs.shape[:1], out)
+            with np.errstate(all="ignore"):
+                self._run_vertices(inputs, constants, results, chunk_size)
+            return results
+
+        if constants.ndim != 3:  # noqa: PLR2004 Magic value used in comparison
+            msg = f"constants must have shape (192, 4) or (K, 192, 4) but has shape {constants.shape}"
+            raise ValueError(msg)
+        num_instances = constants.shape[0]
+        if inputs.ndim == 3:  # noqa: PLR2004 Magic value used in comparison
+            # Shared inputs are read by every instance, so convert them once.
+            inputs = np.asarray(inputs, dtype=np.float32)[np.newaxis]
+        if inputs.ndim != 4 or inputs.shape[0] not in {1, num_instances}:  # noqa: PLR2004 Magic value used in comparison
+            msg = f"inputs must have shape (N, {NUM_INPUTS}, 4) or ({num_instances}, N, {NUM_INPUTS}, 4) but has shape {inputs.shape}"
+            raise ValueError(msg)
+
+        num_vertices = inputs.shape[1]
+        results = self._allocate_results((num_instances, num_vertices), out)
+        with np.errstate(all="ignore"):
+            if num_vertices >= chunk_size:
+                for instance in range(num_instances):
+                    self._run_vertices(
+                        inputs[instance % inputs.shape[0]],
+                        constants[instance],
+                        {name: value[instance] for name, value in results.items()},
+                        chunk_size,
+                    )
+                return results
+
+            # Execute several instances per pass as a (K, N) grid of lanes.
+            instances_per_chunk = chunk_size // max(1, num_vertices)
+            for start in range(0, num_instances, instances_per_chunk):
+                end = min(start + instances_per_chunk, num_instances)
+                inputs_chunk = np.asarray(inputs[start:end] if inputs.shape[0] > 1 else inputs, dtype=np.float32)
+                self._run_chunk(
+                    np.broadcast_to(inputs_chunk, (end - start, *inputs.shape[1:])),
+                    constants[start:end, np.newaxis],
+                    {name: value[start:end] for name, value in results.items()},
+                )
+        return results
+
+    def stream(
+        self, inputs, constants=None, *, chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[tuple[int, dict[str, np.ndarray]]]:
+        """Executes the program over a stream of vertices, yielding the outputs of each chunk.
+
+        Memory use is proportional to `chunk_size` rather than to the number of vertices: the register file and
+        output buffers are allocated once and reused for every chunk.
+
+        :param inputs: An (N, 16, 4) array of any numeric type (e.g., a `numpy.memmap`), a `VertexStream`, or an
+            iterable of such arrays.
+        :param constants: (192, 4) constant registers. Defaults to all zeros.
+        :param chunk_size: The maximum number of vertices executed per vectorized pass.
+        :return: An iterator of `(start, outputs)` tuples where `start` is the index of the first vertex of the chunk
+            and `outputs` maps output register names to (n, 4) float32 arrays. The arrays are overwritten by the next
+            chunk and must be copied to be retained.
+        """
+        if constants is None:
+            constants = np.zeros((NUM_CONSTANTS, 4), dtype=np.float32)
+        constants = as_float32(constants, (NUM_CONSTANTS, 4), "constants")
+        if constants.ndim != 2:  # noqa: PLR2004 Magic value used in comparison
+            msg = f"constants must have shape ({NUM_CONSTANTS}, 4) but has shape {constants.shape}"
+            raise ValueError(msg)
+
+        chunk_size = max(1, chunk_size)
+        buffers = self._allocate_results((chunk_size,))
+        start = 0
+        for chunk in _iter_chunks(inputs, chunk_size):
+            outputs = {name: value[: chunk.shape[0]] for name, value in buffers.items()}
+            with np.errstate(all="ignore"):
+                self._run_chunk(chunk, constants, outputs)
+            yield start, outputs
+            start += chunk.shape[0]
+
+    def _allocate_results(
+        self, lane_shape: tuple[int, ...], out: Mapping[str, np.ndarray] | None = None
+    ) -> dict[str, np.ndarray]:
+        ret = {}
+        for name in self.output_indices():
+            destination = None if out is None else out.get(name)
+            if destination is None:
+                ret[name] = np.empty((*lane_shape, 4), dtype=np.float32)
+            elif destination.shape != (*lane_shape, 4):
+                msg = f"Output '{name}' must have shape {(*lane_shape, 4)} but has shape {destination.shape}"
+                raise ValueError(msg)
+            else:
+                ret[name] = destination
+        if out is not None:
+            unknown = sorted(set(out) - set(ret))
+            if unknown:
+                msg = f"Unknown output registers {unknown}"
+                raise ValueError(msg)
+        return ret
+
+    def _run_vertices(
+        self, inputs: np.ndarray, constants: np.ndarray, results: dict[str, np.ndarray], chunk_size: int
+    ) -> None:
+        """Executes the program for (N, 16, 4) `inputs` sharing (192, 4) `constants` in chunks of vertices."""
+        for start in range(0, inputs.shape[0], chunk_size):
+            end = min(start + chunk_size, inputs.shape[0])
+            self._run_chunk(
+                np.asarray(inputs[start:end], dtype=np.float32),
+                constants,
+                {name: value[start:end] for name, value in results.items()},
+            )
+
+    def _run_chunk(self, inputs: np.ndarray, constants: np.ndarray, outputs: dict[str, np.ndarray]) -> None:
+        """Executes the program for a batch of lanes, writing each output register into `outputs`.
+
+        :param inputs: (..., 16, 4) inputs for each lane.
+        :param constants: (192, 4) constants shared by every lane or (K, 1, 192, 4) per-instance constants.
+        """
+        state = self._state
+        state.reset(inputs, constants)
+        for instruction in self.live_program:
+            _execute(instruction, state)
+        for name, index in self.output_indices().items():
+            outputs[name][:] = state.outputs[index]
+
+
+def run(
+    program: Iterable[VshInstruction | list[int]], inputs, constants=None, *, outputs: Iterable[str] | None = None
+) -> dict[str, np.ndarray]:
+    """Executes `program` for each vertex in `inputs`, returning the output registers. See `Emulator.run`."""
+    return Emulator(program, outputs=outputs).run(inputs, constants)
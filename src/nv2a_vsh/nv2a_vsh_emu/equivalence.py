@@ -0,0 +1,516 @@
+"""Checks whether two programs compute the same outputs.
+
+`check_equivalence` executes both programs on thousands of random vertices and constant sets at once. The values are
+drawn from a wide range of magnitudes, mixed with small integers (which exercise `c[A0+n]` addressing, `SLT`/`SGE`
+ties and `MIN`/`MAX`) and special values such as `±0`, `±inf`, NaN and denormals. Outputs are compared bit for bit,
+except that all NaNs are considered equal. The first differing output component is reported along with a reproducing
+input that has been reduced by setting as many input and constant components as possible to zero.
+
+`prove_equivalence` compares the expressions that compute each output component instead. Equal expressions are
+assigned the same number as they are built (as in common subexpression elimination), after applying only rewrites
+that are exact in float32: the operands of `ADD` and `MUL` are sorted, negation is moved out of products and double
+negation is removed. `MAD` is a product followed by a sum and dot products are sums of products in the order the
+emulator evaluates them. ILU operations are treated as uninterpreted functions of their operands. Equal expressions
+prove that the programs are equivalent for every input; different expressions prove nothing.
+"""
+
+from __future__ import annotations
+
+import struct
+import typing
+
+import numpy as np
+
+from nv2a_vsh.nv2a_vsh_asm import decoder
+from nv2a_vsh.nv2a_vsh_asm.decoder import (
+    FILE_ADDRESS,
+    FILE_CONST,
+    FILE_INPUT,
+    FILE_OUTPUT,
+    FILE_TEMP,
+    UNIT_MAC,
+    decode_program,
+    output_name,
+)
+from nv2a_vsh.nv2a_vsh_asm.vsh_encoder_defs import ILU, MAC
+from nv2a_vsh.nv2a_vsh_emu.compiler import compile_program
+from nv2a_vsh.nv2a_vsh_emu.emulator import (
+    DEFAULT_OUTPUT,
+    NUM_CONSTANTS,
+    NUM_INPUTS,
+    NUM_OUTPUTS,
+    OUTPUT_INDICES,
+)
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Iterable, Sequence
+
+    from nv2a_vsh.nv2a_vsh_asm.decoder import DecodedInstruction, DecodedOperation, Location, Operand
+    from nv2a_vsh.nv2a_vsh_asm.vsh_instruction import VshInstruction
+    from nv2a_vsh.nv2a_vsh_emu.compiler import CompiledProgram
+
+    Program = Sequence[VshInstruction | list[int]]
+
+# The number of random constant sets and the number of random vertices executed with each of them.
+DEFAULT_INSTANCES = 32
+DEFAULT_VERTICES = 128
+
+# The fraction of random values that are replaced by one of `SPECIAL_VALUES`.
+DEFAULT_SPECIAL_FRACTION = 0.05
+
+_FLOAT32 = np.finfo(np.float32)
+
+# Values that commonly expose differences in rounding, signed zeros and overflow.
+SPECIAL_VALUES = np.array(
+    [
+        0.0,
+        -0.0,
+        1.0,
+        -1.0,
+        np.inf,
+        -np.inf,
+        np.nan,
+        _FLOAT32.max,
+        -_FLOAT32.max,
+        _FLOAT32.tiny,
+        -_FLOAT32.tiny,
+        _FLOAT32.smallest_subnormal,
+        -_FLOAT32.smallest_subnormal,
+    ],
+    dtype=np.float32,
+)
+
+# The fraction of random values that are small integers, and their range (which covers every constant register).
+_INTEGER_FRACTION = 0.25
+_INTEGER_RANGE = (-16, NUM_CONSTANTS)
+
+# The range of base 2 exponents of the other random values.
+_EXPONENT_RANGE = (-16.0, 16.0)
+
+_SIGN_BIT = 0x80000000
+
+
+def _format_value(value: float) -> str:
+    return f"{value:.9g}"
+
+
+class Difference(typing.NamedTuple):
+    """An output component that differs between two programs, with the input that reproduces it."""
+
+    output: str
+    component: int
+    # The value computed by the first and second program.
+    expected: float
+    actual: float
+    # (16, 4) vertex attributes and (192, 4) constants.
+    inputs: np.ndarray
+    constants: np.ndarray
+
+    def report(self) -> list[str]:
+        """Returns a description of the difference followed by each nonzero input and constant component."""
+        ret = [
+            f"{self.output}.{'xyzw'[self.component]} differs: "
+            f"{_format_value(self.expected)} != {_format_value(self.actual)}"
+        ]
+        # Nonzero bit patterns also find negative zeros.
+        values = [
+            (f"v{index}", component, self.inputs[index, component])
+            for index, component in np.argwhere(self.inputs.view(np.uint32))
+        ]
+        values.extend(
+            (f"c[{index}]", component, self.constants[index, component])
+            for index, component in np.argwhere(self.constants.view(np.uint32))
+        )
+        if not values:
+            ret.append("Reproduced with all inputs and constants set to zero")
+            return ret
+        ret.append("Reproduced with (all other inputs and constants are zero):")
+        ret.extend(f"  {name}.{'xyzw'[component]} = {_format_value(value)}" for name, component, value in values)
+        return ret
+
+
+class EquivalenceResult(typing.NamedTuple):
+    """The result of comparing two programs."""
+
+    # The names of the compared output registers.
+    outputs: list[str]
+    # The number of random vertices that were compared.
+    trials: int
+    difference: Difference | None
+    # True if the outputs were proven to be identical for every input.
+    proven: bool
+
+    @property
+    def equivalent(self) -> bool:
+        """Returns True if no difference was found."""
+        return self.difference is None
+
+    def report(self) -> list[str]:
+        ret = [f"Compared {', '.join(self.outputs) or 'no outputs'} over {self.trials} random vertices"]
+        if self.difference is not None:
+            ret.extend(self.difference.report())
+        elif self.proven:
+            ret.append("The programs are equivalent (every output expression is identical)")
+        else:
+            ret.append("No differences found")
+        return ret
+
+
+def _output_indices(programs: Sequence[Sequence[DecodedInstruction]], outputs: Iterable[str] | None) -> dict[str, int]:
+    """Returns the names of the output registers to compare, mapped to their register index."""
+    available = dict(OUTPUT_INDICES)
+    for program in programs:
+        for instruction in program:
+            for destination in instruction.outputs:
+                if destination.file == FILE_OUTPUT:
+                    available.setdefault(
+                        output_name(destination.number % NUM_OUTPUTS), destination.number % NUM_OUTPUTS
+                    )
+    if outputs is None:
+        return dict(sorted(available.items(), key=lambda item: item[1]))
+
+    requested = list(outputs)
+    unknown = [name for name in requested if name not in available]
+    if unknown:
+        msg = f"Unknown output registers {unknown}"
+        raise ValueError(msg)
+    return {name: available[name] for name in sorted(requested, key=lambda name: available[name])}
+
+
+def _random_values(rng: np.random.Generator, shape: tuple[int, ...], special_fraction: float) -> np.ndarray:
+    magnitudes = np.exp2(rng.uniform(*_EXPONENT_RANGE, shape))
+    ret = np.where(rng.integers(2, size=shape, dtype=bool), -magnitudes, magnitudes).astype(np.float32)
+    kind = rng.random(shape)
+    integers = kind < _INTEGER_FRACTION
+    ret[integers] = rng.integers(*_INTEGER_RANGE, size=int(np.count_nonzero(integers)))
+    special = kind >= 1.0 - special_fraction
+    ret[special] = rng.choice(SPECIAL_VALUES, size=int(np.count_nonzero(special)))
+    return ret
+
+
+def _differs(expected: np.ndarray, actual: np.ndarray, *, ignore_zero_sign: bool) -> np.ndarray:
+    """Returns a mask of the components that differ, considering all NaNs to be equal."""
+    same = (expected.view(np.uint32) == actual.view(np.uint32)) | (np.isnan(expected) & np.isnan(actual))
+    if ignore_zero_sign:
+        same |= (expected == 0.0) & (actual == 0.0)
+    return ~same
+
+
+class _Runner:
+    """Executes both programs and compares their outputs."""
+
+    def __init__(self, programs: Sequence[Program], output_indices: dict[str, int], *, ignore_zero_sign: bool):
+        self.output_indices = output_indices
+        self.ignore_zero_sign = ignore_zero_sign
+        self.kernels: list[CompiledProgram] = []
+        for program in programs:
+            known = compile_program(program).output_indices()
+            self.kernels.append(compile_program(program, outputs=[name for name in output_indices if name in known]))
+
+    def run(self, inputs: np.ndarray, constants: np.ndarray) -> list[dict[str, np.ndarray]]:
+        """Returns the (K, N, 4) results of each program for every compared output register."""
+        ret = []
+        for kernel in self.kernels:
+            results = kernel.run(inputs, constants)
+            default = np.broadcast_to(np.asarray(DEFAULT_OUTPUT, dtype=np.float32), (*inputs.shape[:2], 4))
+            ret.append({name: results.get(name, default) for name in self.output_indices})
+        return ret
+
+    def differs(self, inputs: np.ndarray, constants: np.ndarray, output: str, component: int) -> np.ndarray:
+        """Returns a (K, N) mask of the lanes for which the given output component differs."""
+        expected, actual = self.run(inputs, constants)
+        return _differs(expected[output], actual[output], ignore_zero_sign=self.ignore_zero_sign)[..., component]
+
+
+def _split(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Splits (B, 832) values into (B, 1, 16, 4) inputs and (B, 192, 4) constants."""
+    inputs = values[:, : NUM_INPUTS * 4].reshape((-1, 1, NUM_INPUTS, 4))
+    constants = values[:, NUM_INPUTS * 4 :].reshape((-1, NUM_CONSTANTS, 4))
+    return inputs, constants
+
+
+def _minimize(runner: _Runner, values: np.ndarray, output: str, component: int) -> np.ndarray:
+    """Sets as many of the (832,) input and constant `values` to zero as possible while the output still differs.
+
+    Each round zeroes every nonzero value separately, then zeroes the largest leading half, quarter, ... of the
+    values that could be zeroed on their own. Each round is executed as two batches.
+    """
+
+    def _preserved(candidates: np.ndarray) -> np.ndarray:
+        return runner.differs(*_split(candidates), output, component)[:, 0]
+
+    ret = values.copy()
+    while True:
+        nonzero = np.flatnonzero(ret.view(np.uint32))
+        if not nonzero.size:
+            return ret
+        singles = np.repeat(ret[np.newaxis], nonzero.size, axis=0)
+        singles[np.arange(nonzero.size), nonzero] = 0.0
+        removable = nonzero[_preserved(singles)]
+        if not removable.size:
+            return ret
+
+        lengths = []
+        length = removable.size
+        while length:
+            lengths.append(length)
+            length //= 2
+        trials = np.repeat(ret[np.newaxis], len(lengths), axis=0)
+        for trial, length in zip(trials, lengths, strict=False):
+            trial[removable[:length]] = 0.0
+        # Zeroing only the first removable value is known to preserve the difference.
+        ret = trials[int(np.argmax(_preserved(trials)))]
+
+
+def check_equivalence(
+    program_a: Program,
+    program_b: Program,
+    *,
+    outputs: Iterable[str] | None = None,
+    instances: int = DEFAULT_INSTANCES,
+    vertices: int = DEFAULT_VERTICES,
+    seed: int = 0,
+    special_fraction: float = DEFAULT_SPECIAL_FRACTION,
+    ignore_zero_sign: bool = False,
+    symbolic: bool = False,
+) -> EquivalenceResult:
+    """Compares the outputs of two programs for random inputs and constants.
+
+    :param program_a: The reference program, as `VshInstruction`s or machine code quadruplets.
+    :param program_b: The program to compare against the reference.
+    :param outputs: The names of the output registers to compare. Defaults to every output register. Outputs that a
+        program never writes hold their default `(0, 0, 0, 1)` value.
+    :param instances: The number of random constant sets.
+    :param vertices: The number of random vertices executed with each constant set.
+    :param seed: The seed of the random number generator.
+    :param special_fraction: The fraction of random values replaced by special values such as `±inf` and NaN.
+    :param ignore_zero_sign: Consider `+0` and `-0` to be equal.
+    :param symbolic: Also compare the expressions computing each output, which may prove that the programs are
+        equivalent.
+    """
+    if instances < 1 or vertices < 1:
+        msg = f"instances ({instances}) and vertices ({vertices}) must be positive"
+        raise ValueError(msg)
+    if not 0.0 <= special_fraction <= 1.0:
+        msg = f"special_fraction ({special_fraction}) must be between 0 and 1"
+        raise ValueError(msg)
+
+    programs = [list(program_a), list(program_b)]
+    output_indices = _output_indices([decode_program(program) for program in programs], outputs)
+    runner = _Runner(programs, output_indices, ignore_zero_sign=ignore_zero_sign)
+
+    rng = np.random.default_rng(seed)
+    inputs = _random_values(rng, (instances, vertices, NUM_INPUTS, 4), special_fraction)
+    constants = _random_values(rng, (instances, NUM_CONSTANTS, 4), special_fraction)
+    expected, actual = runner.run(inputs, constants)
+
+    difference = None
+    for name in output_indices:
+        differs = _differs(expected[name], actual[name], ignore_zero_sign=ignore_zero_sign)
+        lanes = np.argwhere(differs)
+        if not lanes.size:
+            continue
+        # argwhere orders the lanes by instance, then vertex, so the first difference of each component is found by
+        # sorting on the component.
+        instance, vertex, component = lanes[np.lexsort((np.arange(len(lanes)), lanes[:, 2]))[0]]
+        values = np.concatenate([inputs[instance, vertex].ravel(), constants[instance].ravel()])
+        values = _minimize(runner, values, name, int(component))
+        reduced_inputs, reduced_constants = _split(values[np.newaxis])
+        reduced_expected, reduced_actual = runner.run(reduced_inputs, reduced_constants)
+        difference = Difference(
+            name,
+            int(component),
+            float(reduced_expected[name][0, 0, component]),
+            float(reduced_actual[name][0, 0, component]),
+            reduced_inputs[0, 0],
+            reduced_constants[0],
+        )
+        break
+
+    proven = symbolic and difference is None and prove_equivalence(program_a, program_b, outputs=list(output_indices))
+    return EquivalenceResult(list(output_indices), instances * vertices, difference, proven)
+
+
+class _Expressions:
+    """Assigns the same number to expressions that are computed in the same way."""
+
+    def __init__(self) -> None:
+        self._numbers: dict[tuple, int] = {}
+        self._negated: dict[int, int] = {}
+        # Expressions that are the negation of another expression, including negative literals.
+        self._negative: set[int] = set()
+
+    def number(self, key: tuple) -> int:
+        return self._numbers.setdefault(key, len(self._numbers))
+
+    def literal(self, value: float) -> int:
+        bits = struct.unpack("<I", struct.pack("<f", value))[0]
+        ret = self.number(("literal", bits))
+        if ret not in self._negated:
+            # The negation of a literal is the literal with the opposite sign.
+            negated = self.number(("literal", bits ^ _SIGN_BIT))
+            self._negated[ret] = negated
+            self._negated[negated] = ret
+            self._negative.add(ret if bits & _SIGN_BIT else negated)
+        return ret
+
+    def negate(self, value: int) -> int:
+        ret = self._negated.get(value)
+        if ret is None:
+            ret = self.number(("negate", value))
+            self._negative.add(ret)
+            self._negated[value] = ret
+            self._negated[ret] = value
+        return ret
+
+    def _magnitude(self, value: int) -> tuple[int, bool]:
+        """Returns `value` without negation and whether it was negated."""
+        if value in self._negative:
+            return self.negate(value), True
+        return value, False
+
+    def multiply(self, a: int, b: int) -> int:
+        # Rounding to nearest is symmetric, so (-a) * b == -(a * b) exactly.
+        a, negate_a = self._magnitude(a)
+        b, negate_b = self._magnitude(b)
+        ret = self.number(("mul", *sorted((a, b))))
+        return self.negate(ret) if negate_a != negate_b else ret
+
+    def add(self, a: int, b: int) -> int:
+        # The negation is not moved out of sums, as -a + -b is +0 when -(a + b) is -0.
+        return self.number(("add", *sorted((a, b))))
+
+    def sum_of_products(self, a: Sequence[int], b: Sequence[int]) -> int:
+        ret = self.multiply(a[0], b[0])
+        for x, y in zip(a[1:], b[1:], strict=False):
+            ret = self.add(ret, self.multiply(x, y))
+        return ret
+
+
+class _SymbolicState:
+    """The expression held by each register component while a program is evaluated symbolically."""
+
+    def __init__(self, expressions: _Expressions):
+        self.expressions = expressions
+        self.values: dict[Location, int] = {}
+        self.a0 = expressions.literal(0.0)
+        # Identifies the contents of the constant file, which changes when the program writes a constant.
+        self.constants = expressions.number(("constants",))
+
+    def _register(self, location: Location) -> int:
+        ret = self.values.get(location)
+        if ret is not None:
+            return ret
+        register_file, number, component = location
+        if register_file == FILE_INPUT:
+            return self.expressions.number(("input", number, component))
+        if register_file == FILE_CONST:
+            if number >= NUM_CONSTANTS:
+                return self.expressions.literal(0.0)
+            return self.expressions.number(("constant", number, component))
+        if register_file == FILE_OUTPUT:
+            return self.expressions.literal(DEFAULT_OUTPUT[component])
+        return self.expressions.literal(0.0)
+
+    def read(self, operand: Operand, component: int) -> int:
+        """Returns the expression read by the given swizzled component of `operand`."""
+        source = operand.swizzle[component]
+        if operand.relative:
+            ret = self.expressions.number(("relative", operand.number, source, self.a0, self.constants))
+        else:
+            ret = self._register(operand.locations((source,))[0])
+        return self.expressions.negate(ret) if operand.negate else ret
+
+    def _mac(self, operation: DecodedOperation) -> list[int]:
+        expressions = self.expressions
+        operands = [[self.read(operand, component) for component in range(4)] for operand in operation.inputs]
+        mac = MAC(operation.opcode)
+        if mac == MAC.MAC_MOV:
+            return operands[0]
+        if mac == MAC.MAC_MUL:
+            return [expressions.multiply(a, b) for a, b in zip(*operands, strict=False)]
+        if mac == MAC.MAC_ADD:
+            return [expressions.add(a, c) for a, c in zip(*operands, strict=False)]
+        if mac == MAC.MAC_MAD:
+            return [expressions.add(expressions.multiply(a, b), c) for a, b, c in zip(*operands, strict=False)]
+        if mac == MAC.MAC_DP3:
+            return [expressions.sum_of_products(operands[0][:3], operands[1][:3])] * 4
+        if mac == MAC.MAC_DPH:
+            product = expressions.sum_of_products(operands[0][:3], operands[1][:3])
+            return [expressions.add(product, operands[1][3])] * 4
+        if mac == MAC.MAC_DP4:
+            return [expressions.sum_of_products(operands[0], operands[1])] * 4
+        if mac == MAC.MAC_DST:
+            a, b = operands
+            return [expressions.literal(1.0), expressions.multiply(a[1], b[1]), a[2], b[3]]
+        if mac == MAC.MAC_ARL:
+            return [expressions.number(("arl", operands[0][0]))]
+        # MIN, MAX, SLT and SGE do not commute for signed zeros and NaN.
+        return [expressions.number((int(mac), a, b)) for a, b in zip(*operands, strict=False)]
+
+    def _ilu(self, operation: DecodedOperation) -> list[int]:
+        operand = [self.read(operation.inputs[0], component) for component in range(4)]
+        ilu = ILU(operation.opcode)
+        if ilu == ILU.ILU_MOV:
+            return operand
+        if ilu in {ILU.ILU_RCP, ILU.ILU_RCC, ILU.ILU_RSQ}:
+            return [self.expressions.number((int(ilu), operand[0]))] * 4
+        if ilu == ILU.ILU_LIT:
+            return [
+                self.expressions.number((int(ilu), component, operand[0], operand[1], operand[3]))
+                for component in range(4)
+            ]
+        return [self.expressions.number((int(ilu), component, operand[0])) for component in range(4)]
+
+    def _evaluate(self, operation: DecodedOperation) -> list[int]:
+        return self._mac(operation) if operation.unit == UNIT_MAC else self._ilu(operation)
+
+    def execute(self, instruction: DecodedInstruction) -> None:
+        written_constants: list[tuple[int, int, int]] = []
+
+        def write(operation: DecodedOperation, value: list[int]) -> None:
+            for destination in operation.outputs:
+                if destination.file == FILE_ADDRESS:
+                    self.a0 = value[0]
+                    continue
+                if destination.is_read_only:
+                    continue
+                if destination.file == FILE_TEMP:
+                    number = destination.number
+                elif destination.file == FILE_OUTPUT:
+                    number = destination.number % NUM_OUTPUTS
+                elif destination.number >= NUM_CONSTANTS:
+                    continue
+                else:
+                    number = destination.number
+                    written_constants.extend(
+                        (number, component, value[component]) for component in destination.components
+                    )
+                for component in destination.components:
+                    self.values[(destination.file, number, component)] = value[component]
+
+        decoder.execute(instruction.operations(), self._evaluate, write)
+        if written_constants:
+            self.constants = self.expressions.number(("constants", self.constants, *written_constants))
+
+    def output(self, index: int) -> tuple[int, ...]:
+        return tuple(self._register((FILE_OUTPUT, index, component)) for component in range(4))
+
+
+def prove_equivalence(program_a: Program, program_b: Program, *, outputs: Iterable[str] | None = None) -> bool:
+    """Returns True if both programs compute every compared output with identical expressions.
+
+    A result of False does not mean that the programs differ, only that their equivalence could not be proven.
+
+    :param outputs: The names of the output registers to compare. Defaults to every output register.
+    """
+    decoded = [decode_program(program_a), decode_program(program_b)]
+    output_indices = _output_indices(decoded, outputs)
+    expressions = _Expressions()
+    states = []
+    for program in decoded:
+        state = _SymbolicState(expressions)
+        for instruction in program:
+            state.execute(instruction)
+        states.append(state)
+    return all(states[0].output(index) == states[1].output(index) for index in output_indices.values())
@@ -0,0 +1,92 @@
+"""Component level liveness analysis over decoded vertex shader programs."""
+
+from __future__ import annotations
+
+import typing
+
+from nv2a_vsh.nv2a_vsh_asm.decoder import (
+    FILE_ADDRESS,
+    FILE_CONST,
+    FILE_OUTPUT,
+    FILE_TEMP,
+    DecodedInstruction,
+    Destination,
+    Location,
+)
+from nv2a_vsh.nv2a_vsh_asm.vsh_encoder_defs import ILU, MAC
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Iterable
+
+
+def _live_destination(destination: Destination, live: set[Location], *, any_constant_live: bool) -> Destination | None:
+    if destination.file == FILE_CONST and any_constant_live:
+        return destination
+    components = tuple(location[2] for location in destination.locations if location in live)
+    if not components:
+        return None
+    return destination._replace(components=components)
+
+
+def _read_locations(instruction: DecodedInstruction) -> Iterable[tuple[Location, bool]]:
+    """Yields (location, is_relative) for each register component read by `instruction`."""
+    for operand, components in instruction.reads():
+        if operand.file == FILE_CONST and operand.relative:
+            yield (FILE_ADDRESS, 0, 0), True
+        elif operand.file in {FILE_TEMP, FILE_CONST}:
+            for location in operand.locations(components):
+                yield location, False
+
+
+def output_locations(output_numbers: Iterable[int]) -> set[Location]:
+    """Returns every component of the given output registers."""
+    return {(FILE_OUTPUT, number, component) for number in output_numbers for component in range(4)}
+
+
+def prune(program: list[DecodedInstruction], live_out: set[Location]) -> list[DecodedInstruction]:
+    """Removes operations and destination components that do not contribute to the `live_out` locations.
+
+    Instructions are processed in reverse; a component is live if it is in `live_out` or read by a later live
+    operation. Writes to `c` registers are kept whenever a later operation reads a relatively addressed constant.
+    """
+    live = set(live_out)
+    any_constant_live = False
+    ret: list[DecodedInstruction] = []
+
+    for instruction in reversed(program):
+        mac_outputs = tuple(
+            destination
+            for destination in (
+                _live_destination(output, live, any_constant_live=any_constant_live)
+                for output in instruction.mac_outputs
+            )
+            if destination is not None
+        )
+        ilu_outputs = tuple(
+            destination
+            for destination in (
+                _live_destination(output, live, any_constant_live=any_constant_live)
+                for output in instruction.ilu_outputs
+            )
+            if destination is not None
+        )
+
+        pruned = instruction._replace(mac_outputs=mac_outputs, ilu_outputs=ilu_outputs)
+        if not mac_outputs:
+            pruned = pruned._replace(mac=MAC.MAC_NOP, mac_inputs=())
+        if not ilu_outputs:
+            pruned = pruned._replace(ilu=ILU.ILU_NOP, ilu_input=None)
+        if pruned.is_nop:
+            continue
+
+        # Operands are read before results are written, so kill the written components first.
+        for destination in pruned.outputs:
+            live.difference_update(destination.locations)
+        for location, is_relative in _read_locations(pruned):
+            live.add(location)
+            any_constant_live = any_constant_live or is_relative
+
+        ret.append(pruned)
+
+    ret.reverse()
+    return ret
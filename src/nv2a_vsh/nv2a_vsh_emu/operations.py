@@ -0,0 +1,249 @@
+"""Vectorized implementations of the nv2a vertex shader MAC and ILU operations.
+
+Operands are float32 arrays whose last dimension holds the x, y, z, w components. Leading dimensions are broadcast,
+allowing lane-invariant operands (e.g., directly addressed constants) to be passed as (4,) arrays.
+
+The ILU operations follow xemu's vertex program translator, which implements the NV_vertex_program1_1 definitions,
+including its handling of denormals, infinities, NaNs and negative zero. Each transcendental function is evaluated in
+double precision and rounded to float32. The nv2a instead computes RCP, RSQ, EXPP, LOGP and LIT with undocumented
+lookup table based approximations. These are not modeled, as no captured xemu or hardware outputs are available to
+derive or check them against, so results may differ from the hardware in the low bits of the mantissa (and EXPP.z /
+LOGP.z are only specified to partial precision). Regression runs that need hardware bit accuracy must compare against
+captured outputs rather than the emulator.
+
+tests/ilu_special_cases.txt checks the special cases against a separate scalar transcription of xemu's helpers
+(tools/generate_ilu_special_cases.py), not against captured outputs.
+"""
+
+from __future__ import annotations
+
+import typing
+
+import numpy as np
+
+from nv2a_vsh.nv2a_vsh_asm.vsh_encoder_defs import ILU, MAC
+
+# Clamping range of RCC results.
+RCC_MIN = np.float32(5.42101e-020)
+RCC_MAX = np.float32(1.884467e019)
+
+# Limit of the LIT power (src.w) operand, 128 - 1/256.
+LIT_POWER_MAX = np.float32(127.99609375)
+
+if typing.TYPE_CHECKING:
+    # The x, y, z, w components of a result, each either a per-lane array or a lane-invariant scalar.
+    Components = tuple[
+        np.ndarray | np.floating, np.ndarray | np.floating, np.ndarray | np.floating, np.ndarray | np.floating
+    ]
+
+_ZERO = np.float32(0.0)
+_FLT_MIN = np.finfo(np.float32).tiny
+_ONE = np.float32(1.0)
+
+
+def _replicate(value: np.ndarray) -> np.ndarray:
+    """Broadcasts a scalar-per-lane result across the 4 components."""
+    return np.repeat(value[..., np.newaxis], 4, axis=-1)
+
+
+def mac_mov(a: np.ndarray) -> np.ndarray:
+    return a
+
+
+def mac_mul(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return a * b
+
+
+def mac_add(a: np.ndarray, c: np.ndarray) -> np.ndarray:
+    return a + c
+
+
+def mac_mad(a: np.ndarray, b: np.ndarray, c: np.ndarray) -> np.ndarray:
+    return a * b + c
+
+
+def mac_dp3(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    product = a * b
+    return _replicate(product[..., 0] + product[..., 1] + product[..., 2])
+
+
+def mac_dph(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    product = a * b
+    return _replicate(product[..., 0] + product[..., 1] + product[..., 2] + b[..., 3])
+
+
+def mac_dp4(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    product = a * b
+    return _replicate(product[..., 0] + product[..., 1] + product[..., 2] + product[..., 3])
+
+
+def mac_dst(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a, b = np.broadcast_arrays(a, b)
+    ret = np.empty(a.shape, dtype=np.float32)
+    ret[..., 0] = _ONE
+    ret[..., 1] = a[..., 1] * b[..., 1]
+    ret[..., 2] = a[..., 2]
+    ret[..., 3] = b[..., 3]
+    return ret
+
+
+def mac_min(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.minimum(a, b)
+
+
+def mac_max(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.maximum(a, b)
+
+
+def mac_slt(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return (a < b).astype(np.float32)
+
+
+def mac_sge(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return (a >= b).astype(np.float32)
+
+
+def mac_arl(a: np.ndarray) -> np.ndarray:
+    """Returns the integer address register value loaded from `a.x`."""
+    return np.floor(a[..., 0]).astype(np.int32)
+
+
+MAC_OPERATIONS: dict[int, typing.Callable[..., np.ndarray]] = {
+    MAC.MAC_MOV: mac_mov,
+    MAC.MAC_MUL: mac_mul,
+    MAC.MAC_ADD: mac_add,
+    MAC.MAC_MAD: mac_mad,
+    MAC.MAC_DP3: mac_dp3,
+    MAC.MAC_DPH: mac_dph,
+    MAC.MAC_DP4: mac_dp4,
+    MAC.MAC_DST: mac_dst,
+    MAC.MAC_MIN: mac_min,
+    MAC.MAC_MAX: mac_max,
+    MAC.MAC_SLT: mac_slt,
+    MAC.MAC_SGE: mac_sge,
+    MAC.MAC_ARL: mac_arl,
+}
+
+
+def _stack(components: Components) -> np.ndarray:
+    """Stacks per-component results (which may be lane-invariant scalars) into a (..., 4) array."""
+    shape = np.broadcast_shapes(*(np.shape(component) for component in components))
+    ret = np.empty((*shape, 4), dtype=np.float32)
+    for index, component in enumerate(components):
+        ret[..., index] = component
+    return ret
+
+
+# The component-level ILU operations below take the relevant components of the (swizzled) source operand and are
+# shared by the interpreter and compiled kernels. Like the hardware, they flush denormal operands and results to
+# (signed) zero; infinities, NaNs and negative zero otherwise follow IEEE-754 float32 arithmetic.
+
+
+def flush_denormals(x) -> np.ndarray:
+    """Replaces denormal values with a zero of the same sign."""
+    x = np.asarray(x, dtype=np.float32)
+    return np.where(np.abs(x) < _FLT_MIN, np.copysign(_ZERO, x), x)
+
+
+def _exp2(x) -> np.ndarray:
+    # Evaluated in double precision and rounded, which gives the same float32 result on every platform. NumPy's
+    # float32 transcendental functions are vectorized with CPU specific approximations that may differ in the last bit.
+    return np.exp2(x, dtype=np.float64).astype(np.float32)
+
+
+def _log2(x) -> np.ndarray:
+    return np.log2(x, dtype=np.float64).astype(np.float32)
+
+
+def rcp(x: np.ndarray) -> np.ndarray:
+    """1 / x. Zero yields an infinity of the same sign, infinity yields zero."""
+    return flush_denormals(_ONE / flush_denormals(x))
+
+
+def rcc(x: np.ndarray) -> np.ndarray:
+    """1 / x, clamped to [RCC_MIN, RCC_MAX] if positive and to [-RCC_MAX, -RCC_MIN] otherwise.
+
+    A +0 reciprocal (of +inf or of a value whose reciprocal is denormal) is not positive and is clamped to -RCC_MIN.
+    Like the GPU's `clamp`, NaN is replaced by the lower bound.
+    """
+    ret = flush_denormals(_ONE / flush_denormals(x))
+    positive = ret > _ZERO
+    low = np.where(positive, RCC_MIN, -RCC_MAX)
+    high = np.where(positive, RCC_MAX, -RCC_MIN)
+    return np.fmin(np.fmax(ret, low), high).astype(np.float32)
+
+
+def rsq(x: np.ndarray) -> np.ndarray:
+    """1 / sqrt(|x|), rounded once. Zero yields +infinity."""
+    return (1.0 / np.sqrt(np.abs(flush_denormals(x)), dtype=np.float64)).astype(np.float32)
+
+
+def expp(x: np.ndarray) -> Components:
+    x = flush_denormals(x)
+    x_floor = np.floor(x)
+    return flush_denormals(_exp2(x_floor)), x - x_floor, flush_denormals(_exp2(x)), _ONE
+
+
+def logp(x: np.ndarray) -> Components:
+    x = np.abs(flush_denormals(x))
+    mantissa, exponent = np.frexp(x)
+    normal = np.isfinite(x) & (x != _ZERO)
+    # frexp returns a mantissa in [0.5, 1), the hardware returns one in [1, 2). Zero and infinity have an infinite
+    # exponent and a mantissa of 1.0.
+    exponent = np.where(normal, (exponent - 1).astype(np.float32), _log2(x))
+    mantissa = np.where(normal | np.isnan(x), mantissa * np.float32(2.0), _ONE)
+    return exponent, mantissa, _log2(x), _ONE
+
+
+def lit(x: np.ndarray, y: np.ndarray, w: np.ndarray) -> Components:
+    """Returns (1, max(x, 0), exp2(w * log2(max(y, 0))) if x > 0 else 0, 1).
+
+    The power is clamped to +/- LIT_POWER_MAX. NaN operands are replaced by the lower bound of `max` and `clamp`, as on
+    the GPU. A zero `y` yields 0, NaN or +infinity for a positive, zero or negative power.
+    """
+    x = flush_denormals(x)
+    y = flush_denormals(y)
+    power = np.fmin(np.fmax(flush_denormals(w), -LIT_POWER_MAX), LIT_POWER_MAX)
+    diffuse = np.where(x > _ZERO, x, _ZERO)
+    base = np.where(y > _ZERO, y, _ZERO)
+    specular = np.where(diffuse > _ZERO, _exp2(power * _log2(base)), _ZERO)
+    return _ONE, diffuse, flush_denormals(specular), _ONE
+
+
+def ilu_mov(src: np.ndarray) -> np.ndarray:
+    return src
+
+
+def ilu_rcp(src: np.ndarray) -> np.ndarray:
+    return _replicate(rcp(src[..., 0]))
+
+
+def ilu_rcc(src: np.ndarray) -> np.ndarray:
+    return _replicate(rcc(src[..., 0]))
+
+
+def ilu_rsq(src: np.ndarray) -> np.ndarray:
+    return _replicate(rsq(src[..., 0]))
+
+
+def ilu_exp(src: np.ndarray) -> np.ndarray:
+    return _stack(expp(src[..., 0]))
+
+
+def ilu_log(src: np.ndarray) -> np.ndarray:
+    return _stack(logp(src[..., 0]))
+
+
+def ilu_lit(src: np.ndarray) -> np.ndarray:
+    return _stack(lit(src[..., 0], src[..., 1], src[..., 3]))
+
+
+ILU_OPERATIONS: dict[int, typing.Callable[[np.ndarray], np.ndarray]] = {
+    ILU.ILU_MOV: ilu_mov,
+    ILU.ILU_RCP: ilu_rcp,
+    ILU.ILU_RCC: ilu_rcc,
+    ILU.ILU_RSQ: ilu_rsq,
+    ILU.ILU_EXP: ilu_exp,
+    ILU.ILU_LOG: ilu_log,
+    ILU.ILU_LIT: ilu_lit,
+}
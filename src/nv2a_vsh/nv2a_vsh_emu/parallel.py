@@ -0,0 +1,195 @@
+"""Executes vertex shader programs across several processes.
+
+The vertex range is split into shards that are executed by a `ProcessPoolExecutor`. The program, constants, inputs
+and outputs are exchanged through `multiprocessing.shared_memory` blocks, so each task only pickles the names of the
+blocks and the range of vertices to execute.
+"""
+
+from __future__ import annotations
+
+import concurrent.futures
+import contextlib
+import os
+import typing
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from nv2a_vsh.nv2a_vsh_emu.compiler import compile_program
+from nv2a_vsh.nv2a_vsh_emu.emulator import (
+    DEFAULT_CHUNK_SIZE,
+    NUM_CONSTANTS,
+    NUM_INPUTS,
+    Emulator,
+    as_float32,
+    vertex_array,
+)
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from typing_extensions import Self
+
+    from nv2a_vsh.nv2a_vsh_asm.vsh_instruction import VshInstruction
+
+# The minimum number of vertices per shard. Smaller shards cost more in task overhead than they gain in parallelism.
+MIN_SHARD_SIZE = 4096
+
+
+class _SharedArray(typing.NamedTuple):
+    """Describes a NumPy array stored in a shared memory block."""
+
+    name: str
+    shape: tuple[int, ...]
+    dtype: str
+
+
+class _Shard(typing.NamedTuple):
+    program: _SharedArray
+    constants: _SharedArray
+    inputs: _SharedArray
+    outputs: _SharedArray
+    output_names: tuple[str, ...]
+    start: int
+    end: int
+    chunk_size: int
+    compiled: bool
+
+
+class _SharedBlocks:
+    """Allocates shared memory blocks and unlinks them on exit.
+
+    Blocks are closed once every array viewing them has been garbage collected, so arrays may outlive the context.
+    """
+
+    def __init__(self) -> None:
+        self._blocks: list[shared_memory.SharedMemory] = []
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *_args) -> None:
+        for block in self._blocks:
+            block.unlink()
+
+    def create(self, shape: tuple[int, ...], dtype: np.dtype) -> tuple[_SharedArray, np.ndarray]:
+        size = max(1, int(np.prod(shape)) * dtype.itemsize)
+        block = shared_memory.SharedMemory(create=True, size=size)
+        self._blocks.append(block)
+        array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        weakref.finalize(array, block.close)
+        return _SharedArray(block.name, shape, dtype.str), array
+
+
+def _execute_shard(shard: _Shard, attach: typing.Callable[[_SharedArray], np.ndarray]) -> None:
+    words = attach(shard.program).tolist()
+    outputs = shard.output_names
+    emulator = compile_program(words, outputs=outputs) if shard.compiled else Emulator(words, outputs=outputs)
+    shared_outputs = attach(shard.outputs)
+    emulator.run(
+        attach(shard.inputs)[shard.start : shard.end],
+        attach(shard.constants),
+        chunk_size=shard.chunk_size,
+        out={name: shared_outputs[index, shard.start : shard.end] for index, name in enumerate(outputs)},
+    )
+
+
+def _run_shard(shard: _Shard) -> int:
+    """Executes one shard in a worker process, returning the number of vertices executed."""
+    blocks: list[shared_memory.SharedMemory] = []
+
+    def _attach(description: _SharedArray) -> np.ndarray:
+        block = shared_memory.SharedMemory(name=description.name)
+        blocks.append(block)
+        return np.ndarray(description.shape, dtype=np.dtype(description.dtype), buffer=block.buf)
+
+    try:
+        _execute_shard(shard, _attach)
+    finally:
+        for block in blocks:
+            # Closing fails while an exception traceback still references a view of the block. The mapping is then
+            # released when the worker exits.
+            with contextlib.suppress(BufferError):
+                block.close()
+    return shard.end - shard.start
+
+
+def _shard_ranges(num_vertices: int, num_shards: int) -> list[tuple[int, int]]:
+    shard_size = max(MIN_SHARD_SIZE, -(-num_vertices // max(1, num_shards)))
+    return [(start, min(start + shard_size, num_vertices)) for start in range(0, num_vertices, shard_size)]
+
+
+def run_parallel(
+    program: Iterable[VshInstruction | list[int]],
+    inputs,
+    constants=None,
+    *,
+    workers: int | None = None,
+    shards: int | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    compiled: bool = True,
+    outputs: Iterable[str] | None = None,
+) -> dict[str, np.ndarray]:
+    """Executes `program` for each vertex in `inputs` using a pool of worker processes.
+
+    :param program: The program to execute as `VshInstruction`s or machine code quadruplets.
+    :param inputs: (N, 16, 4) vertex attributes of any numeric type (including a `numpy.memmap`), or a `VertexStream`.
+    :param constants: (192, 4) constant registers. Defaults to all zeros.
+    :param workers: The number of worker processes. Defaults to the number of CPUs.
+    :param shards: The number of shards the vertex range is split into. Defaults to `workers`.
+    :param chunk_size: The number of vertices executed per vectorized pass within each worker.
+    :param compiled: Execute a compiled kernel (see `compile_program`) rather than interpreting the program.
+    :param outputs: The names of the output registers to compute. Defaults to every output register.
+    :return: A dictionary mapping output register names to (N, 4) float32 arrays, as returned by `Emulator.run`.
+    """
+    words = np.array(
+        [
+            instruction.encode() if not isinstance(instruction, (list, tuple)) else instruction
+            for instruction in program
+        ],
+        dtype=np.uint32,
+    ).reshape(-1, 4)
+    output_names = tuple(Emulator(words.tolist(), outputs=outputs).output_indices())
+    inputs = vertex_array(inputs)
+    if constants is None:
+        constants = np.zeros((NUM_CONSTANTS, 4), dtype=np.float32)
+    constants = as_float32(constants, (NUM_CONSTANTS, 4), "constants")
+    if constants.ndim != 2:  # noqa: PLR2004 Magic value used in comparison
+        msg = f"constants must have shape ({NUM_CONSTANTS}, 4) but has shape {constants.shape}"
+        raise ValueError(msg)
+
+    workers = workers or os.cpu_count() or 1
+    num_vertices = inputs.shape[0]
+    float32 = np.dtype(np.float32)
+
+    with _SharedBlocks() as blocks:
+        shared_program, program_array = blocks.create(words.shape, words.dtype)
+        program_array[...] = words
+        shared_constants, constants_array = blocks.create(constants.shape, float32)
+        constants_array[...] = constants
+        shared_inputs, inputs_array = blocks.create((num_vertices, NUM_INPUTS, 4), float32)
+        for start in range(0, num_vertices, chunk_size):
+            inputs_array[start : start + chunk_size] = inputs[start : start + chunk_size]
+        shared_outputs, outputs_array = blocks.create((len(output_names), num_vertices, 4), float32)
+
+        tasks = [
+            _Shard(
+                shared_program,
+                shared_constants,
+                shared_inputs,
+                shared_outputs,
+                output_names,
+                start,
+                end,
+                chunk_size,
+                compiled,
+            )
+            for start, end in _shard_ranges(num_vertices, shards or workers)
+        ]
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(workers, max(1, len(tasks)))) as executor:
+            for _count in executor.map(_run_shard, tasks):
+                pass
+
+        # The outputs are returned as views of the shared block, which is released along with the last of them.
+        return {name: outputs_array[index] for index, name in enumerate(output_names)}
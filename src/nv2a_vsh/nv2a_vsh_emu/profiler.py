@@ -0,0 +1,149 @@
+"""Instrumented emulation that records per-instruction execution statistics.
+
+`ProfilingEmulator` is a drop-in replacement for `Emulator` that additionally accumulates a `Profile`: the wall time
+and number of lanes executed for each program counter, the number of NaN and infinite values each instruction
+writes, and a histogram of the effective `A0+n` indices read by relative constant accesses. The regular `Emulator`
+is not instrumented, so profiling has no cost unless it is used.
+
+Unlike `Emulator`, every instruction of the program is executed (as on the hardware) even if it does not contribute
+to an output, so that profiles line up with the program listing.
+"""
+
+from __future__ import annotations
+
+import collections
+import json
+import time
+import typing
+
+import numpy as np
+
+from nv2a_vsh.nv2a_vsh_asm.decoder import FILE_ADDRESS
+from nv2a_vsh.nv2a_vsh_emu.emulator import Emulator, RegisterState, evaluate
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Iterable, Sequence
+
+    from nv2a_vsh.nv2a_vsh_asm.decoder import DecodedInstruction
+    from nv2a_vsh.nv2a_vsh_asm.vsh_instruction import VshInstruction
+
+
+class InstructionProfile:
+    """Statistics accumulated for a single program counter."""
+
+    def __init__(self, pc: int, instruction: str):
+        self.pc = pc
+        self.instruction = instruction
+        self.seconds = 0.0
+        self.lanes = 0
+        self.nan_count = 0
+        self.inf_count = 0
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        return {
+            "pc": self.pc,
+            "instruction": self.instruction,
+            "seconds": self.seconds,
+            "lanes": self.lanes,
+            "nan_count": self.nan_count,
+            "inf_count": self.inf_count,
+        }
+
+
+class Profile:
+    """Execution statistics for a program, accumulated over every call to `ProfilingEmulator.run`."""
+
+    def __init__(self, program: Sequence[DecodedInstruction]):
+        self.instructions = [InstructionProfile(pc, str(instruction)) for pc, instruction in enumerate(program)]
+        # Maps each effective constant index read through `c[A0+n]` (including out of range indices) to the number of
+        # lanes that read it.
+        self.a0_histogram: collections.Counter[int] = collections.Counter()
+        self.chunks = 0
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(entry.seconds for entry in self.instructions)
+
+    def reset(self) -> None:
+        """Discards all recorded statistics."""
+        for entry in self.instructions:
+            entry.seconds = 0.0
+            entry.lanes = 0
+            entry.nan_count = 0
+            entry.inf_count = 0
+        self.a0_histogram.clear()
+        self.chunks = 0
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        return {
+            "total_seconds": self.total_seconds,
+            "chunks": self.chunks,
+            "instructions": [entry.to_dict() for entry in self.instructions],
+            "a0_histogram": {str(index): count for index, count in sorted(self.a0_histogram.items())},
+        }
+
+    def write_json(self, outfile: typing.TextIO) -> None:
+        json.dump(self.to_dict(), outfile, indent=2)
+        outfile.write("\n")
+
+    def format(self, listing: Sequence[str] | None = None) -> list[str]:
+        """Returns one line per instruction with its statistics alongside the given program listing.
+
+        :param listing: The text for each instruction, e.g., `nv2a_vsh.disassemble.disassemble(values, explain=False)`.
+            Defaults to the decoded form of each instruction.
+        """
+        total = self.total_seconds or 1.0
+        ret = []
+        for entry in self.instructions:
+            text = listing[entry.pc] if listing is not None and entry.pc < len(listing) else entry.instruction
+            ret.append(
+                f"{entry.pc:4d} {100.0 * entry.seconds / total:6.2f}% {entry.seconds * 1000.0:9.3f}ms "
+                f"NaN:{entry.nan_count:<6d} Inf:{entry.inf_count:<6d} {text}"
+            )
+        return ret
+
+
+class _ProfilingRegisterState(RegisterState):
+    def __init__(self, histogram: collections.Counter[int]):
+        super().__init__()
+        self._histogram = histogram
+
+    def _read_relative_constant(self, offset: int) -> np.ndarray:
+        indices, counts = np.unique(self.a0 + offset, return_counts=True)
+        self._histogram.update(dict(zip(indices.tolist(), counts.tolist(), strict=True)))
+        return super()._read_relative_constant(offset)
+
+
+class ProfilingEmulator(Emulator):
+    """An `Emulator` that records a `Profile` of every execution in its `profile` attribute."""
+
+    def __init__(self, program: Iterable[VshInstruction | list[int]], *, outputs: Iterable[str] | None = None):
+        super().__init__(program, outputs=outputs)
+        self.profile = Profile(self.program)
+        self._state = _ProfilingRegisterState(self.profile.a0_histogram)
+
+    def _run_chunk(self, inputs: np.ndarray, constants: np.ndarray, outputs: dict[str, np.ndarray]) -> None:
+        state = self._state
+        state.reset(inputs, constants)
+        num_lanes = int(np.prod(inputs.shape[:-2]))
+
+        for entry, instruction in zip(self.profile.instructions, self.program, strict=True):
+            start = time.perf_counter()
+            results = evaluate(instruction, state)
+            for destinations, value in results:
+                for destination in destinations:
+                    state.write(destination, value)
+            entry.seconds += time.perf_counter() - start
+            entry.lanes += num_lanes
+
+            for destinations, value in results:
+                for destination in destinations:
+                    if destination.file == FILE_ADDRESS:
+                        continue
+                    written = np.broadcast_to(value, state.temps.shape[1:])[..., list(destination.components)]
+                    entry.nan_count += int(np.count_nonzero(np.isnan(written)))
+                    entry.inf_count += int(np.count_nonzero(np.isinf(written)))
+
+        self.profile.chunks += 1
+        for name, index in self.output_indices().items():
+            outputs[name][:] = state.outputs[index]
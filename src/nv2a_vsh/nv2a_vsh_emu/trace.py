@@ -0,0 +1,312 @@
+"""Records the register writes performed by a program for selected vertices, and queries them afterwards.
+
+Layout (all integers little-endian):
+
+    header:   magic "NV2AVSHT" | u32 version | u32 vertex count | u32 instruction count | u32 record count
+    vertices: u32 index (into the traced inputs) of each traced vertex
+    records:  one entry per register write, in execution order:
+              u32 program counter | u8 register file | u8 register number | u8 component mask | u8 reserved |
+              u64 data offset | u32 data size
+    data:     one zlib compressed block per record
+
+Each record holds the written components of a single destination register for every traced vertex. The float32 (or
+A0 int32) bit patterns are delta encoded along the vertex axis, split into byte planes and compressed, which is very
+effective for the spatially coherent values of typical meshes. Records are independent, so the register state after
+any instruction is reconstructed by decoding only the last write to each register, without re-executing the program.
+"""
+
+from __future__ import annotations
+
+import mmap
+import struct
+import typing
+import zlib
+
+import numpy as np
+
+from nv2a_vsh.nv2a_vsh_asm.decoder import (
+    FILE_ADDRESS,
+    FILE_CONST,
+    FILE_OUTPUT,
+    FILE_TEMP,
+    Destination,
+    vsh_mask_components,
+)
+from nv2a_vsh.nv2a_vsh_emu.emulator import (
+    DEFAULT_OUTPUT,
+    NUM_CONSTANTS,
+    NUM_INPUTS,
+    NUM_OUTPUTS,
+    Emulator,
+    RegisterState,
+    as_float32,
+    evaluate,
+    vertex_array,
+)
+
+if typing.TYPE_CHECKING:
+    import os
+    from collections.abc import Iterable, Sequence
+
+    from typing_extensions import Self
+
+    from nv2a_vsh.nv2a_vsh_asm.decoder import DecodedInstruction
+    from nv2a_vsh.nv2a_vsh_asm.vsh_instruction import VshInstruction
+
+MAGIC = b"NV2AVSHT"
+_VERSION = 1
+_HEADER = struct.Struct("<8sIIII")
+_RECORD = struct.Struct("<IBBBxQI")
+_FILES = (FILE_TEMP, FILE_OUTPUT, FILE_CONST, FILE_ADDRESS)
+_COMPRESSION_LEVEL = 6
+
+# The value of register components that have not been written. The initial values of constants are not recorded.
+_INITIAL_VALUES = {
+    FILE_TEMP: (0.0, 0.0, 0.0, 0.0),
+    FILE_OUTPUT: DEFAULT_OUTPUT,
+    FILE_CONST: (np.nan, np.nan, np.nan, np.nan),
+}
+
+
+class TraceWrite(typing.NamedTuple):
+    """A register write recorded in a trace.
+
+    `values` holds the written components for each traced vertex as a (V, len(components)) float32 array (int32 for
+    A0).
+    """
+
+    pc: int
+    destination: Destination
+    values: np.ndarray
+
+
+def _component_mask(components: Iterable[int]) -> int:
+    """Converts component indices into a VSH style mask (X = 8 ... W = 1)."""
+    ret = 0
+    for component in components:
+        ret |= 0x8 >> component
+    return ret
+
+
+def _encode(values: np.ndarray) -> bytes:
+    words = np.ascontiguousarray(values).view(np.uint32)
+    deltas = np.diff(words, axis=0, prepend=np.zeros((1, words.shape[1]), dtype=np.uint32))
+    planes = deltas.astype("<u4").view(np.uint8).reshape((*deltas.shape, 4)).transpose(2, 1, 0)
+    return zlib.compress(np.ascontiguousarray(planes).tobytes(), _COMPRESSION_LEVEL)
+
+
+def _decode(data: bytes, num_vertices: int, num_components: int, dtype: np.dtype) -> np.ndarray:
+    planes = np.frombuffer(zlib.decompress(data), dtype=np.uint8).reshape((4, num_components, num_vertices))
+    deltas = np.ascontiguousarray(planes.transpose(2, 1, 0)).view("<u4")[..., 0]
+    return np.cumsum(deltas, axis=0, dtype=np.uint32).view(dtype)
+
+
+def _written_values(state: RegisterState, destination: Destination) -> np.ndarray | None:
+    """Returns the current (V, n) values of the components of `destination`, or None if the write is discarded."""
+    if destination.file == FILE_ADDRESS:
+        return state.a0[:, np.newaxis].copy()
+    if destination.is_read_only:
+        return None
+    if destination.file == FILE_TEMP:
+        register = state.temps[destination.number]
+    elif destination.file == FILE_OUTPUT:
+        register = state.outputs[destination.number % NUM_OUTPUTS]
+    elif destination.number >= NUM_CONSTANTS:
+        return None
+    else:
+        register = state.written_constants[destination.number]
+    return register[:, list(destination.components)].copy()
+
+
+def _record_writes(
+    program: Sequence[DecodedInstruction], inputs: np.ndarray, constants: np.ndarray
+) -> list[tuple[int, Destination, np.ndarray]]:
+    """Executes every instruction of `program`, returning the values of each register write in execution order."""
+    state = RegisterState()
+    state.reset(inputs, constants)
+    ret = []
+    with np.errstate(all="ignore"):
+        for pc, instruction in enumerate(program):
+            results = evaluate(instruction, state)
+            for destinations, value in results:
+                for destination in destinations:
+                    state.write(destination, value)
+            for destinations, _value in results:
+                for destination in destinations:
+                    written = _written_values(state, destination)
+                    if written is not None:
+                        ret.append((pc, destination, written))
+    return ret
+
+
+def _select_vertices(inputs, indices: np.ndarray) -> np.ndarray:
+    vertices = vertex_array(inputs)
+    num_vertices = vertices.shape[0]
+    if indices.size and (indices.min() < 0 or indices.max() >= num_vertices):
+        msg = f"Traced vertex indices must be between 0 and {num_vertices - 1}"
+        raise ValueError(msg)
+    if isinstance(vertices, np.ndarray):
+        return np.asarray(vertices[indices], dtype=np.float32)
+    # Array-likes such as `VertexStream` only support slicing.
+    ret = np.empty((indices.size, NUM_INPUTS, 4), dtype=np.float32)
+    for position, index in enumerate(indices.tolist()):
+        ret[position] = vertices[index : index + 1][0]
+    return ret
+
+
+def record_trace(
+    program: Iterable[VshInstruction | list[int]],
+    inputs,
+    constants=None,
+    *,
+    vertices: Sequence[int] | None = None,
+    outfile: typing.BinaryIO,
+) -> None:
+    """Executes `program` for the selected vertices of `inputs` and writes a trace of every register write.
+
+    Every instruction is executed (as on the hardware), even if it does not contribute to an output.
+
+    :param inputs: (N, 16, 4) vertex attributes of any numeric type, or a `VertexStream`.
+    :param constants: (192, 4) constant registers. Defaults to all zeros.
+    :param vertices: The indices of the vertices to trace. Defaults to every vertex.
+    :param outfile: The binary stream to which the trace is written.
+    """
+    if vertices is None:
+        vertices = range(vertex_array(inputs).shape[0])
+    vertex_indices = np.asarray(vertices, dtype=np.int64).reshape(-1)
+    selected = _select_vertices(inputs, vertex_indices)
+    if constants is None:
+        constants = np.zeros((NUM_CONSTANTS, 4), dtype=np.float32)
+    constants = as_float32(constants, (NUM_CONSTANTS, 4), "constants")
+
+    decoded = Emulator(program).program
+    writes = _record_writes(decoded, selected, constants)
+
+    blobs = [_encode(values) for _pc, _destination, values in writes]
+    offset = _HEADER.size + 4 * len(vertex_indices) + _RECORD.size * len(writes)
+    outfile.write(_HEADER.pack(MAGIC, _VERSION, len(vertex_indices), len(decoded), len(writes)))
+    outfile.write(vertex_indices.astype("<u4").tobytes())
+    for (pc, destination, _values), blob in zip(writes, blobs, strict=True):
+        outfile.write(
+            _RECORD.pack(
+                pc,
+                _FILES.index(destination.file),
+                destination.number,
+                _component_mask(destination.components),
+                offset,
+                len(blob),
+            )
+        )
+        offset += len(blob)
+    for blob in blobs:
+        outfile.write(blob)
+
+
+class Trace:
+    """Read-only view of a trace written by `record_trace`.
+
+    :param path: The path to the trace file, which is memory mapped.
+    """
+
+    def __init__(self, path: str | os.PathLike):
+        with open(path, "rb") as infile:
+            self._mmap = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._read_header(path)
+        except (ValueError, struct.error):
+            self._mmap.close()
+            raise
+
+    def _read_header(self, path: str | os.PathLike) -> None:
+        magic, version, num_vertices, num_instructions, num_records = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            msg = f"'{path}' is not a vertex shader trace"
+            raise ValueError(msg)
+        if version != _VERSION:
+            msg = f"Unsupported trace version {version}"
+            raise ValueError(msg)
+        self.num_instructions = num_instructions
+        self.vertices = np.frombuffer(self._mmap, dtype="<u4", count=num_vertices, offset=_HEADER.size).tolist()
+
+        self._records = []
+        position = _HEADER.size + 4 * num_vertices
+        for _ in range(num_records):
+            pc, file_code, number, mask, offset, size = _RECORD.unpack_from(self._mmap, position)
+            position += _RECORD.size
+            destination = Destination(_FILES[file_code], number, vsh_mask_components(mask))
+            self._records.append((pc, destination, offset, size))
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *_args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def __len__(self) -> int:
+        """Returns the number of recorded register writes."""
+        return len(self._records)
+
+    def _values(self, destination: Destination, offset: int, size: int) -> np.ndarray:
+        dtype = np.dtype("<i4") if destination.file == FILE_ADDRESS else np.dtype("<f4")
+        return _decode(self._mmap[offset : offset + size], len(self.vertices), len(destination.components), dtype)
+
+    def writes(self, pc: int | None = None) -> list[TraceWrite]:
+        """Returns the register writes performed by the instruction at `pc`, or every write if `pc` is None."""
+        return [
+            TraceWrite(record_pc, destination, self._values(destination, offset, size))
+            for record_pc, destination, offset, size in self._records
+            if pc is None or record_pc == pc
+        ]
+
+    def state(self, pc: int) -> dict[str, np.ndarray]:
+        """Returns the value of every register written by the instructions up to and including `pc`.
+
+        :return: A dictionary mapping register names (e.g., `R0`, `oPos`, `c[5]`, `A0`) to (V, 4) float32 arrays (or a
+            (V,) int32 array for `A0`). Components that have not been written yet hold their initial value: 0 for
+            temporaries, (0, 0, 0, 1) for outputs and NaN for constants, whose initial values are not recorded.
+        """
+        # Only the most recent write of each register component determines its value.
+        latest: dict[tuple[str, int, int], tuple[Destination, int, int, int]] = {}
+        for record_pc, destination, offset, size in self._records:
+            if record_pc > pc:
+                break
+            for position, component in enumerate(destination.components):
+                latest[(destination.file, destination.number, component)] = (destination, offset, size, position)
+
+        ret: dict[str, np.ndarray] = {}
+        decoded: dict[int, np.ndarray] = {}
+        num_vertices = len(self.vertices)
+        for (register_file, _number, component), (destination, offset, size, position) in latest.items():
+            name = destination.name
+            if register_file == FILE_ADDRESS:
+                ret[name] = self._decoded(decoded, destination, offset, size)[:, 0]
+                continue
+            register = ret.get(name)
+            if register is None:
+                register = np.empty((num_vertices, 4), dtype=np.float32)
+                register[:] = _INITIAL_VALUES[register_file]
+                ret[name] = register
+            register[:, component] = self._decoded(decoded, destination, offset, size)[:, position]
+        return ret
+
+    def _decoded(self, cache: dict[int, np.ndarray], destination: Destination, offset: int, size: int) -> np.ndarray:
+        values = cache.get(offset)
+        if values is None:
+            values = self._values(destination, offset, size)
+            cache[offset] = values
+        return values
+
+    def history(self, register: str, vertex: int) -> list[tuple[int, np.ndarray]]:
+        """Returns the (pc, written components) of every write to the named register for the given traced vertex.
+
+        :param vertex: The index of the vertex in the traced inputs (one of `vertices`).
+        """
+        position = self.vertices.index(vertex)
+        return [
+            (record_pc, self._values(destination, offset, size)[position])
+            for record_pc, destination, offset, size in self._records
+            if destination.name == register
+        ]
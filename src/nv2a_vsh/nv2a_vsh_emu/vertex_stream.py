@@ -0,0 +1,247 @@
+"""Reads emulator inputs directly from raw (interleaved) vertex buffers.
+
+Each input register is described by a `VertexAttribute`, mirroring the fields of the nv2a
+`NV097_SET_VERTEX_DATA_ARRAY_FORMAT` registers: the attribute's byte offset within the buffer, the stride between
+vertices, the number of components and the component type. Buffers are accessed through zero-copy strided views
+(memory mapped when given a path) and are only converted to float32 one chunk at a time as the emulator reads them.
+"""
+
+from __future__ import annotations
+
+import enum
+import os
+import typing
+
+import numpy as np
+
+from nv2a_vsh.nv2a_vsh_asm.vsh_encoder_defs import InputRegisters
+from nv2a_vsh.nv2a_vsh_emu.emulator import NUM_INPUTS
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Iterator, Mapping
+
+# The value of each input register component that is not provided by a vertex attribute.
+DEFAULT_INPUT = (0.0, 0.0, 0.0, 1.0)
+
+_FORMAT_TYPE_MASK = 0x0F
+_FORMAT_SIZE_SHIFT = 4
+_FORMAT_SIZE_MASK = 0x0F
+_FORMAT_STRIDE_SHIFT = 8
+
+# D3DCOLOR values are stored as B, G, R, A bytes.
+_D3DCOLOR_SWIZZLE = [2, 1, 0, 3]
+
+
+class AttributeType(enum.IntEnum):
+    """Vertex attribute component types, as encoded in the NV097_SET_VERTEX_DATA_ARRAY_FORMAT type field."""
+
+    # Normalized unsigned bytes in D3DCOLOR (B, G, R, A) order.
+    UB_D3D = 0
+    # Normalized signed shorts.
+    S1 = 1
+    # 32-bit floats.
+    F = 2
+    # Normalized unsigned bytes in R, G, B, A order.
+    UB_OGL = 4
+    # Unnormalized signed shorts.
+    S32K = 5
+    # Three normalized signed components packed into 11:11:10 bits of a 32-bit word.
+    CMP = 6
+
+
+# The storage type of a single component (or, for CMP, of the packed value) of each attribute type.
+_STORAGE_DTYPES: dict[AttributeType, np.dtype] = {
+    AttributeType.UB_D3D: np.dtype(np.uint8),
+    AttributeType.S1: np.dtype("<i2"),
+    AttributeType.F: np.dtype("<f4"),
+    AttributeType.UB_OGL: np.dtype(np.uint8),
+    AttributeType.S32K: np.dtype("<i2"),
+    AttributeType.CMP: np.dtype("<u4"),
+}
+
+_MAX_COMPONENTS = 4
+
+
+class VertexAttribute(typing.NamedTuple):
+    """Describes where and how the value of one input register is stored in a vertex buffer.
+
+    :param offset: The byte offset of the attribute of the first vertex.
+    :param stride: The number of bytes between consecutive vertices.
+    :param size: The number of components (1 - 4). CMP attributes always have 3 components.
+    :param type: The component type.
+    """
+
+    offset: int
+    stride: int
+    size: int
+    type: AttributeType = AttributeType.F
+
+    @classmethod
+    def from_format(cls, offset: int, value: int) -> VertexAttribute:
+        """Creates an attribute from the value of an NV097_SET_VERTEX_DATA_ARRAY_FORMAT register."""
+        attribute_type = AttributeType(value & _FORMAT_TYPE_MASK)
+        size = (value >> _FORMAT_SIZE_SHIFT) & _FORMAT_SIZE_MASK
+        if attribute_type == AttributeType.CMP:
+            size = 3
+        return cls(offset, value >> _FORMAT_STRIDE_SHIFT, size, attribute_type)
+
+    @property
+    def element_size(self) -> int:
+        """Returns the number of bytes occupied by the attribute of a single vertex."""
+        storage = _STORAGE_DTYPES[self.type]
+        return storage.itemsize if self.type == AttributeType.CMP else storage.itemsize * self.size
+
+    def validate(self) -> None:
+        if self.type == AttributeType.CMP:
+            if self.size != 3:  # noqa: PLR2004 Magic value used in comparison
+                msg = f"CMP attributes have 3 components, not {self.size}"
+                raise ValueError(msg)
+        elif not 1 <= self.size <= _MAX_COMPONENTS:
+            msg = f"Attribute component count must be between 1 and {_MAX_COMPONENTS} but is {self.size}"
+            raise ValueError(msg)
+        if self.offset < 0 or self.stride < 0:
+            msg = f"Invalid attribute offset {self.offset} or stride {self.stride}"
+            raise ValueError(msg)
+
+
+def _register_index(register: InputRegisters | int | str) -> int:
+    if isinstance(register, str):
+        try:
+            return int(InputRegisters[register.upper()])
+        except KeyError:
+            msg = f"Unknown input register '{register}'"
+            raise ValueError(msg) from None
+    index = int(register)
+    if not 0 <= index < NUM_INPUTS:
+        msg = f"Input register index {index} is out of range"
+        raise ValueError(msg)
+    return index
+
+
+def _unpack_cmp(packed: np.ndarray) -> np.ndarray:
+    """Converts (n,) packed 11:11:10 values into (n, 3) normalized float32 components."""
+    signed = packed.astype(np.int32)
+    ret = np.empty((packed.shape[0], 3), dtype=np.float32)
+    # Shift each field to the top of the word and arithmetic shift it back down to sign extend it.
+    ret[:, 0] = (signed << 21 >> 21) / np.float32(1023.0)
+    ret[:, 1] = (signed << 10 >> 21) / np.float32(1023.0)
+    ret[:, 2] = (signed >> 22) / np.float32(511.0)
+    return np.maximum(ret, np.float32(-1.0))
+
+
+def convert_components(values: np.ndarray, attribute_type: AttributeType) -> np.ndarray:
+    """Converts (n, size) stored components (or (n,) packed CMP values) of the given type into float32."""
+    if attribute_type == AttributeType.F:
+        return values.astype(np.float32)
+    if attribute_type == AttributeType.UB_D3D:
+        ret = values.astype(np.float32) / np.float32(255.0)
+        return ret[:, _D3DCOLOR_SWIZZLE] if ret.shape[1] == _MAX_COMPONENTS else ret
+    if attribute_type == AttributeType.UB_OGL:
+        return values.astype(np.float32) / np.float32(255.0)
+    if attribute_type == AttributeType.S1:
+        return np.maximum(values.astype(np.float32) / np.float32(32767.0), np.float32(-1.0))
+    if attribute_type == AttributeType.S32K:
+        return values.astype(np.float32)
+    return _unpack_cmp(values)
+
+
+class VertexStream:
+    """Presents a raw vertex buffer as the (N, 16, 4) float32 inputs of the emulator.
+
+    Instances may be passed to `Emulator.run` and `Emulator.stream` in place of an input array. Indexing with a slice
+    converts just the requested vertices.
+
+    :param buffer: A path to a file, which is memory mapped, or any object supporting the buffer protocol.
+    :param attributes: Maps input registers (`InputRegisters` members, their names such as `"REG_POS"` or `"V9"`,
+        or register indices) to the attribute that provides their value. Registers without an attribute (and
+        components beyond an attribute's size) read as (0, 0, 0, 1).
+    :param num_vertices: The number of vertices. Defaults to the number of complete vertices in the buffer.
+    """
+
+    def __init__(
+        self,
+        buffer: str | os.PathLike | bytes | bytearray | memoryview | np.ndarray,
+        attributes: Mapping[InputRegisters | int | str, VertexAttribute],
+        num_vertices: int | None = None,
+    ):
+        self._data: np.ndarray
+        if isinstance(buffer, (str, os.PathLike)):
+            self._data = np.memmap(buffer, dtype=np.uint8, mode="r")
+        else:
+            self._data = np.frombuffer(buffer, dtype=np.uint8)
+
+        self.attributes: dict[int, VertexAttribute] = {}
+        for register, attribute in attributes.items():
+            attribute.validate()
+            self.attributes[_register_index(register)] = attribute
+
+        available = {index: self._available_vertices(attribute) for index, attribute in self.attributes.items()}
+        if num_vertices is None:
+            limits = [count for count in available.values() if count is not None]
+            if not limits and self.attributes:
+                msg = "num_vertices must be given if every attribute has a zero stride"
+                raise ValueError(msg)
+            num_vertices = min(limits, default=0)
+        for index, count in available.items():
+            if count is not None and num_vertices > count:
+                msg = f"Attribute for v{index} extends beyond the end of the buffer"
+                raise ValueError(msg)
+        self.num_vertices = num_vertices
+
+        self._views = {index: self._view(attribute) for index, attribute in self.attributes.items()}
+
+    def _available_vertices(self, attribute: VertexAttribute) -> int | None:
+        """Returns the number of complete attribute values in the buffer, or None if unlimited."""
+        remaining = self._data.shape[0] - attribute.offset - attribute.element_size
+        if remaining < 0:
+            return 0
+        if attribute.stride == 0:
+            # A zero stride repeats a single value for every vertex.
+            return None
+        return remaining // attribute.stride + 1
+
+    def _view(self, attribute: VertexAttribute) -> np.ndarray:
+        """Returns a zero-copy strided view of the stored components of `attribute` for every vertex."""
+        storage = _STORAGE_DTYPES[attribute.type]
+        if attribute.type == AttributeType.CMP:
+            shape: tuple[int, ...] = (self.num_vertices,)
+            strides: tuple[int, ...] = (attribute.stride,)
+        else:
+            shape = (self.num_vertices, attribute.size)
+            strides = (attribute.stride, storage.itemsize)
+        return np.ndarray(shape, dtype=storage, buffer=self._data, offset=attribute.offset, strides=strides)
+
+    def __len__(self) -> int:
+        return self.num_vertices
+
+    @property
+    def shape(self) -> tuple[int, int, int]:
+        return (self.num_vertices, NUM_INPUTS, 4)
+
+    @property
+    def ndim(self) -> int:
+        return len(self.shape)
+
+    def __getitem__(self, key: slice) -> np.ndarray:
+        """Converts the vertices selected by `key` into an (n, 16, 4) float32 array."""
+        if not isinstance(key, slice):
+            msg = "VertexStream only supports slicing"
+            raise TypeError(msg)
+        start, stop, step = key.indices(self.num_vertices)
+        count = len(range(start, stop, step))
+        ret = np.empty((count, NUM_INPUTS, 4), dtype=np.float32)
+        ret[...] = DEFAULT_INPUT
+        for index, view in self._views.items():
+            attribute = self.attributes[index]
+            values = convert_components(view[start:stop:step], attribute.type)
+            ret[:, index, : values.shape[1]] = values
+        return ret
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        ret = self[:]
+        return ret if dtype is None else ret.astype(dtype)
+
+    def chunks(self, chunk_size: int) -> Iterator[np.ndarray]:
+        """Yields the converted inputs of consecutive groups of at most `chunk_size` vertices."""
+        for start in range(0, self.num_vertices, max(1, chunk_size)):
+            yield self[start : start + chunk_size]
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+"""Searches encoded nv2a vertex shader programs for instructions matching field predicates."""
+
+# ruff: noqa: T201 `print` found
+
+from __future__ import annotations
+
+import argparse
+import functools
+import logging
+import operator
+import os
+import sys
+
+from nv2a_vsh import disassemble
+from nv2a_vsh.nv2a_vsh_asm import search_index, vsh_instruction
+
+
+def _main(args):
+    log_level = logging.DEBUG if args.verbose else logging.INFO
+    logging.basicConfig(level=log_level)
+
+    index_file = os.path.abspath(os.path.expanduser(args.index)) if args.index else None
+    if index_file and os.path.isfile(index_file):
+        with open(index_file, encoding="utf-8") as infile:
+            index = search_index.ProgramIndex.load(infile)
+    else:
+        index = search_index.ProgramIndex()
+
+    for input_path in args.inputs:
+        input_file = os.path.abspath(os.path.expanduser(input_path))
+        if not os.path.isfile(input_file):
+            print(f"Failed to open input file '{input_path}'", file=sys.stderr)
+            return 1
+        for name, values in disassemble.load_programs(input_file, text=args.text, label=input_path):
+            index.add_program(name, values)
+
+    if index_file and args.inputs:
+        with open(index_file, "w", encoding="utf-8") as outfile:
+            index.save(outfile)
+
+    if not args.query:
+        return 0
+
+    try:
+        predicates = [search_index.parse_term(term) for term in args.query]
+    except ValueError as err:
+        print(err, file=sys.stderr)
+        return 1
+
+    combine = operator.or_ if args.any else operator.and_
+    predicate = functools.reduce(combine, predicates)
+
+    if args.list_programs:
+        for program in index.matching_programs(predicate):
+            print(program)
+        return 0
+
+    vsh_ins = vsh_instruction.VshInstruction()
+    for match in index.search(predicate):
+        vsh_ins.set_values(index.instruction(match))
+        print(f"{match.program}:{match.instruction}: {vsh_ins.disassemble()}")
+
+    return 0
+
+
+def entrypoint():
+    """The main entrypoint for this program."""
+
+    def _parse_args():
+        parser = argparse.ArgumentParser()
+
+        parser.add_argument(
+            "inputs",
+            nargs="*",
+            metavar="source_path",
+            help="Machine code files or archives to add to the index.",
+        )
+
+        parser.add_argument(
+            "-i",
+            "--index",
+            metavar="index_path",
+            help="Path to a persistent index. It is loaded if it exists and updated with any given source files.",
+        )
+
+        parser.add_argument(
+            "-q",
+            "--query",
+            action="append",
+            metavar="FIELD=VALUE",
+            help=(
+                "Predicate an instruction must satisfy, e.g. 'MAC=MUL', 'ILU=RCC', 'A0X=1', 'OUT_ADDRESS=oFog', or "
+                "'ILU!=NOP'. May be specified multiple times."
+            ),
+        )
+
+        parser.add_argument(
+            "--any",
+            action="store_true",
+            help="Match instructions satisfying any query predicate instead of all of them.",
+        )
+
+        parser.add_argument(
+            "-l",
+            "--list-programs",
+            action="store_true",
+            help="Only print the names of programs containing a match.",
+        )
+
+        parser.add_argument(
+            "-t",
+            "--text",
+            action="store_true",
+            help=(
+                "Treat the source files as textual, they must contain a list of hexadecimal integers separated by "
+                "commas."
+            ),
+        )
+
+        parser.add_argument(
+            "-v",
+            "--verbose",
+            help="Enables verbose logging information",
+            action="store_true",
+        )
+
+        return parser.parse_args()
+
+    sys.exit(_main(_parse_args()))
+
+
+if __name__ == "__main__":
+    entrypoint()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+"""Verifies that nv2a vertex shader machine code survives a disassemble -> assemble round trip."""
+
+# ruff: noqa: T201 `print` found
+
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import sys
+
+from nv2a_vsh import disassemble
+from nv2a_vsh.nv2a_vsh_asm import round_trip
+
+
+def _main(args):
+    log_level = logging.DEBUG if args.verbose else logging.INFO
+    logging.basicConfig(level=log_level)
+
+    programs = []
+    for input_path in args.inputs:
+        input_file = os.path.abspath(os.path.expanduser(input_path))
+        if not os.path.isfile(input_file):
+            print(f"Failed to open input file '{input_path}'", file=sys.stderr)
+            return 1
+        programs.extend(disassemble.load_programs(input_file, text=args.text, label=input_path))
+
+    report = round_trip.verify_corpus(
+        programs,
+        ignore_final_flag=args.ignore_final,
+        ignore_unused_fields=args.ignore_unused,
+        max_workers=args.jobs,
+    )
+    print(report.summary(max_examples=args.examples))
+    if args.verbose:
+        for name, diff in report.diffs.items():
+            print(f"\n{name}:\n{diff}", end="")
+
+    return 0 if report.ok else 1
+
+
+def entrypoint():
+    """The main entrypoint for this program."""
+
+    def _parse_args():
+        parser = argparse.ArgumentParser()
+
+        parser.add_argument(
+            "inputs",
+            nargs="+",
+            metavar="source_path",
+            help="Machine code files or archives to verify.",
+        )
+
+        parser.add_argument(
+            "-t",
+            "--text",
+            action="store_true",
+            help=(
+                "Treat the source files as textual, they must contain a list of hexadecimal integers separated by "
+                "commas."
+            ),
+        )
+
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            help="Number of worker processes to use. Defaults to the number of CPUs.",
+        )
+
+        parser.add_argument(
+            "-f",
+            "--ignore-final",
+            action="store_true",
+            help="Ignore differences in the FINAL flag.",
+        )
+
+        parser.add_argument(
+            "-u",
+            "--ignore-unused",
+            action="store_true",
+            help="Ignore differences in fields that are not used by the original instruction.",
+        )
+
+        parser.add_argument(
+            "-e",
+            "--examples",
+            type=int,
+            default=3,
+            help="Maximum number of example instructions to print for each differing field.",
+        )
+
+        parser.add_argument(
+            "-v",
+            "--verbose",
+            help="Enables verbose logging information and prints the differences of each mismatched program",
+            action="store_true",
+        )
+
+        return parser.parse_args()
+
+    sys.exit(_main(_parse_args()))
+
+
+if __name__ == "__main__":
+    entrypoint()
@@ -0,0 +1,26 @@
+"""Shared fixtures for the test suite."""
+
+from __future__ import annotations
+
+import typing
+
+import pytest
+
+from nv2a_vsh.nv2a_vsh_asm.assembler import Assembler
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Callable
+
+
+def _assemble(source: str, **kwargs) -> Assembler:
+    kwargs.setdefault("inline_final_flag", True)
+    asm = Assembler(source)
+    assert asm.assemble(**kwargs), [error.message for error in asm.errors]
+    return asm
+
+
+@pytest.fixture
+def assemble() -> Callable[..., Assembler]:
+    """Returns a function that assembles `source` with the given `Assembler.assemble` options, failing the test if
+    assembly fails. The FINAL flag is inlined unless `inline_final_flag=False` is given."""
+    return _assemble
@@ -0,0 +1,107 @@
+"""Tests for the program archive format."""
+
+# pylint: disable=missing-function-docstring
+
+from __future__ import annotations
+
+import io
+import os
+
+import pytest
+
+from nv2a_vsh import disassemble
+from nv2a_vsh.nv2a_vsh_asm import archive
+
+_PROGRAM_A = [
+    [0x00000000, 0x0020161B, 0x0836106C, 0x2070F858],
+    [0x00000000, 0x0400001B, 0x083613FC, 0x2070F82D],
+]
+_PROGRAM_B = [[0x00000000, 0x0420061B, 0x083613FC, 0x5011F819]]
+
+
+def _write(tmp_path, programs) -> str:
+    path = os.path.join(tmp_path, "programs.vsha")
+    with open(path, "wb") as outfile:
+        archive.write_archive(programs, outfile)
+    return path
+
+
+def test_name_hash_is_fnv1a() -> None:
+    assert archive.name_hash("") == 0xCBF29CE484222325
+    assert archive.name_hash("a") == 0xAF63DC4C8601EC8C
+
+
+def test_program_views(tmp_path) -> None:
+    path = _write(tmp_path, {"a": _PROGRAM_A, "b": _PROGRAM_B})
+
+    with archive.ProgramArchive(path) as program_archive:
+        assert len(program_archive) == 2
+        assert sorted(program_archive.names) == ["a", "b"]
+        assert "a" in program_archive
+        assert "c" not in program_archive
+
+        with program_archive.program("a") as view:
+            assert view.shape == (2, 4)
+            assert view.readonly
+            assert view[1, 3] == 0x2070F82D
+            assert view.tolist() == _PROGRAM_A
+
+        with program_archive.program_by_hash(archive.name_hash("b")) as view:
+            assert view.tolist() == _PROGRAM_B
+
+        assert program_archive.values("b") == _PROGRAM_B
+
+
+def test_program_blobs_are_aligned(tmp_path) -> None:
+    path = _write(tmp_path, {"a": _PROGRAM_A, "a_much_longer_name": _PROGRAM_B})
+
+    with archive.ProgramArchive(path) as program_archive:
+        for name in program_archive.names:
+            entry = program_archive._find(name)  # noqa: SLF001
+            assert entry is not None
+            _hash, _name_offset, _name_length, offset, _count = entry
+            assert offset % 16 == 0
+
+
+def test_missing_program(tmp_path) -> None:
+    path = _write(tmp_path, {"a": _PROGRAM_A})
+
+    with archive.ProgramArchive(path) as program_archive:
+        with pytest.raises(KeyError):
+            program_archive.program("b")
+        with pytest.raises(KeyError):
+            program_archive.program_by_hash(archive.name_hash("b"))
+
+
+def test_empty_program_is_rejected() -> None:
+    with pytest.raises(ValueError, match="empty"):
+        archive.write_archive({"a": []}, io.BytesIO())
+
+
+def test_not_an_archive(tmp_path) -> None:
+    path = os.path.join(tmp_path, "bogus.bin")
+    with open(path, "wb") as outfile:
+        outfile.write(b"\x00" * 32)
+
+    with pytest.raises(ValueError, match="not a vertex shader archive"):
+        archive.ProgramArchive(path)
+
+
+def test_update_archive(tmp_path) -> None:
+    path = os.path.join(tmp_path, "programs.vsha")
+    archive.update_archive(path, "a", _PROGRAM_A)
+    archive.update_archive(path, "b", _PROGRAM_A)
+    archive.update_archive(path, "b", _PROGRAM_B)
+
+    with archive.ProgramArchive(path) as program_archive:
+        assert sorted(program_archive.names) == ["a", "b"]
+        assert program_archive.values("a") == _PROGRAM_A
+        assert program_archive.values("b") == _PROGRAM_B
+
+
+def test_load_programs_from_archive(tmp_path) -> None:
+    path = _write(tmp_path, {"a": _PROGRAM_A, "b": _PROGRAM_B})
+
+    programs = dict(disassemble.load_programs(path, text=False, label="programs"))
+
+    assert programs == {"programs:a": _PROGRAM_A, "programs:b": _PROGRAM_B}
@@ -0,0 +1,110 @@
+"""Tests for common subexpression elimination."""
+
+# pylint: disable=missing-function-docstring
+
+from __future__ import annotations
+
+import os
+import pathlib
+
+import pytest
+
+_RESOURCE_PATH = os.path.dirname(pathlib.Path(__file__).resolve())
+
+
+def test_repeated_matmul_expansion(assemble) -> None:
+    source = "#m matrix4 96\n%matmul4x4 r0 v0 #m\n%matmul4x4 r1 v0 #m\nmov oPos, r0\nadd oD0, r1, c[0]"
+    asm = assemble(source, eliminate_common_subexpressions=True)
+    assert asm.comments == [
+        "dp4 r0.x, v0, c96",
+        "dp4 r0.y, v0, c97",
+        "dp4 r0.z, v0, c98",
+        "dp4 r0.w, v0, c99",
+        "mov oPos, r0",
+        "add oDiffuse, r0, c0",
+    ]
+    assert asm.common_subexpression_result is not None
+    assert asm.common_subexpression_result.report() == [
+        "Removed redundant instruction 'dp4 r1.x, v0, c96'",
+        "Removed redundant instruction 'dp4 r1.y, v0, c97'",
+        "Removed redundant instruction 'dp4 r1.z, v0, c98'",
+        "Removed redundant instruction 'dp4 r1.w, v0, c99'",
+        "Rewrote 'add oDiffuse, r1, c0' to 'add oDiffuse, r0, c0'",
+    ]
+
+
+def test_repeated_norm_expansion(assemble) -> None:
+    asm = assemble(
+        "%norm3 r2 v2 r0\n%norm3 r3 v2 r1\nmul oPos, r2, r3\nmov oD0, r1.w", eliminate_common_subexpressions=True
+    )
+    assert asm.comments == [
+        "dp3 r0.x, v2, v2",
+        "rsq r0.w, r0.xxxx",
+        "mul r2.xyz, v2, r0.wwww",
+        "mul r3.xyz, v2, r0.wwww",
+        "mul oPos, r2, r3",
+        "mov oDiffuse, r0.wwww",
+    ]
+
+
+def test_commutative_operands_and_output_results(assemble) -> None:
+    # The earlier result is only held by oPos, so it is read through R12.
+    asm = assemble("DP4 oPos, v0, c[0]\nDP4 R0, c[0], v0\nMOV oD0, R0.x", eliminate_common_subexpressions=True)
+    assert asm.comments == ["dp4 oPos, v0, c0", "mov oDiffuse, r12.xxxx"]
+
+
+def test_negated_results(assemble) -> None:
+    asm = assemble("MOV R0, -v1\nMOV R1, v1\nADD oPos, R1, -R0.wzyx", eliminate_common_subexpressions=True)
+    assert asm.comments == ["mov r0, -v1", "add oPos, -r0, -r0.wzyx"]
+
+
+def test_overwritten_results_are_recomputed(assemble) -> None:
+    source = "MUL R0, v0, c[0]\nMOV R0, v1\nMUL R1, v0, c[0]\nADD oPos, R1, R0"
+    assert assemble(source, eliminate_common_subexpressions=True).comments == [
+        "mul r0, v0, c0",
+        "mov r0, v1",
+        "mul r1, v0, c0",
+        "add oPos, r1, r0",
+    ]
+
+
+def test_overwritten_inputs_are_recomputed(assemble) -> None:
+    source = "MUL R0, v0, R2\nMOV R2, v1\nMUL R1, v0, R2\nADD oPos, R1, R0"
+    asm = assemble(source, eliminate_common_subexpressions=True)
+    assert asm.comments == ["mul r0, v0, r2", "mov r2, v1", "mul r1, v0, r2", "add oPos, r1, r0"]
+    assert asm.common_subexpression_result is not None
+    assert not asm.common_subexpression_result.report()
+
+
+def test_relative_reads_depend_on_a0(assemble) -> None:
+    source = "ARL A0, v1.x\nMOV R0, c[A0+4]\nARL A0, v2.x\nMOV R1, c[A0+4]\nADD oPos, R0, R1"
+    assert len(assemble(source, eliminate_common_subexpressions=True).comments) == 5
+
+    source = "ARL A0, v1.x\nMOV R0, c[A0+4]\nMOV R1, c[A0+4]\nADD oPos, R0, R1"
+    comments = assemble(source, eliminate_common_subexpressions=True).comments
+    assert len(comments) == 3
+    assert comments[2] == "add oPos, r0, r0"
+
+
+def test_paired_instructions_are_kept(assemble) -> None:
+    source = "MUL R0, v0, c[0]\nMUL R2, v0, c[0] + RCP R1.x, v1.w\nADD oPos, R2, R1.x"
+    assert len(assemble(source, eliminate_common_subexpressions=True).comments) == 3
+
+
+@pytest.mark.parametrize("name", ["all.vsh", "ngb_lava.vsh", "set_pos_and_color.vsh", "simple.vsh"])
+def test_preserves_results(name: str, assemble) -> None:
+    np = pytest.importorskip("numpy")
+    emulator = pytest.importorskip("nv2a_vsh.nv2a_vsh_emu")
+
+    with open(os.path.join(_RESOURCE_PATH, name)) as infile:
+        source = infile.read()
+    original = assemble(source)
+    optimized = assemble(source, eliminate_common_subexpressions=True)
+
+    rng = np.random.default_rng(13)
+    inputs = rng.standard_normal((64, 16, 4)).astype(np.float32)
+    constants = rng.standard_normal((192, 4)).astype(np.float32)
+    expected = emulator.Emulator(original.output).run(inputs, constants)
+    actual = emulator.Emulator(optimized.output).run(inputs, constants)
+    for register, values in expected.items():
+        np.testing.assert_array_equal(actual[register], values)
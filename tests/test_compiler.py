@@ -0,0 +1,143 @@
+"""Tests for the vertex shader to NumPy kernel compiler."""
+
+# pylint: disable=missing-function-docstring
+# pylint: disable=wrong-import-order
+
+from __future__ import annotations
+
+import os
+import pathlib
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from nv2a_vsh.nv2a_vsh_asm.decoder import FILE_OUTPUT, FILE_TEMP, decode_program  # noqa: E402
+from nv2a_vsh.nv2a_vsh_asm.vsh_instruction import VshInstruction  # noqa: E402
+from nv2a_vsh.nv2a_vsh_emu import (  # noqa: E402 Module level import not at top of file
+    Emulator,
+    compile_program,
+    compiler,
+    liveness,
+)
+
+_RESOURCE_PATH = os.path.dirname(pathlib.Path(__file__).resolve())
+
+
+def _inputs(num_vertices: int = 16, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(-4.0, 4.0, (num_vertices, 16, 4)).astype(np.float32)
+
+
+def _constants(seed: int = 1):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(-4.0, 4.0, (192, 4)).astype(np.float32)
+
+
+def _assert_matches_interpreter(program: list[list[int]], inputs=None, constants=None) -> None:
+    inputs = _inputs() if inputs is None else inputs
+    constants = _constants() if constants is None else constants
+
+    expected = Emulator(program).run(inputs, constants)
+    actual = compiler.CompiledProgram(program).run(inputs, constants)
+    assert set(actual) == set(expected)
+    for name, value in expected.items():
+        np.testing.assert_array_equal(actual[name], value, err_msg=name)
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        "MOV oPos, v0\nMOV oD0.yw, -v3.zxwy",
+        "MOV R1, v1\nMUL R0, R1, v2\nADD R0.xz, R0, -c[3].w\nMAD oPos, R0, c[4], v5",
+        "MOV R1, v1\nDP3 oPos.x, R1, v2\nDPH oPos.y, R1, v2\nDP4 oPos.zw, R1, v2",
+        "MOV R1, v1\nDST oD0, R1, v2\nMIN oD1, R1, v2\nMAX oT0, R1, v2\nSLT oT1, R1, v2\nSGE oT2, R1, v2",
+        "RCP oD0, v1.x\nRCC oD1, v1.y\nRSQ oT0, v1.z\nEXPP oT1, v1.w\nLOGP oT2, v1.x\nLIT oT3, v1",
+        "MOV R1, v1\nMOV R2, R1 + RCP R1.x, R1.y\nMOV oD0, R1\nMOV oD1, R2",
+        "MOV oPos, v0\nMOV oD0, R12\nADD oPos.xy, R12, v1",
+        "ARL A0, v1.x\nMOV oPos, c[A0+10]\nMUL oD0, c[A0+2].yxzw, c[A0+2]",
+        "MOV c[5], v1\nARL A0, v2.x\nMOV oPos, c[A0+5]\nMOV oD0, c[5]",
+    ],
+)
+def test_matches_interpreter(source, assemble) -> None:
+    inputs = _inputs()
+    # Exercise relative addressing on both sides of the written constant and out of range indices.
+    inputs[:, 1, 0] = np.linspace(-12.0, 200.0, inputs.shape[0])
+    inputs[:, 2, 0] = np.arange(inputs.shape[0]) % 3
+    _assert_matches_interpreter(assemble(source).output, inputs)
+
+
+def test_matches_interpreter_on_shader_files(assemble) -> None:
+    for filename in ("simple.vsh", "ngb_lava.vsh"):
+        with open(os.path.join(_RESOURCE_PATH, filename), encoding="utf-8") as infile:
+            _assert_matches_interpreter(assemble(infile.read()).output)
+
+
+def test_out_of_range_constant_reads_zero(assemble) -> None:
+    # The assembler rejects c[200], so the constant index is patched into the encoded instruction.
+    ins = VshInstruction()
+    ins.set_values(assemble("MOV oPos, c[4]").output[0])
+    ins.const_reg = 200
+    _assert_matches_interpreter([ins.encode()])
+    assert not np.any(compile_program([ins.encode()]).run(_inputs(), _constants())["oPos"])
+
+
+def test_dead_operations_are_removed(assemble) -> None:
+    source = """
+    MOV R0, v0
+    MUL R1, v1, c[0]
+    MOV oPos.xy, R0
+    """
+    kernel = compiler.CompiledProgram(assemble(source).output)
+
+    assert "c0_" not in kernel.source
+    assert "v1_" not in kernel.source
+    assert "v0_z" not in kernel.source
+
+
+def test_compile_program_caches_kernels(assemble) -> None:
+    compiler.clear_cache()
+    program = assemble("MOV oPos, v0").output
+
+    kernel = compile_program(program)
+    assert compile_program([list(values) for values in program]) is kernel
+
+    compiler.clear_cache()
+    assert compile_program(program) is not kernel
+
+
+def test_prune_narrows_destinations(assemble) -> None:
+    program = decode_program(assemble("MOV R0, v0\nMOV R1, v1\nMOV oPos.x, R0.y").output, stop_at_final=False)
+    pruned = liveness.prune(program, liveness.output_locations([0]))
+
+    assert len(pruned) == 2
+    assert pruned[0].mac_outputs[0].file == FILE_TEMP
+    assert pruned[0].mac_outputs[0].components == (1,)
+    assert pruned[1].mac_outputs[0].file == FILE_OUTPUT
+
+
+@pytest.mark.parametrize("chunk_size", [3, 1000])
+def test_instanced_matches_interpreter(chunk_size, assemble) -> None:
+    source = "MOV c[5], v1\nARL A0, v2.x\nMUL R0, v0, c[A0+4]\nMOV oPos, R0\nMOV R1, c[7]\nADD oD0, c[A0+5], R1"
+    program = assemble(source).output
+    inputs = _inputs(6)
+    inputs[:, 2, 0] = [0.0, 1.0, 2.0, 3.0, -1.0, 300.0]
+    constants = np.stack([_constants(seed) for seed in range(5)])
+
+    expected = Emulator(program).run(inputs, constants, chunk_size=chunk_size)
+    actual = compiler.CompiledProgram(program).run(inputs, constants, chunk_size=chunk_size)
+    for name, value in expected.items():
+        np.testing.assert_array_equal(actual[name], value, err_msg=name)
+
+
+def test_output_subset(assemble) -> None:
+    program = assemble("MOV R1, v1\nMUL oT0, R1, c[3]\nADD oPos, v0, c[0]").output
+    inputs = _inputs()
+    constants = _constants()
+
+    kernel = compile_program(program, outputs=["oPos"])
+    assert kernel is not compile_program(program)
+    assert "v1_" not in kernel.source
+    outputs = kernel.run(inputs, constants)
+    assert list(outputs) == ["oPos"]
+    np.testing.assert_array_equal(outputs["oPos"], Emulator(program).run(inputs, constants)["oPos"])
@@ -0,0 +1,152 @@
+"""Tests for the constant register footprint analysis."""
+
+# pylint: disable=missing-function-docstring
+
+from __future__ import annotations
+
+import os
+import pathlib
+
+import pytest
+
+from nv2a_vsh.disassemble import load_values
+from nv2a_vsh.nv2a_vsh_asm.constant_footprint import ConstantRange, RelativeRead, analyze, parse_value_ranges
+
+_RESOURCE_PATH = os.path.dirname(pathlib.Path(__file__).resolve())
+
+_SKINNING = """MUL R0.x, v3.x, c[4].x
+ARL A0, R0.x
+DP4 oPos.x, v0, c[A0+20]
+DP4 oPos.y, v0, c[A0+21]
+MOV oD0, c[A0+8]
+"""
+
+
+def test_direct_reads(assemble) -> None:
+    footprint = analyze(assemble("MUL R0, v0, c[3]\nMAD oPos, R0, c[4].x, c[4]\nRCP oFog.x, c[10].w").output)
+    assert footprint.direct == {3, 4, 10}
+    assert not footprint.relative
+    assert footprint.upload_plan() == [ConstantRange(3, 2), ConstantRange(10, 1)]
+    assert footprint.upload_plan(max_gap=5) == [ConstantRange(3, 8)]
+
+
+def test_written_constants_are_not_reads(assemble) -> None:
+    footprint = analyze(assemble("MOV c[7], v0\nMOV oPos, v0").output)
+    assert not footprint.indices
+
+
+def test_unknown_a0_reads_every_constant(assemble) -> None:
+    footprint = analyze(assemble(_SKINNING).output)
+    assert footprint.relative[0] == RelativeRead(2, 20, None)
+    assert footprint.indices == set(range(192))
+
+
+def test_reads_before_arl_are_unknown(assemble) -> None:
+    footprint = analyze(assemble("MOV oPos, c[A0+4]").output)
+    assert footprint.relative == [RelativeRead(0, 4, None)]
+
+
+def test_a0_range_from_value_ranges(assemble) -> None:
+    footprint = analyze(assemble(_SKINNING).output, input_ranges={3: (0, 29)}, constant_ranges={4: (3, 3)})
+    assert [read.a0 for read in footprint.relative] == [(0, 87)] * 3
+    assert footprint.relative[0].indices == range(20, 108)
+    assert footprint.relative[2].indices == range(8, 96)
+    assert footprint.upload_plan() == [ConstantRange(4, 1), ConstantRange(8, 101)]
+
+
+def test_a0_is_floored_and_clamped_to_the_constant_file(assemble) -> None:
+    source = "ADD R0.x, v1.x, -c[0].x\nARL A0, R0.x\nMOV oPos, c[A0+2]\nMOV oD0, c[A0+190]"
+    footprint = analyze(assemble(source).output, input_ranges={1: (0.5, 3.5)}, constant_ranges={0: (1, 1)})
+    assert [read.a0 for read in footprint.relative] == [(-1, 2), (-1, 2)]
+    assert [read.indices for read in footprint.relative] == [range(1, 5), range(189, 192)]
+
+
+def test_interval_arithmetic(assemble) -> None:
+    source = """MIN R0.x, v1.x, c[1].x
+SGE R0.y, v1.x, c[1].x
+MAD R0.z, v1.x, -v1.x, c[1].x
+DP3 R0.w, v1, c[1]
+ARL A0, R0.x
+MOV oPos, c[A0+10]
+ARL A0, R0.y
+MOV oD0, c[A0+20]
+ARL A0, R0.z
+MOV oD1, c[A0+40]
+ARL A0, R0.w
+MOV oT0, c[A0+60]
+"""
+    footprint = analyze(assemble(source).output, input_ranges={1: (-2, 3)}, constant_ranges={1: (1, 2)})
+    assert [read.a0 for read in footprint.relative] == [(-2, 2), (0, 1), (-8, 8), (-12, 18)]
+
+
+def test_unbounded_operations_lose_the_range(assemble) -> None:
+    source = "RCP R1.x, v1.x\nARL A0, R1.x\nMOV oPos, c[A0+10]"
+    footprint = analyze(assemble(source).output, input_ranges={1: (1, 2)})
+    assert footprint.relative[0].a0 is None
+
+
+def test_uniforms_label_the_plan(assemble) -> None:
+    with open(os.path.join(_RESOURCE_PATH, "set_pos_and_color.vsh")) as infile:
+        asm = assemble(infile.read())
+    assert asm.uniforms["#view_matrix"] == range(100, 104)
+
+    footprint = analyze(asm.output, uniforms=asm.uniforms)
+    assert footprint.upload_plan() == [
+        ConstantRange(96, 12, ("#model_matrix", "#view_matrix", "#projection_matrix")),
+    ]
+    assert footprint.report() == [
+        "Constants: 12 read directly, 0 through c[A0+n]",
+        "Upload plan: c[96..107] (#model_matrix, #view_matrix, #projection_matrix)",
+        "Upload plan covers 12 of 192 constant registers in 1 ranges",
+    ]
+
+
+def test_report_lists_relative_reads(assemble) -> None:
+    footprint = analyze(assemble(_SKINNING).output, input_ranges={3: (0, 29)}, constant_ranges={4: (3, 3)})
+    assert footprint.report() == [
+        "Constants: 1 read directly, 101 through c[A0+n]",
+        "c[A0+20] at instruction 2: A0 in [0, 87], reads c[20..107]",
+        "c[A0+21] at instruction 3: A0 in [0, 87], reads c[21..108]",
+        "c[A0+8] at instruction 4: A0 in [0, 87], reads c[8..95]",
+        "Upload plan: c[4], c[8..108]",
+        "Upload plan covers 102 of 192 constant registers in 2 ranges",
+    ]
+
+
+def test_encoded_dumps() -> None:
+    values = load_values(os.path.join(_RESOURCE_PATH, "dump1.vsh"), text=True)
+    footprint = analyze(values)
+    assert footprint.direct
+    assert footprint.indices <= set(range(192))
+
+
+def test_parse_value_ranges() -> None:
+    assert parse_value_ranges(["v3=0:29", "c[4]=3:3", "C5=-1:1e3"]) == (
+        {3: (0.0, 29.0)},
+        {4: (3.0, 3.0), 5: (-1.0, 1000.0)},
+    )
+
+
+@pytest.mark.parametrize("spec", ["v16=0:1", "c192=0:1", "c4=3", "r0=1:2", "c4=5:1", "c[4=1:2", "v1=a:b"])
+def test_invalid_value_ranges(spec: str) -> None:
+    with pytest.raises(ValueError, match="Invalid value range"):
+        parse_value_ranges([spec])
+
+
+def test_ranges_contain_emulated_reads(assemble) -> None:
+    np = pytest.importorskip("numpy")
+    profiler = pytest.importorskip("nv2a_vsh.nv2a_vsh_emu.profiler")
+
+    asm = assemble(_SKINNING)
+    footprint = analyze(asm.output, input_ranges={3: (0, 29)}, constant_ranges={4: (3, 3)})
+
+    rng = np.random.default_rng(5)
+    inputs = rng.standard_normal((256, 16, 4)).astype(np.float32)
+    inputs[:, 3, :] = rng.integers(0, 30, (256, 4))
+    constants = rng.standard_normal((192, 4)).astype(np.float32)
+    constants[4] = 3.0
+    emulator = profiler.ProfilingEmulator(asm.output)
+    emulator.run(inputs, constants)
+    read = {index for index in emulator.profile.a0_histogram if 0 <= index < 192}
+    assert read
+    assert read <= footprint.indices
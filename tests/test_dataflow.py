@@ -0,0 +1,116 @@
+"""Tests for the dataflow helpers shared by the optimization passes."""
+
+# pylint: disable=missing-function-docstring
+# pylint: disable=wrong-import-order
+
+from __future__ import annotations
+
+import antlr4
+
+from nv2a_vsh.grammar.vsh.VshLexer import VshLexer
+from nv2a_vsh.grammar.vsh.VshParser import VshParser
+from nv2a_vsh.nv2a_vsh_asm import dataflow, vsh_encoder
+from nv2a_vsh.nv2a_vsh_asm.dataflow import Dependency, Unit
+from nv2a_vsh.nv2a_vsh_asm.encoding_visitor import EncodingVisitor
+from nv2a_vsh.nv2a_vsh_asm.vsh_encoder import Opcode, RegisterFile
+
+_TEMP = RegisterFile.PROGRAM_TEMPORARY
+_OUTPUT = RegisterFile.PROGRAM_OUTPUT
+
+
+def _statements(source: str) -> list[dataflow.Statement]:
+    parser = VshParser(antlr4.CommonTokenStream(VshLexer(antlr4.InputStream(source))))
+    program = EncodingVisitor().visit(parser.program())
+    ret = []
+    for statement in program:
+        if isinstance(statement, tuple):
+            ret.append(statement)
+        else:
+            ret.extend(statement)
+    return ret
+
+
+def _instruction(source: str) -> vsh_encoder.Instruction:
+    ((instruction, _source),) = _statements(source)
+    return instruction
+
+
+def test_add_operands_in_source_order() -> None:
+    (operation,) = dataflow.operations(_instruction("ADD R0.xy, v0, -c[3].w"))
+    assert operation.unit == Unit.MAC
+    assert [source.file for source in operation.inputs] == [RegisterFile.PROGRAM_INPUT, RegisterFile.PROGRAM_ENV_PARAM]
+    assert dataflow.reads(_instruction("ADD R0.xy, v0, -c[3].w")) == {
+        (RegisterFile.PROGRAM_INPUT, 0, 0),
+        (RegisterFile.PROGRAM_INPUT, 0, 1),
+        (RegisterFile.PROGRAM_ENV_PARAM, 3, 3),
+    }
+
+
+def test_paired_operations() -> None:
+    mac, ilu = dataflow.operations(_instruction("DP4 oPos.x, v0, c[0] + RSQ R1.x, c[0].w"))
+    assert (mac.unit, mac.opcode, len(mac.inputs)) == (Unit.MAC, Opcode.OPCODE_DP4, 2)
+    assert (ilu.unit, ilu.opcode) == (Unit.ILU, Opcode.OPCODE_RSQ)
+    assert ilu.reads() == {(RegisterFile.PROGRAM_ENV_PARAM, 0, 3)}
+    assert mac.writes() == {(_OUTPUT, 0, 0)}
+
+
+def test_secondary_outputs() -> None:
+    (operation,) = dataflow.operations(_instruction("RCP oFog.x, v0.w + RCP R1.x, v0.w"))
+    assert operation.unit == Unit.ILU
+    assert len(operation.outputs) == 2
+    assert operation.reads() == {(RegisterFile.PROGRAM_INPUT, 0, 3)}
+
+
+def test_dot_products_read_fixed_components() -> None:
+    assert dataflow.reads(_instruction("DP3 R0.w, R1, R2")) == {
+        (_TEMP, register, component) for register in (1, 2) for component in range(3)
+    }
+    assert dataflow.reads(_instruction("LIT R0, R3")) == {(_TEMP, 3, 0), (_TEMP, 3, 1), (_TEMP, 3, 3)}
+
+
+def test_r12_reads_opos() -> None:
+    assert dataflow.reads(_instruction("MOV R0.x, R12.y")) == {(_OUTPUT, 0, 1)}
+
+
+def test_relative_reads_every_constant() -> None:
+    locations = dataflow.reads(_instruction("MOV R0, c[A0+3]"))
+    assert dataflow.A0_LOCATION in locations
+    assert locations >= dataflow.ALL_CONSTANT_LOCATIONS
+
+
+def test_dependencies() -> None:
+    statements = _statements("MOV R0, v0\nMOV R1, R0\nMOV R0.x, v1\nMOV R0.y, v1")
+    accesses = [(dataflow.reads(instruction), dataflow.writes(instruction)) for instruction, _source in statements]
+    assert dataflow.dependencies(accesses) == [
+        {},
+        {0: Dependency.TRUE},
+        {0: Dependency.OUTPUT, 1: Dependency.ANTI},
+        {0: Dependency.OUTPUT, 1: Dependency.ANTI},
+    ]
+
+
+def test_make_instruction_round_trips() -> None:
+    for source in (
+        "ADD R0.xy, v0, -c[3].w",
+        "RSQ R1.x, v0.w",
+        "DP4 oPos.x, v0, c[0] + RSQ R1.x, c[0].w",
+        "MOV oPos, v0 + MOV R1, c[2]",
+        "MAD R0, v0, c[0], R2.x + RCP R1.x, R2.x",
+    ):
+        instruction = _instruction(source)
+        expected = vsh_encoder.encode([_instruction(source)])
+        rebuilt = dataflow.make_instruction(*_split(dataflow.operations(instruction)))
+        assert vsh_encoder.encode([rebuilt]) == expected, source
+
+
+def _split(operations: list[dataflow.Operation]) -> tuple[dataflow.Operation | None, dataflow.Operation | None]:
+    mac = next((operation for operation in operations if operation.unit == Unit.MAC), None)
+    ilu = next((operation for operation in operations if operation.unit == Unit.ILU), None)
+    return mac, ilu
+
+
+def test_format_instruction() -> None:
+    assert dataflow.format_instruction(_instruction("MAD R0.xy, v0, -c[3].w, R2")) == "mad r0.xy, v0, -c3.wwww, r2"
+    assert dataflow.format_instruction(_instruction("DP4 oPos.x, v0, c[0] + EXPP R1.x, c[0].w")) == (
+        "dp4 oPos.x, v0, c0 + expp r1.x, c0.wwww"
+    )
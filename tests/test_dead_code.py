@@ -0,0 +1,96 @@
+"""Tests for dead code elimination."""
+
+# pylint: disable=missing-function-docstring
+# pylint: disable=wrong-import-order
+
+from __future__ import annotations
+
+import os
+import pathlib
+
+import pytest
+
+_RESOURCE_PATH = os.path.dirname(pathlib.Path(__file__).resolve())
+
+
+def test_removes_unread_temporaries(assemble) -> None:
+    asm = assemble("MOV R0, v0\nMUL R2, v1, c[0]\nMOV oPos, R0", eliminate_dead_code=True)
+    assert asm.comments == ["mov r0, v0", "mov oPos, r0"]
+    assert asm.dead_code_result is not None
+    assert asm.dead_code_result.removed == ["mul r2, v1, c0"]
+    assert asm.dead_code_result.report() == ["Removed dead instruction 'mul r2, v1, c0'"]
+
+
+def test_removes_overwritten_writes(assemble) -> None:
+    asm = assemble("MOV R0, v0\nMOV R0, v1\nMOV oPos, R0", eliminate_dead_code=True)
+    assert asm.comments == ["mov r0, v1", "mov oPos, r0"]
+
+
+def test_narrows_write_masks(assemble) -> None:
+    asm = assemble("MUL R0, v0, c[0]\nMOV oPos.xy, R0", eliminate_dead_code=True)
+    assert asm.comments == ["mul r0.xy, v0, c0", "mov oPos.xy, r0"]
+    assert asm.dead_code_result is not None
+    assert asm.dead_code_result.narrowed == [("mul r0, v0, c0", "mul r0.xy, v0, c0")]
+
+
+def test_narrowing_follows_swizzles_and_fixed_reads(assemble) -> None:
+    asm = assemble("MOV R0, v0\nMOV R1, v1\nDP3 oPos.x, R0, c[0]\nMOV oFog.x, R1.w", eliminate_dead_code=True)
+    assert asm.comments == ["mov r0.xyz, v0", "mov r1.w, v1", "dp3 oPos.x, r0, c0", "mov oFog.x, r1.wwww"]
+
+
+def test_outputs_and_constants_are_live(assemble) -> None:
+    source = "MOV oD0, v3\nMOV c[4], v0\nARL A0, v1.x"
+    asm = assemble(source, eliminate_dead_code=True)
+    assert asm.output == assemble(source, eliminate_dead_code=False).output
+    assert asm.dead_code_result is not None
+    assert not asm.dead_code_result.report()
+
+
+def test_reads_by_the_same_instruction_do_not_keep_writes_live(assemble) -> None:
+    # Both units read before either writes, so the ILU result is not read by the MAC.
+    asm = assemble("MUL oPos, R1, c[0] + RCP R1.x, v0.x", eliminate_dead_code=True)
+    assert asm.comments == ["mul oPos, r1, c0"]
+
+
+def test_removes_one_operation_of_a_pair(assemble) -> None:
+    asm = assemble("MUL R2, v0, c[0] + RSQ R1.x, v0.w\nMOV oPos, R1.x", eliminate_dead_code=True)
+    assert asm.comments == ["rsq r1.x, v0.wwww", "mov oPos, r1.xxxx"]
+
+
+def test_r12_reads_are_not_temporaries(assemble) -> None:
+    asm = assemble("MOV oPos, v0\nMOV R11, v1\nMUL oD0, R12, R11", eliminate_dead_code=True)
+    assert asm.comments == ["mov oPos, v0", "mov r11, v1", "mul oDiffuse, r12, r11"]
+
+
+def test_everything_dead(assemble) -> None:
+    asm = assemble("MOV R0, v0", eliminate_dead_code=True)
+    assert asm.output == []
+
+
+def test_macro_expansions(assemble) -> None:
+    asm = assemble("#matrix matrix4 96\n%matmul4x4 r0 iPos #matrix\nMOV oPos.xy, r0", eliminate_dead_code=True)
+    assert asm.comments == ["dp4 r0.x, v0, c96", "dp4 r0.y, v0, c97", "mov oPos.xy, r0"]
+
+
+def test_frees_slots_for_pairing(assemble) -> None:
+    asm = assemble("MUL R1, v0, c[0]\nRCP R1.w, R2.x\nMOV oPos, R1", schedule=True, eliminate_dead_code=True)
+    assert asm.comments == ["mul r1.xyz, v0, c0 + rcp r1.w, r2.xxxx", "mov oPos, r1"]
+
+
+def test_preserves_emulated_results(assemble) -> None:
+    np = pytest.importorskip("numpy")
+    emulator = pytest.importorskip("nv2a_vsh.nv2a_vsh_emu")
+
+    with open(os.path.join(_RESOURCE_PATH, "all.vsh")) as infile:
+        source = infile.read()
+    optimized = assemble(source, schedule=True, eliminate_dead_code=True)
+    original = assemble(source, eliminate_dead_code=False)
+    assert len(optimized.output) < len(original.output)
+
+    rng = np.random.default_rng(0)
+    inputs = rng.standard_normal((256, 16, 4)).astype(np.float32)
+    constants = rng.standard_normal((192, 4)).astype(np.float32)
+    expected = emulator.Emulator(original.output).run(inputs, constants)
+    actual = emulator.Emulator(optimized.output).run(inputs, constants)
+    for name, value in expected.items():
+        np.testing.assert_array_equal(actual[name], value)
@@ -0,0 +1,82 @@
+"""Tests for the register-level instruction decoder."""
+
+# pylint: disable=missing-function-docstring
+
+from __future__ import annotations
+
+import typing
+
+import pytest
+
+from nv2a_vsh.nv2a_vsh_asm import decoder
+from nv2a_vsh.nv2a_vsh_asm.vsh_encoder_defs import ILU, MAC
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Callable
+
+
+@pytest.fixture
+def decode(assemble) -> Callable[[str], list[decoder.DecodedInstruction]]:
+    return lambda source: decoder.decode_program(assemble(source).output)
+
+
+def test_decode_mov(decode) -> None:
+    (instruction,) = decode("MOV oD0.xz, -v3.yxwz")
+
+    assert instruction.mac == MAC.MAC_MOV
+    assert instruction.ilu == ILU.ILU_NOP
+    assert instruction.mac_inputs == (decoder.Operand("v", 3, (1, 0, 3, 2), negate=True),)
+    assert instruction.mac_outputs == (decoder.Destination("o", 3, (0, 2)),)
+    assert instruction.final
+    assert str(instruction) == "MOV oD0.xz, -v3.yxwz"
+
+
+def test_decode_add_reads_slots_a_and_c(decode) -> None:
+    (instruction,) = decode("ADD R2.xyz, v0, c[12]")
+
+    assert [operand.file for operand in instruction.mac_inputs] == ["v", "c"]
+    assert instruction.mac_inputs[1].number == 12
+    assert instruction.mac_outputs == (decoder.Destination("R", 2, (0, 1, 2)),)
+
+
+def test_decode_paired_ilu_writes_r1(decode) -> None:
+    (instruction,) = decode("MUL R4, v0, c[1] + RSQ R1.w, c[1].x")
+
+    assert instruction.is_paired
+    assert instruction.ilu == ILU.ILU_RSQ
+    assert instruction.ilu_input == decoder.Operand("c", 1, (0, 0, 0, 0))
+    assert instruction.ilu_outputs == (decoder.Destination("R", 1, (3,)),)
+    assert instruction.mac_outputs == (decoder.Destination("R", 4, (0, 1, 2, 3)),)
+
+
+def test_decode_arl_and_relative_constant(decode) -> None:
+    arl, mov = decode("ARL A0, v1.x\nMOV oPos, c[A0+5]")
+
+    assert arl.mac_outputs == (decoder.Destination("a", 0, (0,)),)
+    assert mov.mac_inputs[0].relative
+    assert str(mov.mac_inputs[0]) == "c[A0+5]"
+
+
+def test_reads_components(decode) -> None:
+    (dp3,) = decode("DP3 R0.x, v0, c[0].zyxw")
+    (operand_a, components_a), (operand_b, components_b) = dp3.reads()
+    assert (operand_a.file, components_a) == ("v", (0, 1, 2))
+    assert (operand_b.file, components_b) == ("c", (0, 1, 2))
+
+    (dp4,) = decode("DP4 R0.x, v0, c[0]")
+    assert [components for _operand, components in dp4.reads()] == [(0, 1, 2, 3), (0, 1, 2, 3)]
+
+    (mul,) = decode("MUL R0.y, v0.wzyx, c[0]")
+    assert [components for _operand, components in mul.reads()] == [(2,), (1,)]
+
+
+def test_decode_program_stops_at_final(assemble) -> None:
+    asm = assemble("MOV oPos, v0")
+    program = decoder.decode_program([*asm.output, [0, 0x0020001B, 0x0836106C, 0x2F100FF8]])
+    assert len(program) == 1
+
+
+def test_vsh_mask_components() -> None:
+    assert decoder.vsh_mask_components(0xF) == (0, 1, 2, 3)
+    assert decoder.vsh_mask_components(0x8) == (0,)
+    assert decoder.vsh_mask_components(0x5) == (1, 3)
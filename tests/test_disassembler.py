@@ -10,6 +10,7 @@
 from __future__ import annotations
 
 import io
+import json
 
 import pytest
 
@@ -154,3 +155,45 @@ def test_disassembler_constant_register_output_no_explain() -> None:
         "DPH c[15].xy, v4, c[10]",
         [0x00000000, 0x00C1481B, 0x0836186C, 0x2070C078],
     )
+
+
+def test_disassemble_to_records() -> None:
+    values = [
+        [0x00000000, 0x0420061B, 0x083613FC, 0x5011F818],
+        [0x00000000, 0x00000000, 0x00000000, 0x00000001],
+    ]
+    records = list(disassemble.disassemble_to_records(values))
+
+    assert [record["index"] for record in records] == [0, 1]
+    assert records[0]["words"] == values[0]
+    assert records[0]["fields"]["MAC"] == 1
+    assert records[0]["fields"]["ILU"] == 2
+    assert records[0]["fields"]["OUT_ADDRESS"] == 3
+    assert records[0]["mac"] == {"mnemonic": "MOV", "outputs": ["oD0.xyzw"], "inputs": ["v3"]}
+    assert records[0]["ilu"] == {"mnemonic": "RCP", "outputs": ["R1.w"], "inputs": ["R1.w"]}
+
+    assert records[1]["fields"]["FINAL"] == 1
+    assert records[1]["mac"] is None
+    assert records[1]["ilu"] is None
+
+
+def test_write_jsonl() -> None:
+    values = [
+        [0x00000000, 0x0020161B, 0x0836106C, 0x2070F858],
+        [0x00000000, 0x0400001B, 0x083613FC, 0x2070F82C],
+    ]
+    output = io.StringIO()
+    disassemble.write_jsonl(values, output)
+
+    lines = output.getvalue().splitlines()
+    assert len(lines) == 2
+    records = [json.loads(line) for line in lines]
+    assert records == list(disassemble.disassemble_to_records(values))
+    assert records[1]["ilu"]["mnemonic"] == "RCP"
+
+
+def test_binary_input_parser() -> None:
+    values = [[0x00000000, 0x0020161B, 0x0836106C, 0x2070F858]]
+    data = b"".join(word.to_bytes(4, "little") for word in values[0])
+
+    assert disassemble._parse_binary_input(io.BytesIO(data)) == values
@@ -0,0 +1,324 @@
+"""Tests for the NumPy vertex shader emulator."""
+
+# pylint: disable=missing-function-docstring
+# pylint: disable=wrong-import-order
+
+from __future__ import annotations
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from nv2a_vsh.nv2a_vsh_emu import Emulator, emulator  # noqa: E402 Module level import not at top of file
+
+
+def _inputs(num_vertices: int = 8, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(-2.0, 2.0, (num_vertices, 16, 4)).astype(np.float32)
+
+
+def _constants(seed: int = 1):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(-2.0, 2.0, (192, 4)).astype(np.float32)
+
+
+def test_passthrough(assemble) -> None:
+    inputs = _inputs()
+    outputs = emulator.run(assemble("MOV oPos, v0\nMOV oD0, v3").output, inputs)
+
+    np.testing.assert_array_equal(outputs["oPos"], inputs[:, 0])
+    np.testing.assert_array_equal(outputs["oD0"], inputs[:, 3])
+    np.testing.assert_array_equal(outputs["oT0"], np.broadcast_to([0.0, 0.0, 0.0, 1.0], (8, 4)))
+    assert set(outputs) >= {"oPos", "oD0", "oD1", "oFog", "oPts", "oB0", "oB1", "oT0", "oT1", "oT2", "oT3"}
+
+
+def test_accepts_vsh_instructions(assemble) -> None:
+    asm = assemble("MOV oPos, v1")
+    from nv2a_vsh.nv2a_vsh_asm import vsh_instruction  # noqa: PLC0415 `import` should be at the top-level
+
+    program = []
+    for values in asm.output:
+        ins = vsh_instruction.VshInstruction()
+        ins.set_values(values)
+        program.append(ins)
+
+    inputs = _inputs()
+    np.testing.assert_array_equal(Emulator(program).run(inputs)["oPos"], inputs[:, 1])
+
+
+def test_matrix_transform(assemble) -> None:
+    source = """
+    #model matrix4 96
+    %matmul4x4 r0 iPos #model
+    MOV oPos, r0
+    """
+    inputs = _inputs()
+    constants = _constants()
+    outputs = emulator.run(assemble(source).output, inputs, constants)
+
+    expected = inputs[:, 0] @ constants[96:100].T
+    np.testing.assert_allclose(outputs["oPos"], expected, rtol=1e-5)
+
+
+def test_swizzle_negate_and_mask(assemble) -> None:
+    source = """
+    MOV R0, c[0]
+    MOV R0.yw, -v0.zxwy
+    MOV oD0, R0
+    """
+    inputs = _inputs()
+    constants = _constants()
+    outputs = emulator.run(assemble(source).output, inputs, constants)
+
+    expected = np.empty((8, 4), dtype=np.float32)
+    expected[:] = constants[0]
+    expected[:, 1] = -inputs[:, 0, 0]
+    expected[:, 3] = -inputs[:, 0, 1]
+    np.testing.assert_array_equal(outputs["oD0"], expected)
+
+
+@pytest.mark.parametrize(
+    ("operation", "expected"),
+    [
+        ("MUL", lambda a, b: a * b),
+        ("ADD", lambda a, b: a + b),
+        ("MIN", np.minimum),
+        ("MAX", np.maximum),
+        ("SLT", lambda a, b: (a < b).astype(np.float32)),
+        ("SGE", lambda a, b: (a >= b).astype(np.float32)),
+        ("DP3", lambda a, b: np.repeat(np.sum(a[:, :3] * b[:, :3], axis=1, keepdims=True), 4, axis=1)),
+        ("DP4", lambda a, b: np.repeat(np.sum(a * b, axis=1, keepdims=True), 4, axis=1)),
+        ("DPH", lambda a, b: np.repeat(np.sum(a[:, :3] * b[:, :3], axis=1, keepdims=True) + b[:, 3:], 4, axis=1)),
+    ],
+)
+def test_binary_mac_operations(operation, expected, assemble) -> None:
+    inputs = _inputs()
+    outputs = emulator.run(assemble(f"MOV R1, v1\n{operation} oPos, R1, v2").output, inputs)
+
+    np.testing.assert_allclose(outputs["oPos"], expected(inputs[:, 1], inputs[:, 2]), rtol=1e-6)
+
+
+def test_mad_and_dst(assemble) -> None:
+    inputs = _inputs()
+    source = """
+    MOV R1, v1
+    MOV R2, v2
+    MAD oPos, R1, R2, v3
+    DST oD0, R1, v2
+    """
+    outputs = emulator.run(assemble(source).output, inputs)
+
+    np.testing.assert_allclose(outputs["oPos"], inputs[:, 1] * inputs[:, 2] + inputs[:, 3], rtol=1e-6)
+    a = inputs[:, 1]
+    b = inputs[:, 2]
+    np.testing.assert_allclose(
+        outputs["oD0"], np.stack([np.ones(8), a[:, 1] * b[:, 1], a[:, 2], b[:, 3]], axis=1), rtol=1e-6
+    )
+
+
+def test_ilu_operations(assemble) -> None:
+    source = """
+    RCP oD0, v1.x
+    RSQ oD1, v1.y
+    EXPP oT0, v1.z
+    LOGP oT1, v1.w
+    """
+    inputs = _inputs()
+    inputs[:, 1, 1] = np.abs(inputs[:, 1, 1]) + 0.5
+    inputs[:, 1, 3] = 12.0
+    outputs = emulator.run(assemble(source).output, inputs)
+
+    v1 = inputs[:, 1]
+    np.testing.assert_allclose(outputs["oD0"], np.repeat(1.0 / v1[:, :1], 4, axis=1), rtol=1e-6)
+    np.testing.assert_allclose(outputs["oD1"], np.repeat(1.0 / np.sqrt(v1[:, 1:2]), 4, axis=1), rtol=1e-6)
+    np.testing.assert_allclose(outputs["oT0"][:, 0], np.exp2(np.floor(v1[:, 2])), rtol=1e-6)
+    np.testing.assert_allclose(outputs["oT0"][:, 1], v1[:, 2] - np.floor(v1[:, 2]), rtol=1e-6)
+    np.testing.assert_array_equal(outputs["oT1"][0], [3.0, 1.5, np.float32(np.log2(12.0)), 1.0])
+
+
+def test_paired_operations_read_before_write(assemble) -> None:
+    source = """
+    MOV R1, v1
+    MOV R2, R1 + RCP R1.x, R1.y
+    MOV oD0, R1
+    MOV oD1, R2
+    """
+    inputs = _inputs()
+    outputs = emulator.run(assemble(source).output, inputs)
+
+    v1 = inputs[:, 1]
+    np.testing.assert_array_equal(outputs["oD1"], v1)
+    np.testing.assert_allclose(outputs["oD0"][:, 0], 1.0 / v1[:, 1], rtol=1e-6)
+    np.testing.assert_array_equal(outputs["oD0"][:, 1:], v1[:, 1:])
+
+
+def test_r12_aliases_opos(assemble) -> None:
+    inputs = _inputs()
+    outputs = emulator.run(assemble("MOV oPos, v0\nMOV oD0, R12").output, inputs)
+
+    np.testing.assert_array_equal(outputs["oD0"], inputs[:, 0])
+
+
+def test_relative_constant_addressing(assemble) -> None:
+    inputs = _inputs(4)
+    inputs[:, 1, 0] = [0.0, 1.5, 2.9, 200.0]
+    constants = _constants()
+    outputs = emulator.run(assemble("ARL A0, v1.x\nMOV oPos, c[A0+10]").output, inputs, constants)
+
+    np.testing.assert_array_equal(outputs["oPos"][:3], constants[[10, 11, 12]])
+    # Out of range reads return zero.
+    np.testing.assert_array_equal(outputs["oPos"][3], [0.0, 0.0, 0.0, 0.0])
+
+
+def test_constant_writes_are_per_vertex(assemble) -> None:
+    source = """
+    MOV c[5], v1
+    ARL A0, v2.x
+    MOV oPos, c[A0+5]
+    MOV oD0, c[5]
+    """
+    inputs = _inputs(2)
+    inputs[:, 2, 0] = [0.0, 1.0]
+    constants = _constants()
+    outputs = emulator.run(assemble(source).output, inputs, constants)
+
+    np.testing.assert_array_equal(outputs["oD0"], inputs[:, 1])
+    np.testing.assert_array_equal(outputs["oPos"][0], inputs[0, 1])
+    np.testing.assert_array_equal(outputs["oPos"][1], constants[6])
+
+
+def test_chunking_matches_single_pass(assemble) -> None:
+    source = """
+    DP4 R0.x, v0, c[0]
+    RCP R1.x, R0.x
+    MUL oPos, v0, R1.x
+    """
+    inputs = _inputs(100)
+    constants = _constants()
+    program = Emulator(assemble(source).output)
+
+    single = program.run(inputs, constants, chunk_size=1000)
+    chunked = program.run(inputs, constants, chunk_size=7)
+    for name, value in single.items():
+        np.testing.assert_array_equal(chunked[name], value)
+
+
+def test_rejects_bad_input_shape(assemble) -> None:
+    with pytest.raises(ValueError, match="inputs"):
+        emulator.run(assemble("MOV oPos, v0").output, np.zeros((4, 15, 4)))
+
+
+_INSTANCED_SOURCE = """
+MOV c[5], v1
+ARL A0, v2.x
+DP4 R0.x, v0, c[0]
+MAD R0.yzw, v0, c[A0+4], R0.x
+RCP R1.x, R0.x
+MUL oPos, R0, R1.x
+MOV oD0, c[A0+5]
+"""
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 16, 1000])
+@pytest.mark.parametrize("shared_inputs", [True, False])
+def test_instanced_constants_match_separate_runs(chunk_size, shared_inputs, assemble) -> None:
+    num_instances = 7
+    inputs = _inputs(4) if shared_inputs else np.stack([_inputs(4, seed) for seed in range(num_instances)])
+    inputs[..., 2, 0] = [0.0, 1.0, 2.0, -9.0]
+    constants = np.stack([_constants(seed) for seed in range(num_instances)])
+    program = Emulator(assemble(_INSTANCED_SOURCE).output)
+
+    outputs = program.run(inputs, constants, chunk_size=chunk_size)
+    for instance in range(num_instances):
+        expected = program.run(inputs if shared_inputs else inputs[instance], constants[instance])
+        for name, value in expected.items():
+            assert outputs[name].shape == (num_instances, 4, 4)
+            np.testing.assert_array_equal(outputs[name][instance], value, err_msg=name)
+
+
+def test_instanced_rejects_mismatched_inputs(assemble) -> None:
+    with pytest.raises(ValueError, match="inputs"):
+        emulator.run(assemble("MOV oPos, v0").output, np.zeros((2, 4, 16, 4)), np.zeros((3, 192, 4)))
+    with pytest.raises(ValueError, match="constants"):
+        emulator.run(assemble("MOV oPos, v0").output, np.zeros((4, 16, 4)), np.zeros((1, 3, 192, 4)))
+
+
+_STREAM_SOURCE = """
+DP4 R0.x, v0, c[0]
+RCP R1.x, R0.x
+MUL oPos, v0, R1.x
+ADD oD0, v1, c[1]
+"""
+
+
+def test_stream_from_memmap(tmp_path, assemble) -> None:
+    inputs = _inputs(50).astype(np.float16)
+    path = str(tmp_path / "vertices.bin")
+    inputs.tofile(path)
+    mapped = np.memmap(path, dtype=np.float16, mode="r", shape=inputs.shape)
+    constants = _constants()
+    program = Emulator(assemble(_STREAM_SOURCE).output)
+    expected = program.run(inputs.astype(np.float32), constants)
+
+    starts = []
+    for start, outputs in program.stream(mapped, constants, chunk_size=16):
+        starts.append(start)
+        for name, value in outputs.items():
+            np.testing.assert_array_equal(value, expected[name][start : start + value.shape[0]], err_msg=name)
+    assert starts == [0, 16, 32, 48]
+
+
+def test_stream_from_iterable_reuses_buffers(assemble) -> None:
+    inputs = _inputs(40)
+    constants = _constants()
+    program = Emulator(assemble(_STREAM_SOURCE).output)
+    expected = program.run(inputs, constants)
+
+    buffers = set()
+    chunks = (inputs[start:end] for start, end in ((0, 3), (3, 30), (30, 40)))
+    for start, outputs in program.stream(chunks, constants, chunk_size=10):
+        buffers.add(outputs["oPos"].__array_interface__["data"][0])
+        np.testing.assert_array_equal(outputs["oPos"], expected["oPos"][start : start + outputs["oPos"].shape[0]])
+    assert len(buffers) == 1
+
+
+def test_run_writes_into_preallocated_outputs(tmp_path, assemble) -> None:
+    inputs = _inputs(30)
+    constants = _constants()
+    program = Emulator(assemble(_STREAM_SOURCE).output)
+    expected = program.run(inputs, constants)
+
+    destination = np.lib.format.open_memmap(str(tmp_path / "pos.npy"), mode="w+", dtype=np.float32, shape=(30, 4))
+    outputs = program.run(inputs, constants, chunk_size=7, out={"oPos": destination})
+    assert outputs["oPos"] is destination
+    np.testing.assert_array_equal(np.load(str(tmp_path / "pos.npy")), expected["oPos"])
+    np.testing.assert_array_equal(outputs["oD0"], expected["oD0"])
+
+    with pytest.raises(ValueError, match="shape"):
+        program.run(inputs, constants, out={"oPos": np.empty((29, 4), dtype=np.float32)})
+    with pytest.raises(ValueError, match="Unknown"):
+        program.run(inputs, constants, out={"oBogus": np.empty((30, 4), dtype=np.float32)})
+
+
+def test_output_subset_prunes_program(assemble) -> None:
+    source = """
+    MOV R1, v1
+    MUL R2, R1, c[3]
+    MOV oT0, R2
+    ADD R0, v0, c[0]
+    MOV oPos, R0
+    MOV oD0.x, R0.y
+    """
+    inputs = _inputs()
+    constants = _constants()
+    full = emulator.run(assemble(source).output, inputs, constants)
+
+    program = Emulator(assemble(source).output, outputs=["oPos", "oD0"])
+    outputs = program.run(inputs, constants)
+    assert list(outputs) == ["oPos", "oD0"]
+    assert len(program.live_program) == 3
+    for name, value in outputs.items():
+        np.testing.assert_array_equal(value, full[name])
+
+    with pytest.raises(ValueError, match="Unknown output"):
+        Emulator(assemble(source).output, outputs=["oFoo"])
@@ -0,0 +1,128 @@
+"""Tests for the program equivalence checker."""
+
+# pylint: disable=missing-function-docstring
+
+from __future__ import annotations
+
+import os
+import pathlib
+
+import pytest
+
+np = pytest.importorskip("numpy")
+equivalence = pytest.importorskip("nv2a_vsh.nv2a_vsh_emu.equivalence")
+
+_RESOURCE_PATH = os.path.dirname(pathlib.Path(__file__).resolve())
+
+
+def test_identical_programs(assemble) -> None:
+    program = assemble("DP4 oPos, v0, c[4]\nMOV oD0, v3").output
+    result = equivalence.check_equivalence(program, program, symbolic=True)
+    assert result.equivalent
+    assert result.proven
+    assert result.trials == equivalence.DEFAULT_INSTANCES * equivalence.DEFAULT_VERTICES
+    assert result.report()[-1] == "The programs are equivalent (every output expression is identical)"
+
+
+def test_difference_is_minimized(assemble) -> None:
+    program_a = assemble("MUL R0, v0, c[4]\nADD oPos, R0, v1\nMOV oD0, v2").output
+    program_b = assemble("MUL R0, v0, c[4]\nADD oPos, R0, v1.yxzw\nMOV oD0, v2").output
+    result = equivalence.check_equivalence(program_a, program_b)
+    difference = result.difference
+    assert difference is not None
+    assert (difference.output, difference.component) == ("oPos", 0)
+    assert difference.expected != difference.actual
+    # Only v1.x or v1.y is needed to reproduce the difference.
+    assert np.count_nonzero(difference.inputs.view(np.uint32)) == 1
+    assert np.count_nonzero(difference.inputs[1, :2])
+    assert not np.any(difference.constants.view(np.uint32))
+    assert result.report()[1].startswith("oPos.x differs: ")
+    assert result.report()[2] == "Reproduced with (all other inputs and constants are zero):"
+
+
+def test_special_values(assemble) -> None:
+    # x - x is only zero for finite x.
+    program_a = assemble("MOV oPos, v1").output
+    program_b = assemble("ADD R0, v0, -v0\nADD oPos, R0, v1").output
+    assert equivalence.check_equivalence(program_a, program_b, special_fraction=0.0, ignore_zero_sign=True).equivalent
+    result = equivalence.check_equivalence(program_a, program_b, ignore_zero_sign=True)
+    assert not result.proven
+    difference = result.difference
+    assert difference is not None
+    assert (difference.output, difference.component) == ("oPos", 0)
+    assert np.isnan(difference.actual)
+    assert not np.isfinite(difference.inputs[0, 0])
+    assert np.count_nonzero(difference.inputs.view(np.uint32)) == 1
+
+
+def test_zero_sign(assemble) -> None:
+    program_a = assemble("ADD oPos, v0, c[4]").output
+    program_b = assemble("ADD oPos, v0, c[4]\nMOV R0, c[4]\nADD oPos.x, -R0.x, -v0.x\nMOV oPos.x, -R12.x").output
+    result = equivalence.check_equivalence(program_a, program_b, instances=64)
+    assert result.difference is not None
+    assert result.difference.actual == result.difference.expected == 0.0
+    assert equivalence.check_equivalence(program_a, program_b, instances=64, ignore_zero_sign=True).equivalent
+
+
+def test_selected_outputs(assemble) -> None:
+    program_a = assemble("MOV oPos, v0\nMOV oD0, v1").output
+    program_b = assemble("MOV oPos, v0").output
+    assert not equivalence.check_equivalence(program_a, program_b).equivalent
+    result = equivalence.check_equivalence(program_a, program_b, outputs=["oPos"], symbolic=True)
+    assert result.outputs == ["oPos"]
+    assert result.proven
+
+    with pytest.raises(ValueError, match="Unknown output registers"):
+        equivalence.check_equivalence(program_a, program_b, outputs=["oNope"])
+
+
+def test_invalid_parameters(assemble) -> None:
+    program = assemble("MOV oPos, v0").output
+    with pytest.raises(ValueError, match="must be positive"):
+        equivalence.check_equivalence(program, program, instances=0)
+    with pytest.raises(ValueError, match="special_fraction"):
+        equivalence.check_equivalence(program, program, special_fraction=2.0)
+
+
+@pytest.mark.parametrize(
+    ("source_a", "source_b"),
+    [
+        ("MUL oPos, v0, c[4]", "MUL oPos, c[4], v0"),
+        ("MUL R0, v0, c[4]\nADD oPos, v1, R0", "MOV R2, v1\nMAD R1, c[4], v0, R2\nMOV oPos, R1"),
+        ("MUL oPos, -v0, c[4]", "MUL R0, v0, -c[4]\nMOV oPos, R0"),
+        ("MUL oPos, -v0, -c[4]", "MUL oPos, v0, c[4]"),
+        ("DP3 oPos, v0, c[4]", "DP3 oPos, c[4], v0"),
+        ("ARL A0, v1.x\nMOV oPos, c[A0+4]", "ARL A0, v1.x\nMOV R0, c[A0+4]\nMOV oPos, R0"),
+        ("RSQ R1.x, v0.w\nMUL oPos, v1, R1.x", "RSQ R2.y, v0.w\nMUL oPos, R2.y, v1"),
+    ],
+)
+def test_symbolic_proofs(source_a: str, source_b: str, assemble) -> None:
+    result = equivalence.check_equivalence(assemble(source_a).output, assemble(source_b).output, symbolic=True)
+    assert result.equivalent
+    assert result.proven
+
+
+@pytest.mark.parametrize(
+    ("source_a", "source_b"),
+    [
+        # Sums are not reassociated and negation is not moved out of sums, as neither is exact.
+        ("DP3 oPos, v0, c[4]", "MUL R0, v0, c[4]\nADD R0.x, R0.z, R0.y\nADD oPos, R0.x, R0.x"),
+        ("ADD oPos, -v0, -c[4]", "ADD R0, v0, c[4]\nMOV oPos, -R0"),
+        ("MIN oPos, v0, c[4]", "MIN oPos, c[4], v0"),
+        ("ARL A0, v1.x\nMOV oPos, c[A0+4]", "ARL A0, v2.x\nMOV oPos, c[A0+4]"),
+        ("ARL A0, v1.x\nMOV oPos, c[A0+4]", "ARL A0, v1.x\nMOV c[8], v0\nMOV oPos, c[A0+4]"),
+    ],
+)
+def test_unproven(source_a: str, source_b: str, assemble) -> None:
+    assert not equivalence.prove_equivalence(assemble(source_a).output, assemble(source_b).output)
+
+
+@pytest.mark.parametrize("name", ["all.vsh", "ngb_lava.vsh", "set_pos_and_color.vsh", "simple.vsh"])
+def test_optimized_programs(name: str, assemble) -> None:
+    with open(os.path.join(_RESOURCE_PATH, name)) as infile:
+        source = infile.read()
+    original = assemble(source).output
+    optimized = assemble(source, optimize_peephole=True, eliminate_common_subexpressions=True).output
+    result = equivalence.check_equivalence(original, optimized, symbolic=True)
+    assert result.equivalent, result.report()
+    assert result.proven
@@ -0,0 +1,90 @@
+"""Tests for the program interface description."""
+
+# pylint: disable=missing-function-docstring
+
+from __future__ import annotations
+
+import io
+import json
+import os
+import pathlib
+
+import pytest
+
+from nv2a_vsh.disassemble import load_values
+from nv2a_vsh.nv2a_vsh_asm.interface import ProgramInterface, analyze
+
+_RESOURCE_PATH = os.path.dirname(pathlib.Path(__file__).resolve())
+
+_SOURCE = "DP3 R0.x, v3, c[0]\nADD oPos.xy, v0.yx, c[1]\nRSQ oFog.x, v2.w\nMOV oT0.zw, v9.xxzz\nMOV oD0, v0"
+
+
+def test_inputs_and_outputs(assemble) -> None:
+    program_interface = analyze(assemble(_SOURCE).output)
+    assert program_interface == ProgramInterface(
+        inputs={0: (0, 1, 2, 3), 2: (3,), 3: (0, 1, 2), 9: (2,)},
+        outputs={0: (0, 1), 3: (0, 1, 2, 3), 5: (0,), 9: (2, 3)},
+    )
+    assert program_interface.input_mask == 0x020D
+    assert program_interface.output_mask == 0x0229
+
+
+def test_swizzles_select_read_components(assemble) -> None:
+    assert analyze(assemble("MUL oPos.xy, v1.wzyx, c[0]").output).inputs == {1: (2, 3)}
+    assert analyze(assemble("DPH oPos.x, v1, c[0]").output).inputs == {1: (0, 1, 2)}
+
+
+def test_operand_slots(assemble) -> None:
+    # ADD reads its second operand and ILU operations read their operand from slot C.
+    assert analyze(assemble("ADD oPos, c[0], v4.z").output).inputs == {4: (2,)}
+    program_interface = analyze(assemble("MUL R0.x, v1.x, c[0].x + RCP R1.x, v1.w\nADD oPos, R0.x, R1.x").output)
+    assert program_interface.inputs == {1: (0, 3)}
+    assert program_interface.outputs == {0: (0, 1, 2, 3)}
+
+
+def test_temporaries_and_constants_are_not_included(assemble) -> None:
+    program_interface = analyze(assemble("MOV R0, c[3]\nMOV c[4], R0").output)
+    assert program_interface == ProgramInterface({}, {})
+    assert program_interface.report() == ["Inputs: none", "Outputs: none"]
+
+    # R12 is an alias of oPos rather than an input.
+    assert analyze(assemble("MOV oPos, c[3]\nMOV oD0, R12").output).inputs == {}
+
+
+def test_report(assemble) -> None:
+    assert analyze(assemble(_SOURCE).output).report() == [
+        "Inputs: v0.xyzw, v2.w, v3.xyz, v9.z",
+        "Outputs: oPos.xy, oD0.xyzw, oFog.x, oT0.zw",
+    ]
+
+
+def test_write_json(assemble) -> None:
+    outfile = io.StringIO()
+    analyze(assemble(_SOURCE).output).write_json(outfile)
+    assert json.loads(outfile.getvalue()) == {
+        "inputs": {"v0": "xyzw", "v2": "w", "v3": "xyz", "v9": "z"},
+        "outputs": {"oPos": "xy", "oD0": "xyzw", "oFog": "x", "oT0": "zw"},
+    }
+
+
+def test_write_c_header(assemble) -> None:
+    outfile = io.StringIO()
+    analyze(assemble(_SOURCE).output).write_c_header(outfile, "skin")
+    header = outfile.getvalue()
+    assert header.startswith("#ifndef SKIN_INTERFACE_H_\n#define SKIN_INTERFACE_H_\n")
+    assert "static const uint32_t skin_input_mask = 0x020d;" in header
+    assert (
+        "static const uint8_t skin_input_components[16] = "
+        "{0xf, 0x0, 0x8, 0x7, 0x0, 0x0, 0x0, 0x0, 0x0, 0x4, 0x0, 0x0, 0x0, 0x0, 0x0, 0x0};"
+    ) in header
+    assert "static const uint32_t skin_output_mask = 0x0229;" in header
+
+    with pytest.raises(ValueError, match="not a valid C identifier"):
+        analyze([]).write_c_header(io.StringIO(), "1st")
+
+
+def test_encoded_dumps() -> None:
+    values = load_values(os.path.join(_RESOURCE_PATH, "dump1.vsh"), text=True)
+    program_interface = analyze(values)
+    assert 0 in program_interface.outputs
+    assert program_interface.inputs
@@ -0,0 +1,92 @@
+"""Tests for the float32 models of the vertex shader operations."""
+
+# pylint: disable=missing-function-docstring
+# pylint: disable=wrong-import-order
+
+from __future__ import annotations
+
+import os
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from nv2a_vsh.nv2a_vsh_asm.vsh_encoder_defs import ILU  # noqa: E402 Module level import not at top of file
+from nv2a_vsh.nv2a_vsh_emu import Emulator, compiler, operations  # noqa: E402 Module level import not at top of file
+
+_RESOURCE_PATH = os.path.dirname(pathlib.Path(__file__).resolve())
+_NAN_BITS = 0x7FC00000
+
+
+def _load_special_cases() -> list[tuple[str, list[int], list[int]]]:
+    ret = []
+    with open(os.path.join(_RESOURCE_PATH, "ilu_special_cases.txt")) as infile:
+        for line in infile:
+            line_content = line.strip()
+            if not line_content or line_content.startswith("#"):
+                continue
+            name, *words = line_content.split()
+            values = [int(word, 16) for word in words]
+            ret.append((name, values[:4], values[4:]))
+    return ret
+
+
+_SPECIAL_CASES = _load_special_cases()
+
+
+def _bits(values):
+    return np.asarray(values, dtype=np.uint32).view(np.float32)
+
+
+@pytest.mark.parametrize(("name", "source", "expected"), _SPECIAL_CASES)
+def test_ilu_special_cases(name, source, expected) -> None:
+    operation = operations.ILU_OPERATIONS[ILU[f"ILU_{name}"]]
+    with np.errstate(all="ignore"):
+        result = operation(_bits([source]))[0]
+
+    for component, (actual, expected_bits) in enumerate(zip(result, expected, strict=True)):
+        if expected_bits == _NAN_BITS:
+            assert np.isnan(actual), (component, actual)
+        else:
+            assert int(np.float32(actual).view(np.uint32)) == expected_bits, (component, actual, _bits([expected_bits]))
+
+
+def test_special_cases_are_generated() -> None:
+    generator = os.path.join(_RESOURCE_PATH, os.pardir, "tools", "generate_ilu_special_cases.py")
+    output = subprocess.run([sys.executable, generator], capture_output=True, text=True, check=True).stdout
+    with open(os.path.join(_RESOURCE_PATH, "ilu_special_cases.txt")) as infile:
+        assert output == infile.read()
+
+
+def test_flush_denormals_preserves_sign() -> None:
+    values = _bits([0x00000001, 0x80000001, 0x007FFFFF, 0x00800000, 0x7FC00000])
+    flushed = operations.flush_denormals(values).view(np.uint32)
+
+    np.testing.assert_array_equal(flushed, [0x00000000, 0x80000000, 0x00000000, 0x00800000, 0x7FC00000])
+
+
+def test_compiled_kernels_match_interpreter_on_special_values(assemble) -> None:
+    asm = assemble(
+        """
+        MOV R1, v0
+        RCP oD0, R1.x
+        RCC oD1, R1.y
+        RSQ oT0, R1.z
+        EXPP oT1, R1.w
+        LOGP oT2, R1.x
+        LIT oT3, R1.yzxw
+        """
+    )
+
+    specials = _bits([0x00000000, 0x80000000, 0x00000001, 0x80000001, 0x7F800000, 0xFF800000, 0x7FC00000, 0x3F800000])
+    inputs = np.zeros((len(specials) ** 2, 16, 4), dtype=np.float32)
+    inputs[:, 0, :2] = np.stack(np.meshgrid(specials, specials), axis=-1).reshape(-1, 2)
+    inputs[:, 0, 2:] = inputs[:, 0, 1::-1]
+
+    expected = Emulator(asm.output).run(inputs)
+    actual = compiler.CompiledProgram(asm.output).run(inputs)
+    for name, value in expected.items():
+        np.testing.assert_array_equal(actual[name].view(np.uint32), value.view(np.uint32), err_msg=name)
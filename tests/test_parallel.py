@@ -0,0 +1,43 @@
+"""Tests for multi-process emulation."""
+
+# pylint: disable=missing-function-docstring
+# pylint: disable=wrong-import-order
+
+from __future__ import annotations
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from nv2a_vsh.nv2a_vsh_emu import Emulator  # noqa: E402 Module level import not at top of file
+from nv2a_vsh.nv2a_vsh_emu.parallel import MIN_SHARD_SIZE, run_parallel  # noqa: E402
+
+_SOURCE = """
+MOV c[5], v1
+ARL A0, v2.x
+DP4 R0.x, v0, c[A0+4]
+RCP R1.x, R0.x
+MUL oPos, v0, R1.x
+MOV oD0, c[A0+5]
+"""
+
+
+@pytest.mark.parametrize("compiled", [True, False])
+def test_matches_serial_execution(compiled, assemble) -> None:
+    asm = assemble(_SOURCE)
+    num_vertices = MIN_SHARD_SIZE * 2 + 123
+    rng = np.random.default_rng(0)
+    inputs = rng.uniform(-2.0, 2.0, (num_vertices, 16, 4)).astype(np.float32)
+    inputs[:, 2, 0] = rng.integers(-1, 4, num_vertices)
+    constants = rng.uniform(-2.0, 2.0, (192, 4)).astype(np.float32)
+
+    expected = Emulator(asm.output).run(inputs, constants)
+    actual = run_parallel(asm.output, inputs.astype(np.float64), constants, workers=2, shards=3, compiled=compiled)
+    assert set(actual) == set(expected)
+    for name, value in expected.items():
+        np.testing.assert_array_equal(actual[name], value, err_msg=name)
+
+
+def test_rejects_instanced_constants() -> None:
+    with pytest.raises(ValueError, match="constants"):
+        run_parallel([[0, 0x0020001B, 0x0836106C, 0x2F100FF8]], np.zeros((4, 16, 4)), np.zeros((2, 192, 4)))
@@ -0,0 +1,175 @@
+"""Tests for the peephole optimizer."""
+
+# pylint: disable=missing-function-docstring
+# pylint: disable=wrong-import-order
+
+from __future__ import annotations
+
+import os
+import pathlib
+import typing
+
+import antlr4
+import pytest
+
+from nv2a_vsh.grammar.vsh.VshLexer import VshLexer
+from nv2a_vsh.grammar.vsh.VshParser import VshParser
+from nv2a_vsh.nv2a_vsh_asm.encoding_visitor import EncodingVisitor
+from nv2a_vsh.nv2a_vsh_asm.peephole import Rewrite, optimize
+
+if typing.TYPE_CHECKING:
+    from nv2a_vsh.nv2a_vsh_asm.dataflow import Statement
+
+_RESOURCE_PATH = os.path.dirname(pathlib.Path(__file__).resolve())
+
+
+def _statements(source: str) -> list[Statement]:
+    parser = VshParser(antlr4.CommonTokenStream(VshLexer(antlr4.InputStream(source))))
+    program = EncodingVisitor().visit(parser.program())
+    ret = []
+    for statement in program:
+        if isinstance(statement, tuple):
+            ret.append(statement)
+        else:
+            ret.extend(statement)
+    return ret
+
+
+def test_fuses_multiply_add(assemble) -> None:
+    asm = assemble("MUL R0, v0, c[0]\nADD oPos, R0, c[0].w", optimize_peephole=True)
+    assert asm.comments == ["mad oPos, v0, c0, c0.wwww"]
+    assert asm.peephole_result is not None
+    assert asm.peephole_result.rewrites == [
+        Rewrite("mad", ["mul r0, v0, c0", "add oPos, r0, c0.wwww"], "mad oPos, v0, c0, c0.wwww")
+    ]
+    assert asm.peephole_result.instructions_saved == 1
+
+
+def test_fuse_folds_swizzle_and_negation_into_one_factor(assemble) -> None:
+    asm = assemble("MUL R4.xy, v3.yx, -c[1]\nADD oD0.xy, c[1].z, -R4.yx", optimize_peephole=True)
+    assert asm.comments == ["mad oDiffuse.xy, -v3.xyyy, -c1.yxxx, c1.zzzz"]
+
+
+def test_fuse_requires_a_dead_product(assemble) -> None:
+    source = "MUL R0, v0, c[0]\nADD oPos, R0, c[0]\nMOV oD0, R0"
+    assert assemble(source, optimize_peephole=True).comments == [
+        "mul r0, v0, c0",
+        "add oPos, r0, c0",
+        "mov oDiffuse, r0",
+    ]
+
+
+def test_fuse_requires_unchanged_factors(assemble) -> None:
+    source = "MUL R0, R1, c[0]\nMOV R1, v1\nADD oPos, R0, R1\nMOV oD0, R1"
+    assert assemble(source, optimize_peephole=True).comments == [
+        "mul r0, r1, c0",
+        "mov r1, v1",
+        "add oPos, r0, r1",
+        "mov oDiffuse, r1",
+    ]
+
+
+def test_fuse_requires_components_from_the_product(assemble) -> None:
+    # R0.y is written by an earlier instruction, so the ADD does not read only the product.
+    source = "MOV R0, c[1]\nMUL R0.x, v0, c[0]\nADD oPos, R0.xy, c[0]"
+    assert assemble(source, optimize_peephole=True).comments == [
+        "mov r0, c1",
+        "mul r0.x, v0, c0",
+        "add oPos, r0.xyyy, c0",
+    ]
+
+
+def test_fuse_respects_register_limits(assemble) -> None:
+    source = "MUL R0, v0, c[0]\nADD oPos, R0, v1"
+    assert assemble(source, optimize_peephole=True).comments == ["mul r0, v0, c0", "add oPos, r0, v1"]
+
+
+def test_propagates_copies(assemble) -> None:
+    asm = assemble("MOV R2, -v1.zyxw\nDP4 oPos.x, R2.xxyz, c[4]", optimize_peephole=True)
+    assert asm.comments == ["dp4 oPos.x, -v1.zzyx, c4"]
+
+
+def test_copy_requires_a_single_reader(assemble) -> None:
+    source = "MOV R2, v1\nMUL oPos, R2, c[0]\nMOV oD0, R2"
+    assert assemble(source, optimize_peephole=True).comments == ["mov r2, v1", "mul oPos, r2, c0", "mov oDiffuse, r2"]
+
+
+def test_copy_ignores_overwritten_components(assemble) -> None:
+    source = "MOV R3.xzw, v1\nMOV R3.z, c[1]\nMAD oPos, v1, c[0], R3.wzwy"
+    assert assemble(source, optimize_peephole=True).comments == [
+        "mov r3.xzw, v1",
+        "mov r3.z, c1",
+        "mad oPos, v1, c0, r3.wzwy",
+    ]
+
+
+def test_removes_overwritten_moves(assemble) -> None:
+    asm = assemble("MOV R3, v1\nMOV R3, v2\nMUL oPos, R3, c[0]\nMUL oD0, R3, c[1]", optimize_peephole=True)
+    assert asm.comments == ["mov r3, v2", "mul oPos, r3, c0", "mul oDiffuse, r3, c1"]
+    assert asm.peephole_result is not None
+    assert asm.peephole_result.report() == [
+        "[overwritten-mov] Removed 'mov r3, v1'",
+        "Peephole optimization saved 1 of 4 instructions",
+    ]
+
+
+def test_dph_for_unit_w_inputs(assemble) -> None:
+    source = "DP4 oPos.x, c[4], v0"
+    assert assemble(source, optimize_peephole=True).comments == ["dp4 oPos.x, c4, v0"]
+    assert assemble(source, unit_w_inputs=[0], optimize_peephole=True).comments == ["dph oPos.x, v0, c4"]
+
+
+def test_dph_for_known_one_results(assemble) -> None:
+    # The MOV is no longer read once the DP4 becomes a DPH.
+    asm = assemble(
+        "EXPP R5, v4.x\nMOV R6.x, R5.w\nDP4 oPos.x, R6.yzwx, c[6]\nDP4 oD0.x, R5, c[7]", optimize_peephole=True
+    )
+    assert asm.comments == [
+        "expp r5, v4.xxxx",
+        "dph oPos.x, r6.yzwx, c6",
+        "dph oDiffuse.x, r5, c7",
+    ]
+
+
+def test_dph_requires_exact_one(assemble) -> None:
+    source = "EXPP R5, v4.x\nDP4 oPos.x, -R5, c[6]\nDP4 oD0.x, R5.wwwz, c[6]"
+    assert assemble(source, optimize_peephole=True).comments == [
+        "expp r5, v4.xxxx",
+        "dp4 oPos.x, -r5, c6",
+        "dp4 oDiffuse.x, r5.wwwz, c6",
+    ]
+
+
+def test_selected_rules() -> None:
+    statements = _statements("MOV R2, v1\nMOV R2, v2\nMOV oPos, R2")
+
+    result = optimize(statements, rules=["overwritten-mov"])
+    assert [rewrite.rule for rewrite in result.rewrites] == ["overwritten-mov"]
+    assert [source for _instruction, source in result.statements] == ["mov r2, v2", "mov oPos, r2"]
+
+    result = optimize(statements, rules=[])
+    assert not result.rewrites
+    assert result.statements == statements
+
+    with pytest.raises(ValueError, match="Unknown peephole rule 'fma'"):
+        optimize([], rules=["fma"])
+
+
+@pytest.mark.parametrize("name", ["all.vsh", "ngb_lava.vsh", "set_pos_and_color.vsh", "simple.vsh"])
+def test_preserves_results(name: str, assemble) -> None:
+    np = pytest.importorskip("numpy")
+    emulator = pytest.importorskip("nv2a_vsh.nv2a_vsh_emu")
+
+    with open(os.path.join(_RESOURCE_PATH, name)) as infile:
+        source = infile.read()
+    original = assemble(source)
+    optimized = assemble(source, unit_w_inputs=[0], optimize_peephole=True)
+
+    rng = np.random.default_rng(11)
+    inputs = rng.standard_normal((64, 16, 4)).astype(np.float32)
+    inputs[:, 0, 3] = 1.0
+    constants = rng.standard_normal((192, 4)).astype(np.float32)
+    expected = emulator.Emulator(original.output).run(inputs, constants)
+    actual = emulator.Emulator(optimized.output).run(inputs, constants)
+    for register, values in expected.items():
+        np.testing.assert_array_equal(actual[register], values)
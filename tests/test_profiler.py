@@ -0,0 +1,74 @@
+"""Tests for the profiling emulator."""
+
+# pylint: disable=missing-function-docstring
+# pylint: disable=wrong-import-order
+
+from __future__ import annotations
+
+import io
+import json
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from nv2a_vsh.disassemble import disassemble  # noqa: E402 Module level import not at top of file
+from nv2a_vsh.nv2a_vsh_emu import Emulator  # noqa: E402 Module level import not at top of file
+from nv2a_vsh.nv2a_vsh_emu.profiler import ProfilingEmulator  # noqa: E402 Module level import not at top of file
+
+_SOURCE = """
+ARL A0, v1.x
+MOV R1, c[A0+10]
+RCP oD0, v2.x
+MOV oPos, R1
+"""
+
+
+@pytest.fixture
+def program(assemble) -> list[list[int]]:
+    return assemble(_SOURCE).output
+
+
+def _inputs():
+    inputs = np.ones((6, 16, 4), dtype=np.float32)
+    inputs[:, 1, 0] = [0.0, 0.0, 1.0, 2.0, 500.0, -20.0]
+    inputs[:, 2, 0] = [0.0, 1.0, 2.0, -0.0, np.nan, 4.0]
+    return inputs
+
+
+def test_profile_matches_emulator_results(program) -> None:
+    profiler = ProfilingEmulator(program)
+    outputs = profiler.run(_inputs(), chunk_size=4)
+    expected = Emulator(program).run(_inputs())
+    for name, value in expected.items():
+        np.testing.assert_array_equal(outputs[name], value, err_msg=name)
+
+    profile = profiler.profile
+    assert profile.chunks == 2
+    assert [entry.lanes for entry in profile.instructions] == [6, 6, 6, 6]
+    assert all(entry.seconds > 0.0 for entry in profile.instructions)
+    assert dict(profile.a0_histogram) == {10: 2, 11: 1, 12: 1, 510: 1, -10: 1}
+    # RCP of +0, -0 (both infinite) and NaN, replicated to all 4 components of oD0.
+    assert profile.instructions[2].inf_count == 8
+    assert profile.instructions[2].nan_count == 4
+    assert profile.instructions[0].nan_count == 0
+
+
+def test_profile_export(program) -> None:
+    profiler = ProfilingEmulator(program)
+    profiler.run(_inputs())
+
+    outfile = io.StringIO()
+    profiler.profile.write_json(outfile)
+    exported = json.loads(outfile.getvalue())
+    assert [entry["pc"] for entry in exported["instructions"]] == [0, 1, 2, 3]
+    assert exported["a0_histogram"]["10"] == 2
+
+    listing = disassemble(program, explain=False)
+    lines = profiler.profile.format(listing)
+    assert len(lines) == len(listing)
+    assert lines[2].endswith(listing[2])
+
+    profiler.profile.reset()
+    assert profiler.profile.total_seconds == 0.0
+    assert not profiler.profile.a0_histogram
@@ -0,0 +1,106 @@
+"""Tests for the binary, C header and .npy program writers."""
+
+# pylint: disable=missing-function-docstring
+
+from __future__ import annotations
+
+import io
+import struct
+
+import pytest
+
+from nv2a_vsh.nv2a_vsh_asm import program_writer
+
+_VALUES = [
+    [0x00000000, 0x0020161B, 0x0836106C, 0x2070F858],
+    [0x00000000, 0x0400001B, 0x083613FC, 0x2070F82D],
+]
+
+
+def test_write_binary_is_little_endian() -> None:
+    output = io.BytesIO()
+    program_writer.write_binary(_VALUES, output)
+
+    data = output.getvalue()
+    assert len(data) == 32
+    assert data == struct.pack("<8I", *_VALUES[0], *_VALUES[1])
+
+
+def test_binary_round_trip() -> None:
+    output = io.BytesIO()
+    program_writer.write_binary(_VALUES, output)
+    output.seek(0)
+
+    assert program_writer.read_binary(output) == _VALUES
+
+
+def test_read_binary_rejects_partial_instruction() -> None:
+    with pytest.raises(ValueError, match="multiple of 16"):
+        program_writer.read_binary(io.BytesIO(b"\x00" * 12))
+
+
+def test_write_binary_rejects_malformed_instruction() -> None:
+    with pytest.raises(ValueError, match="4-integer"):
+        program_writer.write_binary([[0, 1, 2]], io.BytesIO())
+
+
+def test_write_c_header() -> None:
+    output = io.StringIO()
+    program_writer.write_c_header(_VALUES, output, "my_shader", comments=["MOV oD0, v3", "MOV oPos, v0"])
+
+    header = output.getvalue()
+    assert "#include <stdint.h>" in header
+    assert "static const uint32_t my_shader[] = {" in header
+    assert "    /* MOV oD0, v3 */\n    0x00000000, 0x0020161b, 0x0836106c, 0x2070f858,\n" in header
+    assert "static const uint32_t my_shader_length = 2;" in header
+    assert header.startswith("#ifndef MY_SHADER_H_\n")
+
+
+def test_write_c_header_without_comments() -> None:
+    output = io.StringIO()
+    program_writer.write_c_header(_VALUES, output)
+
+    assert "/* MOV" not in output.getvalue()
+    assert "static const uint32_t vsh_program[] = {" in output.getvalue()
+
+
+def test_write_c_header_rejects_invalid_name() -> None:
+    with pytest.raises(ValueError, match="C identifier"):
+        program_writer.write_c_header(_VALUES, io.StringIO(), "1bad-name")
+
+
+def test_write_npy_header_is_aligned() -> None:
+    output = io.BytesIO()
+    program_writer.write_npy(_VALUES, output)
+
+    data = output.getvalue()
+    assert program_writer.is_npy(data)
+    header_length = int.from_bytes(data[8:10], "little")
+    assert (10 + header_length) % 64 == 0
+    assert data[10 + header_length - 1 : 10 + header_length] == b"\n"
+    assert len(data) == 10 + header_length + 32
+
+
+def test_npy_round_trip() -> None:
+    output = io.BytesIO()
+    program_writer.write_npy(_VALUES, output)
+    output.seek(0)
+
+    assert program_writer.read_npy(output) == _VALUES
+
+
+def test_npy_loads_with_numpy() -> None:
+    numpy = pytest.importorskip("numpy")
+    output = io.BytesIO()
+    program_writer.write_npy(_VALUES, output)
+    output.seek(0)
+
+    loaded = numpy.load(output)
+    assert loaded.dtype == numpy.dtype("<u4")
+    assert loaded.tolist() == _VALUES
+
+
+def test_assembler_comments_include_final_marker(assemble) -> None:
+    asm = assemble("MOV oD0, v3", inline_final_flag=False)
+    assert len(asm.comments) == len(asm.output) == 2
+    assert asm.comments[-1] == "<NOP FINAL MARKER>"
@@ -0,0 +1,100 @@
+"""Tests for temporary register allocation."""
+
+# pylint: disable=missing-function-docstring
+# pylint: disable=wrong-import-order
+
+from __future__ import annotations
+
+import os
+import pathlib
+
+import pytest
+
+_RESOURCE_PATH = os.path.dirname(pathlib.Path(__file__).resolve())
+
+
+def test_reuses_registers_after_last_read(assemble) -> None:
+    asm = assemble("MOV R5, v0\nMOV oPos, R5\nMOV R7, v1\nMOV oD0, R7", allocate_registers=True)
+    assert asm.comments == ["mov r0, v0", "mov oPos, r0", "mov r0, v1", "mov oDiffuse, r0"]
+    assert asm.allocation_result is not None
+    assert asm.allocation_result.original_registers == {5, 7}
+    assert asm.allocation_result.registers == {0}
+    assert asm.allocation_result.report() == "Register allocation uses 1 temporary registers (previously 2)"
+
+
+def test_overlapping_ranges_use_separate_registers(assemble) -> None:
+    asm = assemble("MOV R4, v0\nMOV R6, v1\nADD oPos, R4, R6", allocate_registers=True)
+    assert asm.comments == ["mov r0, v0", "mov r2, v1", "add oPos, r0, r2"]
+
+
+def test_register_may_be_reused_by_the_reading_instruction(assemble) -> None:
+    asm = assemble("MOV R3, v0\nMUL R8, R3, c[0]\nMOV oPos, R8", allocate_registers=True)
+    assert asm.comments == ["mov r0, v0", "mul r0, r0, c0", "mov oPos, r0"]
+
+
+def test_disjoint_components_share_a_register(assemble) -> None:
+    asm = assemble("MOV R3.x, v0\nMOV R4.y, v1\nADD oPos, R3.x, R4.y", allocate_registers=True)
+    assert asm.comments == ["mov r0.x, v0", "mov r0.y, v1", "add oPos, r0.xxxx, r0.yyyy"]
+
+
+def test_partial_writes_are_kept_together(assemble) -> None:
+    asm = assemble("MOV R6.xy, v0\nMOV R6.zw, v1\nMOV oPos, R6", allocate_registers=True)
+    assert asm.comments == ["mov r0.xy, v0", "mov r0.zw, v1", "mov oPos, r0"]
+
+
+def test_ilu_results_prefer_r1(assemble) -> None:
+    asm = assemble("MOV R4, v0\nRCP R7.x, v1.x\nMUL oPos, R4, R7.x", allocate_registers=True)
+    assert asm.comments == ["mov r0, v0", "rcp r1.x, v1.xxxx", "mul oPos, r0, r1.xxxx"]
+
+
+def test_mac_results_avoid_r1(assemble) -> None:
+    asm = assemble("MOV R0, v0\nMOV R1, v1\nMOV R2, v2\nMAD oPos, R0, R1, R2", allocate_registers=True)
+    assert asm.comments == ["mov r0, v0", "mov r2, v1", "mov r3, v2", "mad oPos, r0, r2, r3"]
+
+
+def test_enables_ilu_pairing(assemble) -> None:
+    source = "MOV R5, v0\nRSQ R6.x, c[3].x\nMUL oPos, R5, c[0]\nMOV oD0, R6.x"
+    asm = assemble(source, schedule=True)
+    assert len(asm.output) == 4
+
+    asm = assemble(source, schedule=True, allocate_registers=True)
+    assert asm.comments == ["mov r0, v0 + rsq r1.x, c3.xxxx", "mul oPos, r0, c0", "mov oDiffuse, r1.xxxx"]
+
+
+def test_paired_ilu_result_stays_in_r1(assemble) -> None:
+    asm = assemble("MUL R4, v0, c[0] + RCP R1.x, v1.x\nMUL oPos, R4, R1.x", allocate_registers=True)
+    assert asm.comments == ["mul r0, v0, c0 + rcp r1.x, v1.xxxx", "mul oPos, r0, r1.xxxx"]
+
+
+def test_registers_read_before_written_keep_their_names(assemble) -> None:
+    asm = assemble("MOV R2, v0\nADD oPos, R2, R7\nMOV R7, v1\nMOV oD0, R7", allocate_registers=True)
+    assert asm.comments == ["mov r0, v0", "add oPos, r0, r7", "mov r0, v1", "mov oDiffuse, r0"]
+
+
+def test_pinned_registers_keep_their_names(assemble) -> None:
+    asm = assemble("MOV R5, v0\nMOV R8, v1\nADD oPos, R5, R8", pinned_registers=[5], allocate_registers=True)
+    assert asm.comments == ["mov r5, v0", "mov r0, v1", "add oPos, r5, r0"]
+
+    asm = assemble("MOV R3, v0\nMOV oPos, R3", pinned_registers=[0], allocate_registers=True)
+    assert asm.comments == ["mov r2, v0", "mov oPos, r2"]
+
+
+@pytest.mark.parametrize("name", ["all.vsh", "ngb_lava.vsh", "set_pos_and_color.vsh", "simple.vsh"])
+def test_preserves_results(name: str, assemble) -> None:
+    np = pytest.importorskip("numpy")
+    emulator = pytest.importorskip("nv2a_vsh.nv2a_vsh_emu")
+
+    with open(os.path.join(_RESOURCE_PATH, name)) as infile:
+        source = infile.read()
+    original = assemble(source)
+    allocated = assemble(source, eliminate_dead_code=True, schedule=True, allocate_registers=True)
+    assert allocated.allocation_result is not None
+    assert len(allocated.allocation_result.registers) <= len(allocated.allocation_result.original_registers)
+
+    rng = np.random.default_rng(7)
+    inputs = rng.standard_normal((64, 16, 4)).astype(np.float32)
+    constants = rng.standard_normal((192, 4)).astype(np.float32)
+    expected = emulator.Emulator(original.output).run(inputs, constants)
+    actual = emulator.Emulator(allocated.output).run(inputs, constants)
+    for register, values in expected.items():
+        np.testing.assert_array_equal(actual[register], values)
@@ -0,0 +1,145 @@
+"""Tests for disassemble -> assemble round trip verification."""
+
+# pylint: disable=missing-function-docstring
+
+from __future__ import annotations
+
+import os
+import pathlib
+
+import pytest
+
+from nv2a_vsh.nv2a_vsh_asm import round_trip
+from nv2a_vsh.nv2a_vsh_asm.vsh_encoder_defs import (
+    ILU,
+    MASK_XYZW,
+    OMUX_ILU,
+    OUTPUT_O,
+    PARAM_V,
+    OutputRegisters,
+)
+from nv2a_vsh.nv2a_vsh_asm.vsh_instruction import VshInstruction, vsh_diff_programs
+
+_RESOURCE_PATH = os.path.dirname(pathlib.Path(__file__).resolve())
+
+
+def _ilu_mov_to_output() -> list[int]:
+    """Returns a MOV executed on the ILU, which the disassembler cannot distinguish from a MAC MOV."""
+    ins = VshInstruction()
+    ins.ilu = ILU.ILU_MOV
+    ins.c_mux = PARAM_V
+    ins.input_reg = 3
+    ins.out_mux = bool(OMUX_ILU)
+    ins.out_o_or_c = bool(OUTPUT_O)
+    ins.out_address = OutputRegisters.REG_DIFFUSE
+    ins.out_o_mask = MASK_XYZW
+    return ins.encode()
+
+
+def test_round_trip_set_pos_and_color(assemble):
+    with open(os.path.join(_RESOURCE_PATH, "set_pos_and_color.vsh")) as infile:
+        program = assemble(infile.read()).output
+
+    report = round_trip.verify_program("set_pos_and_color", program)
+    assert report.ok, report.summary()
+    assert report.programs == 1
+    assert report.instructions == len(program)
+
+
+def test_explicit_final_nop_is_skipped(assemble):
+    program = assemble("MOV oD0, v3\nDP4 oPos.x, v0, c[96]", inline_final_flag=False).output
+
+    report = round_trip.verify_program("explicit", program, ignore_final_flag=True)
+    assert report.ok, report.summary()
+    assert report.skipped == 1
+
+    report = round_trip.verify_program("explicit", program)
+    assert [mismatch.fields for mismatch in report.mismatches] == [("FINAL",)]
+
+
+def test_mismatches_grouped_by_field(assemble):
+    program = [*assemble("MOV oD1, v4").output, _ilu_mov_to_output()]
+
+    report = round_trip.verify_program("ilu_mov", program, ignore_final_flag=True)
+    assert len(report.mismatches) == 1
+    mismatch = report.mismatches[0]
+    assert mismatch.instruction == 1
+    assert mismatch.source == "MOV oD0.xyzw, v3"
+
+    groups = report.by_field()
+    assert {"MAC", "ILU", "OUT_MUX"} <= set(groups)
+    assert groups["MAC"] == [mismatch]
+    assert "ilu_mov:1: MOV oD0.xyzw, v3" in report.summary()
+
+
+def test_ignore_unused_fields():
+    # Differs from the assembled form only in the unused B operand swizzle.
+    program = [[0x00000000, 0x0020061B, 0x0836106C, 0x2070F819]]
+    program[0][2] &= ~(0x3 << 17)
+
+    report = round_trip.verify_program("unused", program)
+    assert [mismatch.fields for mismatch in report.mismatches] == [("B_SWZ_W",)]
+
+    report = round_trip.verify_program("unused", program, ignore_unused_fields=True)
+    assert report.ok, report.summary()
+
+
+@pytest.mark.parametrize(
+    ("source", "fields"),
+    [
+        # The disassembler shortens these swizzles, which changes components that the operation does not read.
+        ("MOV R0.x, v0.xxyy", ("A_SWZ_Y",)),
+        ("MUL R0.xy, v0.xyyz, c[4]", ("A_SWZ_Z",)),
+        ("RCP R1.x, v0.xxyy", ("C_SWZ_Y",)),
+        ("LIT R1, v0.xyyw", ("C_SWZ_Z",)),
+    ],
+)
+def test_ignore_unread_swizzle_components(source: str, fields: tuple[str, ...], assemble):
+    program = assemble(source).output
+
+    report = round_trip.verify_program("unread", program)
+    assert [mismatch.fields for mismatch in report.mismatches] == [fields]
+
+    report = round_trip.verify_program("unread", program, ignore_unused_fields=True)
+    assert report.ok, report.summary()
+
+
+def test_unassemblable_instruction_reports_failure(assemble):
+    ins = VshInstruction()
+    ins.ilu = ILU.ILU_RCP
+    ins.c_mux = PARAM_V
+    ins.out_ilu_mask = MASK_XYZW
+    ins.out_temp_reg = 13
+    program = [*assemble("MOV oD0, v3").output, ins.encode()]
+
+    report = round_trip.verify_program("bad", program, ignore_final_flag=True)
+    assert [(mismatch.instruction, mismatch.fields) for mismatch in report.mismatches] == [
+        (1, (round_trip.ASSEMBLY_FAILED,))
+    ]
+
+
+def test_verify_corpus_parallel_matches_serial(assemble):
+    programs = [
+        ("a", assemble("MOV oD0, v3\nDP4 oPos.x, v0, c[96]").output),
+        ("b", [*assemble("MOV oD1, v4").output, _ilu_mov_to_output()]),
+    ]
+
+    serial = round_trip.verify_corpus(programs, ignore_final_flag=True, max_workers=1)
+    parallel = round_trip.verify_corpus(programs, ignore_final_flag=True, max_workers=2, chunksize=1)
+
+    assert parallel.programs == serial.programs == 2
+    assert parallel.mismatches == serial.mismatches
+    assert [mismatch.program for mismatch in parallel.mismatches] == ["b"]
+
+
+def test_diff_programs(assemble):
+    program = assemble("MOV oD0, v3\nDP4 oPos.x, v0, c[96]").output
+    assert vsh_diff_programs(program, program) == ""
+    assert vsh_diff_programs(program, program[:1]).startswith("Program lengths differ: expected 2 != actual 1")
+    assert vsh_diff_programs(program, [program[1], program[1]]).startswith("[0] Instructions differ.")
+
+    assert round_trip.verify_program("same", program).diffs == {}
+    program = [*assemble("MOV oD1, v4").output, _ilu_mov_to_output()]
+    report = round_trip.verify_program("ilu_mov", program, ignore_final_flag=True)
+    assert list(report.diffs) == ["ilu_mov"]
+    assert report.diffs["ilu_mov"].startswith("[1] Instructions differ.")
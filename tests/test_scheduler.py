@@ -0,0 +1,102 @@
+"""Tests for the MAC/ILU co-issue scheduler."""
+
+# pylint: disable=missing-function-docstring
+# pylint: disable=wrong-import-order
+
+from __future__ import annotations
+
+import os
+import pathlib
+
+import pytest
+
+_RESOURCE_PATH = os.path.dirname(pathlib.Path(__file__).resolve())
+
+
+def test_pairs_independent_operations(assemble) -> None:
+    asm = assemble("MUL R0, v0, c[0]\nRCP R1.x, R2.x", schedule=True)
+    assert asm.output == assemble("MUL R0, v0, c[0] + RCP R1.x, R2.x", schedule=False).output
+    assert asm.comments == ["mul r0, v0, c0 + rcp r1.x, r2.xxxx"]
+    assert asm.schedule_result is not None
+    assert asm.schedule_result.original_slots == 2
+    assert asm.schedule_result.slots_saved == 1
+
+
+def test_hoists_ilu_operation_past_dependent_chain(assemble) -> None:
+    asm = assemble("MUL R2, v0, c[0]\nADD R3, R2, v0\nRSQ R1.x, R4.x", schedule=True)
+    assert asm.comments == ["mul r2, v0, c0 + rsq r1.x, r4.xxxx", "add r3, r2, v0"]
+
+
+def test_read_after_write_is_not_paired(assemble) -> None:
+    asm = assemble("MUL R1, v0, c[0]\nRCP R1.w, R1.x", schedule=True)
+    assert asm.schedule_result is not None
+    assert asm.schedule_result.slots_saved == 0
+
+
+def test_write_after_read_is_paired(assemble) -> None:
+    asm = assemble("MUL R0, R1, c[0]\nRCP R1.x, v0.xxxx", schedule=True)
+    assert asm.comments == ["mul r0, r1, c0 + rcp r1.x, v0.xxxx"]
+
+
+def test_ilu_may_not_move_above_a_reader_of_its_result(assemble) -> None:
+    asm = assemble("MOV oPos, v0\nMOV R2, R1\nMUL R3, v1, c[1]\nRCP R1.x, v0.xxxx", schedule=True)
+    assert asm.comments == ["mov oPos, v0", "mov r2, r1 + rcp r1.x, v0.xxxx", "mul r3, v1, c1"]
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        # Paired ILU operations can only write R1.
+        "MUL R0, v0, c[0]\nRCP R2.x, v0.xxxx",
+        # Only one unit may write an output register.
+        "MUL oPos, v0, c[0]\nRCP oFog.x, v0.xxxx",
+        "MOV c[3], v0\nRCP oFog.x, v0.xxxx",
+        # Only one input register may be read.
+        "MUL R0, v0, c[0]\nRCP R1.x, v1.x",
+        # Only one constant register may be read.
+        "MUL R0, v0, c[0]\nRCP R1.x, c[1].x",
+        "MUL R0, v0, c[0]\nRCP R1.x, c[A0+0].x",
+        # The ILU reads slot C, which MAD also uses.
+        "MAD R0, v0, c[0], R3\nRCP R1.x, R2.x",
+        # ADD is encoded into slot C.
+        "ADD R0, v0, c[0]\nRCP R1.x, R2.x",
+        # Both operations write R1.x.
+        "MUL R1.x, v0, c[0]\nRCP R1.x, R2.x",
+        # ILU MOVs are left to the MAC.
+        "MUL R0, v0, c[0]\nMOV R1, R2",
+    ],
+)
+def test_ineligible_pairs(source: str, assemble) -> None:
+    asm = assemble(source, schedule=True)
+    assert asm.schedule_result is not None
+    assert asm.schedule_result.slots_saved == 0
+    assert asm.output == assemble(source, schedule=False).output
+
+
+def test_mad_sharing_slot_c(assemble) -> None:
+    asm = assemble("MAD R0, v0, c[0], R2.x\nRCP R1.x, R2.x", schedule=True)
+    assert asm.comments == ["mad r0, v0, c0, r2.xxxx + rcp r1.x, r2.xxxx"]
+
+
+def test_relative_constants_depend_on_constant_writes(assemble) -> None:
+    asm = assemble("MOV c[5], v0\nMUL R0, v1, c[1]\nRCP R1.x, c[A0+3].x", schedule=True)
+    assert asm.comments == ["mov c[5], v0", "mul r0, v1, c1", "rcp r1.x, c3.xxxx"]
+
+
+def test_schedule_preserves_emulated_results(assemble) -> None:
+    np = pytest.importorskip("numpy")
+    emulator = pytest.importorskip("nv2a_vsh.nv2a_vsh_emu")
+
+    with open(os.path.join(_RESOURCE_PATH, "all.vsh")) as infile:
+        source = infile.read()
+    scheduled = assemble(source, schedule=True)
+    assert scheduled.schedule_result is not None
+    assert scheduled.schedule_result.slots_saved > 0
+
+    rng = np.random.default_rng(0)
+    inputs = rng.standard_normal((256, 16, 4)).astype(np.float32)
+    constants = rng.standard_normal((192, 4)).astype(np.float32)
+    expected = emulator.Emulator(assemble(source, schedule=False).output).run(inputs, constants)
+    actual = emulator.Emulator(scheduled.output).run(inputs, constants)
+    for name, value in expected.items():
+        np.testing.assert_array_equal(actual[name], value)
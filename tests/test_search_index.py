@@ -0,0 +1,105 @@
+"""Tests for the program search index."""
+
+# pylint: disable=missing-function-docstring
+
+from __future__ import annotations
+
+import io
+
+import pytest
+
+from nv2a_vsh.nv2a_vsh_asm import search_index
+from nv2a_vsh.nv2a_vsh_asm.vsh_encoder_defs import ILU, MAC, OutputRegisters
+
+_PROGRAM_A = """
+MUL oPos.xyz, R12, c58
++ RCC R1.x, R12.w
+MOV oFog.x, v0.w
+"""
+
+_PROGRAM_B = """
+ARL A0, v1.x
+MOV R2, c[A0+120]
+MUL oPos, R2, c[3]
+"""
+
+
+@pytest.fixture
+def index(assemble) -> search_index.ProgramIndex:
+    ret = search_index.ProgramIndex()
+    ret.add_program("a", assemble(_PROGRAM_A).output)
+    ret.add_program("b", assemble(_PROGRAM_B).output)
+    return ret
+
+
+def test_field_query(index):
+    assert index.search(search_index.mac(MAC.MAC_MUL)) == [
+        search_index.Match("a", 0),
+        search_index.Match("b", 2),
+    ]
+
+
+def test_paired_query(index):
+    query = search_index.mac(MAC.MAC_MUL) & search_index.ilu(ILU.ILU_RCC)
+    assert index.search(query) == [search_index.Match("a", 0)]
+
+
+def test_or_and_not_queries(index):
+    assert index.matching_programs(search_index.writes_output(OutputRegisters.REG_FOG_COORD)) == ["a"]
+    assert index.search(search_index.reads_relative_constant()) == [search_index.Match("b", 1)]
+
+    query = search_index.mac(MAC.MAC_ARL) | search_index.ilu(ILU.ILU_RCC)
+    assert index.search(query) == [search_index.Match("a", 0), search_index.Match("b", 0)]
+
+    assert index.search(~search_index.mac(MAC.MAC_MOV) & search_index.Field("FINAL", 1)) == [search_index.Match("b", 2)]
+
+
+def test_parse_term(index):
+    assert index.search(search_index.parse_term("MAC=mul") & search_index.parse_term("ILU!=NOP")) == [
+        search_index.Match("a", 0)
+    ]
+    assert index.matching_programs(search_index.parse_term("OUT_ADDRESS=oFog")) == ["a"]
+    assert index.search(search_index.parse_term("CONST=0x78")) == [search_index.Match("b", 1)]
+
+
+def test_predicate_requires_evaluate():
+    class Incomplete(search_index.Predicate):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()  # type: ignore[abstract]
+
+
+@pytest.mark.parametrize("term", ["MAC", "MAC=BOGUS", "A_SWZ_X=1"])
+def test_parse_term_invalid(term):
+    with pytest.raises(ValueError):  # noqa: PT011 `pytest.raises(ValueError)` is too broad
+        search_index.parse_term(term)
+
+
+def test_incremental_replacement(index, assemble):
+    index.add_program("a", assemble("MOV oD0, v3").output)
+
+    assert index.search(search_index.ilu(ILU.ILU_RCC)) == []
+    assert index.search(search_index.mac(MAC.MAC_MOV)) == [search_index.Match("a", 0), search_index.Match("b", 1)]
+
+    index.remove_program("b")
+    assert index.programs == ["a"]
+    assert index.search(search_index.mac(MAC.MAC_MUL)) == []
+
+
+def test_save_and_load_round_trip(index, assemble):
+    index.remove_program("a")
+    index.add_program("c", assemble(_PROGRAM_A).output)
+
+    buffer = io.StringIO()
+    index.save(buffer)
+    buffer.seek(0)
+    loaded = search_index.ProgramIndex.load(buffer)
+
+    assert loaded.programs == ["b", "c"]
+    query = search_index.mac(MAC.MAC_MUL)
+    assert loaded.search(query) == index.search(query)
+    assert loaded.instruction(search_index.Match("c", 1)) == index.instruction(search_index.Match("c", 1))
+
+    loaded.add_program("d", assemble("ARL A0, v0.x").output)
+    assert loaded.search(search_index.mac(MAC.MAC_ARL)) == [search_index.Match("b", 0), search_index.Match("d", 0)]
@@ -0,0 +1,180 @@
+"""Tests for specializing programs for known constant values."""
+
+# pylint: disable=missing-function-docstring
+
+from __future__ import annotations
+
+import os
+import pathlib
+import typing
+
+import pytest
+
+from nv2a_vsh.nv2a_vsh_asm.constant_footprint import ConstantRange
+from nv2a_vsh.nv2a_vsh_asm.specialization import parse_constant_values
+
+if typing.TYPE_CHECKING:
+    from nv2a_vsh.nv2a_vsh_asm.assembler import Assembler
+
+_RESOURCE_PATH = os.path.dirname(pathlib.Path(__file__).resolve())
+
+_IDENTITY = {96: (1, 0, 0, 0), 97: (0, 1, 0, 0), 98: (0, 0, 1, 0), 99: (0, 0, 0, 1)}
+
+
+def test_multiplication_by_one_becomes_a_move(assemble) -> None:
+    asm = assemble(
+        "MUL R0, v0, c[4]\nMUL oPos, R0, -c[5].x\nMOV oD0, R0", known_constants={4: (1, 1, 1, 1), 5: (-1, 2, 2, 2)}
+    )
+    assert asm.comments == ["mov r0, v0", "mov oPos, r0", "mov oDiffuse, r0"]
+    assert asm.specialization_result is not None
+    assert asm.specialization_result.rewritten == [
+        ("mul r0, v0, c4", "mov r0, v0"),
+        ("mul oPos, r0, -c5.xxxx", "mov oPos, r0"),
+    ]
+
+
+def test_self_copies_are_removed(assemble) -> None:
+    asm = assemble("MOV R0, v0\nMUL R0.xy, R0, c[4]\nMOV oPos, R0", known_constants={4: (1, 1, 0, 0)})
+    assert asm.comments == ["mov r0, v0", "mov oPos, r0"]
+    assert asm.specialization_result is not None
+    assert asm.specialization_result.removed == ["mul r0.xy, r0, c4"]
+
+
+def test_known_results_are_read_from_constants(assemble) -> None:
+    # c[4].x * c[4].y is held by c[5].z, and the product is then no longer needed.
+    source = "MUL R0.x, c[4].x, c[4].y\nADD oPos, v0, R0.x"
+    constants = {4: (2, 3, 0, 0), 5: (0, 0, 6, 0)}
+    assert assemble(source, known_constants=constants).comments == ["mov r0.x, c5.zzzz", "add oPos, v0, r0.xxxx"]
+    assert assemble(source, known_constants=constants, optimize_peephole=True).comments == ["add oPos, v0, c5.zzzz"]
+
+
+def test_multiply_add_with_unit_factor(assemble) -> None:
+    asm = assemble(
+        "MAD oPos, v0, c[4], v0\nMAD oD0, v1, -c[5], c[6]", known_constants={4: (1, 1, 1, 1), 5: (1, 1, 1, 1)}
+    )
+    assert asm.comments == ["add oPos, v0, v0", "add oDiffuse, -v1, c6"]
+
+
+def test_zero_is_only_folded_with_fast_math(assemble) -> None:
+    source = "ADD R0, v0, c[4]\nMAD oD0, v1, v1, c[4]\nMUL oFog.x, v2.x, c[4].x\nMOV oPos, R0"
+    constants = {4: (0, 0, 0, 0)}
+    assert assemble(source, known_constants=constants).comments == [
+        "add r0, v0, c4",
+        "mad oDiffuse, v1, v1, c4",
+        "mul oFog.x, v2.xxxx, c4.xxxx",
+        "mov oPos, r0",
+    ]
+    assert assemble(source, known_constants=constants, fast_math=True).comments == [
+        "mov r0, v0",
+        "mul oDiffuse, v1, v1",
+        "mov oFog.x, c4.xxxx",
+        "mov oPos, r0",
+    ]
+
+
+def test_negative_zero_is_an_exact_additive_identity(assemble) -> None:
+    assert assemble("ADD oPos, v0, c[4]", known_constants={4: (-0.0, -0.0, -0.0, -0.0)}).comments == ["mov oPos, v0"]
+
+
+def test_identity_matrix(assemble) -> None:
+    source = "#tex matrix4 96\n%matmul4x4 oT0 v9 #tex\nMOV oPos, v0"
+    assert len(assemble(source, known_constants=_IDENTITY).specialization_result.rewritten) == 0  # type: ignore[union-attr]
+
+    asm = assemble(source, known_constants=_IDENTITY, fast_math=True)
+    assert asm.comments == [
+        "mov oTex0.x, v9.xxxx",
+        "mov oTex0.y, v9.yyyy",
+        "mov oTex0.z, v9.zzzz",
+        "mov oTex0.w, v9.wwww",
+        "mov oPos, v0",
+    ]
+    assert asm.specialization_result is not None
+    assert not asm.specialization_result.footprint.indices
+
+
+def test_known_a0_becomes_a_direct_read(assemble) -> None:
+    source = "ARL A0, c[4].x\nMOV oPos, c[A0+10]\nDP4 oD0, v0, c[A0+20]"
+    asm = assemble(source, known_constants={4: (2.5, 0, 0, 0)})
+    assert asm.comments[1:] == ["mov oPos, c12", "dp4 oDiffuse, v0, c22"]
+    assert asm.specialization_result is not None
+    assert asm.specialization_result.footprint.upload_plan() == [
+        ConstantRange(4, 1),
+        ConstantRange(12, 1),
+        ConstantRange(22, 1),
+    ]
+
+
+def test_paired_instructions_are_kept(assemble) -> None:
+    source = "MUL R0, v0, c[4] + RCP R1.x, v1.w\nADD oPos, R0, R1.x"
+    assert len(assemble(source, known_constants={4: (1, 1, 1, 1)}).comments) == 2
+
+
+def test_dead_work_is_removed(assemble) -> None:
+    source = "DP3 R0.x, v0, v0\nMUL R1, R0.x, c[4]\nADD oPos, v0, R1"
+    asm = assemble(source, known_constants={4: (0, 0, 0, 0)}, fast_math=True)
+    assert asm.comments == ["mov oPos, v0"]
+    assert asm.specialization_result is not None
+    assert asm.specialization_result.instructions_saved == 2
+    assert asm.specialization_result.report()[-4:] == [
+        "Specialization saved 2 of 3 instructions",
+        "Constants: 0 read directly, 0 through c[A0+n]",
+        "Upload plan: none",
+        "Upload plan covers 0 of 192 constant registers in 0 ranges",
+    ]
+
+
+def test_invalid_constants(assemble) -> None:
+    with pytest.raises(ValueError, match="Invalid known value"):
+        assemble("MOV oPos, c[4]", known_constants={4: (1, 2)})
+
+
+def test_parse_constant_values() -> None:
+    assert parse_constant_values(["c4=1,0,0,0.5", "c[5]=0", "C6=-1,2,3,4"]) == {
+        4: (1.0, 0.0, 0.0, 0.5),
+        5: (0.0, 0.0, 0.0, 0.0),
+        6: (-1.0, 2.0, 3.0, 4.0),
+    }
+
+
+@pytest.mark.parametrize("spec", ["c192=0", "v4=0", "c4=1,2", "c4=a", "c4", "c[4=1"])
+def test_invalid_constant_values(spec: str) -> None:
+    with pytest.raises(ValueError, match="Invalid constant value"):
+        parse_constant_values([spec])
+
+
+def _assert_same_results(original: Assembler, specialized: Assembler, constants: dict) -> None:
+    np = pytest.importorskip("numpy")
+    emulator = pytest.importorskip("nv2a_vsh.nv2a_vsh_emu")
+
+    rng = np.random.default_rng(17)
+    inputs = rng.standard_normal((64, 16, 4)).astype(np.float32)
+    values = rng.standard_normal((192, 4)).astype(np.float32)
+    for index, value in constants.items():
+        values[index] = value
+    expected = emulator.Emulator(original.output).run(inputs, values)
+    actual = emulator.Emulator(specialized.output).run(inputs, values)
+    for register, result in expected.items():
+        np.testing.assert_array_equal(actual[register], result)
+
+
+@pytest.mark.parametrize("name", ["all.vsh", "ngb_lava.vsh", "set_pos_and_color.vsh", "simple.vsh"])
+def test_preserves_results(name: str, assemble) -> None:
+    with open(os.path.join(_RESOURCE_PATH, name)) as infile:
+        source = infile.read()
+    original = assemble(source)
+    patterns = [(1, 1, 1, 1), (0, 1, 0, -1), (-1, 2, 0.5, 0), (-0.0, -0.0, 1, 1)]
+    constants = {index: patterns[index % len(patterns)] for index in range(0, 192, 3)}
+    _assert_same_results(original, assemble(source, known_constants=constants), constants)
+
+
+def test_fast_math_preserves_identity_transforms(assemble) -> None:
+    source = "#tex matrix4 96\n%matmul4x4 oT0 v9 #tex\n%matmul4x4 oPos v0 #tex"
+    original = assemble(source)
+    specialized = assemble(source, known_constants=_IDENTITY, fast_math=True)
+    assert specialized.comments[4:] == [
+        "mov oPos.x, v0.xxxx",
+        "mov oPos.y, v0.yyyy",
+        "mov oPos.z, v0.zzzz",
+        "mov oPos.w, v0.wwww",
+    ]
+    _assert_same_results(original, specialized, _IDENTITY)
@@ -0,0 +1,108 @@
+"""Tests for static program statistics."""
+
+# pylint: disable=missing-function-docstring
+
+from __future__ import annotations
+
+import os
+import pathlib
+
+import pytest
+
+from nv2a_vsh.disassemble import disassemble_to_instructions, load_values
+from nv2a_vsh.nv2a_vsh_asm.stats import LatencyModel, analyze, parse_latency_model
+
+_RESOURCE_PATH = os.path.dirname(pathlib.Path(__file__).resolve())
+
+
+def test_counts_slots(assemble) -> None:
+    stats = analyze(assemble("MUL R0, v0, c[0] + RCP R1.x, v1.x\nMOV oPos, R0\nRSQ oD0.x, v2.x").output)
+    assert stats.instructions == 3
+    assert (stats.paired, stats.mac_only, stats.ilu_only, stats.nops) == (1, 1, 1, 0)
+    assert stats.mac_utilization == pytest.approx(2 / 3)
+    assert stats.ilu_utilization == pytest.approx(2 / 3)
+
+
+def test_counts_explicit_final_nop(assemble) -> None:
+    asm = assemble("MOV oPos, v0", inline_final_flag=False)
+    stats = analyze(asm.output)
+    assert (stats.instructions, stats.mac_only, stats.nops) == (2, 1, 1)
+
+
+def test_independent_instructions_do_not_stall(assemble) -> None:
+    stats = analyze(assemble("MOV oPos, v0\nMOV oD0, v1\nRCP oFog.x, v2.x").output, LatencyModel(mac=4, ilu=6))
+    # Issued at cycles 0, 1 and 2; the RCP result is available at cycle 8.
+    assert stats.cycles == 8
+    assert stats.stall_cycles == 5
+    assert stats.critical_path == [2]
+    assert stats.critical_path_cycles == 6
+    assert stats.cycles >= stats.critical_path_cycles
+
+
+def test_dependent_instructions_stall(assemble) -> None:
+    source = "MUL R0, v0, c[0]\nRSQ R1.x, R0.w\nMUL oPos, R0, R1.x"
+    stats = analyze(assemble(source).output, LatencyModel(mac=4, ilu=6))
+    # Issued at cycles 0, 4 and 10.
+    assert stats.cycles == 14
+    assert stats.stall_cycles == 11
+    assert stats.critical_path == [0, 1, 2]
+    assert stats.critical_path_cycles == 14
+
+
+def test_dependencies_are_tracked_per_component(assemble) -> None:
+    stats = analyze(assemble("MOV R0.x, v0\nMOV oPos, R0.y").output, LatencyModel(mac=4))
+    # oPos does not wait for R0.x, so it is issued at cycle 1.
+    assert stats.cycles == 5
+
+
+def test_relative_reads_depend_on_a0_and_constant_writes(assemble) -> None:
+    source = "MOV c[10], v0\nARL A0, v1.x\nMOV oPos, c[A0+3]"
+    stats = analyze(assemble(source).output, LatencyModel(mac=4))
+    assert stats.critical_path == [1, 2]
+    assert stats.cycles == 9
+
+    stats = analyze(assemble(source).output, LatencyModel(mac=4, overrides={"ARL": 1}))
+    assert stats.critical_path == [0, 2]
+    assert stats.cycles == 8
+
+
+def test_latency_overrides() -> None:
+    model = parse_latency_model(["mac=2", "ILU=7", "rsq=9"])
+    assert model == LatencyModel(mac=2, ilu=7, overrides={"RSQ": 9})
+    assert model.latency("RSQ", "ilu") == 9
+    assert model.latency("RCP", "ilu") == 7
+    assert model.latency("DP4", "mac") == 2
+
+
+@pytest.mark.parametrize("spec", ["RSQ", "RSQ=0", "RSQ=fast", "FOO=3"])
+def test_invalid_latency(spec: str) -> None:
+    with pytest.raises(ValueError, match="latency"):
+        parse_latency_model([spec])
+
+
+def test_estimate_includes_final_latency(assemble) -> None:
+    stats = analyze(assemble("MOV R0, v0\nRSQ R1.x, R0.x\nMUL oPos, R1.x, v1").output)
+    assert stats.critical_path_cycles == 11
+    assert stats.cycles == 11
+
+
+def test_report(assemble) -> None:
+    stats = analyze(assemble("MUL R0, v0, c[0]\nRSQ R1.x, R0.w\nMUL oPos, R0, R1.x").output, LatencyModel(mac=4, ilu=6))
+    assert stats.report() == [
+        "Instructions: 3 of 136",
+        "Slots: 0 paired, 2 MAC only, 1 ILU only, 0 NOP",
+        "Utilization: MAC 66.7%, ILU 33.3%",
+        "Critical path: 3 operations, 14 cycles",
+        "Estimated cycles per vertex: 14 (11 stalled)",
+    ]
+
+
+def test_encoded_dumps() -> None:
+    values = load_values(os.path.join(_RESOURCE_PATH, "dump1.vsh"), text=True)
+    stats = analyze(disassemble_to_instructions(values))
+    assert stats == analyze(values)
+    # Decoding stops at the first FINAL instruction.
+    assert stats.instructions == 22
+    assert stats.paired == 1
+    assert stats.cycles >= stats.instructions
+    assert stats.cycles >= stats.critical_path_cycles
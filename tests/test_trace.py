@@ -0,0 +1,159 @@
+"""Tests for execution trace recording and replay."""
+
+# pylint: disable=missing-function-docstring
+# pylint: disable=wrong-import-order
+
+from __future__ import annotations
+
+import io
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from nv2a_vsh.nv2a_vsh_emu import (  # noqa: E402 Module level import not at top of file
+    Emulator,
+    VertexAttribute,
+    VertexStream,
+)
+from nv2a_vsh.nv2a_vsh_emu.trace import Trace, record_trace  # noqa: E402 Module level import not at top of file
+
+_SOURCE = """
+MOV R1, v1
+ARL A0, R1.x
+MUL R2.xy, R1, c[A0+10]
+ADD oD0.xz, R2, v2
+MOV c[5].w, R1.y
+DP4 oPos.x, R1, c[1] + RCP R1.z, R1.w
+"""
+
+
+@pytest.fixture
+def program(assemble) -> list[list[int]]:
+    return assemble(_SOURCE).output
+
+
+def _inputs(count: int = 8):
+    rng = np.random.default_rng(1)
+    inputs = rng.uniform(-4.0, 4.0, (count, 16, 4)).astype(np.float32)
+    inputs[:, 1, 0] = np.arange(count)
+    return inputs
+
+
+def _constants():
+    return np.random.default_rng(2).standard_normal((192, 4)).astype(np.float32)
+
+
+def _record(program, tmp_path, inputs, vertices=None):
+    path = tmp_path / "program.trace"
+    with open(path, "wb") as outfile:
+        record_trace(program, inputs, _constants(), vertices=vertices, outfile=outfile)
+    return path
+
+
+def test_writes_store_written_components(tmp_path, program):
+    inputs = _inputs()
+    with Trace(_record(program, tmp_path, inputs)) as trace:
+        assert trace.num_instructions == 6
+        assert trace.vertices == list(range(8))
+        assert [str(write.destination) for write in trace.writes()] == [
+            "R1.xyzw",
+            "A0.x",
+            "R2.xy",
+            "oD0.xz",
+            "c[5].w",
+            "oPos.x",
+            "R1.z",
+        ]
+
+        (write,) = trace.writes(3)
+        assert write.pc == 3
+        assert write.values.shape == (8, 2)
+        assert [write.pc for write in trace.writes(5)] == [5, 5]
+
+        (a0,) = trace.writes(1)
+        assert a0.values.dtype == np.int32
+        np.testing.assert_array_equal(a0.values[:, 0], np.arange(8))
+
+
+def test_state_matches_emulator(tmp_path, program):
+    inputs = _inputs()
+    expected = Emulator(program).run(inputs, _constants())
+    with Trace(_record(program, tmp_path, inputs)) as trace:
+        state = trace.state(5)
+
+    np.testing.assert_array_equal(state["oPos"], expected["oPos"])
+    np.testing.assert_array_equal(state["oD0"], expected["oD0"])
+    np.testing.assert_array_equal(state["R1"][:, [0, 1, 3]], inputs[:, 1, [0, 1, 3]])
+    np.testing.assert_array_equal(state["R1"][:, 2], np.float32(1.0) / inputs[:, 1, 3])
+    np.testing.assert_array_equal(state["A0"], np.arange(8))
+
+
+def test_state_before_later_writes(tmp_path, program):
+    inputs = _inputs()
+    with Trace(_record(program, tmp_path, inputs)) as trace:
+        assert sorted(trace.state(0)) == ["R1"]
+        state = trace.state(3)
+
+    assert "oPos" not in state
+    np.testing.assert_array_equal(state["R2"][:, 2:], 0.0)
+    np.testing.assert_array_equal(state["oD0"][:, 1], 0.0)
+    np.testing.assert_array_equal(state["oD0"][:, 3], 1.0)
+
+
+def test_unwritten_constant_components_are_nan(tmp_path, program):
+    inputs = _inputs()
+    with Trace(_record(program, tmp_path, inputs)) as trace:
+        constant = trace.state(5)["c[5]"]
+
+    assert np.isnan(constant[:, :3]).all()
+    np.testing.assert_array_equal(constant[:, 3], inputs[:, 1, 1])
+
+
+def test_selected_vertices(tmp_path, program):
+    inputs = _inputs()
+    expected = Emulator(program).run(inputs, _constants())
+    with Trace(_record(program, tmp_path, inputs, vertices=[6, 2])) as trace:
+        assert trace.vertices == [6, 2]
+        np.testing.assert_array_equal(trace.state(5)["oD0"], expected["oD0"][[6, 2]])
+
+        history = trace.history("R1", vertex=2)
+        assert [pc for pc, _value in history] == [0, 5]
+        np.testing.assert_array_equal(history[0][1], inputs[2, 1])
+        assert history[1][1].shape == (1,)
+
+
+def test_vertex_stream_inputs(tmp_path, program):
+    inputs = _inputs()
+    stream = VertexStream(inputs.tobytes(), {index: VertexAttribute(index * 16, 16 * 16, 4) for index in range(16)})
+    with Trace(_record(program, tmp_path, stream, vertices=[3, 5])) as trace:
+        np.testing.assert_array_equal(trace.state(0)["R1"], inputs[[3, 5], 1])
+
+
+def test_delta_encoding_is_lossless(tmp_path, program):
+    inputs = _inputs(64)
+    inputs[::3, 1, 1] = np.nan
+    inputs[1::3, 1, 1] = -np.inf
+    inputs[2::3, 1, 1] = -0.0
+    with Trace(_record(program, tmp_path, inputs)) as trace:
+        (write,) = trace.writes(0)
+    np.testing.assert_array_equal(write.values.view(np.uint32), inputs[:, 1].view(np.uint32))
+
+
+def test_smooth_inputs_compress(tmp_path, program):
+    inputs = np.zeros((4096, 16, 4), dtype=np.float32)
+    inputs[:, 1] = np.linspace(0.0, 1.0, 4096, dtype=np.float32)[:, np.newaxis]
+    path = _record(program, tmp_path, inputs)
+    assert path.stat().st_size < 4096 * 4 * 4
+
+
+def test_invalid_vertices(program):
+    with pytest.raises(ValueError, match="Traced vertex indices"):
+        record_trace(program, _inputs(), vertices=[8], outfile=io.BytesIO())
+
+
+def test_invalid_file(tmp_path):
+    path = tmp_path / "bad.trace"
+    path.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError, match="is not a vertex shader trace"):
+        Trace(path)
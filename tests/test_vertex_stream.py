@@ -0,0 +1,100 @@
+"""Tests for reading emulator inputs from raw vertex buffers."""
+
+# pylint: disable=missing-function-docstring
+# pylint: disable=wrong-import-order
+
+from __future__ import annotations
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from nv2a_vsh.nv2a_vsh_asm.vsh_encoder_defs import InputRegisters  # noqa: E402 Module level import not at top of file
+from nv2a_vsh.nv2a_vsh_emu import Emulator  # noqa: E402 Module level import not at top of file
+from nv2a_vsh.nv2a_vsh_emu.vertex_stream import (  # noqa: E402 Module level import not at top of file
+    AttributeType,
+    VertexAttribute,
+    VertexStream,
+)
+
+# float3 position, D3DCOLOR diffuse, short2 texcoord (unnormalized), packed normal.
+_VERTEX = np.dtype([("pos", "<f4", 3), ("diffuse", "u1", 4), ("tex", "<i2", 2), ("normal", "<u4")])
+_ATTRIBUTES: dict[InputRegisters | int | str, VertexAttribute] = {
+    InputRegisters.REG_POS: VertexAttribute(0, _VERTEX.itemsize, 3, AttributeType.F),
+    "REG_DIFFUSE": VertexAttribute(12, _VERTEX.itemsize, 4, AttributeType.UB_D3D),
+    9: VertexAttribute(16, _VERTEX.itemsize, 2, AttributeType.S32K),
+    "v2": VertexAttribute(20, _VERTEX.itemsize, 3, AttributeType.CMP),
+}
+
+
+def _vertices(count: int = 10):
+    rng = np.random.default_rng(0)
+    ret = np.zeros(count, dtype=_VERTEX)
+    ret["pos"] = rng.uniform(-10.0, 10.0, (count, 3))
+    ret["diffuse"] = rng.integers(0, 256, (count, 4))
+    ret["tex"] = rng.integers(-32768, 32768, (count, 2))
+    # x = 1023 (1.0), y = -1023 (-1.0), z = -512 (clamped to -1.0).
+    ret["normal"] = 1023 | ((2048 - 1023) << 11) | (512 << 22)
+    return ret
+
+
+def test_interleaved_attributes() -> None:
+    vertices = _vertices()
+    stream = VertexStream(vertices.tobytes(), _ATTRIBUTES)
+    inputs = stream[:]
+
+    assert len(stream) == len(vertices)
+    assert inputs.shape == (10, 16, 4)
+    np.testing.assert_array_equal(inputs[:, 0, :3], vertices["pos"])
+    np.testing.assert_array_equal(inputs[:, 0, 3], 1.0)
+    np.testing.assert_allclose(inputs[:, 3], vertices["diffuse"][:, [2, 1, 0, 3]] / 255.0, rtol=1e-6)
+    np.testing.assert_array_equal(inputs[:, 9], np.column_stack([vertices["tex"], np.zeros(10), np.ones(10)]))
+    np.testing.assert_array_equal(inputs[:, 2], np.broadcast_to([1.0, -1.0, -1.0, 1.0], (10, 4)))
+    np.testing.assert_array_equal(inputs[:, 1], np.broadcast_to([0.0, 0.0, 0.0, 1.0], (10, 4)))
+
+
+def test_normalized_shorts_and_bytes() -> None:
+    data = np.array([[32767, -32768, 0, 16384]], dtype="<i2").tobytes() + bytes([255, 0, 51, 102])
+    attributes: dict[InputRegisters | int | str, VertexAttribute] = {
+        "V0": VertexAttribute(0, 0, 4, AttributeType.S1),
+        "V1": VertexAttribute(8, 0, 4, AttributeType.UB_OGL),
+    }
+    stream = VertexStream(data, attributes, num_vertices=2)
+    inputs = stream[:]
+
+    np.testing.assert_allclose(inputs[:, 0], [[1.0, -1.0, 0.0, 16384 / 32767]] * 2, rtol=1e-6)
+    np.testing.assert_allclose(inputs[:, 1], [[1.0, 0.0, 0.2, 0.4]] * 2, rtol=1e-6)
+
+
+def test_from_format_register() -> None:
+    # NV097_SET_VERTEX_DATA_ARRAY_FORMAT: type F, size 3, stride 24.
+    assert VertexAttribute.from_format(8, (24 << 8) | (3 << 4) | 2) == VertexAttribute(8, 24, 3, AttributeType.F)
+    assert VertexAttribute.from_format(0, (4 << 8) | (1 << 4) | 6).size == 3
+
+
+def test_memory_mapped_stream_matches_array(tmp_path, assemble) -> None:
+    vertices = _vertices(37)
+    path = tmp_path / "vertices.bin"
+    vertices.tofile(str(path))
+    stream = VertexStream(path, _ATTRIBUTES)
+
+    asm = assemble("MOV R1, v0\nADD oPos, R1, v3\nMUL oT0, v9, v2")
+    emulator = Emulator(asm.output)
+    expected = emulator.run(stream[:])
+
+    np.testing.assert_array_equal(emulator.run(stream, chunk_size=8)["oPos"], expected["oPos"])
+    for start, outputs in emulator.stream(stream, chunk_size=8):
+        np.testing.assert_array_equal(outputs["oT0"], expected["oT0"][start : start + outputs["oT0"].shape[0]])
+    np.testing.assert_array_equal(np.concatenate(list(stream.chunks(10))), stream[:])
+
+
+def test_rejects_bad_descriptors() -> None:
+    data = bytes(64)
+    with pytest.raises(ValueError, match="beyond"):
+        VertexStream(data, {"V0": VertexAttribute(0, 16, 4)}, num_vertices=5)
+    with pytest.raises(ValueError, match="component count"):
+        VertexStream(data, {"V0": VertexAttribute(0, 16, 5)})
+    with pytest.raises(ValueError, match="Unknown input register"):
+        VertexStream(data, {"iPosition": VertexAttribute(0, 16, 4)})
+    with pytest.raises(ValueError, match="num_vertices"):
+        VertexStream(data, {"V0": VertexAttribute(0, 0, 4)})
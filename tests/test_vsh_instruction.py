@@ -4,7 +4,7 @@ import re
 
 import pytest
 
-from nv2a_vsh.nv2a_vsh_asm.vsh_instruction import VshInstruction, explain, vsh_diff_instructions
+from nv2a_vsh.nv2a_vsh_asm.vsh_instruction import VshInstruction, decode_fields, explain, vsh_diff_instructions
 
 
 def test_default_explain():
@@ -181,3 +181,22 @@ def test_diff_instructions_different_c_fields_differ():
         vsh_diff_instructions([0x0, 0x0, 0x0, 0x0], [0x0, 0x0, 0x1, 0x0], ignore_final_flag=False)
         == "Instructions differ.\n\t0x00000000 0x00000000 0x00000000 0x00000000\n\t0x00000000 0x00000000 0x00000001 0x00000000\n\n\tC_TEMP_REG_HIGH 0x0 (00) != actual 0x1 (01)\n"
     )
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        [0x00000000, 0x0000001B, 0x0836106C, 0x20700FF8],
+        [0x00000000, 0x006F20BF, 0x9C001456, 0x7C000002],
+        [0x00000000, 0x0647401B, 0xC4361BFF, 0x1078E800],
+    ],
+)
+def test_decode_fields_matches_explain(data):
+    fields = decode_fields(data)
+    explained = explain(data).split("\n\t")[1:]
+    assert [f"{name}: 0x{value:x}" for name, value in fields.items()] == [line.split(" (")[0] for line in explained]
+
+
+def test_decode_fields_with_invalid_input():
+    with pytest.raises(ValueError, match=re.escape("values [0, 1] must be a 4-integer encoded instruction")):
+        decode_fields([0, 1])
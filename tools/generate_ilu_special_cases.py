@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+
+"""Generates tests/ilu_special_cases.txt, the expected results of the ILU operations for special case operands.
+
+The expected values are transcribed by hand from xemu's vertex program translator (the `_RCP`, `_RCC`, `_RSQ`, `_EXP`,
+`_LOG` and `_LIT` GLSL helpers in hw/xbox/nv2a/pgraph/glsl/vsh-prog.c, formerly hw/xbox/nv2a/vsh.c), which in turn
+follows the NV_vertex_program1_1 specification. Each helper is quoted next to its transcription below. The
+transcription is written with scalar Python floats, independently of the NumPy kernels in nv2a_vsh_emu/operations.py,
+so that it checks the special case handling of those kernels. The values are not captured from xemu or the hardware,
+so they do not show that the kernels match either bit for bit.
+
+xemu executes these helpers on the host GPU, so some details are left to the GPU. They are resolved as follows:
+
+* Every GLSL operation is evaluated exactly and rounded to float32 once. The host GPU may be less precise, and the
+  nv2a itself uses lookup table based approximations that are not modeled (see operations.py).
+* `min`, `max` and `clamp` return the other operand when one operand is NaN (IEEE-754 minNum/maxNum, as implemented
+  by GPUs), and `max(-0.0, 0.0)` is `+0.0`.
+* Denormal operands and results are flushed to zero, preserving the sign, as the nv2a does not support denormals.
+
+Usage:
+
+    python tools/generate_ilu_special_cases.py > tests/ilu_special_cases.txt
+"""
+
+# ruff: noqa: T201 `print` found
+
+from __future__ import annotations
+
+import math
+import struct
+
+_FLT_MIN = 2.0**-126
+_INF = math.inf
+_NAN = math.nan
+_NAN_BITS = 0x7FC00000
+
+# Operands of RCP, RCC, RSQ, EXPP and LOGP (as float32 bit patterns). Covers signed zeros, denormals, infinities,
+# NaN, the range of RCC's clamping and of exp2's results, and a few ordinary values.
+_SCALAR_OPERANDS = [
+    0x3F800000,  # 1
+    0xBF800000,  # -1
+    0x40000000,  # 2
+    0xBF000000,  # -0.5
+    0x3E99999A,  # 0.3
+    0x40400000,  # 3
+    0x00000000,  # 0
+    0x80000000,  # -0
+    0x00000001,  # Smallest denormal
+    0x80000001,
+    0x007FFFFF,  # Largest denormal
+    0x00800000,  # FLT_MIN
+    0x7F800000,  # inf
+    0xFF800000,  # -inf
+    0x7FC00000,  # NaN
+    0x7E967699,  # 1e38
+    0xFE967699,  # -1e38
+    0x006CE3EE,  # 1e-38
+    0x7F7FC99E,  # 3.4e38
+    0x60AD78EC,  # 1e20, whose reciprocal is below the RCC clamping range
+    0x9E3CE508,  # -1e-20, whose reciprocal is above the RCC clamping range
+    0x5F502AB5,  # 1.5e19
+    0x1FC8B359,  # 8.5e-20
+    0x42FE0000,  # 127, the largest normal exp2 result
+    0x43000000,  # 128, exp2 overflows
+    0xC2FC0000,  # -126, exp2 is FLT_MIN
+    0xC2FE0000,  # -127, exp2 is a denormal
+    0xC3150000,  # -149
+    0x3F400000,  # 0.75
+    0xC0100000,  # -2.25
+    0x47800000,  # 65536
+]
+
+# Operands of LIT as (x, y, z, w) float32 bit patterns.
+_LIT_OPERANDS = [
+    (0x3F000000, 0x3F000000, 0x00000000, 0x40000000),
+    (0xBF000000, 0x3F000000, 0x00000000, 0x40000000),
+    (0x3F000000, 0xBF000000, 0x00000000, 0x40000000),
+    (0x3F000000, 0x00000000, 0x00000000, 0x40000000),
+    (0x00000000, 0x3F000000, 0x00000000, 0x40000000),
+    (0x80000000, 0x3F000000, 0x00000000, 0x40000000),
+    (0x3F800000, 0x3F666666, 0x00000000, 0x43480000),
+    (0x3F800000, 0x3F666666, 0x00000000, 0xC3480000),
+    (0x3F800000, 0x40000000, 0x00000000, 0x43000000),
+    (0x00000001, 0x3F000000, 0x00000000, 0x40000000),
+    (0x3F000000, 0x00000001, 0x00000000, 0x40000000),
+    (0x3F000000, 0x3F000000, 0x00000000, 0x00000001),
+    (0x7F800000, 0x3F000000, 0x00000000, 0x40400000),
+    (0x7FC00000, 0x3F000000, 0x00000000, 0x40400000),
+    (0x3F000000, 0x7FC00000, 0x00000000, 0x40400000),
+    (0x3F000000, 0x3F000000, 0x00000000, 0x7FC00000),
+    (0x3F000000, 0x7F800000, 0x00000000, 0x3F800000),
+    (0x3F000000, 0x3E800000, 0x00000000, 0x00000000),
+    (0x3F4CCCCD, 0x3A83126F, 0x00000000, 0x42FFFE01),
+    (0x40400000, 0x3FC00000, 0x00000000, 0xC0200000),
+    # y = 0 with a zero and a negative power.
+    (0x3F000000, 0x00000000, 0x00000000, 0x00000000),
+    (0x3F000000, 0x00000000, 0x00000000, 0xC0000000),
+]
+
+
+def _from_bits(bits: int) -> float:
+    return struct.unpack("<f", struct.pack("<I", bits))[0]
+
+
+def _to_bits(value: float) -> int:
+    if math.isnan(value):
+        return _NAN_BITS
+    return struct.unpack("<I", struct.pack("<f", value))[0]
+
+
+def _f32(value: float) -> float:
+    """Rounds `value` to float32, flushing denormal results to zero."""
+    if math.isnan(value) or math.isinf(value):
+        return value
+    try:
+        ret = struct.unpack("<f", struct.pack("<f", value))[0]
+    except OverflowError:
+        ret = math.copysign(_INF, value)
+    if ret != 0.0 and abs(ret) < _FLT_MIN:
+        ret = math.copysign(0.0, ret)
+    return ret
+
+
+def _div(a: float, b: float) -> float:
+    if b == 0.0:
+        if a == 0.0 or math.isnan(a):
+            return _NAN
+        return math.copysign(_INF, a) * math.copysign(1.0, b)
+    return _f32(a / b)
+
+
+def _mul(a: float, b: float) -> float:
+    return _f32(a * b)
+
+
+def _sub(a: float, b: float) -> float:
+    return _f32(a - b)
+
+
+def _floor(value: float) -> float:
+    if math.isnan(value) or math.isinf(value):
+        return value
+    return math.copysign(float(math.floor(value)), value)
+
+
+def _exp2(value: float) -> float:
+    if math.isnan(value):
+        return value
+    try:
+        return _f32(2.0**value)
+    except OverflowError:
+        return _INF
+
+
+def _log2(value: float) -> float:
+    if math.isnan(value) or value < 0.0:
+        return _NAN
+    if value == 0.0:
+        return -_INF
+    if math.isinf(value):
+        return _INF
+    return _f32(math.log2(value))
+
+
+def _inversesqrt(value: float) -> float:
+    if math.isnan(value) or value < 0.0:
+        return _NAN
+    if value == 0.0:
+        return _INF
+    return _f32(1.0 / math.sqrt(value))
+
+
+def _max(a: float, b: float) -> float:
+    if math.isnan(a):
+        return b
+    if math.isnan(b):
+        return a
+    if a == b == 0.0:
+        return a if math.copysign(1.0, a) > 0.0 else b
+    return max(a, b)
+
+
+def _min(a: float, b: float) -> float:
+    if math.isnan(a):
+        return b
+    if math.isnan(b):
+        return a
+    return min(a, b)
+
+
+def _clamp(value: float, low: float, high: float) -> float:
+    return _min(_max(value, low), high)
+
+
+def _rcp(src: float) -> list[float]:
+    # return vec4(1.0 / src);
+    return [_div(1.0, src)] * 4
+
+
+def _rcc(src: float) -> list[float]:
+    # float t = 1.0 / src;
+    # if (t > 0.0) t = clamp(t, 5.42101e-020, 1.884467e+019);
+    # else t = clamp(t, -1.884467e+019, -5.42101e-020);
+    # return vec4(t);
+    low = _f32(5.42101e-020)
+    high = _f32(1.884467e019)
+    t = _div(1.0, src)
+    t = _clamp(t, low, high) if t > 0.0 else _clamp(t, -high, -low)
+    return [t] * 4
+
+
+def _rsq(src: float) -> list[float]:
+    # return vec4(inversesqrt(abs(src)));
+    return [_inversesqrt(abs(src))] * 4
+
+
+def _expp(src: float) -> list[float]:
+    # vec4 t;
+    # t.x = exp2(floor(src));
+    # t.y = src - floor(src);
+    # t.z = exp2(src);
+    # t.w = 1.0;
+    floor = _floor(src)
+    return [_exp2(floor), _sub(src, floor), _exp2(src), 1.0]
+
+
+def _logp(src: float) -> list[float]:
+    # float tmp = abs(src);
+    # if (tmp == 0.0) return vec4(-inf, 1.0, -inf, 1.0);
+    # if (isinf(tmp)) return vec4(inf, 1.0, inf, 1.0);
+    # float exponent = floor(log2(tmp));
+    # return vec4(exponent, tmp / exp2(exponent), log2(tmp), 1.0);
+    tmp = abs(src)
+    if tmp == 0.0:
+        return [-_INF, 1.0, -_INF, 1.0]
+    if math.isinf(tmp):
+        return [_INF, 1.0, _INF, 1.0]
+    exponent = _floor(_log2(tmp))
+    return [exponent, _div(tmp, _exp2(exponent)), _log2(tmp), 1.0]
+
+
+def _lit(x: float, y: float, w: float) -> list[float]:
+    # float epsilon = 1.0 / 256.0;
+    # s.w = clamp(s.w, -(128.0 - epsilon), 128.0 - epsilon);
+    # s.x = max(s.x, 0.0);
+    # s.y = max(s.y, 0.0);
+    # vec4 t = vec4(1.0, 0.0, 0.0, 1.0);
+    # t.y = s.x;
+    # t.z = (s.x > 0.0) ? exp2(s.w * log2(s.y)) : 0.0;
+    power_max = 128.0 - 1.0 / 256.0
+    w = _clamp(w, -power_max, power_max)
+    x = _max(x, 0.0)
+    y = _max(y, 0.0)
+    specular = _exp2(_mul(w, _log2(y))) if x > 0.0 else 0.0
+    return [1.0, x, specular, 1.0]
+
+
+def _flushed(bits: int) -> float:
+    return _f32(_from_bits(bits))
+
+
+def _line(name: str, source: tuple[int, ...], result: list[float]) -> str:
+    words = [f"{bits:08x}" for bits in source]
+    results = [f"{_to_bits(value):08x}" for value in result]
+    return f"{name} {' '.join(words)}  {' '.join(results)}"
+
+
+def main() -> None:
+    """Writes the expected results to stdout."""
+    print("# Expected results of the ILU operations for special and boundary case operands, as float32 bit patterns.")
+    print(
+        "# Generated by tools/generate_ilu_special_cases.py from a transcription of xemu's vertex program ILU helpers;"
+    )
+    print("# these are not captured xemu or hardware outputs. Do not edit by hand.")
+    print("#")
+    print("# <operation> <source x y z w>  <result x y z w>")
+    print("#")
+    print("# Only the source components read by each operation are significant. 7fc00000 matches any NaN result.")
+    for name, operation in (("RCP", _rcp), ("RCC", _rcc), ("RSQ", _rsq), ("EXP", _expp), ("LOG", _logp)):
+        for bits in _SCALAR_OPERANDS:
+            print(_line(name, (bits, 0, 0, 0), operation(_flushed(bits))))
+    for source in _LIT_OPERANDS:
+        x, y, _, w = (_flushed(bits) for bits in source)
+        print(_line("LIT", source, _lit(x, y, w)))
+
+
+if __name__ == "__main__":
+    main()